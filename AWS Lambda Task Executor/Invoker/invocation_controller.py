@@ -0,0 +1,201 @@
+from __future__ import print_function, division, absolute_import
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Error codes returned by AWS Lambda when we are being throttled (e.g., the account's concurrency limit has been reached).
+THROTTLE_ERROR_CODES = ("TooManyRequestsException", "ThrottlingException", "ThrottledException")
+
+def is_throttle_error(ex):
+    """ Return True if the given exception (raised by ``lambda_client.invoke``) indicates that we were throttled. """
+    if type(ex).__name__ in THROTTLE_ERROR_CODES:
+        return True
+    response = getattr(ex, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code", None) in THROTTLE_ERROR_CODES
+    return False
+
+class InvocationController(object):
+    """ Invoke AWS Lambda functions concurrently, adapting the number of in-flight invocations with AIMD.
+
+    Payloads are placed in a priority queue (lower values are invoked first) and invoked by a pool of threads.
+    The number of invocations that may be in flight at once (the "concurrency limit") is tuned with
+    additive-increase/multiplicative-decrease:
+
+        - Every successful invocation whose latency is within ``latency_target`` increases the limit by
+          ``additive_increase / limit`` (so the limit grows by roughly ``additive_increase`` per round).
+        - A throttled invocation (``TooManyRequestsException``) or an invocation slower than ``latency_target``
+          multiplies the limit by ``multiplicative_decrease``. The limit is decreased at most once every
+          ``decrease_interval`` seconds, so a burst of throttles counts as a single congestion event.
+
+    Throttled payloads are retried (up to ``max_retries`` times) after a jittered exponential backoff, keeping
+    their original priority. Other errors are logged and the payload is dropped.
+
+    Parameters
+    ----------
+    lambda_client : boto3 Lambda client
+        Anything with an ``invoke(FunctionName=..., InvocationType=..., Payload=...)`` method.
+    function_name : str
+        Default name of the function to invoke.
+    initial_concurrency : int
+        Starting concurrency limit.
+    min_concurrency, max_concurrency : int
+        Bounds on the concurrency limit. ``max_concurrency`` is also the size of the thread pool.
+    """
+    def __init__(self, lambda_client, function_name = None, initial_concurrency = 8, min_concurrency = 1, max_concurrency = 128,
+                 additive_increase = 1.0, multiplicative_decrease = 0.5, latency_target = 1.0, decrease_interval = 0.1,
+                 base_backoff = 0.05, max_backoff = 5.0, max_retries = 10, rate_window = 5.0, invocation_type = "Event"):
+        self.lambda_client = lambda_client
+        self.function_name = function_name
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.additive_increase = additive_increase
+        self.multiplicative_decrease = multiplicative_decrease
+        self.latency_target = latency_target
+        self.decrease_interval = decrease_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_retries = max_retries
+        self.rate_window = rate_window
+        self.invocation_type = invocation_type
+
+        self.lock = threading.Condition()
+        self.ready = []                     # Heap of (priority, sequence number, payload, function name, attempts).
+        self.delayed = []                   # Heap of (ready time, priority, sequence number, payload, function name, attempts).
+        self.counter = itertools.count()
+        self.in_flight = 0
+        self.last_decrease = 0
+        self.executor = None
+
+        self.completion_times = deque()     # Completion times of the invocations within the last 'rate_window' seconds.
+        self.num_invoked = 0                # Number of successful invocations.
+        self.num_throttled = 0              # Number of throttled invocations (each retry counts).
+        self.num_retries = 0
+        self.num_failed = 0                 # Number of payloads dropped due to an error (or too many retries).
+        self.total_latency = 0
+
+    def __repr__(self):
+        return "<InvocationController: concurrency={:.1f}, in-flight={}, queued={}, invoked={}, throttled={}>".format(
+            self.concurrency, self.in_flight, len(self.ready) + len(self.delayed), self.num_invoked, self.num_throttled)
+
+    def submit(self, payload, priority = 0, function_name = None):
+        """ Queue a payload for invocation. Payloads with lower priority values are invoked first. """
+        with self.lock:
+            heapq.heappush(self.ready, (priority, next(self.counter), payload, function_name or self.function_name, 0))
+            self.lock.notify_all()
+
+    def invoke_all(self, payloads, priority = 0, function_name = None):
+        """ Invoke each of the given payloads, returning once every payload has been invoked (or dropped).
+
+            Returns the number of successful invocations. """
+        num_invoked = self.num_invoked
+        for payload in payloads:
+            self.submit(payload, priority = priority, function_name = function_name)
+        self.run_until_empty()
+        return self.num_invoked - num_invoked
+
+    def run_until_empty(self):
+        """ Dispatch queued payloads (respecting the concurrency limit) until the queues are empty and nothing is in flight. """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers = self.max_concurrency)
+        with self.lock:
+            while True:
+                now = time.time()
+                while len(self.delayed) > 0 and self.delayed[0][0] <= now:
+                    _, priority, seq, payload, function_name, attempts = heapq.heappop(self.delayed)
+                    heapq.heappush(self.ready, (priority, seq, payload, function_name, attempts))
+                while len(self.ready) > 0 and self.in_flight < int(self.concurrency):
+                    item = heapq.heappop(self.ready)
+                    self.in_flight += 1
+                    self.executor.submit(self._invoke, item)
+                if len(self.ready) == 0 and len(self.delayed) == 0 and self.in_flight == 0:
+                    return
+                # Wait for an invocation to complete (or for the next throttled payload to become ready again).
+                timeout = None
+                if len(self.delayed) > 0:
+                    timeout = max(self.delayed[0][0] - now, 0)
+                self.lock.wait(timeout)
+
+    def _invoke(self, item):
+        priority, seq, payload, function_name, attempts = item
+        start = time.time()
+        try:
+            self.lambda_client.invoke(FunctionName = function_name, InvocationType = self.invocation_type, Payload = payload)
+        except Exception as ex:
+            with self.lock:
+                self.in_flight -= 1
+                if is_throttle_error(ex):
+                    self.num_throttled += 1
+                    self._decrease(time.time())
+                    if attempts < self.max_retries:
+                        self.num_retries += 1
+                        heapq.heappush(self.delayed, (time.time() + self.backoff(attempts), priority, seq, payload, function_name, attempts + 1))
+                    else:
+                        self.num_failed += 1
+                        logger.error("Dropping invocation of {} after {} throttled attempts.".format(function_name, attempts + 1))
+                else:
+                    self.num_failed += 1
+                    logger.error("Invocation of {} failed: {}".format(function_name, ex))
+                self.lock.notify_all()
+            return
+        end = time.time()
+        latency = end - start
+        with self.lock:
+            self.in_flight -= 1
+            self.num_invoked += 1
+            self.total_latency += latency
+            self.completion_times.append(end)
+            if latency > self.latency_target:
+                self._decrease(end)
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + self.additive_increase / self.concurrency)
+            self.lock.notify_all()
+
+    def _decrease(self, now):
+        # Must be called while holding the lock.
+        if now - self.last_decrease >= self.decrease_interval:
+            self.concurrency = max(self.min_concurrency, self.concurrency * self.multiplicative_decrease)
+            self.last_decrease = now
+
+    def backoff(self, attempts):
+        """ Return the delay (in seconds) before retrying a payload which has been throttled 'attempts + 1' times ("full jitter"). """
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempts)))
+
+    def invokes_per_second(self):
+        """ Return the number of successful invocations per second over the last 'rate_window' seconds. """
+        with self.lock:
+            now = time.time()
+            while len(self.completion_times) > 0 and self.completion_times[0] < now - self.rate_window:
+                self.completion_times.popleft()
+            if len(self.completion_times) == 0:
+                return 0.0
+            # Use the actual span of the window if we haven't been running for 'rate_window' seconds yet.
+            span = max(now - self.completion_times[0], 1e-3)
+            return len(self.completion_times) / min(span, self.rate_window)
+
+    def get_metrics(self):
+        return {
+            "concurrency": self.concurrency,
+            "in-flight": self.in_flight,
+            "queued": len(self.ready) + len(self.delayed),
+            "num-invoked": self.num_invoked,
+            "num-throttled": self.num_throttled,
+            "num-retries": self.num_retries,
+            "num-failed": self.num_failed,
+            "mean-latency": (self.total_latency / self.num_invoked) if self.num_invoked > 0 else None,
+            "invokes-per-second": self.invokes_per_second()
+        }
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait = True)
+            self.executor = None
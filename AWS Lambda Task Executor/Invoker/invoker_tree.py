@@ -0,0 +1,142 @@
+from __future__ import print_function, division, absolute_import
+
+import logging
+import random
+import string
+
+import ujson
+
+logger = logging.getLogger(__name__)
+
+# We can only send a payload of this size (in bytes) or less to a Lambda function directly.
+MAX_PAYLOAD_BYTES = 256000
+
+# An Invoker invokes this many Executors itself once its share of the payloads is small enough.
+DEFAULT_LEAF_SIZE = 50
+
+# Payloads staged in Redis are removed automatically after this many seconds.
+STAGED_PAYLOADS_TTL = 3600
+
+# Number of payloads written by a single RPUSH when staging payloads in Redis.
+STAGING_CHUNK_SIZE = 1000
+
+def split_range(start, end, k):
+    """ Split [start, end) into (at most) k contiguous sub-ranges whose sizes differ by at most one. """
+    n = end - start
+    k = max(1, min(k, n))
+    ranges = []
+    for i in range(k):
+        sub_start = start + (n * i) // k
+        sub_end = start + (n * (i + 1)) // k
+        if sub_end > sub_start:
+            ranges.append((sub_start, sub_end))
+    return ranges
+
+def stage_payloads(redis_client, payloads, ttl = STAGED_PAYLOADS_TTL):
+    """ Store the payloads in a Redis list (once), so that the Invokers can be passed ranges of the list by key.
+
+        Returns the key of the list. """
+    rand_pick = string.ascii_uppercase + string.digits + string.ascii_lowercase
+    key = "invoker-tree-" + "".join(random.choice(rand_pick) for _ in range(20))
+    pipeline = redis_client.pipeline(transaction = False)
+    for i in range(0, len(payloads), STAGING_CHUNK_SIZE):
+        pipeline.rpush(key, *payloads[i : i + STAGING_CHUNK_SIZE])
+    pipeline.expire(key, ttl)
+    pipeline.execute()
+    return key
+
+def make_invoker_events(payloads, executor_function_name, invoker_function_name, fanout, leaf_size = DEFAULT_LEAF_SIZE,
+                        redis_client = None, redis_address = None):
+    """ Create the events for the Invokers at the root of an invocation tree which launches the given payloads.
+
+        If the payloads fit in a single Lambda payload, they are split into 'fanout' inline batches. Otherwise, they are
+        staged in Redis once (see ``stage_payloads``) and each Invoker is given a range of the staged list. """
+    base_event = {
+        "lambda_function_name": executor_function_name,
+        "invoker_function_name": invoker_function_name,
+        "fanout": fanout,
+        "leaf_size": leaf_size
+    }
+    ranges = split_range(0, len(payloads), fanout)
+    events = []
+    if len(ujson.dumps(payloads)) > MAX_PAYLOAD_BYTES:
+        if redis_client is None:
+            raise ValueError("A Redis client is required to launch {} payloads, as they are larger than {} bytes.".format(len(payloads), MAX_PAYLOAD_BYTES))
+        redis_key = stage_payloads(redis_client, payloads)
+        for start, end in ranges:
+            event = dict(base_event, redis_key = redis_key, redis_address = redis_address, start = start, end = end)
+            events.append(event)
+    else:
+        for start, end in ranges:
+            events.append(dict(base_event, payloads_serialized = payloads[start:end]))
+    return events
+
+def launch_invoker_tree(controller, payloads, executor_function_name, invoker_function_name, fanout, leaf_size = DEFAULT_LEAF_SIZE,
+                        redis_client = None, redis_address = None):
+    """ Launch the given Executor payloads via a k-ary tree of Invokers. Returns the number of Invokers invoked. """
+    events = make_invoker_events(payloads, executor_function_name, invoker_function_name, fanout, leaf_size = leaf_size,
+                                 redis_client = redis_client, redis_address = redis_address)
+    return controller.invoke_all([ujson.dumps(event) for event in events], function_name = invoker_function_name)
+
+def handle_invoker_event(event, controller, get_redis_client):
+    """ Process an event sent to the Invoker.
+
+        If the event has a "fanout" of at least two, the Invoker's payloads are split into 'fanout' sub-batches. All but
+        the first are sent to other Invokers, and the first is split again, until it has at most "leaf_size" payloads.
+        Those are invoked by this Invoker. The sub-batches are sent before the Executors are invoked, so a launch of
+        N payloads completes in O(log N) rounds of invocations.
+
+        Payloads staged in Redis are passed as a range ("start", "end") of the list at "redis_key". Only the range that
+        this Invoker ends up invoking itself is read. Events with a "redis_key" but no range (the format used before
+        invocation trees) hold the serialized event under that key.
+
+        Parameters
+        ----------
+        event : dict
+            The event passed to the Invoker.
+        controller : InvocationController
+            Used to issue the invocations.
+        get_redis_client : callable
+            Called with the address of the Redis instance on which payloads are staged. Returns a client.
+
+        Returns the number of Executors and the number of Invokers invoked.
+    """
+    executor_function_name = event["lambda_function_name"]
+    invoker_function_name = event.get("invoker_function_name", None)
+    fanout = event.get("fanout", 0)
+    leaf_size = event.get("leaf_size", DEFAULT_LEAF_SIZE)
+    use_tree = fanout >= 2 and invoker_function_name is not None
+
+    child_events = []
+    if "redis_key" in event and "start" in event:
+        start, end = event["start"], event["end"]
+        if use_tree:
+            while end - start > leaf_size:
+                ranges = split_range(start, end, fanout)
+                for sub_start, sub_end in ranges[1:]:
+                    child_events.append(dict(event, start = sub_start, end = sub_end))
+                start, end = ranges[0]
+        redis_client = get_redis_client(event["redis_address"])
+        payloads = [payload.decode() if isinstance(payload, bytes) else payload for payload in redis_client.lrange(event["redis_key"], start, end - 1)]
+    else:
+        if "redis_key" in event:
+            redis_client = get_redis_client(event["redis_address"])
+            payloads = ujson.loads(redis_client.get(event["redis_key"]))["payloads_serialized"]
+        else:
+            payloads = event["payloads_serialized"]
+        if use_tree:
+            while len(payloads) > leaf_size:
+                ranges = split_range(0, len(payloads), fanout)
+                for sub_start, sub_end in ranges[1:]:
+                    child_event = {key: value for key, value in event.items() if key not in ("redis_key", "redis_address")}
+                    child_event["payloads_serialized"] = payloads[sub_start:sub_end]
+                    child_events.append(child_event)
+                payloads = payloads[ranges[0][0]:ranges[0][1]]
+
+    # The other Invokers go first (lower priority value), as they have more work to do than we do.
+    for child_event in child_events:
+        controller.submit(ujson.dumps(child_event), priority = 0, function_name = invoker_function_name)
+    for payload in payloads:
+        controller.submit(payload, priority = 1, function_name = executor_function_name)
+    controller.run_until_empty()
+    return len(payloads), len(child_events)
@@ -4,9 +4,25 @@ import redis
 #import multiprocessing
 import boto3 
 
+from invocation_controller import InvocationController
+from invoker_tree import handle_invoker_event
+
 lc = boto3.client("lambda", region_name = "us-east-1")
 redis_client = None 
 
+# Invokes the payloads concurrently, backing off when we are throttled. The controller (and its concurrency limit)
+# is kept across warm invocations of the Invoker.
+controller = InvocationController(lc, initial_concurrency = 8, max_concurrency = 64)
+
+def get_redis_client(redis_addr):
+    """ Return the (cached) connection to the Redis instance on which payloads have been staged. """
+    global redis_client
+    if redis_client is None:
+        print("Connecting to Redis at {}.".format(redis_addr))
+        redis_client = redis.Redis(host = redis_addr, port = 6379, db = 0)
+        print("Connection successful.")
+    return redis_client
+
 def lambda_handler(event, context):
     """
     This is the handler for the "Invoker" AWS Lambda function. 
@@ -18,40 +34,16 @@ def lambda_handler(event, context):
         
         context: Provides methods and properties that provide information about the invocation, function, and execution environment. Passed by AWS Lambda to the function at runtime. 
     """
-    global redis_client
-
-    payloads_serialized = None 
-    lambda_function_name = event["lambda_function_name"]
     st = time.time()
-    if "redis_key" in event: 
-        redis_key = event["redis_key"]
-        redis_addr = event["redis_address"]
-        if redis_client is None:
-            print("Connecting to Redis at {}.".format(redis_addr))
-            redis_client = redis.Redis(host = redis_addr, port = 6379, db = 0)
-            print("Connection successful.")
-        print("Retrieving data from Redis at key {}.".format(redis_key))
-        t = time.time()
-        payloads_serialized = redis_client.get(redis_key)
-        e = time.time()
-        print("Time to retrieve payloads from Redis: {} seconds.".format(e - t))
-        
-        t = time.time()
-        payloads_serialized = ujson.loads(payloads_serialized)["payloads_serialized"]
-        e = time.time()
-        print("Time to deserialize payloads from Redis: {} seconds".format((e-t)))
-    else:    
-        payloads_serialized = event["payloads_serialized"]
-    
-    print("Invoking {} lambdas with function name {}.".format(len(payloads_serialized), lambda_function_name))
-    
+    print("Invoking {} lambdas with function name {}.".format("staged" if "redis_key" in event else len(event.get("payloads_serialized", [])), event["lambda_function_name"]))
+
     t = time.time()
-    for payload in payloads_serialized:
-        lc.invoke(FunctionName=lambda_function_name, InvocationType='Event', Payload=payload)
+    num_invoked, num_invokers = handle_invoker_event(event, controller, get_redis_client)
     end = time.time()
     
-    print("Time to invoke {} functions: {} seconds. Total time: {} seconds.".format(len(payloads_serialized), (end - t), (end - st)))
+    print("Time to invoke {} functions and {} invokers: {} seconds. Total time: {} seconds.".format(num_invoked, num_invokers, (end - t), (end - st)))
+    print("Invocation metrics: {}".format(controller.get_metrics()))
     return {
         'statusCode': 200,
-        'body': ujson.dumps('Invoked {} Lambda functions.'.format(len(payloads_serialized)))
+        'body': ujson.dumps('Invoked {} Lambda functions.'.format(num_invoked))
     }
@@ -0,0 +1,58 @@
+from __future__ import print_function, division, absolute_import
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Appended to the end of a task key to get the key (on the same Redis instance as the task's output) counting the downstream
+# tasks that have yet to read the output. Only written for tasks whose output should be garbage-collected.
+CONSUMER_COUNTER_SUFFIX = "---consumers"
+
+# Records that ARGV[1] consumers read the value at KEYS[1], deleting the value (and its counter) once every consumer has read it.
+# Values whose producers did not register a consumer count are left alone.
+RELEASE_VALUE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+   return -1
+end
+local remaining = redis.call('DECRBY', KEYS[2], ARGV[1])
+if remaining <= 0 then
+   redis.call('UNLINK', KEYS[1], KEYS[2])
+end
+return remaining
+"""
+
+def num_consumers(path_node):
+    """ Return the number of downstream tasks that are going to release the output of the given task.
+
+        Every downstream task counts, including the 'become' task: it only runs on the same Executor if it is ready once
+        the output is stored. Otherwise (e.g., a fan-in whose other inputs aren't done yet), another Executor runs it and
+        reads the output from Redis. Each downstream task releases each of its inputs once it has executed, wherever it got
+        them from (Redis, the local cache, or the invocation payload). """
+    return path_node.num_downstream_tasks()
+
+def register_consumers(redis_client, key, count):
+    """ Record that 'count' downstream tasks are going to read the value stored under 'key'. Must be written before
+        any of them can run. """
+    redis_client.set(key + CONSUMER_COUNTER_SUFFIX, count)
+
+def release_values(locate, keys):
+    """ Record that one consumer of each of the given keys no longer needs its value.
+
+        'locate' is called with a key and returns a (location, Redis client) pair identifying the instance storing it,
+        or None if the value can't be located without another round trip (these are skipped; the Scheduler deletes them
+        along with the rest of the job's keys). The releases are pipelined per instance. """
+    pipelines = dict()
+    for key in keys:
+        located = locate(key)
+        if located is None:
+            continue
+        location, redis_client = located
+        if location not in pipelines:
+            pipelines[location] = redis_client.pipeline(transaction = False)
+        pipelines[location].eval(RELEASE_VALUE_SCRIPT, 2, key, key + CONSUMER_COUNTER_SUFFIX, 1)
+
+    for location, pipeline in pipelines.items():
+        try:
+            pipeline.execute()
+        except Exception as ex:
+            logger.error("Failed to release values stored at {}: {}".format(location, ex))
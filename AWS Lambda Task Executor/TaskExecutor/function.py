@@ -10,13 +10,16 @@ import sys
 import queue 
 import logging
 import os
+from collections import OrderedDict
 from zipfile import ZipFile
 import boto3
 
-from wukong_metrics import TaskExecutionBreakdown, LambdaExecutionBreakdown, WukongEvent
+from wukong_metrics import TaskExecutionBreakdown, LambdaExecutionBreakdown, WukongEvent, pack_task_breakdown, pack_lambda_breakdown
 from utils import key_split
 from exception import error_message
 from serialization import from_frames
+from sharding import RedisShardRing, parse_redis_endpoint
+from consumers import num_consumers, register_consumers, release_values
 
 from aws_xray_sdk.core import xray_recorder
 xray_recorder.configure(service='my_service', sampling=True, context_missing='LOG_ERROR') #context=AsyncContext()
@@ -27,6 +30,27 @@ xray_recorder.configure(service='my_service', sampling=True, context_missing='LO
 # https://docs.aws.amazon.com/lambda/latest/dg/lambda-python-how-to-create-deployment-package.html#python-package-dependencies
 
 no_value = "--no-value-sentinel--"
+
+# Key in a task definition holding the definitions of the tasks the Scheduler fused into it (in execution order).
+FUSED_TASKS_KEY = "fused-tasks"
+
+# Key in a task definition listing the hashes of the large constants the Scheduler staged out of it (see get_staged_constants).
+STAGED_CONSTANTS_KEY = "staged-constants"
+
+# A staged constant is replaced (in the task definition, or in its serialized arguments) by this prefix followed by the constant's hash.
+STAGED_CONSTANT_PREFIX = "--staged-constant--"
+
+# Appended to the hash of a staged constant to get the Redis key (on the control-plane shards) under which it is stored.
+CONSTANT_KEY_SUFFIX = "---constant"
+
+# Maximum total size (in bytes) of the staged constants cached by this container. The least recently used ones are evicted first.
+STAGED_CONSTANTS_CACHE_BYTES = 256 * 1024 * 1024
+
+# Key in a task definition holding the task's fingerprint. If present, the Scheduler memoizes the task's output (see publish_memoized_output).
+FINGERPRINT_KEY = "fingerprint"
+
+# Redis list (on the dcp_redis instance) of the memoizable outputs stored by the Task Executors, drained by the Scheduler.
+MEMOIZED_OUTPUTS_KEY = "memoized-outputs"
 collection_types = (tuple, list, set, frozenset)
 
 # These are automatically passed by scheduler/other Lambdas.
@@ -43,6 +67,11 @@ dcp_redis = None #redis.StrictRedis(host = proxy_address, port = 6379, db = 0, s
 
 pubsub = None #dcp_redis.pubsub()
 
+# Consistent-hash ring over the Redis instances on which dependency counters, paths, Fargate metadata, and small results are stored.
+# The list of endpoints is passed to us in the invocation payload ("redis-endpoints"). If it is absent, then the ring consists of just dcp_redis.
+dcp_ring = None
+redis_endpoints = None
+
 # Leaf Task Lambdas will subscribe to a Redis Pub/Sub channel prefixed by this. The suffix will be the corresponding leaf task key.
 leaf_task_channel_prefix = "__keyspace@0__:"
 
@@ -51,6 +80,10 @@ EC2_REDIS_METRIC_KEY = "EC2-Redis"
 # Maintains a list of tasks executed locally on this Lambda function.
 executed_tasks = dict()
 
+# Cache of the staged constants (hash --> serialized constant) read by this container, in least-recently-used order.
+staged_constants = OrderedDict()
+staged_constants_bytes = 0
+
 # Key used in dictionary sent to Lambdas (the dictionary contains information from Path objects).
 TASK_TO_FARGATE_MAPPING = "tasks-to-fargate-mapping"
 NODES_MAP = "nodes-map"
@@ -58,6 +91,10 @@ NODES_MAP = "nodes-map"
 # Map between IP addresses and Redis clients (each of which would be connected to the Redis instance at the respective IP address).
 hostnames_to_clients = dict()
 
+# Map between task keys and the endpoint ("host:port") of a copy of the task's value that this Lambda should read from.
+# The KV Store Proxy copies values with a large fan-out to several Fargate nodes and spreads the readers across the copies.
+read_replicas = dict()
+
 # These are used as keys in dictionaries passed to and between Lambdas (i.e., Scheduler --> Lambda, Lambda --> Lambda, Lambda --> Proxy, Proxy --> Lambda, etc.)
 starting_node_payload_key = "starts-at"
 path_key_payload_key = "path-key"
@@ -91,7 +128,7 @@ ITERATION_COUNTER_SUFFIX = "---iteration"
 # Appended to the end of a task key to store fargate node metadata in Redis.
 FARGATE_DATA_SUFFIX = "---fargate"
 
-# Redis pub-sub channel used to transfer messages to the Scheduler.
+# Redis Stream (formerly a pub-sub channel) used to transfer messages to the Scheduler.
 REDIS_PUB_SUB_CHANNEL = "dask-workers-1"
 
 # Used to tell Task Executors whether or not to use the Task Queue (large objects wait for tasks to become ready instead of writing data).
@@ -176,6 +213,9 @@ def lambda_handler(event, context):
    global executor_function_name
    global proxy_address
    global dcp_redis
+   global dcp_ring
+   global redis_endpoints
+   global read_replicas
    handler_start_time = time.time()
 
    install_deps_from_S3_start = time.time()
@@ -227,6 +267,15 @@ def lambda_handler(event, context):
    # Now that we have the proxy address, connect to Redis (co-located with the proxy).
    dcp_redis = redis.StrictRedis(host = proxy_address, port = 6379, db = 0, socket_connect_timeout  = 20, socket_timeout = 20)
 
+   # Connect to the control-plane shards. Keep the existing ring if this container is being reused with the same endpoints.
+   _redis_endpoints = event.get("redis-endpoints") or [proxy_address]
+   if dcp_ring is None or redis_endpoints != _redis_endpoints:
+      redis_endpoints = _redis_endpoints
+      dcp_ring = RedisShardRing(redis_endpoints, socket_connect_timeout = 20, socket_timeout = 20)
+   logger.debug("Control-plane Redis shards: {}".format(dcp_ring.endpoints))
+
+   read_replicas = event.get("read-replicas") or dict()
+
    # Begin executing tasks.
    res = task_executor(event, context, previous_results = dict(), task_execution_breakdowns = task_execution_breakdowns, lambda_execution_breakdown = lambda_execution_breakdown)
 
@@ -287,7 +336,7 @@ def lambda_handler(event, context):
       #while num_tries <= max_tries and num_loops < max_loops:
       while time.time() < finish:
          new_val = counter_value
-         new_val_encoded = dcp_redis.get(leaf_key + ITERATION_COUNTER_SUFFIX)
+         new_val_encoded = dcp_ring.get_client(leaf_key).get(leaf_key + ITERATION_COUNTER_SUFFIX)
          logger.debug("Leaf Task Lambda associated with task {} retrieved value {} for iteration counter encoded.".format(leaf_key, new_val_encoded))
          if new_val_encoded is not None:
             new_val = int(new_val_encoded.decode())
@@ -384,9 +433,10 @@ def lambda_handler(event, context):
       # Explicitly unsubscribe so it's clear we aren't looking for messages anymore.
       pubsub.unsubscribe(channel)
 
+   # Push compact, fixed-layout records (rather than pickled objects), which the Scheduler drains into columnar tables.
    if len(task_execution_breakdowns) > 0:
-      dcp_redis.lpush("task_breakdowns", *[cloudpickle.dumps(breakdown) for breakdown in list(task_execution_breakdowns.values())])
-   dcp_redis.lpush("lambda_durations", cloudpickle.dumps(lambda_execution_breakdown))
+      dcp_redis.lpush("task_breakdowns", *[pack_task_breakdown(breakdown) for breakdown in list(task_execution_breakdowns.values())])
+   dcp_redis.lpush("lambda_durations", pack_lambda_breakdown(lambda_execution_breakdown))
 
    if len(lambda_execution_breakdown.fan_outs) > 0:
       dcp_redis.lpush("fan-out-data", *[cloudpickle.dumps(fanout_data) for fanout_data in lambda_execution_breakdown.fan_outs])
@@ -600,7 +650,7 @@ def task_executor(event, context, previous_results = dict(), task_execution_brea
       # If we're already subscribed, then this shouldn't have any ill-effects given Redis just uses a HashTable to map subscriptions...
       #pubsub.subscribe(channel) 
 
-      counter_value = int(dcp_redis.get(leaf_key + ITERATION_COUNTER_SUFFIX).decode())
+      counter_value = int(dcp_ring.get_client(leaf_key).get(leaf_key + ITERATION_COUNTER_SUFFIX).decode())
 
    logger.debug("-+-+-+-+-+- Lambda Debug: {} -+-+- Use Bitwise Dependency Checking: {} -+-+- Use Task Queue: {} -+-+- Is Leaf: {} -+-+- Starting Node Key: {} -+-+-+-+-+-".format(lambda_debug, use_bit_dep_checking, use_task_queue, is_leaf, starting_node_key))
 
@@ -675,8 +725,9 @@ def task_executor(event, context, previous_results = dict(), task_execution_brea
 @xray_recorder.capture("publish_dcp_message")
 def publish_dcp_message(channel, payload, serialized = True, max_tries = 8, base_sleep = 0.1, max_sleep = 5):
    """
-   Used to publish messages via Redis' pub-sub API. The "dcp" refers to "dependency counter process". There is one specific Redis server used by Wukong to track
-   task dependencies (via so-called "dependency counters"). We are using the pub-sub API of that specific Redis server when publishing (or listening for) messages.
+   Used to publish messages to the Scheduler/KV Store Proxy. The "dcp" refers to "dependency counter process". There is one specific Redis server used by Wukong to track
+   task dependencies (via so-called "dependency counters"). Messages are appended (XADD) to a Redis Stream on that server named after the channel. The Scheduler and the
+   proxy read the streams as part of a consumer group, so messages are not lost if they fall behind or restart.
    """
    payload_serialized = payload 
 
@@ -689,8 +740,8 @@ def publish_dcp_message(channel, payload, serialized = True, max_tries = 8, base
 
    while num_tries <= max_tries:
       try:
-         dcp_redis.publish(channel, payload_serialized)
-         logger.debug("Successfully published Redis pub-sub message.")
+         dcp_redis.xadd(channel, {"data": payload_serialized})
+         logger.debug("Successfully published message to Redis Stream {}.".format(channel))
          success = True
          break
       except (ConnectionError, Exception) as ex:
@@ -709,7 +760,7 @@ def publish_dcp_message(channel, payload, serialized = True, max_tries = 8, base
 def get_path_from_redis(path_key = None, task_execution_breakdown = None, lambda_execution_breakdown = None):
    """ 
    Retrieve a Path object from Redis. This is a separate method because it does not use a path_node object
-   and it always uses the Redis instance to which dcp_redis is connected.
+   and it always uses the control-plane shard (see dcp_ring) responsible for the path key.
 
    Args:
       path_key (String): The Redis key for the desired Path object.
@@ -719,7 +770,7 @@ def get_path_from_redis(path_key = None, task_execution_breakdown = None, lambda
       lambda_execution_breakdown (LambdaExecutionBreakdown): The WukongMetrics object encapsulating all metrics associated with this Lambda invocation.         
 
    Returns:
-      Path: the Path object stored at the given key in the Redis instance to which dcp_redis is connected.
+      Path: the Path object stored at the given key on the control-plane shard responsible for that key.
    """
 
    logger.debug("Obtaining path from Redis for path_key {}".format(path_key))
@@ -727,7 +778,7 @@ def get_path_from_redis(path_key = None, task_execution_breakdown = None, lambda
    read_start = time.time()
 
    # Retrieve the Path object from Redis.
-   path_serialized = dcp_redis.get(path_key)
+   path_serialized = dcp_ring.get_client(path_key).get(path_key)
    
    # Compute read time and size for metric collection/debugging.
    read_stop = time.time()
@@ -815,7 +866,7 @@ def get_data_from_redis(task_to_fargate_mapping,
          if key not in task_to_fargate_mapping:
             logger.debug("[WARNING] The key '{}' is not contained within task_to_fargate_mapping. The tasks contained in the mapping are:\n\t{}\nRetrieving Fargate info from Redis now...".format(redis_key, list(task_to_fargate_mapping.keys())))
             read_start = time.time()
-            fargate_dict_serialized = dcp_redis.get(key + FARGATE_DATA_SUFFIX)
+            fargate_dict_serialized = dcp_ring.get_client(key).get(key + FARGATE_DATA_SUFFIX)
             read_stop = time.time()
             fargate_dict = json.loads(fargate_dict_serialized)
             deser_stop = time.time()
@@ -873,9 +924,9 @@ def get_data_from_redis(task_to_fargate_mapping,
          # Cache the connection.
          hostnames_to_clients[fargate_ip] = redis_client      
    else:
-      logger.debug("Obtaining data for key {} [sid-{}] from DCP Redis.".format(redis_key, current_scheduler_id))
+      logger.debug("Obtaining data for key {} [sid-{}] from DCP Redis shard {}.".format(redis_key, current_scheduler_id, dcp_ring.get_node_name(redis_key)))
 
-      redis_client = dcp_redis
+      redis_client = dcp_ring.get_client(redis_key)
    
    read_start = time.time() 
 
@@ -895,7 +946,7 @@ def get_data_from_redis(task_to_fargate_mapping,
          if exists > 0:
             return True 
          else:
-            exists = dcp_redis.get(redis_key)
+            exists = dcp_ring.get_client(redis_key).get(redis_key)
 
             read_size = sys.getsizeof(exists)
             lambda_execution_breakdown.bytes_read += read_size 
@@ -915,8 +966,23 @@ def get_data_from_redis(task_to_fargate_mapping,
 
    val = None
 
+   # If the proxy assigned us a copy of this value, try to read it from there first. The copies expire, so if the copy
+   # is missing (or the node cannot be reached), we just fall back to the usual location without sleeping.
+   if redis_key in read_replicas:
+      replica_endpoint = read_replicas[redis_key]
+      try:
+         replica_client = hostnames_to_clients.get(replica_endpoint, None)
+         if replica_client is None:
+            replica_host, replica_port = parse_redis_endpoint(replica_endpoint)
+            replica_client = redis.StrictRedis(host = replica_host, port = replica_port, db = 0, socket_connect_timeout = 5, socket_timeout = 20)
+            hostnames_to_clients[replica_endpoint] = replica_client
+         val = replica_client.get(redis_key)
+         logger.debug("Read value for key {} [sid-{}] from read replica {}: {}".format(redis_key, current_scheduler_id, replica_endpoint, "hit" if val is not None else "miss"))
+      except Exception as ex:
+         logger.error("Exception while reading key {} [sid-{}] from read replica {}: {}".format(redis_key, current_scheduler_id, replica_endpoint, ex))
+
    # Exponential backoff...
-   while (num_tries < max_tries):
+   while val is None and num_tries < max_tries:
       try:
          logger.debug("\tAttempting to read value for {} [sid-{}] now... (try {}/{})".format(redis_key, current_scheduler_id, num_tries, max_tries))
          read_start = time.time() # Re-initialize the start time here in case we've looped.
@@ -980,7 +1046,7 @@ def get_data_from_redis(task_to_fargate_mapping,
             try:
                read_start = time.time() # Re-initialize the start time here in case we've looped or checked Fargate-Redis previously.
                # Retrieve and return the data.
-               val = dcp_redis.get(redis_key)
+               val = dcp_ring.get_client(redis_key).get(redis_key)
                read_stop = time.time()
                break 
             except Exception as ex:
@@ -1088,7 +1154,7 @@ def store_value_in_redis(path_node,
          # Cache the connection.
          hostnames_to_clients[fargate_ip] = redis_client
    else:
-      redis_client = dcp_redis
+      redis_client = dcp_ring.get_client(redis_key)
    
    # If we're supposed to check for an existing value first, then we'll see if a value already exists. Otherwise simply store the data w/o checking.
    if check_first:
@@ -1167,6 +1233,18 @@ def store_value_in_redis(path_node,
 
    write_stop = time.time()
    redis_write_time = write_stop - write_start
+
+   # If the output should be garbage-collected, record how many downstream tasks are going to read it. The last one deletes it.
+   # This is written before the downstream tasks are invoked (or become-d), so every release finds the counter.
+   task_payload = path_node.task_payload
+   if key is None and type(task_payload) is dict and task_payload.get("collect-garbage", False) and not task_payload.get("output-wanted", True) and num_consumers(path_node) > 0:
+      try:
+         register_consumers(redis_client, redis_key, num_consumers(path_node))
+      except Exception as ex:
+         logger.error("Failed to register the consumers of task {}: {}".format(task_key, ex))
+
+   if key is None:
+      publish_memoized_output(task_payload, task_key, fargate_node, write_size)
    
    # Record metric information.
    task_execution_breakdown.redis_write_time += redis_write_time 
@@ -1207,6 +1285,48 @@ def store_value_in_redis(path_node,
 
    return True 
 
+def publish_memoized_output(task_payload, task_key, fargate_node, nbytes):
+   """
+      Tell the Scheduler that the output of the given task has been stored, if the task has a fingerprint, so that later jobs can reuse it.
+
+      Args:
+         task_payload (dict): The task's payload (as constructed by the Scheduler).
+
+         task_key (str): The key the output was stored under.
+
+         fargate_node (dict or None): The Fargate node storing the output. None if it was stored on the control-plane shards.
+
+         nbytes (int): The size of the stored output.
+   """
+   if type(task_payload) is not dict or task_payload.get(FINGERPRINT_KEY, None) is None:
+      return
+   record = {"fingerprint": task_payload[FINGERPRINT_KEY], "key": task_key, "fargate-node": fargate_node, "nbytes": nbytes}
+   try:
+      dcp_redis.lpush(MEMOIZED_OUTPUTS_KEY, json.dumps(record))
+   except Exception as ex:
+      logger.error("Failed to publish the memoized output of task {}: {}".format(task_key, ex))
+
+def release_dependencies(task_to_fargate_mapping, keys):
+   """ Record that the current task has used (and no longer needs) the values of the given keys.
+
+      Each value whose consumer counter drops to zero is deleted from Redis (UNLINK). Values we can't locate without
+      another round trip are skipped; the Scheduler deletes them along with the rest of the job's keys.
+
+      Args:
+         task_to_fargate_mapping (dict): Mapping between task keys and fargate dicts. This defines which tasks are stored in which Fargate nodes.
+
+         keys (list): The keys of the dependencies the current task used.
+   """
+   def locate(key):
+      if use_fargate:
+         fargate_dict = task_to_fargate_mapping.get(key, None)
+         if fargate_dict is None or fargate_dict[FARGATE_PUBLIC_IP_KEY] not in hostnames_to_clients:
+            return None
+         return fargate_dict[FARGATE_PUBLIC_IP_KEY], hostnames_to_clients[fargate_dict[FARGATE_PUBLIC_IP_KEY]]
+      return dcp_ring.get_node_name(key), dcp_ring.get_client(key)
+
+   release_values(locate, keys)
+
 def create_mask(n, omit = []):
    """ Create a bit mask for a dependency key with 'n' dependencies. We shift
        and modify the bit mask to work with the way Redis and EC2 store their values.
@@ -1292,7 +1412,7 @@ def check_dependency_counter_bits(dependent_path_node, num_dependencies, increme
       logger.debug("bit_offset for {}: {}".format(dependency_path_node.task_key, bit_offset))
 
       # Construct transaction.
-      dep_pipeline = dcp_redis.pipeline(transaction = True)
+      dep_pipeline = dcp_ring.get_client(dependent_task_key).pipeline(transaction = True)
       dep_pipeline.setbit(key_counter, bit_offset, 1)
       dep_pipeline.get(key_counter)
 
@@ -1415,7 +1535,7 @@ def check_dependency_counter_bits(dependent_path_node, num_dependencies, increme
 
       while num_tries <= max_tries:
          try:
-            dep_counter_bytes = dcp_redis.get(key_counter)
+            dep_counter_bytes = dcp_ring.get_client(key_counter).get(key_counter)
             success = True
             break                                                                                                               
          except (ConnectionError, Exception) as ex:
@@ -1587,7 +1707,7 @@ def check_dependency_counter(path_node, num_dependencies, increment = False, tas
 
       while num_tries <= max_tries:
          try:
-            dependencies_completed = dcp_redis.incr(key_counter)
+            dependencies_completed = dcp_ring.get_client(key_counter).incr(key_counter)
             success = True
             break                                                                                                            
          except (ConnectionError, Exception) as ex:
@@ -1636,7 +1756,7 @@ def check_dependency_counter(path_node, num_dependencies, increment = False, tas
 
       while num_tries <= max_tries:
          try:
-            dependencies_completed = int(dcp_redis.get(key_counter).decode())
+            dependencies_completed = int(dcp_ring.get_client(key_counter).get(key_counter).decode())
             success = True 
             break
          except AttributeError:
@@ -2057,7 +2177,7 @@ def process_path(nodes_map_serialized,
             while (num_tries <= max_tries and not success):
                try:  
                   # By convention, store final results in the big node cluster.
-                  dcp_redis.set(task_key, serialized_value)
+                  dcp_ring.get_client(task_key).set(task_key, serialized_value)
                   success = True
                except Exception as ex:
                   logger.error("Connection to DCP Redis timed out while calling set() for task {}. (try {}/{}).".format(
@@ -2074,6 +2194,8 @@ def process_path(nodes_map_serialized,
                      logger.warning("\t\tSleeping for {} seconds before trying again...".format(sleep_amount))
                      time.sleep(sleep_amount)                     
 
+            publish_memoized_output(current_path_node.task_payload, task_key, None, write_size)
+
             # Collect, calculate, and store diagnostic/metric/debug information.
             write_stop = time.time()
             write_duration = write_stop - write_start
@@ -2422,7 +2544,7 @@ def process_out_edges(out_edges,
                continue
             # Does a value exist for the task in Redis? 
             # Note that this will only catch tasks which were final results... so not exactly useful...
-            elif dcp_redis.exists(dependent_key) != 0:
+            elif dcp_ring.get_client(dependent_key).exists(dependent_key) != 0:
                continue 
             else:
                logger.debug("[INFO] Cannot delete previous result {} yet as at least one task ({}) is still incomplete.".format(key, dependent_key))
@@ -2488,6 +2610,7 @@ def process_out_edges(out_edges,
          invoked_by_payload_key: current_task_key,
          "use-fargate": use_fargate,
          "proxy_address": proxy_address,
+         "redis-endpoints": redis_endpoints,
          "executor_function_name": executor_function_name,
          "invoker_function_name": invoker_function_name
       }
@@ -2894,10 +3017,10 @@ def process_big(current_path_node,
          
          # If we're using the bit-method, then we should toggle the bit, not increment.
          if use_bit_dep_checking == False:
-            dcp_redis.incr(key_counter)
+            dcp_ring.get_client(key_counter).incr(key_counter)
          else:
             offset = current_path_node.dep_index_map[out_edge.task_key]
-            dcp_redis.setbit(key_counter, offset, 1)
+            dcp_ring.get_client(key_counter).setbit(key_counter, offset, 1)
       else:
          # In some cases, big tasks should not use the task queue. For example, in GEMM, tasks are often dependent on exclusively large tasks (and a large number
          # of them) so the current version of this strategy would not work correctly. For now, it is up to the user to determine when they should attempt to use the task queue.
@@ -3118,11 +3241,12 @@ def process_big(current_path_node,
          
          write_start = time.time()
          # By convention, store final results in the big node cluster.
-         dcp_redis.set(task_node.task_key, value_serialized)         
+         dcp_ring.get_client(task_node.task_key).set(task_node.task_key, value_serialized)         
          write_stop = time.time() 
 
          write_duration = write_stop - write_start 
          write_size = sys.getsizeof(value_serialized)
+         publish_memoized_output(task_node.task_payload, task_node.task_key, None, write_size)
 
          write_event = WukongEvent(
             name = "Store Intermediate Data in EC2 Redis",
@@ -3236,8 +3360,29 @@ def process_task(task_definition,
    if "kwargs" in task_definition:
       kwargs_serialized = task_definition["kwargs"]
 
+   # If the Scheduler fused a chain of tasks into this one, those tasks are executed (in order) right before this one.
+   # Their results are only kept in memory, as nothing outside of the chain depends on them.
+   fused_tasks = task_definition.get(FUSED_TASKS_KEY, None)
+
+   # The Scheduler may have replaced large constants in the task (and in the tasks fused into it) by references to their hashes.
+   constants = None
+   staged = set(task_definition.get(STAGED_CONSTANTS_KEY, ()))
+   for fused_task in fused_tasks or ():
+      staged.update(fused_task.get(STAGED_CONSTANTS_KEY, ()))
+   if len(staged) > 0:
+      constants = get_staged_constants(staged, task_execution_breakdown = current_task_execution_breakdown, lambda_execution_breakdown = lambda_execution_breakdown)
+      missing_constants = [digest for digest in staged if digest not in constants]
+      if len(missing_constants) > 0:
+         logger.error("Staged constants {} of task {} are missing from Redis. Exiting.".format(missing_constants, key))
+         return {
+            OP_KEY: TASK_ERRED_KEY,
+            "statusCode": 400,
+            "exception": "staged constants {} are missing".format(missing_constants),
+            "body": "staged constants {} are missing".format(missing_constants)
+         }
+
    # Deserialize the code, arguments, and key-word arguments for the task.
-   func, args, kwargs = _deserialize(func_serialized, args_serialized, kwargs_serialized, task_serialized)
+   func, args, kwargs = _deserialize(func_serialized, args_serialized, kwargs_serialized, task_serialized, constants = constants)
 
    subsegment = xray_recorder.begin_subsegment("getting-dependencies-from-redis")
    
@@ -3389,7 +3534,11 @@ def process_task(task_definition,
       lambda_execution_breakdown.publishing_messages += publish_duration      
 
    function_start_time = time.time()
-   result = apply_function(func, args2, kwargs2, key)
+   if fused_tasks:
+      # Errors raised by any task of the chain are reported as errors of this (composite) task.
+      result = apply_function(execute_fused_tasks, (fused_tasks, data, func, args, kwargs, constants), {}, key)
+   else:
+      result = apply_function(func, args2, kwargs2, key)
    function_end_time = time.time()
    execution_time = function_end_time - function_start_time  
    result[EXECUTION_TIME_KEY] = execution_time
@@ -3414,6 +3563,11 @@ def process_task(task_definition,
       # The task executed successfully so store its task_definition in executed_tasks to indicate this.
       executed_tasks[key] = task_definition
 
+      # We won't need our dependencies again, so let their producers' Redis instances know. Every downstream task is counted
+      # as a consumer, whether it reads the value from Redis, from our local cache (e.g., when we 'become' it), or from its payload.
+      if task_definition.get("collect-garbage", False) and len(dependencies) > 0:
+         release_dependencies(task_to_fargate_mapping, list(dependencies))
+
    # If the Lambda's execution resulted in an error, then we want to inform the Scheduler of this regardless of whether or not debugging is enabled.
    elif result[OP_KEY] == TASK_ERRED_KEY:
       payload = {
@@ -3530,10 +3684,10 @@ def process_enqueued_tasks(previous_results, tasks_to_fargate_nodes, nodes_to_pr
 
             # If we're using the bit-method, then we should toggle the bit, not increment.
             if use_bit_dep_checking == False:
-               dcp_redis.incr(key_counter)
+               dcp_ring.get_client(key_counter).incr(key_counter)
             else:
                offset = delayed_node.large_node.dep_index_map[path_node.task_key]
-               dcp_redis.setbit(key_counter, offset, 1) 
+               dcp_ring.get_client(key_counter).setbit(key_counter, offset, 1) 
          else:
             logger.debug("Downstream task {} is still not ready to execute. Will put it back into the task_queue.".format(path_node.task_key))
             still_not_ready.append(delayed_node)
@@ -3787,14 +3941,26 @@ def deserialize_payload(payload):
    return from_frames(payload)
 
 @xray_recorder.capture("_deserialize")
-def _deserialize(function=None, args=None, kwargs=None, task=no_value):
-   """ Deserialize task inputs and regularize to func, args, kwargs """
+def _deserialize(function=None, args=None, kwargs=None, task=no_value, constants=None):
+   """ Deserialize task inputs and regularize to func, args, kwargs
+
+   'constants' maps the hashes of the constants staged out of the task to their serialized form (see get_staged_constants).
+   """
+   if constants:
+      function = _staged_value(function, constants, loads = False)
+      args = _staged_value(args, constants, loads = False)
+      kwargs = _staged_value(kwargs, constants, loads = False)
    if function is not None:
       function = cloudpickle.loads(function)
    if args:
       args = cloudpickle.loads(args)
    if kwargs:
       kwargs = cloudpickle.loads(kwargs)
+   if constants:
+      if type(args) in (tuple, list):
+         args = type(args)(_staged_value(arg, constants) for arg in args)
+      if type(kwargs) is dict:
+         kwargs = {name: _staged_value(value, constants) for name, value in kwargs.items()}
 
    if task is not no_value:
       assert not function and not args and not kwargs
@@ -3803,6 +3969,69 @@ def _deserialize(function=None, args=None, kwargs=None, task=no_value):
 
    return function, args or (), kwargs or {}
 
+def _staged_value(value, constants, loads = True):
+   """ If 'value' is a reference to a staged constant, return the constant (deserialized if 'loads' is True). Otherwise, return 'value'. """
+   if isinstance(value, str) and value.startswith(STAGED_CONSTANT_PREFIX):
+      value = constants[value[len(STAGED_CONSTANT_PREFIX):]]
+      return cloudpickle.loads(value) if loads else value
+   return value
+
+def get_staged_constants(digests, task_execution_breakdown = None, lambda_execution_breakdown = None):
+   """
+   Retrieve the large constants the Scheduler staged out of task definitions.
+
+   The constants are stored once (under their content hash) on the control-plane shards, and are cached by this container,
+   so each one is read from Redis (with a single MGET per shard) once per container rather than once per task.
+
+   Args:
+      digests (iterable): The hashes of the constants.
+
+      task_execution_breakdown (TaskExecutionBreakdown): The WukongMetrics object encapsulating all metrics associated with the currently-processing task.
+
+      lambda_execution_breakdown (LambdaExecutionBreakdown): The WukongMetrics object encapsulating all metrics associated with this Lambda invocation.
+
+   Returns:
+      dict: Mapping of hash --> serialized constant. Constants that could not be found are left out.
+   """
+   global staged_constants_bytes
+   constants = dict()
+   missing = []
+   for digest in digests:
+      if digest in staged_constants:
+         staged_constants.move_to_end(digest)
+         constants[digest] = staged_constants[digest]
+      else:
+         missing.append(digest)
+
+   if len(missing) == 0:
+      return constants
+
+   read_start = time.time()
+   values = dcp_ring.mget([digest + CONSTANT_KEY_SUFFIX for digest in missing])
+   read_stop = time.time()
+   read_size = 0
+   for digest, value in zip(missing, values):
+      if value is None:
+         continue
+      constants[digest] = value
+      read_size += len(value)
+      staged_constants[digest] = value
+      staged_constants_bytes += len(value)
+
+   # Evict the least recently used constants once the cache is full.
+   while staged_constants_bytes > STAGED_CONSTANTS_CACHE_BYTES and len(staged_constants) > 0:
+      _, evicted = staged_constants.popitem(last = False)
+      staged_constants_bytes -= len(evicted)
+
+   logger.debug("Read {} staged constants ({} bytes) from Redis in {} seconds. {} were cached.".format(len(missing), read_size, read_stop - read_start, len(constants) - len(missing)))
+   if lambda_execution_breakdown is not None:
+      lambda_execution_breakdown.add_read_time(EC2_REDIS_METRIC_KEY, STAGED_CONSTANTS_KEY, read_size, read_stop - read_start, read_start, read_stop)
+      lambda_execution_breakdown.bytes_read += read_size
+      lambda_execution_breakdown.redis_read_time += read_stop - read_start
+   if task_execution_breakdown is not None:
+      task_execution_breakdown.redis_read_time += read_stop - read_start
+   return constants
+
 @xray_recorder.capture("execute_task")
 def execute_task(task):
    """ Evaluate a nested task
@@ -3821,6 +4050,20 @@ def execute_task(task):
    else:
       return task
 
+@xray_recorder.capture("execute_fused_tasks")
+def execute_fused_tasks(fused_tasks, data, func, args, kwargs, constants = None):
+   """ Execute the tasks fused into a composite task, followed by the composite task itself.
+
+   Each fused task's result is added to (a copy of) 'data', so that the tasks after it in the chain can find it by key.
+   'constants' holds the staged constants referenced by the fused tasks. Returns the result of the composite task.
+   """
+   data = dict(data)
+   for fused_task in fused_tasks:
+      f, a, kw = _deserialize(fused_task.get("function"), fused_task.get("args"), fused_task.get("kwargs"), fused_task.get("task", no_value),
+                              constants = constants)
+      data[fused_task["key"]] = f(*pack_data(a, data, key_types=(bytes, unicode)), **pack_data(kw, data, key_types=(bytes, unicode)))
+   return func(*pack_data(args, data, key_types=(bytes, unicode)), **pack_data(kwargs, data, key_types=(bytes, unicode)))
+
 @xray_recorder.capture("apply_function")
 def apply_function(function, args, kwargs, key):
    """ Run a function, collect information
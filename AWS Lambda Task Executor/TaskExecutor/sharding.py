@@ -0,0 +1,129 @@
+from __future__ import print_function, division, absolute_import
+
+from collections import defaultdict
+import logging
+
+import redis
+from uhashring import HashRing
+
+logger = logging.getLogger(__name__)
+
+# Default port used by the Redis instances which make up the control plane (dependency counters, paths, etc.)
+DEFAULT_REDIS_PORT = 6379
+
+# Maximum number of keys written by a single MSET within a pipeline. Very large MSETs block the Redis
+# event loop for a noticeable amount of time, so we split them up (they are still sent in one round trip).
+MSET_CHUNK_SIZE = 5000
+
+def parse_redis_endpoint(endpoint):
+    """ Convert an endpoint of the form "host", "host:port", (host, port) or [host, port] into a (host, port) tuple. """
+    if isinstance(endpoint, (tuple, list)):
+        host, port = endpoint
+        return str(host), int(port)
+    endpoint = str(endpoint)
+    if ":" in endpoint:
+        host, port = endpoint.rsplit(":", 1)
+        return host, int(port)
+    return endpoint, DEFAULT_REDIS_PORT
+
+def normalize_redis_endpoints(endpoints):
+    """ Return the list of endpoints as "host:port" strings. These strings are used as the names of the nodes on
+        the hash ring, so every component (Scheduler, Client, KV Store Proxy, Task Executors) must agree on them. """
+    normalized = []
+    for endpoint in endpoints:
+        host, port = parse_redis_endpoint(endpoint)
+        normalized.append("{}:{}".format(host, port))
+    return normalized
+
+class RedisShardRing(object):
+    """ Consistent-hash sharding of the Wukong control plane across several Redis instances.
+
+        Dependency counters, paths, Fargate metadata and small (final) results are placed on one of the
+        given Redis endpoints according to a ketama hash ring over the *task key*. The suffix appended to a
+        task key (e.g. "---dep-counter", "---path") is stripped before hashing so that everything associated
+        with a given task lives on the same shard.
+
+        The same ring is reconstructed by the Task Executors, the KV Store Proxy and the Client from the
+        list of endpoints, which is sent along in every path payload (see "redis-endpoints").
+
+        Parameters
+        ----------
+        endpoints : list
+            List of Redis endpoints. Each entry is "host", "host:port" or a (host, port) pair.
+        client_kwargs : dict
+            Extra keyword arguments passed to ``redis.StrictRedis`` when connecting to a shard.
+    """
+    def __init__(self, endpoints, **client_kwargs):
+        if len(endpoints) == 0:
+            raise ValueError("At least one Redis endpoint is required to construct a RedisShardRing.")
+        self.endpoints = normalize_redis_endpoints(endpoints)
+        self.clients = dict()
+        for endpoint in self.endpoints:
+            host, port = parse_redis_endpoint(endpoint)
+            self.clients[endpoint] = redis.StrictRedis(host = host, port = port, db = 0, **client_kwargs)
+        self.hash_ring = HashRing(nodes = self.endpoints, hash_fn = "ketama")
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def __repr__(self):
+        return "RedisShardRing({})".format(self.endpoints)
+
+    def get_node_name(self, key):
+        """ Return the "host:port" of the shard responsible for the given (possibly suffixed) key. """
+        if len(self.endpoints) == 1:
+            return self.endpoints[0]
+        return self.hash_ring.get_node(shard_key(key))
+
+    def get_client(self, key):
+        """ Return the Redis client of the shard responsible for the given key. """
+        return self.clients[self.get_node_name(key)]
+
+    def group_keys(self, keys):
+        """ Return a mapping of shard name --> list of keys stored on that shard. """
+        groups = defaultdict(list)
+        for key in keys:
+            groups[self.get_node_name(key)].append(key)
+        return groups
+
+    def group_mapping(self, mapping):
+        """ Return a mapping of shard name --> {key: value} for the key-value pairs stored on that shard. """
+        groups = defaultdict(dict)
+        for key, value in mapping.items():
+            groups[self.get_node_name(key)][key] = value
+        return groups
+
+    def mset(self, mapping, chunk_size = MSET_CHUNK_SIZE):
+        """ Store all of the given key-value pairs. One pipeline is executed per shard.
+
+            Returns a dictionary mapping shard name --> number of keys written to that shard. """
+        counts = dict()
+        for node_name, shard_mapping in self.group_mapping(mapping).items():
+            pipeline = self.clients[node_name].pipeline(transaction = False)
+            items = list(shard_mapping.items())
+            for i in range(0, len(items), chunk_size):
+                pipeline.mset(dict(items[i:i + chunk_size]))
+            pipeline.execute()
+            counts[node_name] = len(items)
+            logger.debug("Wrote {} keys to Redis shard {}.".format(len(items), node_name))
+        return counts
+
+    def mget(self, keys):
+        """ Retrieve the values of the given keys (one MGET per shard). Values are returned in the same order as the keys. """
+        values = dict()
+        for node_name, shard_keys in self.group_keys(keys).items():
+            for key, value in zip(shard_keys, self.clients[node_name].mget(shard_keys)):
+                values[key] = value
+        return [values[key] for key in keys]
+
+    def for_each_client(self, func):
+        """ Call ``func(client)`` for every shard, returning a mapping of shard name --> return value. """
+        return {node_name: func(client) for node_name, client in self.clients.items()}
+
+def shard_key(key):
+    """ Strip the Wukong suffix (e.g. "---dep-counter") from a key so that all of a task's keys hash identically. """
+    key = str(key)
+    idx = key.find("---")
+    if idx > 0:
+        return key[:idx]
+    return key
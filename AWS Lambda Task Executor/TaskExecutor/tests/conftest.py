@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The Task Executor's modules import each other as top-level modules (as they do when deployed to AWS Lambda).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
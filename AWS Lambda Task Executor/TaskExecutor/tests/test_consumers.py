@@ -0,0 +1,73 @@
+from __future__ import print_function, division, absolute_import
+
+from consumers import CONSUMER_COUNTER_SUFFIX, num_consumers, register_consumers, release_values
+from wukong.pathing import PathNode
+
+
+class Instance(object):
+    """ Stands in for a Redis instance: SET, and a pipeline whose EVAL runs the release script. """
+    def __init__(self):
+        self.data = dict()
+        self.queued = []
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def eval(self, script, num_keys, value_key, counter_key, amount):
+        self.queued.append((value_key, counter_key, amount))
+
+    def execute(self):
+        results = []
+        for value_key, counter_key, amount in self.queued:
+            if counter_key not in self.data:
+                results.append(-1)
+                continue
+            self.data[counter_key] = int(self.data[counter_key]) - amount
+            if self.data[counter_key] <= 0:
+                self.data.pop(value_key, None)
+                del self.data[counter_key]
+            results.append(self.data.get(counter_key, 0))
+        self.queued = []
+        return results
+
+
+def node(task_key, invoke=(), become=None):
+    return PathNode({"collect-garbage": True, "output-wanted": False}, task_key, None, list(invoke), become, None)
+
+
+def test_fan_in_become_is_a_consumer():
+    redis = Instance()
+    locate = lambda key: ("redis", redis)
+
+    # 't' invokes 'a' and would become 'b', but 'b' also depends on 'u', which hasn't finished yet. So another
+    # Executor runs 'b' later on and reads the value of 't' from Redis, after 'a' did.
+    t = node("t", invoke=["a"], become="b")
+    assert num_consumers(t) == 2
+    redis.set("t", b"T")
+    register_consumers(redis, "t", num_consumers(t))
+
+    release_values(locate, ["t"])           # 'a' executed.
+    assert redis.data["t"] == b"T" and redis.data["t" + CONSUMER_COUNTER_SUFFIX] == 1
+    release_values(locate, ["u", "t"])      # 'b' executed.
+    assert redis.data == {}
+
+
+def test_local_become_releases_its_input():
+    redis = Instance()
+    locate = lambda key: ("redis", redis)
+
+    # 'b' is ready, so it runs on the same Executor and uses its local copy of the value; it still releases it.
+    t = node("t", become="b")
+    redis.set("t", b"T")
+    register_consumers(redis, "t", num_consumers(t))
+    release_values(locate, ["t"])
+    assert redis.data == {}
+
+    # Values without a registered consumer count (e.g., wanted by the client) are left alone, as are those we can't locate.
+    redis.set("v", b"V")
+    release_values(locate, ["v"])
+    release_values(lambda key: None, ["v"])
+    assert redis.data == {"v": b"V"}
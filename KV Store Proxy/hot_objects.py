@@ -0,0 +1,105 @@
+from collections import OrderedDict
+import time
+
+from tornado import gen
+from tornado.concurrent import Future
+
+class SingleFlight(object):
+    """ Coalesce concurrent requests for the same key into a single request.
+
+        The first caller for a key runs the request. Callers arriving while it is in flight wait for (and share) its result.
+    """
+    def __init__(self):
+        self.in_flight = dict()         # Map of key --> Future for the request currently in flight.
+        self.num_requests = 0           # Number of requests actually issued.
+        self.num_coalesced = 0          # Number of callers that shared an in-flight request.
+
+    @gen.coroutine
+    def do(self, key, request):
+        """ Return the result of 'request()' (a coroutine function), sharing it with concurrent callers for the same key. """
+        future = self.in_flight.get(key, None)
+        if future is not None:
+            self.num_coalesced += 1
+            result = yield future
+            return result
+        future = Future()
+        self.in_flight[key] = future
+        self.num_requests += 1
+        try:
+            result = yield request()
+        except Exception as ex:
+            future.set_exception(ex)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self.in_flight[key]
+        return result
+
+class HotObjectCache(object):
+    """ Short-lived, size-bounded in-memory copy of recently-produced values (e.g., the outputs of large fan-outs).
+
+        Entries expire 'ttl' seconds after they are inserted. Once the cached values exceed 'capacity_bytes', the least-recently
+        used entries are evicted.
+    """
+    def __init__(self, capacity_bytes = 512 * 1024 * 1024, ttl = 30):
+        self.capacity_bytes = capacity_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()    # Map of key --> (value, expiration time), in LRU order.
+        self.num_bytes = 0
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return self.get(key, count = False) is not None
+
+    def get(self, key, count = True):
+        entry = self.entries.get(key, None)
+        if entry is not None and entry[1] < time.time():
+            self.remove(key)
+            entry = None
+        if entry is None:
+            if count:
+                self.num_misses += 1
+            return None
+        self.entries.move_to_end(key)
+        if count:
+            self.num_hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        if len(value) > self.capacity_bytes:
+            return
+        self.remove(key)
+        self.entries[key] = (value, time.time() + self.ttl)
+        self.num_bytes += len(value)
+        self.evict()
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.num_bytes -= len(entry[0])
+
+    def evict(self):
+        """ Drop expired entries, then least-recently used entries until we are within capacity. """
+        now = time.time()
+        for key in [key for key, (_, expires) in self.entries.items() if expires < now]:
+            self.remove(key)
+            self.num_evictions += 1
+        while self.num_bytes > self.capacity_bytes and len(self.entries) > 0:
+            key, (value, _) = self.entries.popitem(last = False)
+            self.num_bytes -= len(value)
+            self.num_evictions += 1
+
+    def get_metrics(self):
+        return {
+            "num-entries": len(self.entries),
+            "num-bytes": self.num_bytes,
+            "num-hits": self.num_hits,
+            "num-misses": self.num_misses,
+            "num-evictions": self.num_evictions
+        }
@@ -0,0 +1,144 @@
+import base64
+from collections import defaultdict, deque
+import datetime
+import logging
+import time
+
+from tornado import gen
+from tornado.locks import Condition
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+class IOOperation(object):
+    """ A single 'set' operation received from a Task Executor, waiting to be written to a storage (Fargate) node. """
+    __slots__ = ("task_key", "value_encoded", "fargate_ip", "message", "enqueued_at")
+
+    def __init__(self, task_key, value_encoded, fargate_ip, message):
+        self.task_key = task_key
+        self.value_encoded = value_encoded
+        self.fargate_ip = fargate_ip
+        self.message = message
+        self.enqueued_at = time.time()
+
+class ProxyIOScheduler(object):
+    """ Processes the IO operations sent to the KV Store Proxy by the Task Executors as soon as they arrive.
+
+        Operations are queued per storage host (the Fargate node on which the value is stored). Each host is drained
+        by at most 'max_concurrency_per_host' coroutines. A drainer takes every operation queued for its host (up to
+        'max_batch_size'), writes all of the values to that host with a single pipeline, and then hands each task
+        to ``RedisProxy.process_task`` so that its downstream tasks are checked and invoked.
+
+        ``submit()`` applies backpressure: once 'max_queue_depth' operations are queued, it waits until the queue
+        drains before accepting the operation. Callers (the TCP read loop and the Redis Stream consumers) wait on
+        ``submit()``, so they stop reading new messages while the proxy is saturated.
+
+        Parameters
+        ----------
+        proxy : RedisProxy
+            The proxy on whose behalf we are processing operations.
+        max_concurrency_per_host : int
+            Maximum number of concurrent pipelines issued to a single storage host.
+        max_batch_size : int
+            Maximum number of SETs coalesced into a single pipeline.
+        max_queue_depth : int
+            Maximum number of operations queued (across all hosts) before ``submit()`` starts to wait.
+        latency_history : int
+            Number of recent per-operation latencies retained for ``get_metrics()``.
+    """
+    def __init__(self, proxy, max_concurrency_per_host = 4, max_batch_size = 64, max_queue_depth = 10000, latency_history = 10000):
+        self.proxy = proxy
+        self.loop = proxy.loop
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.max_batch_size = max_batch_size
+        self.max_queue_depth = max_queue_depth
+
+        self.pending = defaultdict(deque)       # Map of storage host --> queued IOOperations.
+        self.in_flight = defaultdict(int)       # Map of storage host --> number of active drainers.
+        self.queue_depth = 0                    # Number of operations that are queued or being processed.
+        self.not_full = Condition()             # Notified whenever operations complete, to wake up waiting submitters.
+
+        self.latencies = deque(maxlen = latency_history)   # Time (seconds) from submission to completion of recent operations.
+        self.max_observed_queue_depth = 0
+        self.num_submitted = 0
+        self.num_completed = 0
+        self.num_batches = 0
+        self.num_errors = 0
+        self.num_backpressure_waits = 0
+
+    @gen.coroutine
+    def submit(self, task_key, value_encoded, fargate_ip, message):
+        """ Queue a 'set' operation and make sure a drainer is running for its storage host. """
+        while self.queue_depth >= self.max_queue_depth:
+            self.num_backpressure_waits += 1
+            yield self.not_full.wait()
+
+        self.pending[fargate_ip].append(IOOperation(task_key, value_encoded, fargate_ip, message))
+        self.queue_depth += 1
+        self.num_submitted += 1
+        self.max_observed_queue_depth = max(self.max_observed_queue_depth, self.queue_depth)
+
+        if self.in_flight[fargate_ip] < self.max_concurrency_per_host:
+            self.in_flight[fargate_ip] += 1
+            self.loop.spawn_callback(self.drain, fargate_ip)
+
+    @gen.coroutine
+    def drain(self, fargate_ip):
+        """ Process the operations queued for the given storage host until there are none left. """
+        queue = self.pending[fargate_ip]
+        try:
+            while len(queue) > 0:
+                batch = [queue.popleft() for _ in range(min(self.max_batch_size, len(queue)))]
+                try:
+                    yield self.process_batch(fargate_ip, batch)
+                except Exception as ex:
+                    self.num_errors += len(batch)
+                    logger.error("[ {} ] Failed to process {} IO operations for storage host {}.".format(datetime.datetime.utcnow(), len(batch), fargate_ip))
+                    logger.exception(ex)
+                finally:
+                    now = time.time()
+                    for op in batch:
+                        self.latencies.append(now - op.enqueued_at)
+                    self.num_completed += len(batch)
+                    self.queue_depth -= len(batch)
+                    self.not_full.notify_all()
+        finally:
+            self.in_flight[fargate_ip] -= 1
+
+    @gen.coroutine
+    def process_batch(self, fargate_ip, batch):
+        # Coalesce all of the SETs for this host into a single pipeline (one round trip).
+        redis_client = yield self.proxy.get_redis_client(fargate_ip)
+        redis_pipeline = redis_client.pipeline()
+        for op in batch:
+            # Operations without a value refer to a value that is already stored on the host.
+            if op.value_encoded is not None:
+                redis_pipeline.set(op.task_key, base64.b64decode(op.value_encoded))
+        yield redis_pipeline.execute()
+        self.num_batches += 1
+
+        for op in batch:
+            yield self.proxy.process_task(op.task_key, _value_encoded = op.value_encoded, message = op.message, fargate_ip = fargate_ip, value_stored = True)
+
+    def get_metrics(self):
+        """ Return a dictionary describing the current queue depth and the latency of recently-completed operations. """
+        latencies = sorted(self.latencies)
+        def percentile(q):
+            if len(latencies) == 0:
+                return None
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+        return {
+            "queue-depth": self.queue_depth,
+            "queue-depth-per-host": {host: len(queue) for host, queue in self.pending.items() if len(queue) > 0},
+            "max-queue-depth": self.max_observed_queue_depth,
+            "in-flight-per-host": {host: count for host, count in self.in_flight.items() if count > 0},
+            "num-submitted": self.num_submitted,
+            "num-completed": self.num_completed,
+            "num-batches": self.num_batches,
+            "num-errors": self.num_errors,
+            "num-backpressure-waits": self.num_backpressure_waits,
+            "latency-mean": (sum(latencies) / len(latencies)) if len(latencies) > 0 else None,
+            "latency-p50": percentile(0.50),
+            "latency-p99": percentile(0.99),
+            "latency-max": latencies[-1] if len(latencies) > 0 else None
+        }
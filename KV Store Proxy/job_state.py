@@ -0,0 +1,164 @@
+from collections import OrderedDict
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Job ID used for graph-init operations which do not specify one (e.g., from an older Scheduler).
+DEFAULT_JOB_ID = "default"
+
+class JobState(object):
+    """ The state retained by the KV Store Proxy for a single job (i.e., a single call to update_graph() on the Scheduler).
+
+        Sizes are approximate: we count the serialized paths, the invocation templates, and the encoded (pickled) form of
+        each decoded node, which is what dominates the proxy's memory usage.
+    """
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.completed_tasks = set()
+        self.path_nodes = {}                        # Mapping of task keys to path nodes.
+        self.serialized_paths = {}                  # Mapping of path starting keys to the serialized paths retrieved from Redis.
+        self.proxy_index = {}                       # Mapping of task keys (whose fan-out we handle) to the key of the task starting the path containing them.
+        self.invocation_templates = {}              # Mapping of path starting keys to the (open) invocation payload for that path.
+        self.priorities = {}                        # Mapping of downstream task keys to their priority (critical path length) computed by the Scheduler.
+        self.num_bytes = 0
+
+    def add_path_node(self, task_key, node, encoded_size):
+        if task_key not in self.path_nodes:
+            self.num_bytes += encoded_size
+        self.path_nodes[task_key] = node
+
+    def add_serialized_path(self, starting_node_key, serialized_path):
+        if starting_node_key not in self.serialized_paths:
+            self.num_bytes += len(serialized_path)
+        self.serialized_paths[starting_node_key] = serialized_path
+
+    def add_invocation_template(self, starting_node_key, template):
+        if starting_node_key not in self.invocation_templates:
+            self.num_bytes += len(template)
+        self.invocation_templates[starting_node_key] = template
+
+    def get_metrics(self):
+        now = time.time()
+        return {
+            "num-proxy-nodes": len(self.proxy_index),
+            "num-path-nodes": len(self.path_nodes),
+            "num-serialized-paths": len(self.serialized_paths),
+            "num-invocation-templates": len(self.invocation_templates),
+            "num-completed-tasks": len(self.completed_tasks),
+            "num-bytes": self.num_bytes,
+            "age": now - self.created_at,
+            "idle": now - self.last_access
+        }
+
+class JobStateTable(object):
+    """ The per-job state retained by the KV Store Proxy.
+
+        A job's state is created by its graph-init operation and dropped once the Scheduler reports that the job completed
+        (or was cancelled). As a safety valve (e.g., if the Scheduler goes away before a job completes), jobs that have not
+        been touched for 'ttl' seconds are dropped, and the least-recently used jobs are dropped while more than 'max_jobs'
+        jobs or more than 'max_bytes' bytes of state are retained. The most recently used job is never evicted.
+    """
+    def __init__(self, max_jobs = 64, max_bytes = 2 * 1024 * 1024 * 1024, ttl = 3600):
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.jobs = OrderedDict()                   # Mapping of job IDs to JobState objects, in LRU order.
+        self.task_to_job = {}                       # Mapping of task keys to the JobState of the (most recent) job containing them.
+
+        self.num_created = 0
+        self.num_completed = 0
+        self.num_cancelled = 0
+        self.num_expired = 0
+        self.num_evicted = 0
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __contains__(self, job_id):
+        return job_id in self.jobs
+
+    def get_or_create(self, job_id):
+        """ Return the state of the given job, creating it if necessary. """
+        job = self.jobs.get(job_id, None)
+        if job is None:
+            job = JobState(job_id)
+            self.jobs[job_id] = job
+            self.num_created += 1
+        self.touch(job)
+        self.evict()
+        return job
+
+    def register_tasks(self, job, proxy_index):
+        """ Add the given proxy nodes (task key --> key of the path containing it) to the job. """
+        job.proxy_index.update(proxy_index)
+        for task_key in proxy_index:
+            self.task_to_job[task_key] = job
+
+    def register_task(self, job, task_key):
+        self.task_to_job[task_key] = job
+
+    def job_for_task(self, task_key):
+        """ Return the state of the job containing the given task, or None if we don't know about the task. """
+        job = self.task_to_job.get(task_key, None)
+        if job is not None:
+            self.touch(job)
+        return job
+
+    def touch(self, job):
+        job.last_access = time.time()
+        if job.job_id in self.jobs:
+            self.jobs.move_to_end(job.job_id)
+
+    def drop(self, job_id, cancelled = False):
+        """ Drop the state of a job that completed (or was cancelled). Returns False if we don't have the job. """
+        if job_id not in self.jobs:
+            return False
+        self._remove(job_id)
+        if cancelled:
+            self.num_cancelled += 1
+        else:
+            self.num_completed += 1
+        return True
+
+    def _remove(self, job_id):
+        job = self.jobs.pop(job_id)
+        for task_key in list(job.proxy_index) + list(job.path_nodes):
+            # A later job may have re-registered the same task, in which case we leave its entry alone.
+            if self.task_to_job.get(task_key, None) is job:
+                del self.task_to_job[task_key]
+        logger.debug("Dropped state of job {}: {}".format(job_id, job.get_metrics()))
+
+    def num_bytes(self):
+        return sum(job.num_bytes for job in self.jobs.values())
+
+    def evict(self):
+        """ Drop expired jobs, then least-recently used jobs until we are within the limits. """
+        now = time.time()
+        most_recent = next(reversed(self.jobs)) if len(self.jobs) > 0 else None
+        for job_id in [job_id for job_id, job in self.jobs.items() if now - job.last_access > self.ttl and job_id != most_recent]:
+            logger.warning("Dropping state of job {} as it has not been used for {} seconds.".format(job_id, self.ttl))
+            self._remove(job_id)
+            self.num_expired += 1
+        num_bytes = self.num_bytes()
+        while len(self.jobs) > 1 and (len(self.jobs) > self.max_jobs or num_bytes > self.max_bytes):
+            job_id = next(iter(self.jobs))
+            num_bytes -= self.jobs[job_id].num_bytes
+            logger.warning("Evicting state of job {} ({} jobs retained, {} bytes).".format(job_id, len(self.jobs), num_bytes))
+            self._remove(job_id)
+            self.num_evicted += 1
+
+    def get_metrics(self):
+        return {
+            "num-jobs": len(self.jobs),
+            "num-tasks": len(self.task_to_job),
+            "num-bytes": self.num_bytes(),
+            "num-created": self.num_created,
+            "num-completed": self.num_completed,
+            "num-cancelled": self.num_cancelled,
+            "num-expired": self.num_expired,
+            "num-evicted": self.num_evicted,
+            "jobs": {job_id: job.get_metrics() for job_id, job in self.jobs.items()}
+        }
@@ -5,8 +5,6 @@ sys.path.append('/usr/local/lib64/python3.7/site-packages')
 
 from pathing import Path, PathNode 
 import aioredis
-import asyncio
-import redis # For the polling processes 
 
 import hashlib
 import argparse 
@@ -28,19 +26,23 @@ import boto3
 import time
 import datetime 
 
-import multiprocessing
-from multiprocessing import Pipe, Process
-import queue 
 from uhashring import HashRing 
 
 from serialization import Serialized, dumps, from_frames
 from network import CommClosedError, get_stream_address, TCP
 from proxy_lambda_invoker import ProxyLambdaInvoker 
+from sharding import AsyncRedisShardRing, normalize_redis_endpoints, proxy_worker_for_key
+from proxy_dispatcher import ProxyDispatcher
+from redis_streams import AsyncRedisStreamConsumer
+from io_scheduler import ProxyIOScheduler
+from hot_objects import HotObjectCache, SingleFlight
+from job_state import JobStateTable, DEFAULT_JOB_ID
 
 from tornado.ioloop import IOLoop
 from tornado.ioloop import PeriodicCallback
 from tornado.options import define, options
 from tornado import gen
+from tornado.concurrent import Future
 from tornado.iostream import StreamClosedError
 from tornado.tcpclient import TCPClient
 from tornado.tcpserver import TCPServer
@@ -66,6 +68,20 @@ define('redis_port1', default=6379, help="Port for the Redis cluster")
 define('redis_port2', default=6380, help="Port for the Redis cluster")
 
 TASK_KEY = "task_key"
+PATH_KEY_SUFFIX = "---path"
+DEPENDENCY_COUNTER_SUFFIX = "---dep-counter"
+
+# Appended to a task key to get the key counting the downstream tasks that have yet to read the task's output (see the Task Executor).
+CONSUMER_COUNTER_SUFFIX = "---consumers"
+
+# Number of proxy nodes ingested per step when processing a graph-init operation in the background.
+GRAPH_INIT_CHUNK_SIZE = 500
+
+# How often (in seconds) the retained per-job state is checked for expired jobs.
+JOB_EVICTION_INTERVAL = 60
+
+# Task Executors write messages for the proxy to Redis Streams. The proxy reads them as part of this consumer group.
+REDIS_STREAM_GROUP_NAME = "wukong-proxy"
 
 # Used when mapping PathNode --> Fargate Task with a dictionary. These are the keys.
 FARGATE_ARN_KEY = "taskARN"
@@ -76,54 +92,170 @@ FARGATE_PRIVATE_IP_KEY = "privateIpv4Address"
 class RedisProxy(object):
     """Tornado asycnrhonous TCP server co-located with a Redis cluster."""
 
-    def __init__(self, lambda_client, print_debug = False, redis_host = None):
+    def __init__(self, lambda_client, print_debug = False, redis_host = None, redis_endpoints = None, worker_id = None, num_workers = 1, proxy_port = None,
+                 hot_object_fanout = 32, num_read_replicas = 2, read_replica_ttl = 300,
+                 max_retained_jobs = 64, max_retained_bytes = 2 * 1024 * 1024 * 1024, job_state_ttl = 3600):
         self.lambda_client = lambda_client
         self.print_debug = print_debug
-        self.completed_tasks = set()
+
+        # Values read by at least 'hot_object_fanout' downstream tasks (that don't receive the value in their payload) are
+        # copied to 'num_read_replicas' other storage nodes before the downstream tasks are invoked. Each downstream task
+        # is assigned one of the copies to read from. The copies expire after 'read_replica_ttl' seconds.
+        self.hot_object_fanout = hot_object_fanout
+        self.num_read_replicas = num_read_replicas
+        self.read_replica_ttl = read_replica_ttl
+        self.hot_objects = HotObjectCache()         # Short-lived copies of recently-stored values (keyed by task key).
+        self.value_reads = SingleFlight()           # Coalesces concurrent reads of the same value from the storage nodes.
+        self.num_replicated = 0
+
+        # When the proxy is sharded across several processes (see ProxyDispatcher), each worker
+        # only processes the task keys in its own partition. 'worker_id' is None for a stand-alone proxy.
+        self.worker_id = worker_id
+        self.num_workers = num_workers
+        self.port = proxy_port or options.proxy_port
 
         self.redis_host = redis_host
+        # Control-plane Redis instances across which dependency counters and paths are sharded.
+        # The Scheduler may send an updated list in the 'start' operation.
+        self.redis_endpoints = normalize_redis_endpoints(redis_endpoints or [redis_host])
         self.scheduler_address = ""                 # The address of the modified Dask Distributed scheduler 
-        self.serialized_paths = {}                  # List of serialized paths retrieved from Redis 
-        self.path_nodes = {}                        # Mapping of task keys to path nodes 
-        self.serialized_path_nodes = {}             # List of serialized path nodes.
+
+        # The paths, path nodes, invocation templates, etc. of each job are kept in a JobState object. A job's state is
+        # created by its graph-init operation and dropped when the Scheduler sends the corresponding job-done operation.
+        self.jobs = JobStateTable(max_jobs = max_retained_jobs, max_bytes = max_retained_bytes, ttl = job_state_ttl)
+        self.path_fetches = {}                      # Mapping of (job ID, path starting key) to Futures for paths currently being retrieved from Redis.
         self.handlers = {
                 "set": self.handle_set,                 # Store a value in Redis.
                 "graph-init": self.handle_graph_init,   # DAG from the Scheduler.
+                "job-done": self.handle_job_done,       # A job completed (or was cancelled) on the Scheduler.
                 "start": self.handle_start,             # 'START' operation from the Scheduler.
-                "redis-io": self.handle_IO              # Generic IO operation from a Lambda worker.
+                "redis-io": self.handle_IO,             # Generic IO operation from a Lambda worker.
+                "io-metrics": self.handle_io_metrics    # Request for the IO scheduler's queue depth and latency metrics.
             }
         self.hostnames_to_redis = dict()
-        self.io_operations = queue.Queue()          # FIFO queue for I/O operations received from AWS Lambda functions.
 
     def start(self):
         self.server = TCPServer()
         self.server.handle_stream = self.handle_stream
-        self.server.listen(options.proxy_port)
-        self.port = options.proxy_port
+        self.server.listen(self.port)
         self.need_to_process = []
         #logger.debug("Redis proxy listening at {}:{}".format(self.redis_endpoint, self.port))
-        logger.debug("Redis proxy listening on port {}".format(self.port))
+        if self.worker_id is None:
+            logger.debug("Redis proxy listening on port {}".format(self.port))
+        else:
+            logger.debug("Redis proxy worker {}/{} listening on port {}".format(self.worker_id, self.num_workers, self.port))
         
         self.loop = IOLoop.current()
 
+        # IO operations from Lambdas are processed as soon as they arrive (rather than one at a time on a timer).
+        self.io_scheduler = ProxyIOScheduler(self)
+
+        # Drop the state of jobs which the Scheduler never reported as done (e.g., because it went away).
+        self.job_eviction_callback = PeriodicCallback(self.jobs.evict, JOB_EVICTION_INTERVAL * 1000)
+        self.job_eviction_callback.start()
+
         # On the next iteration of the IOLoop, we will attempt to connect to the Redis servers.
         self.loop.add_callback(self.connect_to_redis_servers)
 
         # Start the IOLoop! 
         self.loop.start()
 
-        # Begin asynchronously processing IO operations for Lambdas.
-        self.process_IO = PeriodicCallback(self.process_IO_operation, callback_time = 100)
-        self.process_IO.start()
-
     @gen.coroutine
     def connect_to_redis_servers(self):
         logger.debug("[ {} ] Connecting to Redis server...".format(datetime.datetime.utcnow()))
         self.redis_client = yield aioredis.create_redis(address = (self.redis_host, 6379))
-        logger.debug("[ {} ] Connected to Redis successfully!".format(datetime.datetime.utcnow()))
+        self.dcp_ring = AsyncRedisShardRing(self.redis_endpoints)
+        yield self.dcp_ring.connect(existing_clients = {"{}:6379".format(self.redis_host): self.redis_client})
+        logger.debug("[ {} ] Connected to Redis successfully! Control-plane shards: {}".format(datetime.datetime.utcnow(), self.dcp_ring.endpoints))
+
+    def owns_task(self, task_key):
+        """ Return True if this proxy (worker) is responsible for processing the given task. """
+        if self.worker_id is None:
+            return True
+        return proxy_worker_for_key(task_key, self.num_workers) == self.worker_id
+
+    @gen.coroutine
+    def update_redis_endpoints(self, redis_endpoints):
+        """ Rebuild the shard ring if the Scheduler is using a different set of control-plane Redis instances. """
+        redis_endpoints = normalize_redis_endpoints(redis_endpoints)
+        if redis_endpoints == self.redis_endpoints:
+            return
+        logger.debug("[ {} ] Updating control-plane shards from {} to {}.".format(datetime.datetime.utcnow(), self.redis_endpoints, redis_endpoints))
+        dcp_ring = AsyncRedisShardRing(redis_endpoints)
+        yield dcp_ring.connect(existing_clients = self.dcp_ring.clients)
+        self.redis_endpoints = redis_endpoints
+        self.dcp_ring = dcp_ring
 
     @gen.coroutine
-    def process_task(self, task_key, _value_encoded = None, message = None):   
+    def get_redis_client(self, fargate_ip):
+        """ Return the (cached) connection to the Redis instance running on the given Fargate node. """
+        redis_client = self.hostnames_to_redis.get(fargate_ip, None)
+        if redis_client is None:
+            redis_client = yield aioredis.create_redis(address = (fargate_ip, 6379))
+
+            # Cache new Redis instance.
+            self.hostnames_to_redis[fargate_ip] = redis_client
+        return redis_client
+
+    @gen.coroutine
+    def get_value(self, task_key, fargate_ip):
+        """ Return the (serialized) value of the given task, which is stored on the given Fargate node.
+
+            Recently-seen values are served from memory. Concurrent reads of the same value share a single request. """
+        value_serialized = self.hot_objects.get(task_key)
+        if value_serialized is not None:
+            return value_serialized
+
+        @gen.coroutine
+        def read():
+            redis_client = yield self.get_redis_client(fargate_ip)
+            value = yield redis_client.get(task_key)
+            if value is None:
+                raise KeyError("No value stored for task {} on storage node {}.".format(task_key, fargate_ip))
+            self.hot_objects.put(task_key, value)
+            return value
+        value_serialized = yield self.value_reads.do(task_key, read)
+        return value_serialized
+
+    @gen.coroutine
+    def replicate_hot_object(self, task_key, value_encoded, fargate_ip):
+        """ Copy the value of the given task to (up to) 'num_read_replicas' other storage nodes.
+
+            Returns the list of locations from which the value can be read. The first entry is None, which stands for the
+            node on which the value was originally stored (the Task Executors already know where that is). The rest are
+            the endpoints ("host:port") of the copies. Nodes which could not be written to are left out. """
+        value_serialized = self.hot_objects.get(task_key)
+        if value_serialized is None:
+            value_serialized = base64.b64decode(value_encoded)
+            self.hot_objects.put(task_key, value_serialized)
+
+        # Choose the replicas by hashing the task key, so that the copies of different values are spread across the nodes.
+        hosts = sorted(host for host in self.hostnames_to_redis if host != fargate_ip)
+        if len(hosts) > 0:
+            offset = int(hashlib.md5(task_key.encode()).hexdigest(), 16) % len(hosts)
+            hosts = (hosts[offset:] + hosts[:offset])[:self.num_read_replicas]
+
+        endpoints = [None]
+        results = yield [self.write_replica(host, task_key, value_serialized) for host in hosts]
+        for host, written in zip(hosts, results):
+            if written:
+                endpoints.append("{}:6379".format(host))
+        self.num_replicated += 1
+        logger.debug("[ {} ] Replicated value of task {} to {} storage nodes.".format(datetime.datetime.utcnow(), task_key, len(endpoints) - 1))
+        return endpoints
+
+    @gen.coroutine
+    def write_replica(self, host, task_key, value_serialized):
+        try:
+            redis_client = yield self.get_redis_client(host)
+            yield redis_client.set(task_key, value_serialized, expire = self.read_replica_ttl)
+        except Exception as ex:
+            logger.error("Failed to replicate value of task {} to storage node {}: {}".format(task_key, host, ex))
+            return False
+        return True
+
+    @gen.coroutine
+    def process_task(self, task_key, _value_encoded = None, message = None, fargate_ip = None, value_stored = False):   
         """
             Args:
                 task_key (str): The key of the task we're processing.
@@ -131,30 +263,43 @@ class RedisProxy(object):
                 _value_encoded (str): The base64 string encoding of the serialized value of the task we're processing.
 
                 message (dict): The message that was originally sent to the proxy.
+
+                fargate_ip (str): The IP of the Fargate node on which the value is stored. Taken from the message if not specified.
+
+                value_stored (bool): If True, the value has already been written to the Fargate node (by the IO scheduler).
         """   
         if self.print_debug:
             logger.debug("[ {} ] Processing task {} now...".format(datetime.datetime.utcnow(), task_key))
         
+        job = self.jobs.job_for_task(task_key)
+        if job is None:
+            logger.error("[ {} ] [ERROR] Cannot process task {}, as the state of its job has been dropped.".format(datetime.datetime.utcnow(), task_key))
+            return
+
         # Decode the value but keep it serialized.              
-        value_encoded = _value_encoded or message["value-encoded"]
-        value_serialized = base64.b64decode(value_encoded)
-        task_node = self.path_nodes[task_key]  
+        value_encoded = _value_encoded or message.get("value-encoded", None)
+        task_node = yield self.get_path_node(job, task_key)
         #fargate_ip = message[FARGATE_PUBLIC_IP_KEY]  
-        fargate_ip = message[FARGATE_PRIVATE_IP_KEY]
+        fargate_ip = fargate_ip or get_fargate_ip(message)
         fargate_node = task_node.fargate_node
         #fargate_ip = task_node.getFargatePublicIP()
         task_payload = task_node.task_payload
+        # Whether the value should be deleted from Redis once all of the downstream tasks have read it.
+        collect_garbage = task_payload.get("collect-garbage", False) and not task_payload.get("output-wanted", True)
 
-        redis_client = None 
-        if fargate_ip in self.hostnames_to_redis:
-            redis_client = self.hostnames_to_redis[fargate_ip]
+        if value_encoded is None:
+            # The message refers to a value which is already stored on the Fargate node, so we read it from there.
+            value_serialized = yield self.get_value(task_key, fargate_ip)
+            value_encoded = base64.b64encode(value_serialized).decode()
         else:
-            redis_client = yield aioredis.create_redis(address = (fargate_ip, 6379))
-
-            # Cache new Redis instance.
-            self.hostnames_to_redis[fargate_ip] = redis_client
-        
-        yield redis_client.set(task_key, value_serialized)
+            redis_client = yield self.get_redis_client(fargate_ip)
+            if not value_stored:
+                value_serialized = base64.b64decode(value_encoded)
+                yield redis_client.set(task_key, value_serialized)
+            # We (or our IO scheduler) wrote the value, so we register its consumers (the Task Executor does this when it writes
+            # the value itself). The 'become' task counts too: the Executor that sent us the value only runs it if it is ready.
+            if collect_garbage and task_node.num_downstream_tasks() > 0:
+                yield redis_client.set(task_key + CONSUMER_COUNTER_SUFFIX, task_node.num_downstream_tasks())
 
         # Store the result in redis.
         #if sys.getsizeof(value_serialized) > task_payload["storage_threshold"]:
@@ -166,91 +311,91 @@ class RedisProxy(object):
         #    logger.debug("[ {} ] Storing task {} in Small Redis instance listening at {}".format(datetime.datetime.utcnow(), task_key, redis_instance.address))
         #    yield redis_instance.set(task_key, value_serialized)
 
-        self.completed_tasks.add(task_key)
+        job.completed_tasks.add(task_key)
 
         num_dependencies_of_dependents = task_payload["num-dependencies-of-dependents"]
-        can_now_execute = []
 
         logger.debug("[ {} ] Value for {} successfully stored in Redis. Checking dependencies/invoke nodes now...".format(datetime.datetime.utcnow(), task_key))
 
         if self.print_debug:
             logger.debug("[ {} ] [PROCESSING] Now processing the downstream tasks for task {}".format(datetime.datetime.utcnow(), task_key))
 
-        for invoke_key in task_node.invoke:
-            futures = []
-            invoke_node = self.path_nodes[invoke_key]
+        # Increment the dependency counter of every "invoke" node at once (see ready_dependents). The invoke nodes whose final
+        # dependency this task was are executed now. The others will be executed eventually, once their final dependency resolves.
+        dependencies_completed, can_now_execute = yield ready_dependents(self.dcp_ring, task_node.invoke, num_dependencies_of_dependents)
 
-            # Grab the key of the "invoke" node and check how many dependencies it has.
-            # Next, check Redis to see how many dependencies are available. If all dependencies
-            # are available, then we append this node to the can_now_execute list. Otherwise, we skip it.
-            # The invoke node will be executed eventually once its final dependency resolves.
-            dependency_counter_key = invoke_key + "---dep-counter"
-            num_dependencies = num_dependencies_of_dependents[invoke_key]
-
-            # We create a pipeline for incrementing the counter and getting its value (atomically). 
-            # We do this to reduce the number of round trips required for this step of the process.
-            #redis_pipeline = self.get_redis_client(invoke_key).pipeline()
-            redis_pipeline = self.redis_client.pipeline()
-
-            futures.append(redis_pipeline.incr(dependency_counter_key))  # Enqueue the atomic increment operation.
-            futures.append(redis_pipeline.get(dependency_counter_key))   # Enqueue the atomic get operation AFTER the increment operation.
-
-            # Execute the pipeline; save the responses in a local variable.
-            result = yield redis_pipeline.execute()
-            responses = yield asyncio.gather(*futures)
-
-            # Decode and cast the result of the 'get' operation.
-            dependencies_completed = int(responses[1])                    
-
-            # Check if the task is ready for execution. If it is, put it in the "can_now_execute" list. 
-            # If the task is not yet ready, then we don't do anything further with it at this point.
-            if dependencies_completed == num_dependencies:
-                if self.print_debug:
+        if self.print_debug:
+            for invoke_key in task_node.invoke:
+                num_dependencies = num_dependencies_of_dependents[invoke_key]
+                if dependencies_completed[invoke_key] == num_dependencies:
                     logger.debug("[DEP. CHECKING] - task {} is now ready to execute as all {} dependencies have been computed.".format(invoke_key, num_dependencies))
-                can_now_execute.append(invoke_node)
-            else:
-                if self.print_debug:
-                    logger.debug("[DEP. CHECKING] - task {} cannot execute yet. Only {} out of {} dependencies have been computed.".format(invoke_key, dependencies_completed, num_dependencies))
+                    continue
+                # The downstream node is only needed for debugging output, so it is not decoded just for this.
+                invoke_node = job.path_nodes.get(invoke_key, None)
+                if invoke_node is not None:
+                    logger.debug("[DEP. CHECKING] - task {} cannot execute yet. Only {} out of {} dependencies have been computed.".format(invoke_key, dependencies_completed[invoke_key], num_dependencies))
                     logger.debug("\nMissing dependencies: ")
                     deps = invoke_node.task_payload["dependencies"]
                     for dep_task_key in deps:
-                        if dep_task_key not in self.completed_tasks:
+                        if dep_task_key not in job.completed_tasks:
                             logger.debug("     ", dep_task_key)
                             logger.debug("\n")
             
+        # Invoke the ready tasks with the most downstream work first. The Scheduler already orders the 'invoke' list this way,
+        # but we sort by the priorities sent with the graph-init operation in case the node came from elsewhere.
+        can_now_execute.sort(key = lambda invoke_key: job.priorities.get(invoke_key, 0), reverse = True)
+
         # Invoke all of the ready-to-execute tasks in parallel.
         # logger.debug("[ {} ] Invoking {} of the {} downstream tasks of current task {}:".format(datetime.datetime.utcnow(), len(can_now_execute), len(task_node.invoke), task_key))
         # for node in can_now_execute:
         #     logger.debug("     ", node.task_key)
         # logger.debug("\n")
-        for invoke_node in can_now_execute:
+        payloads = []
+        # The tail of every payload is the same for all of the downstream tasks, so we build it once.
+        task_key_serialized = ujson.dumps(task_key)
+        results_suffix = '"previous-results":{' + task_key_serialized + ':"' + value_encoded + '"},"invoked-by":' + task_key_serialized + '}'
+        readers = []        # Downstream tasks which will have to read the value from Redis.
+        for invoke_key in can_now_execute:
             # We're going to check and see if we can send the previous task's data along with the path. 
             # If not, then the Lambda function will just have to retrieve the data from Redis instead.
-            payload = self.serialized_paths[invoke_node.task_key]
-            payload_size = sys.getsizeof(payload)
-            relevant_data_size = sys.getsizeof(value_encoded)
-            combined_size = payload_size + relevant_data_size
+            template = yield self.get_invocation_template(job, invoke_key)
+            combined_size = len(template) + len(results_suffix)
             # We can only send a payload of size 256,000 bytes or less to a Lambda function directly.
             # If the payload is too large, then the Lambda will retrieve the data from Redis.
             if combined_size < 256000:
-                #logger.debug("Payload (before any deserialization or anything): ", payload)
+                # Add the data for 'this' task to the payload. The Lambda function expects the value to be 
+                # in a dictionary stored at key "previous-results". The value should be encoded. The template
+                # is the serialized path with its closing brace removed, so we just append the remaining fields.
+                payloads.append(template + results_suffix)
+                if self.print_debug:
+                    logger.debug("[INVOKE] Invoking Task Executor for task {}.".format(invoke_key))
+            else:
+                readers.append((invoke_key, template))
 
-                # Deserialize the payload so we can modify it. 
-                payload = ujson.loads(payload)
+        # If many downstream tasks are going to read the value, spread the reads across several copies of it.
+        read_endpoints = [None]
+        if len(readers) >= self.hot_object_fanout and self.num_read_replicas > 0:
+            read_endpoints = yield self.replicate_hot_object(task_key, value_encoded, fargate_ip)
 
-                # Add the data for 'this' task to the payload. The Lambda function expects the value to be 
-                # in a dictionary stored at key "previous-results". The value should be encoded.
-                payload["previous-results"] = {task_key: value_encoded}
-                payload["invoked-by"] = task_key
-                # Re-serialize the payload.
-                payload = ujson.dumps(payload)
+        for i, (invoke_key, template) in enumerate(readers):
+            read_endpoint = read_endpoints[i % len(read_endpoints)]
             # If the path + data was too big, see if we can get away with just sending the path. If not, then the Lambda can get that from Redis too.
-            elif sys.getsizeof(payload) > 256000:
-                payload = ujson.dumps({"path-key": invoke_node.task_key + "---path", "invoked-by": task_key})
+            if len(template) > 256000:
+                payload = {"path-key": invoke_key + PATH_KEY_SUFFIX, "invoked-by": task_key, "redis-endpoints": self.dcp_ring.endpoints}
+                if read_endpoint is not None:
+                    payload["read-replicas"] = {task_key: read_endpoint}
+                payload = ujson.dumps(payload)
+            elif read_endpoint is not None:
+                payload = template + '"read-replicas":{' + task_key_serialized + ':' + ujson.dumps(read_endpoint) + '},"invoked-by":' + task_key_serialized + '}'
+            else:
+                payload = template + '"invoked-by":' + task_key_serialized + '}'
             
             if self.print_debug:
-                logger.debug("[INVOKE] Invoking Task Executor for task {}.".format(invoke_node.task_key))
-            self.lambda_invoker.send(payload)            
+                logger.debug("[INVOKE] Invoking Task Executor for task {}.".format(invoke_key))
+            payloads.append(payload)
+
+        # Hand the entire ready set to the invoker in one call.
+        self.lambda_invoker.send_many(payloads)
 
     @gen.coroutine
     def deserialize_and_process_message(self, stream, address = None, **kwargs):
@@ -299,39 +444,41 @@ class RedisProxy(object):
 
     @gen.coroutine
     def handle_IO(self, message, **kwargs):
-        logger.debug("handle_io kwargs: {}".format(kwargs))
-        stream = kwargs['stream']
-        address = kwargs['address']
-        local_address = "tcp://" + get_stream_address(stream)
-        lambda_comm = TCP(stream, local_address, "tcp://" + address[0], deserialize = True)
-        self.io_operations.put([message, lambda_comm])
+        fargate_node = message['fargate-node']
+        #fargate_ip = fargate_node[FARGATE_PUBLIC_IP_KEY]
+        fargate_ip = fargate_node[FARGATE_PRIVATE_IP_KEY]
+        fargate_arn = fargate_node[FARGATE_ARN_KEY]
+        task_key = message[TASK_KEY]
+        redis_operation = message['redis-op']
+        logger.debug("[ {} ] Handling Redis IO {} for task {}, Fargate Node {} listening at {}:6379".format(datetime.datetime.utcnow(), redis_operation, task_key, fargate_arn, fargate_ip))
+
+        if redis_operation == "set":
+            # Grab the associated task node.
+            if not self.knows_task(task_key):
+                # This can happen if the Lambda function executes before the proxy finishes processing the DAG info sent by the Scheduler. 
+                # In these situations, we add the messages to a list that gets processed once the DAG-processing concludes.
+                # logger.debug("[ {} ] [WARNING] {} is not currently contained within self.path_nodes... Will try to process again later...".format(datetime.datetime.utcnow(), task_key))
+                self.need_to_process.append([message, time.time()])
+            else:
+                # Waiting on submit() applies backpressure to this connection when the IO scheduler is saturated.
+                yield self.io_scheduler.submit(task_key, message.get("value-encoded", None), fargate_ip, message)
+        else:
+            logger.error("Unknown Redis IO operation {} for task {}.".format(redis_operation, task_key))
 
     @gen.coroutine
-    def process_IO_operation(self):
-        if (self.io_operations.qsize() != 0):
-            arr = self.io_operations.get()
-            message = arr[0] 
-            stream = arr[1]
-
-            fargate_node = message['fargate-node']
-            #fargate_ip = fargate_node[FARGATE_PUBLIC_IP_KEY]
-            fargate_ip = fargate_node[FARGATE_PRIVATE_IP_KEY]
-            fargate_arn = fargate_node[FARGATE_ARN_KEY]
-            task_key = message[TASK_KEY]
-            redis_operation = message['redis-op']
-            logger.debug("[ {} ] Handling Redis IO {} for task {}, Fargate Node {} listening at {}:6379".format(datetime.datetime.utcnow(), redis_operation, task_key, fargate_arn, fargate_ip))
-
-            if redis_operation == "set":
-                # Grab the associated task node.
-                if task_key not in self.path_nodes:
-                    # This can happen if the Lambda function executes before the proxy finishes processing the DAG info sent by the Scheduler. 
-                    # In these situations, we add the messages to a list that gets processed once the DAG-processing concludes.
-                    # logger.debug("[ {} ] [WARNING] {} is not currently contained within self.path_nodes... Will try to process again later...".format(datetime.datetime.utcnow(), task_key))
-                    self.need_to_process.append([message])
-                else:
-                    # logger.debug("[ {} ] The task {} is contained within self.path_nodes. Processing now...".format(datetime.datetime.utcnow(), task_key))
-                    yield self.process_task(task_key, _value_encoded = None, message = message)                
-                
+    def handle_io_metrics(self, message, **kwargs):
+        """ Reply with the IO scheduler's metrics (queue depth, per-operation latency, etc.), the hot-object cache's
+            metrics, and the amount of per-job state that is currently retained. """
+        stream = kwargs["stream"]
+        address = kwargs["address"]
+        metrics = self.io_scheduler.get_metrics()
+        metrics["hot-objects"] = self.hot_objects.get_metrics()
+        metrics["value-reads"] = {"num-requests": self.value_reads.num_requests, "num-coalesced": self.value_reads.num_coalesced}
+        metrics["num-replicated"] = self.num_replicated
+        metrics["jobs"] = self.jobs.get_metrics()
+        local_address = "tcp://" + get_stream_address(stream)
+        comm = TCP(stream, local_address, "tcp://" + address[0], deserialize = True)
+        yield comm.write({"op": "io-metrics", "metrics": metrics})
 
     @gen.coroutine
     def handle_set(self, message, **kwargs):
@@ -342,53 +489,217 @@ class RedisProxy(object):
         logger.debug("[ {} ] [OPERATION - set] Received 'set' operation from a Lambda. Task Key: {}.".format(datetime.datetime.utcnow(), task_key))
 
         # Grab the associated task node.
-        if task_key not in self.path_nodes:
+        if not self.knows_task(task_key):
             # This can happen if the Lambda function executes before the proxy finishes processing the DAG info sent by the Scheduler. 
             # In these situations, we add the messages to a list that gets processed once the DAG-processing concludes.
             # logger.debug("[ {} ] [WARNING] {} is not currently contained within self.path_nodes... Will try to process again later...".format(datetime.datetime.utcnow(), task_key))
-            self.need_to_process.append([message])
+            self.need_to_process.append([message, time.time()])
             return
         else:
             # logger.debug("[ {} ] The task {} is contained within self.path_nodes. Processing now...".format(datetime.datetime.utcnow(), task_key))
-            yield self.process_task(task_key, message = message, _value_encoded = None)
+            yield self.io_scheduler.submit(task_key, message.get("value-encoded", None), get_fargate_ip(message), message)
+
+    def knows_task(self, task_key):
+        """ Return True if the graph-init operation for the given task has been received (its node may not be decoded yet). """
+        return self.jobs.job_for_task(task_key) is not None
+
+    @gen.coroutine
+    def handle_job_done(self, message, **kwargs):
+        """ Drop the state of a job once the Scheduler reports that all of its tasks finished (or were cancelled). """
+        job_id = message["job-id"]
+        cancelled = message.get("cancelled", False)
+        if self.jobs.drop(job_id, cancelled = cancelled):
+            logger.debug("[ {} ] [OPERATION - job-done] Dropped state of job {} (cancelled: {}). {} jobs retained.".format(datetime.datetime.utcnow(), job_id, cancelled, len(self.jobs)))
 
     @gen.coroutine
     def handle_graph_init(self, message, **kwargs):
+        if "proxy-index" in message:
+            # The Scheduler sends an index of the nodes whose fan-out is handled by the proxy. We register these
+            # and return right away. The nodes are retrieved and decoded in the background (or on demand, if
+            # a task completes before its node has been ingested).
+            job = self.jobs.get_or_create(message.get("job-id", DEFAULT_JOB_ID))
+            proxy_index = {task_key: path_start for task_key, path_start in message["proxy-index"].items() if self.owns_task(task_key)}
+            self.jobs.register_tasks(job, proxy_index)
+            job.priorities.update(message.get("priorities", {}))
+            logger.debug("[ {} ] [OPERATION - graph-init] Registered {} proxy nodes for job {}.".format(datetime.datetime.utcnow(), len(proxy_index), job.job_id))
+            self.loop.spawn_callback(self.ingest_proxy_nodes, job, list(proxy_index.keys()))
+            self.loop.spawn_callback(self.process_deferred_tasks)
+            return
+
+        job = self.jobs.get_or_create(message.get("job-id", DEFAULT_JOB_ID))
+
         # Grab the paths from Redis directly.
         path_keys = message["path-keys"]
 
         if len(path_keys) == 0:
             logger.debug("[WARNING] Received graph-init operation from Scheduler, but the list of path keys was empty...")
         else:
-            response = yield self.redis_client.mget(*path_keys)
+            response = yield self.dcp_ring.mget(path_keys)
 
-            # Iterate over all of the serialized paths and deserialize them/deserialize the nodes.
+            serialized_paths = dict()
+            encoded_nodes = dict()
+
+            # Iterate over all of the serialized paths and collect the encoded nodes.
             for serialized_path in response:
                 path = ujson.loads(serialized_path)
                 starting_node_key = path["starting-node-key"]
 
                 # Map the task key corresponding to the beginning of the path to the path itself.
-                self.serialized_paths[starting_node_key] = serialized_path # May want to check if path is already in the list?
-
-                # Iterate over all of the encoded-and-serialized nodes and deserialize them. 
-                for task_key, encoded_node in path["nodes-map"].items():
-                    decoded_node = base64.b64decode(encoded_node)
-                    deserialized_node = cloudpickle.loads(decoded_node)
-                        
-                    # The 'frames' stuff is related to the Dask protocol. We use Dask's deserialization algorithm here.
-                    frames = []
-                    for encoded in deserialized_node.task_payload:
-                        frames.append(base64.b64decode(encoded))
-                    deserialized_task_payload = yield deserialize_payload(frames)
-                    deserialized_node.task_payload = deserialized_task_payload
-                    self.path_nodes[task_key] = deserialized_node
-            for lst in self.need_to_process:
-                msg = lst[0]
-                task_key = msg[TASK_KEY]
-                value_encoded = msg["value-encoded"]
-                yield self.process_task(task_key, _value_encoded = value_encoded, message = msg) # Could also pass *lst.
-            # Clear the list.
-            self.need_to_process = [] 
+                serialized_paths[starting_node_key] = serialized_path # May want to check if path is already in the list?
+                encoded_nodes.update(path["nodes-map"])
+
+            # A stand-alone proxy decodes every node. A proxy worker only decodes the nodes in its partition,
+            # along with the downstream ("invoke") nodes of those tasks, as those are the only nodes it will touch.
+            owned_keys = [task_key for task_key in encoded_nodes if self.owns_task(task_key)]
+            for task_key in owned_keys:
+                yield self.decode_path_node(job, task_key, encoded_nodes[task_key])
+                self.jobs.register_task(job, task_key)
+            if self.worker_id is not None:
+                for task_key in owned_keys:
+                    for invoke_key in job.path_nodes[task_key].invoke:
+                        if invoke_key not in job.path_nodes:
+                            yield self.decode_path_node(job, invoke_key, encoded_nodes[invoke_key])
+                        if invoke_key in serialized_paths:
+                            job.add_serialized_path(invoke_key, serialized_paths[invoke_key])
+            else:
+                for starting_node_key, serialized_path in serialized_paths.items():
+                    job.add_serialized_path(starting_node_key, serialized_path)
+            yield self.process_deferred_tasks()
+
+    @gen.coroutine
+    def process_deferred_tasks(self):
+        """ Process the 'set' operations that arrived before the graph-init operation for their task.
+
+            Operations that have been waiting for longer than the job state TTL (e.g., late operations for a job whose
+            state has already been dropped) are discarded. """
+        deferred, self.need_to_process = self.need_to_process, []
+        now = time.time()
+        for lst in deferred:
+            msg, deferred_at = lst
+            task_key = msg[TASK_KEY]
+            if not self.knows_task(task_key):
+                if now - deferred_at < self.jobs.ttl:
+                    self.need_to_process.append(lst)
+                else:
+                    logger.warning("[ {} ] Discarding 'set' operation for unknown task {} after {} seconds.".format(datetime.datetime.utcnow(), task_key, now - deferred_at))
+                continue
+            value_encoded = msg.get("value-encoded", None)
+            yield self.io_scheduler.submit(task_key, value_encoded, get_fargate_ip(msg), msg)
+
+    @gen.coroutine
+    def ingest_proxy_nodes(self, job, task_keys, chunk_size = GRAPH_INIT_CHUNK_SIZE):
+        """ Retrieve and decode the given proxy nodes (and prefetch the paths of their downstream tasks) in the background.
+
+            Work is done in chunks, and we yield to the IOLoop between chunks so that incoming operations are not held up. """
+        _start = time.time()
+        for i in range(0, len(task_keys), chunk_size):
+            # Stop if the job completed (or its state was evicted) in the meantime.
+            if self.jobs.jobs.get(job.job_id, None) is not job:
+                logger.debug("[ {} ] Stopped ingesting proxy nodes of job {}, as its state has been dropped.".format(datetime.datetime.utcnow(), job.job_id))
+                return
+            chunk = [task_key for task_key in task_keys[i : i + chunk_size] if task_key not in job.path_nodes]
+
+            # Group the nodes by the path containing them, so that each path is only parsed once.
+            keys_by_path = defaultdict(list)
+            for task_key in chunk:
+                keys_by_path[job.proxy_index.get(task_key, task_key)].append(task_key)
+            yield self.fetch_paths(job, list(keys_by_path.keys()))
+            for path_start, keys in keys_by_path.items():
+                yield self.decode_nodes_from_path(job, path_start, keys)
+
+            # The paths of the downstream tasks are sent along with their invocations, so grab those now too.
+            invoke_keys = set()
+            for task_key in chunk:
+                invoke_keys.update(job.path_nodes[task_key].invoke)
+            yield self.fetch_paths(job, list(invoke_keys))
+            yield gen.moment
+        self.jobs.evict()
+        logger.debug("[ {} ] Ingested {} proxy nodes in {} seconds.".format(datetime.datetime.utcnow(), len(task_keys), time.time() - _start))
+
+    @gen.coroutine
+    def fetch_paths(self, job, starting_node_keys):
+        """ Retrieve the serialized paths beginning at the given tasks, unless they're cached already.
+
+            Paths are retrieved with one MGET per shard. Concurrent requests for the same path share a single fetch. """
+        to_fetch = []
+        waiting = []
+        for key in starting_node_keys:
+            if key in job.serialized_paths:
+                continue
+            fetch_key = (job.job_id, key)
+            if fetch_key in self.path_fetches:
+                waiting.append(self.path_fetches[fetch_key])
+            else:
+                self.path_fetches[fetch_key] = Future()
+                to_fetch.append(key)
+        if len(to_fetch) > 0:
+            try:
+                response = yield self.dcp_ring.mget([key + PATH_KEY_SUFFIX for key in to_fetch])
+                for key, serialized_path in zip(to_fetch, response):
+                    if serialized_path is not None:
+                        job.add_serialized_path(key, serialized_path)
+            finally:
+                for key in to_fetch:
+                    self.path_fetches.pop((job.job_id, key)).set_result(None)
+        if len(waiting) > 0:
+            yield waiting
+
+    @gen.coroutine
+    def get_serialized_path(self, job, starting_node_key):
+        """ Return the serialized path beginning at the given task, retrieving it from Redis if necessary. """
+        if starting_node_key not in job.serialized_paths:
+            yield self.fetch_paths(job, [starting_node_key])
+        return job.serialized_paths[starting_node_key]
+
+    @gen.coroutine
+    def get_invocation_template(self, job, starting_node_key):
+        """ Return the invocation template of the path beginning at the given task.
+
+            The template is the serialized path (a JSON object) without its closing brace, followed by a comma if the
+            object has any fields. A payload is created by appending the remaining fields and the closing brace, so
+            the path is never parsed or re-serialized when a task is invoked. Templates are cached. """
+        template = job.invocation_templates.get(starting_node_key, None)
+        if template is None:
+            serialized_path = yield self.get_serialized_path(job, starting_node_key)
+            if isinstance(serialized_path, bytes):
+                serialized_path = serialized_path.decode()
+            template = serialized_path.rstrip()
+            assert template.endswith("}"), "Serialized path for {} is not a JSON object.".format(starting_node_key)
+            template = template[:-1].rstrip()
+            if not template.endswith("{"):
+                template = template + ","
+            job.add_invocation_template(starting_node_key, template)
+        return template
+
+    @gen.coroutine
+    def decode_nodes_from_path(self, job, starting_node_key, task_keys):
+        """ Decode the nodes of the given tasks (which must be contained in the path beginning at 'starting_node_key'). """
+        serialized_path = yield self.get_serialized_path(job, starting_node_key)
+        nodes_map = ujson.loads(serialized_path)["nodes-map"]
+        for task_key in task_keys:
+            if task_key not in job.path_nodes:
+                yield self.decode_path_node(job, task_key, nodes_map[task_key])
+
+    @gen.coroutine
+    def get_path_node(self, job, task_key):
+        """ Return the PathNode of the given task, decoding it on demand (the result is cached). """
+        if task_key not in job.path_nodes:
+            yield self.decode_nodes_from_path(job, job.proxy_index.get(task_key, task_key), [task_key])
+        return job.path_nodes[task_key]
+
+    @gen.coroutine
+    def decode_path_node(self, job, task_key, encoded_node):
+        """ Decode and deserialize a PathNode (and its task payload) from a path's nodes map. """
+        decoded_node = base64.b64decode(encoded_node)
+        deserialized_node = cloudpickle.loads(decoded_node)
+            
+        # The 'frames' stuff is related to the Dask protocol. We use Dask's deserialization algorithm here.
+        frames = []
+        for encoded in deserialized_node.task_payload:
+            frames.append(base64.b64decode(encoded))
+        deserialized_task_payload = yield deserialize_payload(frames)
+        deserialized_node.task_payload = deserialized_task_payload
+        job.add_path_node(task_key, deserialized_node, len(encoded_node))
 
     @gen.coroutine
     def handle_start(self, message, **kwargs):
@@ -399,33 +710,36 @@ class RedisProxy(object):
         self.redis_channel_names = message["redis-channel-names"]
         self.scheduler_address = message["scheduler-address"]
 
+        if "redis-endpoints" in message:
+            yield self.update_redis_endpoints(message["redis-endpoints"])
+
         # We need the number of cores available as this determines how many processes total we can have.
         num_cores = multiprocessing.cpu_count()            
         cores_remaining = num_cores - len(self.redis_channel_names)
+
+        # Proxy workers split the remaining cores between them.
+        if self.num_workers > 1:
+            cores_remaining = max(cores_remaining / self.num_workers, 1)
             
-        # Start a certain number of Redis polling processes to listen for results.
+        # Create a certain number of channels (Redis Streams) on which Task Executors send us results.
         num_redis_processes_to_create = math.ceil(cores_remaining * 0.5)
-        logger.debug("Creating {} 'Redis Polling' processes.".format(num_redis_processes_to_create))
+        logger.debug("Creating {} Redis Stream consumers.".format(num_redis_processes_to_create))
 
         self.redis_channel_names_for_proxy = []
-        self.base_channel_name = "redis-proxy-"
+        if self.worker_id is None:
+            self.base_channel_name = "redis-proxy-"
+        else:
+            self.base_channel_name = "redis-proxy-{}-".format(self.worker_id)
         for i in range(num_redis_processes_to_create):
             name = self.base_channel_name + str(i)
             self.redis_channel_names_for_proxy.append(name)
 
-        # Create a list to keep track of the processes as well as the Queue object, which we use for communication between the processes.
-        self.redis_polling_processes = []
-        self.redis_polling_queue = multiprocessing.Queue()
-            
-        # For each channel, we create a process and store a reference to it in our list.
+        # For each channel, we create a consumer which reads the corresponding Redis Stream on the IOLoop.
+        self.redis_stream_consumers = []
         for channel_name in self.redis_channel_names_for_proxy:
-            redis_polling_process = Process(target = self.poll_redis_process, args = (self.redis_polling_queue, channel_name, self.redis_host))
-            redis_polling_process.daemon = True 
-            self.redis_polling_processes.append(redis_polling_process)
-                
-        # Start the processes.
-        for redis_polling_process in self.redis_polling_processes:
-            redis_polling_process.start()  
+            consumer = AsyncRedisStreamConsumer((self.redis_host, 6379), channel_name, REDIS_STREAM_GROUP_NAME, REDIS_STREAM_GROUP_NAME + "-" + channel_name, 
+                                                self.consume_lambda_messages)
+            self.redis_stream_consumers.append(consumer)
                 
         self.lambda_invoker = ProxyLambdaInvoker(interval = "2ms", chunk_size = 1, redis_channel_names = self.redis_channel_names, redis_channel_names_for_proxy = self.redis_channel_names_for_proxy, loop = self.loop)
         self.lambda_invoker.start(self.lambda_client, scheduler_address = self.scheduler_address)
@@ -436,14 +750,15 @@ class RedisProxy(object):
 
         logger.debug("[START Operation] Retrieved Scheduler's address from Redis: {}".format(self.scheduler_address))
 
-        payload = {"op": "redis-proxy-channels", "num_channels": len(self.redis_channel_names_for_proxy), "base_name": self.base_channel_name}
+        payload = {"op": "redis-proxy-channels", "num_channels": len(self.redis_channel_names_for_proxy), "base_name": self.base_channel_name, "worker-id": self.worker_id}
         logger.debug("[ {} ] Payload for Scheduler: {}.".format(datetime.datetime.utcnow(), payload))
         local_address = "tcp://" + get_stream_address(stream)
         self.scheduler_comm = TCP(stream, local_address, "tcp://" + address[0], deserialize = True)
         logger.debug("[ {} ] Writing message to Scheduler...".format(datetime.datetime.utcnow()))
         bytes_written = yield self.scheduler_comm.write(payload)
         logger.debug("[ {} ] Wrote {} bytes to Scheduler...".format(datetime.datetime.utcnow(), bytes_written))
-        self.loop.spawn_callback(self.consume_redis_queue)
+        for consumer in self.redis_stream_consumers:
+            self.loop.spawn_callback(consumer.run)
         logger.debug("Now for handle comm")
         #payload2 = {"op": "debug-msg", "message": "[ {} ] Goodbye, world!".format(datetime.datetime.utcnow())}
         #yield self.scheduler_comm.write(payload2)
@@ -537,118 +852,100 @@ class RedisProxy(object):
                 raise 
                 break
 
-    def poll_redis_process(self, _queue, redis_channel_name, redis_endpoint):
-        ''' This function defines a process which continually polls Redis for messages. 
-        
-            When a message is found, it is passed to the main Scheduler process via the queue given to this process. ''' 
-        logger.debug("Redis Polling Process started. Polling channel ", redis_channel_name)
-
-        redis_client = redis.StrictRedis(host=redis_endpoint, port = 6379, db = 0)
-
-        logger.debug("[ {} ] Redis polling processes connected to Redis Client at {}:{}".format(datetime.datetime.utcnow(), redis_endpoint, 6379))
-
-        base_sleep_interval = 0.05 
-        max_sleep_interval = 0.15 
-        current_sleep_interval = base_sleep_interval
-        consecutive_misses = 0
-        
-        # We just do pub-sub on the first redis client.
-        redis_channel = redis_client.pubsub(ignore_subscribe_messages = True)
-        redis_channel.subscribe(redis_channel_name)
-        
-        # This process will just loop endlessly polling Redis for messages. When it finds a message,
-        # it will decode it (from bytes to UTF-8) and send it to the Scheduler process via the queue. 
-        #
-        # If no messages are found, then the thread will sleep before continuing to poll. 
-        while True:
-            message = redis_channel.get_message()
-            if message is not None:
-                timestamp_now = datetime.datetime.utcnow()
-                # logger.debug("[ {} ] Received message from channel {}.".format(timestamp_now, redis_channel_name))   
-                data = message["data"]
-                # The message should be a "bytes"-like object so we decode it.
-                # If we neglect to turn off the subscribe/unsubscribe confirmation messages,
-                # then we may get messages that are just numbers. 
-                # We ignore these by catching the exception and simply passing.
-                data = data.decode()
-                data = ujson.loads(data)
-                # logger.debug("Data: ", data)
-                _queue.put([data])
-                consecutive_misses = 0
-                current_sleep_interval = base_sleep_interval
-            else:
-                time.sleep(current_sleep_interval)
-                consecutive_misses = consecutive_misses + 1
-                current_sleep_interval += 0.05 
-                if (current_sleep_interval > max_sleep_interval):
-                    current_sleep_interval = max_sleep_interval
-
     @gen.coroutine
-    def consume_redis_queue(self):
-        ''' This function executes periodically (as a PeriodicCallback on the IO loop). 
-        It reads messages from the message queue until none are available.'''
-        # logger.debug("Consume Redis Queue is being executed...")
-        while True:
-            messages = []
-            # 'end' is the time at which we should stop iterating. By default, it is 50ms.
-            stop_at = datetime.datetime.utcnow().microsecond + 5000
-            while datetime.datetime.utcnow().microsecond < stop_at and len(messages) < 50:
-                try:
-                    timestamp_now = datetime.datetime.utcnow()
-                    # Attempt to get a payload from the Queue. A 'payload' consists of a message
-                    # and possibly some benchmarking data. The message will be at index 0 of the payload.
-                    payload = self.redis_polling_queue.get(block = False, timeout = None)
-                    message = payload[0]
-                    messages.append(message)
-                # In the case that the queue is empty, break out of the loop and process what we already have.
-                except queue.Empty:
-                    break
-            if len(messages) > 0:
-                # logger.debug("[ {} ] Processing {} messages from Redis Message Queue.".format(datetime.datetime.utcnow(), len(messages)))
-                for message in messages:
-                    if "op" in message:
-                        op = message["op"]
-                        if op == "set":
-                            task_key = message[TASK_KEY]
-                            value_encoded = message["value-encoded"]
-                            logger.debug("[ {} ] [OPERATION - set] Received 'set' operation from a Lambda. Task Key: {}.".format(datetime.datetime.utcnow(), task_key))
-
-                            # Grab the associated task node.
-                            if task_key not in self.path_nodes:
-                                # This can happen if the Lambda function executes before the proxy finishes processing the DAG info sent by the Scheduler. 
-                                # In these situations, we add the messages to a list that gets processed once the DAG-processing concludes.
-                                # logger.debug("[ {} ] [WARNING] {} is not currently contained within self.path_nodes... Will try to process again later...".format(datetime.datetime.utcnow(), task_key))
-                                self.need_to_process.append([message])
-                                continue 
-                            else:
-                                # logger.debug("[ {} ] The task {} is contained within self.path_nodes. Processing now...".format(datetime.datetime.utcnow(), task_key))
-                                yield self.process_task(task_key, _value_encoded = value_encoded, message = message)
-                        else:
-                            logger.error("Unknown Operation from Redis Queue... Message: {}".format(message))
+    def consume_lambda_messages(self, messages):
+        ''' Process a batch of messages read from a Redis Stream by one of our AsyncRedisStreamConsumers. '''
+        for message in messages:
+            if "op" in message:
+                op = message["op"]
+                if op == "set":
+                    task_key = message[TASK_KEY]
+                    value_encoded = message.get("value-encoded", None)
+                    logger.debug("[ {} ] [OPERATION - set] Received 'set' operation from a Lambda. Task Key: {}.".format(datetime.datetime.utcnow(), task_key))
+
+                    # Grab the associated task node.
+                    if not self.knows_task(task_key):
+                        # This can happen if the Lambda function executes before the proxy finishes processing the DAG info sent by the Scheduler. 
+                        # In these situations, we add the messages to a list that gets processed once the DAG-processing concludes.
+                        self.need_to_process.append([message, time.time()])
+                        continue 
                     else:
-                        logger.error("Message from Redis Queue did NOT contain an operation... Message: {}".format(message))
-            # Sleep for 5 milliseconds...
-            yield gen.sleep(0.005)
+                        yield self.io_scheduler.submit(task_key, value_encoded, get_fargate_ip(message), message)
+                else:
+                    logger.error("Unknown Operation from Redis Stream... Message: {}".format(message))
+            else:
+                logger.error("Message from Redis Stream did NOT contain an operation... Message: {}".format(message))
+
+@gen.coroutine
+def ready_dependents(dcp_ring, invoke_keys, num_dependencies_of_dependents):
+    """ Record that a task completed by incrementing the dependency counters of its downstream tasks ('invoke_keys').
+
+        The counters are sharded, so this issues one pipeline per control-plane shard (concurrently) rather than one round
+        trip per downstream task. The value returned by INCR is used directly: it is the count *including* this task, so
+        exactly one of a downstream task's dependencies observes the final count, even when several of them complete at the
+        same time.
+
+        Returns the mapping of downstream task key --> number of its dependencies completed, and the list of the downstream
+        tasks which are now ready to execute (in the order of 'invoke_keys'). """
+    counter_values = yield dcp_ring.incr_many([invoke_key + DEPENDENCY_COUNTER_SUFFIX for invoke_key in invoke_keys])
+    dependencies_completed = {invoke_key: counter_values[invoke_key + DEPENDENCY_COUNTER_SUFFIX] for invoke_key in invoke_keys}
+    ready = [invoke_key for invoke_key in invoke_keys if dependencies_completed[invoke_key] == num_dependencies_of_dependents[invoke_key]]
+    return dependencies_completed, ready
+
+def get_fargate_ip(message):
+    """ Return the IP of the Fargate node on which the value in the given 'set' or 'redis-io' message should be stored. """
+    # Task Executors currently send the public IP of the Fargate node with 'set' operations.
+    for ip_key in (FARGATE_PRIVATE_IP_KEY, FARGATE_PUBLIC_IP_KEY):
+        if ip_key in message:
+            return message[ip_key]
+    return message["fargate-node"][FARGATE_PRIVATE_IP_KEY]
+
 @gen.coroutine
 def deserialize_payload(payload):
    msg = yield from_frames(payload)
    raise gen.Return(msg)
 
+def run_proxy_worker(worker_id, num_workers, proxy_port, aws_region = "us-east-1", print_debug = False, redis_host = None, redis_endpoints = None,
+                     hot_object_fanout = 32, num_read_replicas = 2):
+   """ Entry point of a KV Store Proxy worker process (see ProxyDispatcher). Each worker has its own IOLoop, Lambda client, and Redis connections. """
+   lambda_client = boto3.client('lambda', region_name=aws_region)
+   proxy = RedisProxy(lambda_client, print_debug = print_debug, redis_host = redis_host, redis_endpoints = redis_endpoints, 
+                      worker_id = worker_id, num_workers = num_workers, proxy_port = proxy_port,
+                      hot_object_fanout = hot_object_fanout, num_read_replicas = num_read_replicas)
+   proxy.start()
+
 if __name__ == "__main__":
     # Set up command-line arguments.
     parser = argparse.ArgumentParser(description='Process some values.')
     parser.add_argument("-pd", "--print-debug", dest="print_debug", nargs=1, type=bool, default = False)
     parser.add_argument("-reg", "--region", dest="aws_region", nargs=1, default = ["us-east-1"])
     parser.add_argument("-res", "--redis", dest="redis_hostname", nargs = 1, type = str)
+    parser.add_argument("-w", "--num-workers", dest="num_workers", type = int, default = 1, help = "Number of proxy worker processes. If greater than 1, task keys are partitioned across the workers.")
+    parser.add_argument("-rep", "--redis-endpoints", dest="redis_endpoints", nargs = "+", type = str, default = None, help = "Control-plane Redis endpoints (host or host:port) across which counters and paths are sharded.")
+    parser.add_argument("-hf", "--hot-object-fanout", dest="hot_object_fanout", type = int, default = 32, help = "Values read by at least this many downstream tasks are copied to other storage nodes.")
+    parser.add_argument("-nr", "--num-read-replicas", dest="num_read_replicas", type = int, default = 2, help = "Number of additional copies made of hot values. Set to 0 to disable replication.")
     args = vars(parser.parse_args())
 
     print_debug = args["print_debug"]
     aws_region = args["aws_region"][0]
     redis_host = args["redis_hostname"][0]
+    redis_endpoints = args["redis_endpoints"]
+    num_workers = args["num_workers"]
+    hot_object_fanout = args["hot_object_fanout"]
+    num_read_replicas = args["num_read_replicas"]
 
     logger.debug("aws_region: %s" % aws_region)
-    lambda_client = boto3.client('lambda', region_name=aws_region)
 
-    # Start the proxy.
-    proxy = RedisProxy(lambda_client, print_debug = print_debug, redis_host = redis_host)
-    proxy.start()
\ No newline at end of file
+    if num_workers > 1:
+        # Start the workers behind a dispatcher listening on the usual proxy port.
+        worker_kwargs = {"aws_region": aws_region, "print_debug": print_debug, "redis_host": redis_host, "redis_endpoints": redis_endpoints,
+                         "hot_object_fanout": hot_object_fanout, "num_read_replicas": num_read_replicas}
+        dispatcher = ProxyDispatcher(num_workers, run_proxy_worker, worker_kwargs = worker_kwargs, proxy_port = options.proxy_port)
+        dispatcher.start()
+    else:
+        lambda_client = boto3.client('lambda', region_name=aws_region)
+
+        # Start the proxy.
+        proxy = RedisProxy(lambda_client, print_debug = print_debug, redis_host = redis_host, redis_endpoints = redis_endpoints,
+                           hot_object_fanout = hot_object_fanout, num_read_replicas = num_read_replicas)
+        proxy.start()
\ No newline at end of file
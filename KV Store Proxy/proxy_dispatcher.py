@@ -0,0 +1,202 @@
+import datetime
+import logging
+from multiprocessing import Process
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
+from tornado.tcpserver import TCPServer
+
+from network import CommClosedError, TCP, connect_to_address, get_stream_address
+from sharding import proxy_worker_for_key
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+TASK_KEY = "task_key"
+
+# Metrics that are combined across workers by taking the largest (or, for 'idle', the smallest) value rather than the sum.
+# Latencies cannot be combined exactly, so the combined latencies are those of the slowest worker.
+MAX_METRICS = ("max-queue-depth", "latency-mean", "latency-p50", "latency-p99", "latency-max", "age")
+MIN_METRICS = ("idle",)
+
+def merge_metrics(metrics_of_workers):
+    """ Combine the metrics reported by each worker into metrics describing the whole (sharded) proxy.
+
+        Nested dictionaries (e.g., per-host queue depths or per-job state) are merged key by key. Numbers are summed,
+        except for those listed in MAX_METRICS and MIN_METRICS. Values a worker does not have (None) are ignored. """
+    merged = dict()
+    for metrics in metrics_of_workers:
+        for name, value in metrics.items():
+            current = merged.get(name, None)
+            if isinstance(value, dict):
+                merged[name] = merge_metrics([current or {}, value])
+            elif value is None or current is None:
+                merged[name] = value if current is None else current
+            elif name in MAX_METRICS:
+                merged[name] = max(current, value)
+            elif name in MIN_METRICS:
+                merged[name] = min(current, value)
+            else:
+                merged[name] = current + value
+    return merged
+
+class ProxyDispatcher(object):
+    """ Lightweight front-end for a multi-process (sharded) KV Store Proxy.
+
+        The dispatcher launches 'num_workers' worker processes. Each worker runs its own RedisProxy (listening on
+        'proxy_port + 1 + worker_id') with its own Redis polling processes and its own ProxyLambdaInvoker, and it owns
+        the partition of task keys given by ``proxy_worker_for_key``. Workers share nothing.
+
+        The dispatcher listens on 'proxy_port' (where the Scheduler expects the proxy to be). It does no task processing:
+
+            - 'start' is forwarded to every worker. The replies are combined into a single 'redis-proxy-channels'
+              message listing the channels of each worker, so the Scheduler can address the owning worker directly.
+
+            - Messages carrying a task key (e.g., 'set', 'redis-io') are forwarded to the worker owning that key.
+
+            - Requests that expect a reply (e.g., 'io-metrics') are sent to every worker over a dedicated connection. The
+              replies are merged by the function registered in 'request_handlers' and sent back as a single reply.
+
+            - Everything else (e.g., 'graph-init', 'job-done') is fire-and-forget and is broadcast to all of the workers.
+    """
+    def __init__(self, num_workers, worker_target, worker_kwargs = None, proxy_port = 8989):
+        self.num_workers = num_workers
+        self.worker_target = worker_target
+        self.worker_kwargs = worker_kwargs or {}
+        self.proxy_port = proxy_port
+        self.worker_processes = []
+        self.worker_comms = dict()      # Map of worker ID --> TCP comm used to forward messages to that worker.
+        self.num_forwarded = [0] * num_workers
+        self.request_handlers = {
+                "io-metrics": self.merge_io_metrics     # Request for each worker's IO scheduler metrics.
+            }
+
+    def worker_port(self, worker_id):
+        return self.proxy_port + 1 + worker_id
+
+    def start(self):
+        for worker_id in range(self.num_workers):
+            worker_process = Process(target = self.worker_target, args = (worker_id, self.num_workers, self.worker_port(worker_id)), kwargs = self.worker_kwargs)
+            worker_process.daemon = True
+            self.worker_processes.append(worker_process)
+
+        for worker_process in self.worker_processes:
+            worker_process.start()
+
+        logger.debug("[ {} ] Started {} KV Store Proxy workers on ports {}-{}.".format(datetime.datetime.utcnow(), self.num_workers, self.worker_port(0), self.worker_port(self.num_workers - 1)))
+
+        self.server = TCPServer()
+        self.server.handle_stream = self.handle_stream
+        self.server.listen(self.proxy_port)
+        logger.debug("Proxy dispatcher listening on port {}".format(self.proxy_port))
+
+        self.loop = IOLoop.current()
+        self.loop.start()
+
+    @gen.coroutine
+    def connect_to_worker(self, worker_id):
+        """ Open a new connection to the given worker. The worker may still be starting up, so we allow for a generous timeout. """
+        comm = yield connect_to_address("tcp://127.0.0.1:{}".format(self.worker_port(worker_id)), timeout = 30)
+        raise gen.Return(comm)
+
+    @gen.coroutine
+    def get_worker_comm(self, worker_id):
+        """ Return the (cached) connection used to forward messages to the given worker. """
+        comm = self.worker_comms.get(worker_id, None)
+        if comm is None or comm.stream is None or comm.stream.closed():
+            comm = yield self.connect_to_worker(worker_id)
+            self.worker_comms[worker_id] = comm
+        raise gen.Return(comm)
+
+    @gen.coroutine
+    def handle_stream(self, stream, address):
+        logger.debug("[ {} ] Dispatcher accepted connection from {}".format(datetime.datetime.utcnow(), address))
+        local_address = "tcp://" + get_stream_address(stream)
+        comm = TCP(stream, local_address, "tcp://" + address[0], deserialize = True)
+        try:
+            while True:
+                message = yield comm.read()
+                op = message["op"]
+                if op == "start":
+                    yield self.handle_start(message, comm)
+                elif op in self.request_handlers:
+                    yield self.handle_request(message, comm)
+                else:
+                    yield self.dispatch(message)
+        except (CommClosedError, StreamClosedError, EnvironmentError) as e:
+            logger.debug("[ {} ] Connection from {} closed: {}".format(datetime.datetime.utcnow(), address, e))
+        finally:
+            stream.close()
+
+    @gen.coroutine
+    def handle_start(self, message, scheduler_comm):
+        """ Forward the 'start' operation to each worker and tell the Scheduler about every worker's channels.
+
+            Each worker keeps its 'start' connection open and reads subsequent Scheduler messages from it,
+            so these connections are dedicated to the 'start' operation (forwarding uses separate connections). """
+        workers = []
+        self.start_comms = []
+        for worker_id in range(self.num_workers):
+            comm = yield self.connect_to_worker(worker_id)
+            yield comm.write(message)
+            self.start_comms.append(comm)
+
+        for worker_id, comm in enumerate(self.start_comms):
+            reply = yield comm.read()
+            workers.append({
+                "worker-id": worker_id,
+                "num_channels": reply["num_channels"],
+                "base_name": reply["base_name"]
+            })
+
+        payload = {
+            "op": "redis-proxy-channels",
+            "num_channels": sum(worker["num_channels"] for worker in workers),
+            "base_name": workers[0]["base_name"],
+            "workers": workers
+        }
+        logger.debug("[ {} ] Payload for Scheduler: {}.".format(datetime.datetime.utcnow(), payload))
+        yield scheduler_comm.write(payload)
+
+    @gen.coroutine
+    def handle_request(self, message, client_comm):
+        """ Send a request to every worker, wait for all of their replies, and send the merged reply to the client.
+
+            The forwarding connections are write-only (replies would interleave with those of other clients), so each
+            request uses its own connections. """
+        comms = []
+        try:
+            for worker_id in range(self.num_workers):
+                comm = yield self.connect_to_worker(worker_id)
+                comms.append(comm)
+                self.num_forwarded[worker_id] += 1
+                yield comm.write(message)
+            replies = []
+            for comm in comms:
+                reply = yield comm.read()
+                replies.append(reply)
+        finally:
+            for comm in comms:
+                comm.abort()
+        yield client_comm.write(self.request_handlers[message["op"]](replies))
+
+    def merge_io_metrics(self, replies):
+        return {
+            "op": "io-metrics",
+            "metrics": merge_metrics([reply["metrics"] for reply in replies]),
+            "workers": [{"worker-id": worker_id, "metrics": reply["metrics"]} for worker_id, reply in enumerate(replies)]
+        }
+
+    @gen.coroutine
+    def dispatch(self, message):
+        if TASK_KEY in message:
+            worker_id = proxy_worker_for_key(message[TASK_KEY], self.num_workers)
+            comm = yield self.get_worker_comm(worker_id)
+            self.num_forwarded[worker_id] += 1
+            yield comm.write(message)
+        else:
+            for worker_id in range(self.num_workers):
+                comm = yield self.get_worker_comm(worker_id)
+                self.num_forwarded[worker_id] += 1
+                yield comm.write(message)
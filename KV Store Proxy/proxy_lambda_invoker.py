@@ -11,13 +11,14 @@ import boto3
 import ntplib
 import datetime
 import json
-import ujson
 import time 
 from numbers import Number 
 import datetime
 from datetime import timedelta
 from math import ceil
 
+from invocation_controller import InvocationController
+
 timedelta_sizes = {
     "s": 1,
     "ms": 1e-3,
@@ -52,7 +53,8 @@ class ProxyLambdaInvoker(object):
     """
     
     def __init__(self, interval = "5ms", use_multiple_invokers = True, function_name="WukongExecutor", num_invokers = 8, redis_channel_names = None, debug_print = False, 
-            chunk_size = 5, loop=None, serializers=None, minimum_tasks_for_multiple_invokers = 8, redis_channel_names_for_proxy = None):
+            chunk_size = 5, loop=None, serializers=None, minimum_tasks_for_multiple_invokers = 8, redis_channel_names_for_proxy = None,
+            initial_concurrency = 8, max_concurrency = 64):
         # XXX is the loop arg useful?
         self.loop = loop or IOLoop.current()
         self.interval = parse_timedelta(interval, default="ms")
@@ -81,11 +83,16 @@ class ProxyLambdaInvoker(object):
         self.use_multiple_invokers = use_multiple_invokers 
         self.num_invokers = num_invokers
         self.serializers = serializers
+        self.initial_concurrency = initial_concurrency      # Starting number of concurrent invocations issued by each process (see InvocationController).
+        self.max_concurrency = max_concurrency              # Maximum number of concurrent invocations issued by each process.
+        self.controller = None
         #self.ntp_client = ntplib.NTPClient()
         
     def start(self, lambda_client, scheduler_address):
         print("Starting BatchedLambdaInvoker with interval {}...".format(self.interval))
         self.lambda_client = lambda_client
+        self.controller = InvocationController(lambda_client, function_name = self.lambda_function_name, 
+                                               initial_concurrency = self.initial_concurrency, max_concurrency = self.max_concurrency)
         self.loop.add_callback(self._background_send)
         self.scheduler_address = scheduler_address
         
@@ -133,7 +140,10 @@ class ProxyLambdaInvoker(object):
             self.batch_count += 1
             self.next_deadline = self.loop.time() + self.interval            # Break the payload up into chunks -- one chunk for each invoker process AND the Scheduler process itself.
             payload_chunk_size = ceil(len(payload) / (self.num_invokers + 1))    # We divide by num_invokers + 1 since the Scheduler can also invoke Lambda functions itself.
-            payloads = [payload[x : x + payload_chunk_size] for x in range(0, len(payload), payload_chunk_size)]
+            # Payloads are queued in descending order of priority, so we deal them out round-robin: every chunk then begins with
+            # some of the most important payloads, rather than the first chunk getting all of them.
+            num_chunks = ceil(len(payload) / payload_chunk_size)
+            payloads = [payload[x::num_chunks] for x in range(num_chunks)]
             
             # The scheduler gets the first payload. This is important because,
             # in the case where there is only one payload, we want the Scheduler 
@@ -148,14 +158,13 @@ class ProxyLambdaInvoker(object):
                 sent_time = time.time()
                 msg = {"payload": payloads[i], "sent-time": sent_time}
                 conn = self.lambda_pipes[invoker_index]
-                conn.send(ujson.dumps(msg)) #TODO Can't we just send this without the json.dumps()?
+                conn.send(msg)
                 invoker_index += 1
             try:
                 # send_start_time = time.time()
 
                 # Send each chunk to an invocation of the AWS Lambda function for evaluation.
-                for payload in scheduler_payload:
-                    self.lambda_client.invoke(FunctionName=self.lambda_function_name, InvocationType='Event', Payload = payload)
+                self.controller.invoke_all(scheduler_payload)
             except Exception:
                 #logger.exception("Error in batched write")
                 print("Error in batched write.")
@@ -178,6 +187,27 @@ class ProxyLambdaInvoker(object):
         if self.next_deadline is None:
             self.waker.set()
 
+    def get_metrics(self):
+        """ Return the metrics (concurrency limit, throttles, invokes/sec, etc.) of the invocations issued by this process. """
+        if self.controller is None:
+            return {}
+        return self.controller.get_metrics()
+
+    def send_many(self, msgs):
+        """ Schedule several tasks for sending to Lambda at once (e.g., all of the ready dependents of a fan-out).
+
+        This completes quickly and synchronously
+        """
+        if len(msgs) == 0:
+            return
+        self.message_count += len(msgs)
+
+        self.buffer.extend(msgs)
+
+        # Avoid spurious wakeups if possible
+        if self.next_deadline is None:
+            self.waker.set()
+
     @gen.coroutine
     def close(self):
         """ Flush existing messages"""
@@ -215,6 +245,8 @@ class ProxyLambdaInvoker(object):
             for consecutive empty Pipes."""
         print("[ {} ] - Lambda Invoker Process {} - INFO: Lambda Invoker Process began executing...".format(datetime.datetime.utcnow(), ID))
         lambda_client = boto3.client('lambda', region_name='us-east-1')
+        controller = InvocationController(lambda_client, function_name = self.lambda_function_name, 
+                                          initial_concurrency = self.initial_concurrency, max_concurrency = self.max_concurrency)
         current_redis_channel_index = 0
         #lambda_batch_size = chunk_size                # How many tasks are sent to an individual Lambda function.
         #lambda_queue = []                            # Messages are put into this queue for processing/invocation.
@@ -229,23 +261,17 @@ class ProxyLambdaInvoker(object):
             data_available = conn.poll()
             if data_available:
                 # Grab the message from the connection.
-                _msg = conn.recv()
-                msg  = ujson.loads(_msg)
+                msg = conn.recv()
                 sent_time = msg["sent-time"]
                 current_payload = msg["payload"]
                 received_time = time.time()
                 # print("[ {} ] Lambda Invoker Process {} - INFO: Received message from connection. Took {} seconds to transfer through conn.".format(datetime.datetime.utcnow(), ID, received_time - sent_time))
-                num_lambdas_submitted = 0
                 start = time.time()
-                for payload in current_payload:
-                    #remote = self.ntp_client.request("north-america.pool.ntp.org")
-                    #invoke_time = remote.dest_time + remote.offset        
-                    #_payload = {"event": payload, "invoke-time": invoke_time}                    
-                    lambda_client.invoke(FunctionName=self.lambda_function_name, InvocationType='Event', Payload = payload)
-                    num_lambdas_submitted += 1
+                controller.invoke_all(current_payload)
                 stop = time.time()                
                 time_to_submit = stop - start 
-                # print("[ {} ] Lambda Invoker Process {} - INFO: submitted {} Lambdas in {} seconds.".format(datetime.datetime.utcnow(), ID, num_lambdas_submitted, time_to_submit))
+                if self.debug_print:
+                    print("[ {} ] Lambda Invoker Process {} - INFO: {}".format(datetime.datetime.utcnow(), ID, controller.get_metrics()))
                 # Since there was a message in the pipe, we set the sleep interval back to the base amount.
                 current_sleep_interval = base_sleep_interval
             else:
@@ -0,0 +1,171 @@
+import datetime
+import logging
+
+import aioredis
+import ujson
+from tornado import gen
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Name of the field in each stream entry that holds the (JSON-serialized) message.
+STREAM_DATA_FIELD = b"data"
+
+class AsyncRedisStreamConsumer(object):
+    """ Consume messages published to a Redis Stream by AWS Lambda Task Executors as part of a consumer group.
+
+        This replaces the pub-sub polling processes and the multiprocessing Queue. The consumer is a coroutine on the
+        IOLoop which issues blocking XREADGROUP calls on its own Redis connection (a blocking command ties up the
+        connection), hands each batch to 'handler' (a coroutine), and then acknowledges and deletes the batch, so the
+        stream only holds the entries that haven't been processed yet (the consumer group is the stream's only reader).
+        Entries that were delivered to this consumer but never acknowledged (e.g., the proxy was restarted) are replayed first.
+
+        Errors never stop the consumer: it backs off and tries again, reconnecting if the connection was lost. If the group is
+        gone (e.g., the stream was deleted by a FLUSHALL), it is created again. Entries whose acknowledgement failed are
+        acknowledged again before the next read, so handled messages aren't redelivered.
+
+        Parameters
+        ----------
+        redis_address : (str, int)
+            Address of the Redis instance on which the stream lives.
+        stream_name : str
+            Name of the stream (this is the "channel" name used by the Task Executors).
+        group_name : str
+            Name of the consumer group. The group is created if it does not already exist.
+        consumer_name : str
+            Name of this consumer within the group. Must be stable across restarts for pending entries to be replayed.
+        handler : coroutine function
+            Called with a list of deserialized messages (dicts).
+        max_retry_delay : float
+            Longest time (in seconds) to wait before reading again after an error. The delay doubles after each
+            consecutive failure, up to this value.
+    """
+    def __init__(self, redis_address, stream_name, group_name, consumer_name, handler, batch_size = 500, block_ms = 1000,
+                 max_retry_delay = 5):
+        self.redis_address = redis_address
+        self.stream_name = stream_name
+        self.group_name = group_name
+        self.consumer_name = consumer_name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.max_retry_delay = max_retry_delay
+        self.please_stop = False
+        self.redis_client = None
+
+        self.num_messages = 0
+        self.num_batches = 0
+        self.num_replayed = 0
+        self.num_errors = 0
+        self.num_group_recreations = 0
+        self.entries_to_ack = []                    # IDs of handled entries whose acknowledgement failed.
+
+    def stop(self):
+        self.please_stop = True
+
+    @gen.coroutine
+    def create_group(self, latest_id = "$"):
+        """ Create the consumer group (and the stream) if they do not exist yet. The group starts reading after 'latest_id'. """
+        try:
+            yield self.redis_client.xgroup_create(self.stream_name, self.group_name, latest_id = latest_id, mkstream = True)
+        except aioredis.errors.ReplyError as ex:
+            # BUSYGROUP means the group already exists, which is fine (e.g., the proxy is being restarted).
+            if "BUSYGROUP" not in str(ex):
+                raise
+
+    @gen.coroutine
+    def read(self, latest_id, timeout = None):
+        entries = yield self.redis_client.xread_group(self.group_name, self.consumer_name, [self.stream_name], timeout = timeout,
+                                                      count = self.batch_size, latest_ids = [latest_id])
+        # Each entry is a tuple of (stream_name, entry_id, fields).
+        return entries
+
+    @gen.coroutine
+    def run(self):
+        # First, replay any entries that were delivered to this consumer but never acknowledged.
+        replaying = True
+        group_latest_id = "$"                       # Where the group starts reading if it has to be created.
+        retry_delay = 0
+        while not self.please_stop:
+            try:
+                if self.redis_client is None or self.redis_client.closed:
+                    self.redis_client = yield aioredis.create_redis(address = self.redis_address)
+                if group_latest_id is not None:
+                    yield self.create_group(latest_id = group_latest_id)
+                    group_latest_id = None
+                    logger.debug("[ {} ] Consuming Redis Stream {} as {}/{}.".format(datetime.datetime.utcnow(), self.stream_name, self.group_name, self.consumer_name))
+                if len(self.entries_to_ack) > 0:
+                    yield self.acknowledge(self.entries_to_ack)
+                    self.entries_to_ack = []
+                if replaying:
+                    replaying = yield self.replay_pending()
+                else:
+                    entries = yield self.read(">", timeout = self.block_ms)
+                    if entries:
+                        yield self.handle_entries(entries)
+                retry_delay = 0
+                continue
+            except aioredis.errors.ReplyError as ex:
+                # The stream (and thus the group) may have been deleted, e.g., by a FLUSHALL, along with the entries pending in the
+                # old group. Every entry in the stream was added since then, so the group is created again from the start of the
+                # stream. Creating it is harmless if it still exists.
+                group_latest_id = "0"
+                self.entries_to_ack = []
+                self.num_group_recreations += 1
+                if "NOGROUP" in str(ex):
+                    logger.warning("[ {} ] Consumer group {} of stream {} no longer exists. Creating it again.".format(
+                        datetime.datetime.utcnow(), self.group_name, self.stream_name))
+                    continue
+                self.num_errors += 1
+                logger.error("[ {} ] Error while consuming stream {}: {}".format(datetime.datetime.utcnow(), self.stream_name, ex))
+            except Exception as ex:
+                # E.g., the connection was lost (it's re-established before the next attempt).
+                self.num_errors += 1
+                logger.error("[ {} ] Error while consuming stream {}: {}".format(datetime.datetime.utcnow(), self.stream_name, repr(ex)))
+            # Back off before trying again, rather than spinning while Redis is unreachable.
+            retry_delay = min(self.max_retry_delay, max(0.1, retry_delay * 2))
+            yield gen.sleep(retry_delay)
+
+    @gen.coroutine
+    def replay_pending(self):
+        """ Replay a batch of the entries delivered to this consumer but never acknowledged. Returns False once there are none left. """
+        entries = yield self.read("0")
+        if len(entries) == 0:
+            return False
+        # Entries which were deleted from the stream (e.g., trimmed) come back with no fields. They're only acknowledged.
+        deleted = [entry_id for _, entry_id, fields in entries if not fields]
+        if len(deleted) > 0:
+            yield self.acknowledge(deleted)
+        entries = [entry for entry in entries if entry[2]]
+        if len(entries) > 0:
+            self.num_replayed += len(entries)
+            logger.debug("Replaying {} pending entries from stream {}.".format(len(entries), self.stream_name))
+            yield self.handle_entries(entries)
+        return True
+
+    @gen.coroutine
+    def acknowledge(self, entry_ids):
+        yield self.redis_client.xack(self.stream_name, self.group_name, *entry_ids)
+        yield self.redis_client.execute(b"XDEL", self.stream_name, *entry_ids)
+
+    @gen.coroutine
+    def handle_entries(self, entries):
+        messages = []
+        for _, entry_id, fields in entries:
+            try:
+                messages.append(ujson.loads(fields[STREAM_DATA_FIELD].decode()))
+            except (KeyError, ValueError) as ex:
+                self.num_errors += 1
+                logger.error("Could not deserialize entry {} from stream {}: {}".format(entry_id, self.stream_name, ex))
+        try:
+            yield self.handler(messages)
+        except Exception as ex:
+            self.num_errors += 1
+            logger.exception(ex)
+        self.num_messages += len(messages)
+        self.num_batches += 1
+
+        # Acknowledge the whole batch, then delete it. If that fails, it's retried before the next read.
+        self.entries_to_ack.extend(entry_id for _, entry_id, _ in entries)
+        yield self.acknowledge(self.entries_to_ack)
+        self.entries_to_ack = []
@@ -0,0 +1,123 @@
+from collections import defaultdict
+import hashlib
+
+import aioredis
+from tornado import gen
+from uhashring import HashRing
+
+# Default port used by the Redis instances which make up the control plane (dependency counters, paths, etc.)
+DEFAULT_REDIS_PORT = 6379
+
+def parse_redis_endpoint(endpoint):
+    """ Convert an endpoint of the form "host", "host:port", (host, port) or [host, port] into a (host, port) tuple. """
+    if isinstance(endpoint, (tuple, list)):
+        host, port = endpoint
+        return str(host), int(port)
+    endpoint = str(endpoint)
+    if ":" in endpoint:
+        host, port = endpoint.rsplit(":", 1)
+        return host, int(port)
+    return endpoint, DEFAULT_REDIS_PORT
+
+def normalize_redis_endpoints(endpoints):
+    """ Return the list of endpoints as "host:port" strings (these are the names of the nodes on the hash ring). """
+    normalized = []
+    for endpoint in endpoints:
+        host, port = parse_redis_endpoint(endpoint)
+        normalized.append("{}:{}".format(host, port))
+    return normalized
+
+def shard_key(key):
+    """ Strip the Wukong suffix (e.g. "---dep-counter") from a key so that all of a task's keys hash identically. """
+    key = str(key)
+    idx = key.find("---")
+    if idx > 0:
+        return key[:idx]
+    return key
+
+class AsyncRedisShardRing(object):
+    """ asyncio/aioredis counterpart of the Scheduler's RedisShardRing.
+
+        Dependency counters and paths are placed on one of the control-plane Redis instances according to a
+        ketama hash ring over the task key. The node names are "host:port" strings, so this ring agrees with
+        the rings constructed by the Scheduler, the Client, and the Task Executors for the same endpoints.
+
+        ``connect()`` must be called (and waited on) before the ring is used.
+    """
+    def __init__(self, endpoints):
+        if len(endpoints) == 0:
+            raise ValueError("At least one Redis endpoint is required to construct an AsyncRedisShardRing.")
+        self.endpoints = normalize_redis_endpoints(endpoints)
+        self.clients = dict()
+        self.hash_ring = HashRing(nodes = self.endpoints, hash_fn = "ketama")
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    @gen.coroutine
+    def connect(self, existing_clients = None):
+        """ Connect to each shard. Connections in 'existing_clients' (mapping of "host:port" --> client) are reused. """
+        existing_clients = existing_clients or {}
+        for endpoint in self.endpoints:
+            if endpoint in existing_clients:
+                self.clients[endpoint] = existing_clients[endpoint]
+            else:
+                self.clients[endpoint] = yield aioredis.create_redis(address = parse_redis_endpoint(endpoint))
+
+    def get_node_name(self, key):
+        """ Return the "host:port" of the shard responsible for the given (possibly suffixed) key. """
+        if len(self.endpoints) == 1:
+            return self.endpoints[0]
+        return self.hash_ring.get_node(shard_key(key))
+
+    def get_client(self, key):
+        """ Return the aioredis client of the shard responsible for the given key. """
+        return self.clients[self.get_node_name(key)]
+
+    def group_keys(self, keys):
+        """ Return a mapping of shard name --> list of keys stored on that shard. """
+        groups = defaultdict(list)
+        for key in keys:
+            groups[self.get_node_name(key)].append(key)
+        return groups
+
+    @gen.coroutine
+    def mget(self, keys):
+        """ Retrieve the values of the given keys (one MGET per shard, issued concurrently). Values are returned in the same order as the keys. """
+        groups = self.group_keys(keys)
+        node_names = list(groups.keys())
+        responses = yield [self.clients[node_name].mget(*groups[node_name]) for node_name in node_names]
+        values = dict()
+        for node_name, response in zip(node_names, responses):
+            for key, value in zip(groups[node_name], response):
+                values[key] = value
+        return [values[key] for key in keys]
+
+    @gen.coroutine
+    def incr_many(self, keys):
+        """ Atomically increment each of the given counters. One pipeline is issued per shard, and the shards are
+            updated concurrently. Returns a mapping of key --> value of the counter *after* the increment. """
+        groups = self.group_keys(keys)
+        node_names = list(groups.keys())
+        pipelines = []
+        for node_name in node_names:
+            redis_pipeline = self.clients[node_name].pipeline()
+            for key in groups[node_name]:
+                redis_pipeline.incr(key)
+            pipelines.append(redis_pipeline)
+        responses = yield [redis_pipeline.execute() for redis_pipeline in pipelines]
+        values = dict()
+        for node_name, response in zip(node_names, responses):
+            for key, value in zip(groups[node_name], response):
+                values[key] = int(value)
+        return values
+
+def proxy_worker_for_key(key, num_workers):
+    """ Return the ID of the KV Store Proxy worker process which owns the given task key.
+
+        Tasks are partitioned across the proxy's worker processes by a stable hash of the (unsuffixed) task key,
+        so the Scheduler can address the right worker's channels directly without going through the dispatcher. """
+    if num_workers <= 1:
+        return 0
+    digest = hashlib.md5(shard_key(key).encode()).hexdigest()
+    return int(digest, 16) % num_workers
@@ -0,0 +1,88 @@
+from __future__ import print_function, division, absolute_import
+
+from tornado.ioloop import IOLoop
+
+from job_state import JobStateTable
+from proxy import RedisProxy
+
+
+class Proxy(object):
+    """ Stands in for the RedisProxy's job-done handling. """
+    handle_job_done = RedisProxy.handle_job_done
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    def job_done(self, job_id, cancelled = False):
+        IOLoop.current().run_sync(lambda: self.handle_job_done({"op": "job-done", "job-id": job_id, "cancelled": cancelled}))
+
+
+def start_job(jobs, job_id, num_tasks = 2, path_bytes = 10):
+    job = jobs.get_or_create(job_id)
+    jobs.register_tasks(job, {"%s-task-%d" % (job_id, i): "%s-task-0" % job_id for i in range(num_tasks)})
+    job.add_serialized_path("%s-task-0" % job_id, b"x" * path_bytes)
+    return job
+
+
+def test_least_recently_used_jobs_are_evicted():
+    jobs = JobStateTable(max_jobs = 3, max_bytes = 1000)
+    for i in range(3):
+        start_job(jobs, "job-%d" % i)
+    # Completing a task of the oldest job makes it the most recently used.
+    assert jobs.job_for_task("job-0-task-1").job_id == "job-0"
+    start_job(jobs, "job-3")
+    assert list(jobs.jobs) == ["job-2", "job-0", "job-3"]
+    assert jobs.job_for_task("job-1-task-0") is None and jobs.num_evicted == 1
+
+    # Too many bytes: every job but the most recent one goes, however large it is.
+    start_job(jobs, "job-4", path_bytes = 5000)
+    jobs.evict()
+    assert list(jobs.jobs) == ["job-4"] and jobs.num_evicted == 4
+    assert set(jobs.task_to_job) == {"job-4-task-0", "job-4-task-1"}
+
+
+def test_idle_jobs_expire():
+    jobs = JobStateTable(ttl = 60)
+    for i in range(3):
+        start_job(jobs, "job-%d" % i)
+    for job_id in ("job-0", "job-2"):
+        jobs.jobs[job_id].last_access -= 61
+    jobs.evict()
+    # The most recently used job is kept even though it is idle.
+    assert list(jobs.jobs) == ["job-1", "job-2"] and jobs.num_expired == 1
+    assert jobs.job_for_task("job-0-task-0") is None
+
+
+def test_job_done_drops_the_job_state():
+    proxy = Proxy(JobStateTable())
+    start_job(proxy.jobs, "job-0")
+    second = start_job(proxy.jobs, "job-1")
+    # A later job re-submitting one of the tasks takes it over (once it has decoded its node).
+    second.add_path_node("job-0-task-1", object(), 10)
+    proxy.jobs.register_task(second, "job-0-task-1")
+
+    proxy.job_done("job-0")
+    assert "job-0" not in proxy.jobs and proxy.jobs.job_for_task("job-0-task-0") is None
+    assert proxy.jobs.job_for_task("job-0-task-1") is second
+    proxy.job_done("job-1", cancelled = True)
+    proxy.job_done("job-1")
+    assert len(proxy.jobs) == 0 and proxy.jobs.task_to_job == {}
+    assert proxy.jobs.num_completed == 1 and proxy.jobs.num_cancelled == 1
+
+
+def test_table_stays_bounded_over_many_jobs():
+    proxy = Proxy(JobStateTable(max_jobs = 16, max_bytes = 10000, ttl = 60))
+    for i in range(5000):
+        start_job(proxy.jobs, "job-%d" % i, num_tasks = 10, path_bytes = 100 + i % 1000)
+        proxy.jobs.evict()
+        if i % 3 == 0:
+            proxy.job_done("job-%d" % i)
+        elif i % 3 == 1 and i > 0:
+            # The Scheduler never reports this job as done, and it isn't used again.
+            proxy.jobs.jobs["job-%d" % i].last_access -= 61
+        assert len(proxy.jobs) <= 16
+        assert proxy.jobs.num_bytes() <= 10000 + 1100
+        assert len(proxy.jobs.task_to_job) <= 16 * 10
+    metrics = proxy.jobs.get_metrics()
+    assert metrics["num-created"] == 5000
+    assert metrics["num-completed"] + metrics["num-expired"] + metrics["num-evicted"] + metrics["num-jobs"] == 5000
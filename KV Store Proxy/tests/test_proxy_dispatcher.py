@@ -0,0 +1,100 @@
+from __future__ import print_function, division, absolute_import
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.tcpserver import TCPServer
+from tornado.testing import bind_unused_port
+
+from network import CommClosedError, TCP, get_stream_address
+from proxy_dispatcher import ProxyDispatcher, merge_metrics
+
+
+class Worker(TCPServer):
+    """ Stands in for a RedisProxy worker: replies to 'io-metrics' and records every other message. """
+    def __init__(self, worker_id):
+        super(Worker, self).__init__()
+        self.worker_id = worker_id
+        self.received = []
+        sock, self.port = bind_unused_port()
+        self.add_socket(sock)
+
+    @gen.coroutine
+    def handle_stream(self, stream, address):
+        comm = TCP(stream, "tcp://" + get_stream_address(stream), "tcp://" + address[0], deserialize = True)
+        try:
+            while True:
+                message = yield comm.read()
+                self.received.append(message)
+                if message["op"] == "io-metrics":
+                    yield comm.write({"op": "io-metrics", "metrics": {
+                        "queue-depth": self.worker_id + 1,
+                        "queue-depth-per-host": {"10.0.0.%d" % self.worker_id: 1, "10.0.0.9": 2},
+                        "latency-p99": None if self.worker_id == 0 else 0.5 * self.worker_id,
+                        "jobs": {"num-jobs": 1, "jobs": {"job-0": {"num-bytes": 10, "age": self.worker_id, "idle": self.worker_id}}}
+                    }})
+        except CommClosedError:
+            pass
+
+
+class Client(object):
+    def __init__(self):
+        self.written = []
+
+    @gen.coroutine
+    def write(self, message):
+        self.written.append(message)
+
+
+def make_dispatcher(num_workers):
+    workers = [Worker(worker_id) for worker_id in range(num_workers)]
+    dispatcher = ProxyDispatcher(num_workers, worker_target = None)
+    dispatcher.worker_port = lambda worker_id: workers[worker_id].port
+    return dispatcher, workers
+
+
+def test_io_metrics_are_merged_across_workers():
+    dispatcher, workers = make_dispatcher(3)
+    client = Client()
+    try:
+        IOLoop.current().run_sync(lambda: dispatcher.handle_request({"op": "io-metrics"}, client), timeout = 10)
+    finally:
+        for worker in workers:
+            worker.stop()
+
+    [reply] = client.written
+    assert reply["op"] == "io-metrics"
+    assert [worker["worker-id"] for worker in reply["workers"]] == [0, 1, 2]
+    assert reply["workers"][2]["metrics"]["queue-depth"] == 3
+    assert reply["metrics"] == {
+        "queue-depth": 6,
+        "queue-depth-per-host": {"10.0.0.0": 1, "10.0.0.1": 1, "10.0.0.2": 1, "10.0.0.9": 6},
+        "latency-p99": 1.0,
+        "jobs": {"num-jobs": 3, "jobs": {"job-0": {"num-bytes": 30, "age": 2, "idle": 0}}}
+    }
+    assert dispatcher.num_forwarded == [1, 1, 1]
+
+
+def test_fire_and_forget_ops_are_broadcast():
+    dispatcher, workers = make_dispatcher(2)
+
+    @gen.coroutine
+    def run():
+        yield dispatcher.dispatch({"op": "job-done", "job-id": "job-0"})
+        for _ in range(1000):
+            if all(worker.received for worker in workers):
+                break
+            yield gen.sleep(0.01)
+
+    try:
+        IOLoop.current().run_sync(run, timeout = 10)
+    finally:
+        for worker in workers:
+            worker.stop()
+        for comm in dispatcher.worker_comms.values():
+            comm.abort()
+    assert [worker.received for worker in workers] == [[{"op": "job-done", "job-id": "job-0"}]] * 2
+
+
+def test_merge_metrics_ignores_missing_values():
+    assert merge_metrics([{"latency-max": None, "num-errors": 1}, {"latency-max": 2.0, "num-errors": 2}]) == {"latency-max": 2.0, "num-errors": 3}
+    assert merge_metrics([]) == {}
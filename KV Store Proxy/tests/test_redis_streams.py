@@ -0,0 +1,110 @@
+from __future__ import print_function, division, absolute_import
+
+import json
+
+import aioredis
+import pytest
+import redis
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+import redis_streams
+from redis_streams import AsyncRedisStreamConsumer
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class Client(object):
+    """ The aioredis commands used by the consumer, run against a fakeredis server. """
+    def __init__(self, server):
+        self.redis_client = fakeredis.FakeStrictRedis(server=server)
+        self.closed = False
+        self.fail_next_read = False
+
+    def call(self, command, *args, **kwargs):
+        try:
+            return getattr(self.redis_client, command)(*args, **kwargs)
+        except redis.exceptions.ResponseError as ex:
+            raise aioredis.errors.ReplyError(str(ex))
+
+    @gen.coroutine
+    def xgroup_create(self, stream, group_name, latest_id="$", mkstream=False):
+        return self.call("xgroup_create", stream, group_name, id=latest_id, mkstream=mkstream)
+
+    @gen.coroutine
+    def xread_group(self, group_name, consumer_name, streams, timeout=0, count=None, latest_ids=None):
+        if self.fail_next_read:
+            self.closed = True
+            raise aioredis.errors.ConnectionClosedError("Reader at end of file")
+        response = self.call("xreadgroup", group_name, consumer_name, dict(zip(streams, latest_ids)), count=count)
+        yield gen.moment
+        return [(stream, entry_id, fields) for stream, entries in response for entry_id, fields in entries]
+
+    @gen.coroutine
+    def xack(self, stream, group_name, *entry_ids):
+        return self.call("xack", stream, group_name, *entry_ids)
+
+    @gen.coroutine
+    def execute(self, command, *args):
+        return self.call("execute_command", command, *args)
+
+
+def publish(redis_client, message):
+    return redis_client.xadd("stream", {"data": json.dumps(message)})
+
+
+@gen.coroutine
+def wait_for(condition, num_steps=2000):
+    for _ in range(num_steps):
+        if condition():
+            return
+        yield gen.sleep(0.005)
+    assert condition()
+
+
+def test_consumer_survives_lost_connections_and_flushes(monkeypatch):
+    server = fakeredis.FakeServer()
+    clients = []
+
+    @gen.coroutine
+    def create_redis(address):
+        clients.append(Client(server))
+        return clients[-1]
+    monkeypatch.setattr(redis_streams.aioredis, "create_redis", create_redis)
+
+    redis_client = fakeredis.FakeStrictRedis(server=server)
+    received = []
+
+    @gen.coroutine
+    def handler(messages):
+        received.extend(messages)
+
+    consumer = AsyncRedisStreamConsumer(("localhost", 6379), "stream", "group", "consumer", handler, max_retry_delay=0.05)
+
+    # Three entries were delivered before a restart. One of them has since been deleted from the stream.
+    redis_client.xgroup_create("stream", "group", id="$", mkstream=True)
+    ids = [publish(redis_client, {"i": i}) for i in range(3)]
+    redis_client.xreadgroup("group", "consumer", {"stream": ">"})
+    redis_client.xdel("stream", ids[1])
+
+    @gen.coroutine
+    def run():
+        IOLoop.current().spawn_callback(consumer.run)
+        yield wait_for(lambda: len(received) == 2)
+        yield wait_for(lambda: redis_client.xpending("stream", "group")["pending"] == 0)
+
+        # The connection drops: the consumer reconnects.
+        clients[-1].fail_next_read = True
+        publish(redis_client, {"i": 3})
+        yield wait_for(lambda: len(received) == 3)
+
+        # The stream and its group go away. Messages published afterwards are still consumed.
+        redis_client.flushall()
+        publish(redis_client, {"i": 4})
+        yield wait_for(lambda: len(received) == 4)
+        yield wait_for(lambda: redis_client.xlen("stream") == 0)
+        consumer.stop()
+
+    IOLoop.current().run_sync(run, timeout=30)
+    assert received == [{"i": 0}, {"i": 2}, {"i": 3}, {"i": 4}]
+    assert len(clients) == 2 and consumer.num_replayed == 2 and consumer.num_group_recreations >= 1
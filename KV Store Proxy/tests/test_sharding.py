@@ -0,0 +1,112 @@
+from __future__ import print_function, division, absolute_import
+
+import pytest
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from proxy import ready_dependents, DEPENDENCY_COUNTER_SUFFIX
+from sharding import AsyncRedisShardRing
+
+
+class Pipeline(object):
+    def __init__(self, shard):
+        self.shard = shard
+        self.queued = []
+
+    def incr(self, key):
+        self.queued.append(key)
+
+    @gen.coroutine
+    def execute(self):
+        self.shard.num_pipelines += 1
+        results = []
+        for key in self.queued:
+            self.shard.data[key] = self.shard.data.get(key, 0) + 1
+            results.append(self.shard.data[key])
+        return results
+
+
+class Shard(object):
+    """ Stands in for the aioredis client of one control-plane shard. """
+    def __init__(self):
+        self.data = dict()
+        self.num_pipelines = 0
+
+    def pipeline(self):
+        return Pipeline(self)
+
+
+def make_ring(num_shards):
+    ring = AsyncRedisShardRing(["10.0.0.%d:6379" % i for i in range(num_shards)])
+    ring.clients = {endpoint: Shard() for endpoint in ring.endpoints}
+    return ring
+
+
+def test_incr_many_issues_one_pipeline_per_shard():
+    ring = make_ring(3)
+    keys = ["x-%d" % i + DEPENDENCY_COUNTER_SUFFIX for i in range(100)]
+    values = IOLoop.current().run_sync(lambda: ring.incr_many(keys))
+    assert values == {key: 1 for key in keys}
+    values = IOLoop.current().run_sync(lambda: ring.incr_many(keys[:10]))
+    assert values == {key: 2 for key in keys[:10]}
+    assert sum(shard.num_pipelines for shard in ring.clients.values()) == 6
+    # Each counter lives on the shard its task key hashes to.
+    for key in keys:
+        assert key in ring.get_client(key).data
+
+
+def test_ready_dependents_at_several_fan_outs():
+    for fan_out in (1, 10, 1000, 10000):
+        ring = make_ring(3)
+        invoke_keys = ["y-%d" % i for i in range(fan_out)]
+        # Every other downstream task also depends on a second task.
+        num_dependencies = {key: 1 + i % 2 for i, key in enumerate(invoke_keys)}
+
+        completed, ready = IOLoop.current().run_sync(lambda: ready_dependents(ring, invoke_keys, num_dependencies))
+        assert completed == {key: 1 for key in invoke_keys}
+        assert ready == invoke_keys[::2]
+
+        # The second dependency completes: only the tasks that were waiting for it become ready, in order.
+        completed, ready = IOLoop.current().run_sync(lambda: ready_dependents(ring, invoke_keys[1::2], num_dependencies))
+        assert ready == invoke_keys[1::2]
+        assert sum(shard.num_pipelines for shard in ring.clients.values()) <= 6
+
+
+class FakeRedisPipeline(object):
+    def __init__(self, redis_client):
+        self.redis_pipeline = redis_client.pipeline(transaction = False)
+
+    def incr(self, key):
+        self.redis_pipeline.incr(key)
+
+    @gen.coroutine
+    def execute(self):
+        results = self.redis_pipeline.execute()
+        yield gen.moment
+        return results
+
+
+class FakeRedisShard(object):
+    """ The aioredis commands used by the ring, run against a fakeredis server. """
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+
+    def pipeline(self):
+        return FakeRedisPipeline(self.redis_client)
+
+
+def test_ready_dependents_against_redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    ring = AsyncRedisShardRing(["10.0.0.%d:6379" % i for i in range(3)])
+    redis_clients = {endpoint: fakeredis.FakeStrictRedis(server = fakeredis.FakeServer()) for endpoint in ring.endpoints}
+    ring.clients = {endpoint: FakeRedisShard(redis_client) for endpoint, redis_client in redis_clients.items()}
+    invoke_keys = ["z-%d" % i for i in range(10000)]
+    num_dependencies = {key: 2 for key in invoke_keys}
+
+    # Both dependencies of every downstream task complete at the same time: each task is ready exactly once.
+    results = IOLoop.current().run_sync(lambda: gen.multi([ready_dependents(ring, invoke_keys, num_dependencies) for _ in range(2)]))
+    assert sorted(results[0][1] + results[1][1]) == sorted(invoke_keys)
+    for key in invoke_keys:
+        counter_key = key + DEPENDENCY_COUNTER_SUFFIX
+        assert redis_clients[ring.get_node_name(counter_key)].get(counter_key) == b"2"
+    assert all(redis_client.dbsize() > 0 for redis_client in redis_clients.values())
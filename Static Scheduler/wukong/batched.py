@@ -124,6 +124,19 @@ class BatchedSend(object):
         if self.next_deadline is None:
             self.waker.set()
 
+    def send_many(self, msgs):
+        """ Schedule several messages for sending to the other side (in the same batch, if possible)
+
+        This completes quickly and synchronously
+        """
+        if self.comm is not None and self.comm.closed():
+            raise CommClosedError
+
+        self.message_count += len(msgs)
+        self.buffer.extend(msgs)
+        if self.next_deadline is None:
+            self.waker.set()
+
     @gen.coroutine
     def close(self):
         """ Flush existing messages and then close comm """
@@ -8,8 +8,11 @@ from tornado import gen, locks
 from tornado.ioloop import IOLoop
 
 from multiprocessing import Process, Pipe
+import threading
 
 from .core import CommClosedError
+from .invocation_controller import InvocationController
+from .invoker_tree import DEFAULT_LEAF_SIZE, launch_invoker_tree
 from .utils import parse_timedelta
 
 import redis 
@@ -75,7 +78,9 @@ class BatchedLambdaInvoker(object):
             aws_access_key_id = None,
             aws_secret_access_key = None,
             aws_session_token = None,
-            use_invoker_lambdas_threshold = 10000):
+            use_invoker_lambdas_threshold = 10000,
+            invoker_tree_fanout = 0,
+            invoker_tree_leaf_size = DEFAULT_LEAF_SIZE):
         self.loop = loop or IOLoop.current()
         self.interval = parse_timedelta(interval, default="ms")
         self.waker = locks.Event()
@@ -101,11 +106,16 @@ class BatchedLambdaInvoker(object):
         self.time_spent_invoking = 0
         self.lambda_invokers = []
         self.lambda_pipes = []
+        self.pipe_lock = threading.Lock()   # Serializes writes to the pipes, which may come from send_now() on another thread.
+        self.next_pipe = 0                  # Index of the pipe used by the next call to send_now().
         self.aws_region = aws_region
         self.use_multiple_invokers = use_multiple_invokers 
         self.num_invokers = num_invokers
         self.force_use_invoker_lambdas = force_use_invoker_lambdas
         self.use_invoker_lambdas_threshold = use_invoker_lambdas_threshold
+        self.invoker_tree_fanout = invoker_tree_fanout          # If >= 2, Invoker Lambdas are launched as a tree with this fan-out (see invoker_tree.py).
+        self.invoker_tree_leaf_size = invoker_tree_leaf_size    # Each Invoker in the tree invokes at most this many Executors itself.
+        self.controller = None
         self.recent_message_log = deque(
             maxlen=dask.config.get("distributed.comm.recent-messages-log-length")
         )
@@ -118,6 +128,7 @@ class BatchedLambdaInvoker(object):
     def start(self, lambda_client, scheduler_address):
         print("Starting BatchedLambdaInvoker with interval {}...".format(self.interval))
         self.lambda_client = lambda_client
+        self.controller = InvocationController(lambda_client, function_name = self.invoker_function_name)
         self.loop.add_callback(self._background_send)
         self.scheduler_address = scheduler_address
         
@@ -173,7 +184,10 @@ class BatchedLambdaInvoker(object):
             payload_chunk_size = ceil(len(payload) / (self.num_invokers + 1))    # We divide by num_invokers + 1 since the Scheduler can also invoke Lambda functions itself.
             logger.debug("Size of payload (number of things that were in buffer): {}".format(len(payload)))
             logger.debug("Payload Chunk Size: {}".format(payload_chunk_size))
-            payloads = [payload[x : x + payload_chunk_size] for x in range(0, len(payload), payload_chunk_size)]
+            # Payloads are queued in descending order of priority, so we deal them out round-robin: every chunk then begins with
+            # some of the most important payloads, rather than the first chunk getting all of them.
+            num_chunks = ceil(len(payload) / payload_chunk_size)
+            payloads = [payload[x::num_chunks] for x in range(num_chunks)]
             logger.debug("Number of payloads created: {}".format(len(payloads)))
             # The scheduler gets the first payload. This is important because,
             # in the case where there is only one payload, we want the Scheduler 
@@ -187,14 +201,22 @@ class BatchedLambdaInvoker(object):
                 use_invoker_lambdas = True
             
             # Send each invoker its respective payload.
-            for i in range(1, len(payloads)):
-                sent_time = time.time()
-                msg = {"payload": payloads[i], "sent-time": sent_time, "use-invoker-lambdas": use_invoker_lambdas}
-                conn = self.lambda_pipes[invoker_index]
-                conn.send(msg)
-                invoker_index += 1
+            with self.pipe_lock:
+                for i in range(1, len(payloads)):
+                    sent_time = time.time()
+                    msg = {"payload": payloads[i], "sent-time": sent_time, "use-invoker-lambdas": use_invoker_lambdas}
+                    conn = self.lambda_pipes[invoker_index]
+                    conn.send(msg)
+                    invoker_index += 1
             try:
-                if use_invoker_lambdas:
+                if use_invoker_lambdas and self.invoker_tree_fanout >= 2:
+                    send_start_time = time.time()
+                    num_invokers = launch_invoker_tree(self.controller, scheduler_payload, self.executor_function_name, self.invoker_function_name, self.invoker_tree_fanout, 
+                                                       leaf_size = self.invoker_tree_leaf_size, redis_client = self.redis_client, redis_address = self.redis_address)
+                    self.total_lambdas_invoked = self.total_lambdas_invoked + len(scheduler_payload)
+                    self.num_tasks_invoked = self.num_tasks_invoked + len(scheduler_payload)
+                    logger.debug("Launched {} tasks via {} root Invokers in {} seconds.".format(len(scheduler_payload), num_invokers, time.time() - send_start_time))
+                elif use_invoker_lambdas:
                     # We want each Lambda invoker to invoke ~50 Lambdas.
                     payloads_for_lamba_invokers = [scheduler_payload[x : x + 50] for x in range(0, len(scheduler_payload), 50)]
                     timestamp_now = datetime.datetime.utcnow()
@@ -204,6 +226,7 @@ class BatchedLambdaInvoker(object):
                     total_time_spent_serializing = 0
                     total_time_spent_invoking = 0  
                     rand_pick = string.ascii_uppercase + string.digits + string.ascii_lowercase
+                    invoker_payloads = []
                     for payload in payloads_for_lamba_invokers:
                         t = time.time()
                         msg = {
@@ -215,21 +238,15 @@ class BatchedLambdaInvoker(object):
                             _key = ''.join(random.choice(rand_pick) for _ in range(20))
                             _new_msg_serialized = ujson.dumps({"lambda_function_name": self.executor_function_name, "redis_key": _key, "redis_address": self.redis_address})
                             self.redis_client.set(_key, msg_serialized)
-                            e = time.time()
-                            total_time_spent_serializing += (e - t)
-                            time_invoke_start = time.time()
-                            self.lambda_client.invoke(FunctionName=self.invoker_function_name, InvocationType='Event', Payload=_new_msg_serialized)
-                            time_invoke_end = time.time()
-                            diff_invoke = time_invoke_end - time_invoke_start
-                            total_time_spent_invoking += diff_invoke           
+                            invoker_payloads.append(_new_msg_serialized)
                         else:
-                            e = time.time()
-                            total_time_spent_serializing += (e - t)
-                            time_invoke_start = time.time()
-                            self.lambda_client.invoke(FunctionName=self.invoker_function_name, InvocationType='Event', Payload=msg_serialized)
-                            time_invoke_end = time.time()
-                            diff_invoke = time_invoke_end - time_invoke_start
-                            total_time_spent_invoking += diff_invoke 
+                            invoker_payloads.append(msg_serialized)
+                        e = time.time()
+                        total_time_spent_serializing += (e - t)
+                    # The Invoker Lambdas are invoked concurrently (see InvocationController).
+                    time_invoke_start = time.time()
+                    self.controller.invoke_all(invoker_payloads, function_name = self.invoker_function_name)
+                    total_time_spent_invoking += time.time() - time_invoke_start
                     send_done_time = time.time()
                     
                     self.total_lambdas_invoked = self.total_lambdas_invoked + len(scheduler_payload)
@@ -248,16 +265,10 @@ class BatchedLambdaInvoker(object):
                     # Send each chunk to an invocation of the AWS Lambda function for evaluation.
                     total_time_spent_serializing = 0
                     total_time_spent_invoking = 0
-                    for payload in scheduler_payload:
-                        # Synchronize time for benchmarking cold starts (and start-times for Lambdas in general).
-                        #remote = self.ntp_client.request("north-america.pool.ntp.org")
-                        #invoke_time = remote.dest_time + remote.offset        
-                        #_payload = {"event": payload, "invoke-time": invoke_time}            
-                        time_invoke_start = time.time()
-                        self.lambda_client.invoke(FunctionName=self.executor_function_name, InvocationType='Event', Payload=payload)
-                        time_invoke_end = time.time()
-                        diff_invoke = time_invoke_end - time_invoke_start
-                        total_time_spent_invoking += diff_invoke 
+                    # The Executors are invoked concurrently (see InvocationController).
+                    time_invoke_start = time.time()
+                    self.controller.invoke_all(scheduler_payload, function_name = self.executor_function_name)
+                    total_time_spent_invoking += time.time() - time_invoke_start
                     send_done_time = time.time()
                     
                     self.total_lambdas_invoked = self.total_lambdas_invoked + len(scheduler_payload)
@@ -290,6 +301,23 @@ class BatchedLambdaInvoker(object):
         if self.next_deadline is None:
             self.waker.set()
 
+    def send_now(self, msgs):
+        """ Hand a list of payloads straight to one of the invoker processes, bypassing the buffer.
+
+        Unlike send(), this does not wait for the IOLoop, so it may be called from another thread
+        (e.g., to start leaf tasks while the Scheduler's IOLoop is still busy building the rest of a schedule).
+        The payloads are invoked directly rather than through Invoker Lambdas.
+        """
+        msgs = list(msgs)
+        self.message_count += len(msgs)
+        if len(self.lambda_pipes) == 0:
+            self.controller.invoke_all(msgs, function_name = self.executor_function_name)
+            return
+        with self.pipe_lock:
+            conn = self.lambda_pipes[self.next_pipe % len(self.lambda_pipes)]
+            self.next_pipe += 1
+            conn.send({"payload": msgs, "sent-time": time.time(), "use-invoker-lambdas": False})
+
     @gen.coroutine
     def close(self):
         """ Flush existing messages"""
@@ -329,6 +357,8 @@ class BatchedLambdaInvoker(object):
         print("[ {} ] - Lambda Invoker Process {} - INFO: Lambda Invoker Process began executing...".format(datetime.datetime.utcnow(), ID))
         
         lambda_client = boto3.client('lambda', region_name=aws_region, aws_access_key_id = aws_access_key_id, aws_secret_access_key = aws_secret_access_key, aws_session_token = aws_session_token)
+        # Invokes the Executors concurrently, adapting to throttling by AWS Lambda.
+        controller = InvocationController(lambda_client, function_name = self.executor_function_name)
         current_redis_channel_index = 0
         expected_messages = None                      # This is how many messages we are expecting to get.
         base_sleep_interval = 0.005                   # The starting sleep interval.
@@ -350,10 +380,16 @@ class BatchedLambdaInvoker(object):
                 #print("[ {} ] Lambda Invoker Process {} - INFO: Received message from connection. Took {} seconds to transfer through conn.".format(datetime.datetime.utcnow(), ID, received_time - sent_time))
                 num_lambdas_submitted = 0
                 start = time.time()
-                if use_invoker_lambdas:
+                if use_invoker_lambdas and self.invoker_tree_fanout >= 2:
+                    num_root_invokers = launch_invoker_tree(controller, current_payload, self.executor_function_name, self.invoker_function_name, self.invoker_tree_fanout, 
+                                                            leaf_size = self.invoker_tree_leaf_size, redis_client = _redis_client, redis_address = redis_address)
+                    logger.debug("Lambda Invoker Process {} - launched {} EXECUTOR Lambdas through {} root INVOKER Lambdas in {} seconds.".format(ID, len(current_payload), num_root_invokers, time.time() - start))
+                    current_sleep_interval = base_sleep_interval
+                elif use_invoker_lambdas:
                     payloads_for_lamba_invokers = [current_payload[x : x + 50] for x in range(0, len(current_payload), 50)]
                     #print("[ {} ] Invoking {} INVOKER Lambdas.".format(datetime.datetime.utcnow(), len(payloads_for_lamba_invokers)))
                     rand_pick = string.ascii_uppercase + string.digits + string.ascii_lowercase
+                    invoker_payloads = []
                     for payload in payloads_for_lamba_invokers:
                         msg = {
                             "payloads_serialized": payload,
@@ -364,26 +400,20 @@ class BatchedLambdaInvoker(object):
                             _key = ''.join(random.choice(rand_pick) for _ in range(20))
                             _redis_client.set(_key, msg_serialized)
                             new_msg_serialized = ujson.dumps({"lambda_function_name": self.executor_function_name, "redis_key": _key, "redis_address": self.redis_address})
-                            lambda_client.invoke(FunctionName=self.invoker_function_name, InvocationType='Event', Payload=new_msg_serialized)
+                            invoker_payloads.append(new_msg_serialized)
                         else:
-                            lambda_client.invoke(FunctionName=self.invoker_function_name, InvocationType='Event', Payload=msg_serialized)
-                        num_lambdas_submitted += 1
+                            invoker_payloads.append(msg_serialized)
+                    num_lambdas_submitted = controller.invoke_all(invoker_payloads, function_name = self.invoker_function_name)
                     stop = time.time()                
                     time_to_submit = stop - start 
                     #print("[ {} ] Lambda Invoker Process {} - INFO: submitted {} INVOKER Lambdas in {} seconds.".format(datetime.datetime.utcnow(), ID, num_lambdas_submitted, time_to_submit))
                     # Since there was a message in the pipe, we set the sleep interval back to the base amount.
                     current_sleep_interval = base_sleep_interval                
                 else:
-                    for payload in current_payload:
-                        # Synchronize time for benchmarking cold starts (and start-times for Lambdas in general).
-                        #remote = self.ntp_client.request("north-america.pool.ntp.org")
-                        #invoke_time = remote.dest_time + remote.offset
-                        #_payload = {"event": payload, "invoke-time": invoke_time}
-                        lambda_client.invoke(FunctionName=self.executor_function_name, InvocationType='Event', Payload=payload)
-                        num_lambdas_submitted += 1
+                    num_lambdas_submitted = controller.invoke_all(current_payload)
                     stop = time.time()                
                     time_to_submit = stop - start 
-                    print("[ {} ] Lambda Invoker Process {} - INFO: submitted {} EXECUTOR Lambdas in {} seconds.".format(datetime.datetime.utcnow(), ID, num_lambdas_submitted, time_to_submit))
+                    print("[ {} ] Lambda Invoker Process {} - INFO: submitted {} EXECUTOR Lambdas in {} seconds ({:.1f} invokes/sec).".format(datetime.datetime.utcnow(), ID, num_lambdas_submitted, time_to_submit, controller.invokes_per_second()))
                     # Since there was a message in the pipe, we set the sleep interval back to the base amount.
                     current_sleep_interval = base_sleep_interval
             else:
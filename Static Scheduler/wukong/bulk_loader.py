@@ -0,0 +1,157 @@
+from __future__ import print_function, division, absolute_import
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from .sharding import MSET_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Number of connections used to write to each shard at the same time.
+DEFAULT_CONNECTIONS_PER_SHARD = 4
+
+# Maximum size (in bytes) of the keys and values written by a single MSET.
+DEFAULT_BATCH_BYTES = 4 * 1024 * 1024
+
+# Batches never shrink below this size (in bytes) when adapting to the latency bound.
+MIN_BATCH_BYTES = 64 * 1024
+
+def entry_size(key, value):
+    """ Number of bytes a key-value pair takes in an MSET (ignoring the protocol's framing). """
+    if not isinstance(value, (bytes, str)):
+        value = str(value)
+    return len(key) + len(value)
+
+class BulkLoader(object):
+    """ Uploads large mappings (e.g., static schedules) to the control-plane shards.
+
+        The key-value pairs are grouped by shard and split into batches of at most 'batch_bytes' bytes (and 'batch_keys' keys),
+        each written with one MSET. Every shard is written to over 'connections_per_shard' connections in parallel, and all of
+        the shards at the same time, instead of one huge MSET per shard sent over a single connection.
+
+        Redis executes a command without interruption, so the size of a batch bounds how long other clients (e.g., the Task
+        Executors of jobs that are already running) may have to wait for Redis. If 'max_batch_latency' is set, the batch size
+        adapts so that writing a batch takes about that long: it is halved (down to MIN_BATCH_BYTES) whenever a batch takes
+        longer, and grows back gradually (up to 'batch_bytes') while batches take less than half of it.
+
+        Parameters
+        ----------
+        ring : RedisShardRing
+            The shards to write to. The keys are spread across them by the ring.
+        connections_per_shard : int
+            Number of batches written to each shard at the same time.
+        batch_bytes : int
+            Maximum size (in bytes) of a batch.
+        batch_keys : int
+            Maximum number of keys in a batch.
+        max_batch_latency : float
+            Target time (in seconds) to write one batch. None disables the adaptation.
+    """
+    def __init__(self, ring, connections_per_shard = DEFAULT_CONNECTIONS_PER_SHARD, batch_bytes = DEFAULT_BATCH_BYTES,
+                 batch_keys = MSET_CHUNK_SIZE, max_batch_latency = None):
+        self.ring = ring
+        self.connections_per_shard = max(int(connections_per_shard), 1)
+        self.max_batch_bytes = batch_bytes
+        self.batch_bytes = batch_bytes
+        self.batch_keys = batch_keys
+        self.max_batch_latency = max_batch_latency
+        self.executor = ThreadPoolExecutor(max_workers = self.connections_per_shard * len(ring), thread_name_prefix = "Bulk-Loader")
+        self.lock = threading.Lock()
+
+        # Totals over every load() so far.
+        self.num_loads = 0
+        self.num_keys = 0
+        self.num_bytes = 0
+        self.num_batches = 0
+        self.total_duration = 0
+        self.max_latency = 0
+        self.last_stats = None
+
+    def _next_batch(self, items, state):
+        """ Take the next batch of (key, value) pairs off 'items', a shard's list of pairs. Must be called while holding the lock. """
+        start = state["position"]
+        end = start
+        size = 0
+        while end < len(items) and end - start < self.batch_keys:
+            item_size = entry_size(*items[end])
+            # A single pair larger than the batch size still makes up a batch on its own.
+            if end > start and size + item_size > self.batch_bytes:
+                break
+            size += item_size
+            end += 1
+        state["position"] = end
+        return items[start:end], size
+
+    def _record_latency(self, latency):
+        """ Adapt the batch size to the latency of the last batch. Must be called while holding the lock. """
+        self.max_latency = max(self.max_latency, latency)
+        if self.max_batch_latency is None:
+            return
+        if latency > self.max_batch_latency:
+            self.batch_bytes = max(MIN_BATCH_BYTES, self.batch_bytes // 2)
+        elif latency < self.max_batch_latency / 2:
+            self.batch_bytes = min(self.max_batch_bytes, int(self.batch_bytes * 1.25))
+
+    def _write_shard(self, redis_client, items, state, stats):
+        """ Write batches of the given shard's pairs until there are none left. Runs on several threads at once per shard. """
+        while True:
+            with self.lock:
+                batch, size = self._next_batch(items, state)
+            if len(batch) == 0:
+                return
+            start = time.time()
+            redis_client.mset(dict(batch))
+            latency = time.time() - start
+            with self.lock:
+                self._record_latency(latency)
+                stats["num-batches"] += 1
+                stats["num-bytes"] += size
+                stats["max-batch-latency"] = max(stats["max-batch-latency"], latency)
+
+    def load(self, mapping):
+        """ Store all of the given key-value pairs. Returns statistics about the upload (sizes, duration, throughput). """
+        start = time.time()
+        stats = {"num-keys": len(mapping), "num-bytes": 0, "num-batches": 0, "max-batch-latency": 0, "shards": dict()}
+        futures = []
+        for node_name, shard_mapping in self.ring.group_mapping(mapping).items():
+            items = list(shard_mapping.items())
+            stats["shards"][node_name] = len(items)
+            state = {"position": 0}
+            for _ in range(min(self.connections_per_shard, len(items))):
+                futures.append(self.executor.submit(self._write_shard, self.ring.clients[node_name], items, state, stats))
+        for future in futures:
+            future.result()
+        duration = time.time() - start
+        stats["duration"] = duration
+        stats["keys-per-second"] = stats["num-keys"] / duration if duration > 0 else None
+        stats["bytes-per-second"] = stats["num-bytes"] / duration if duration > 0 else None
+        stats["batch-bytes"] = self.batch_bytes
+        with self.lock:
+            self.num_loads += 1
+            self.num_keys += stats["num-keys"]
+            self.num_bytes += stats["num-bytes"]
+            self.num_batches += stats["num-batches"]
+            self.total_duration += duration
+            self.last_stats = stats
+        logger.debug("Wrote {} keys ({:,} bytes) in {} batches to {} shards in {:.3f} seconds.".format(
+            stats["num-keys"], stats["num-bytes"], stats["num-batches"], len(stats["shards"]), duration))
+        return stats
+
+    def get_metrics(self):
+        with self.lock:
+            return {
+                "num-loads": self.num_loads,
+                "num-keys": self.num_keys,
+                "num-bytes": self.num_bytes,
+                "num-batches": self.num_batches,
+                "total-duration": self.total_duration,
+                "bytes-per-second": (self.num_bytes / self.total_duration) if self.total_duration > 0 else None,
+                "batch-bytes": self.batch_bytes,
+                "max-batch-latency": self.max_latency,
+                "last-load": self.last_stats
+            }
+
+    def close(self):
+        self.executor.shutdown(wait = False)
@@ -1,7 +1,7 @@
 from __future__ import print_function, division, absolute_import
 
 import atexit
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from concurrent.futures import ThreadPoolExecutor, CancelledError
 from concurrent.futures._base import DoneAndNotDoneFutures
 from contextlib import contextmanager
@@ -31,7 +31,6 @@ import weakref
 #import elasticache_auto_discovery
 #from pymemcache.client.hash import HashClient
 import redis 
-import cloudpickle 
 from uhashring import HashRing 
 
 import dask
@@ -81,6 +80,8 @@ from .protocol.pickle import dumps, loads
 from .publish import Datasets
 from .pubsub import PubSubClientExtension
 from .security import Security
+from .sharding import RedisShardRing
+from .gather import GatherEngine, DEFAULT_GATHER_CONCURRENCY, DEFAULT_GATHER_CHUNK_SIZE
 from .sizeof import sizeof
 from .threadpoolexecutor import rejoin
 from .worker import dumps_task, get_client, get_worker, secede
@@ -558,6 +559,11 @@ class Client(Node):
         the scheduler to serve as intermediary.
     heartbeat_interval: int
         Time in milliseconds between heartbeats to scheduler
+    gather_concurrency: int
+        Number of threads retrieving (and deserializing) results from Redis
+        at the same time
+    gather_chunk_size: int
+        Maximum number of results retrieved from Redis with a single request
     **kwargs:
         If you do not pass a scheduler address, Client will create a
         ``LocalCluster`` object, passing any extra keyword arguments.
@@ -614,6 +620,8 @@ class Client(Node):
         deserializers=None,
         extensions=DEFAULT_EXTENSIONS,
         direct_to_workers=None,
+        gather_concurrency=DEFAULT_GATHER_CONCURRENCY,
+        gather_chunk_size=DEFAULT_GATHER_CHUNK_SIZE,
         **kwargs
     ):
         if timeout == no_default:
@@ -656,6 +664,11 @@ class Client(Node):
         self._gather_semaphore = Semaphore(5)
         self._gather_keys = None
         self._gather_future = None
+        self._gather_concurrency = gather_concurrency
+        self._gather_chunk_size = gather_chunk_size
+        self._gather_engine = None
+        # Mapping of submission ID --> when each graph was submitted to (and acknowledged by) the scheduler, most recent last.
+        self._graph_submissions = OrderedDict()
 
         # Communication
         self.security = security or Security()
@@ -711,7 +724,8 @@ class Client(Node):
             "task-retried": self._handle_retried_key,
             "task-erred": self._handle_task_erred,
             "restart": self._handle_restart,
-            "error": self._handle_error
+            "error": self._handle_error,
+            "graph-received": self._handle_graph_received
         }
 
         self._state_handlers = {
@@ -1065,6 +1079,11 @@ class Client(Node):
 
         self.redis_address = msg[0][REDIS_ADDRESS_KEY]
         self.dcp_redis = redis.StrictRedis(host = self.redis_address, port = 6379, db = 0)
+        # Small (final) results are sharded across the Scheduler's control-plane Redis instances.
+        self.dcp_ring = RedisShardRing(msg[0].get("redis-endpoints") or [self.redis_address])
+        if self._gather_engine is not None:
+            self._gather_engine.close()
+        self._gather_engine = GatherEngine(self.dcp_ring, max_concurrency=self._gather_concurrency, chunk_size=self._gather_chunk_size)
         #self._handle_redis_info(msg[0]["big_redis_endpoints"], msg[0]["small_redis_endpoints"])
 
         bcomm = BatchedSend(interval="10ms", loop=self.loop)
@@ -1191,6 +1210,13 @@ class Client(Node):
             except CancelledError:
                 pass
 
+    def _handle_graph_received(self, submission_id=None, job_id=None, received_at=None):
+        submission = self._graph_submissions.get(submission_id)
+        if submission is not None:
+            submission["job-id"] = job_id
+            submission["received-at"] = received_at
+            submission["acknowledged-at"] = pythontime.time()
+
     def _handle_key_in_memory(self, key=None, type=None, workers=None):
         state = self.futures.get(key)
         if state is not None:
@@ -1322,6 +1348,8 @@ class Client(Node):
                 yield self.scheduler_comm.close()
             for key in list(self.futures):
                 self._release_key(key=key)
+            if self._gather_engine is not None:
+                self._gather_engine.close()
             if self._start_arg is None:
                 with ignoring(AttributeError):
                     yield self.cluster._close()
@@ -1799,70 +1827,76 @@ class Client(Node):
         self._gather_future = None 
         
         result = dict()
-        missing_keys = set()
-        data = dict() 
-
-        redis_key_lists = defaultdict(list)
-        
-        print("[{}] -- CLIENT -- Retrieving values for {} keys.".format(datetime.datetime.utcnow(), len(keys)))
 
-        values = self.dcp_redis.mget(keys)
+        logger.debug("Retrieving values for {} keys from Redis.".format(len(keys)))
+        start = pythontime.time()
 
-        values = zip(keys, values)
+        # Small results are on the control-plane shards. All shards are read from concurrently, off of the IOLoop.
+        data, missing_keys = yield self._gather_engine.submit(keys)
 
-        for key, value in values:
-            if value is not None:
-                value_deserialized = cloudpickle.loads(value)
-                print("[CLIENT] Obtained value for key {} from Redis.".format(key))
-                data[key] = value_deserialized
-            else:
-                print("[ERROR - {}] Failed to retrieve value for task {} from Redis instance listening at addr {}".format(datetime.datetime.utcnow(), key, self.redis_address))
-                value = self.dcp_redis.get(key)
-                if value is not None:
-                    value_deserialized = cloudpickle.loads(value)
-                    print("[CLIENT - WARNING {}] Obtained value {} for key {} from Redis on SECOND try.".format(datetime.datetime.utcnow(), value_deserialized, key))
-                    data[key] = value_deserialized
-                else:
-                    #traceback.print_stack(file=sys.stdout)
-                    missing_keys.add(key)
-        
-        # If missing_keys is non-empty, meaning there are missing keys, then construct the appropriate response. 
+        # The remaining results were stored on the Fargate nodes the Scheduler placed them on.
         if missing_keys:
-            print("[{}] Client asking Scheduler for AWS Fargate information to get missing task data for keys {}".format(datetime.datetime.utcnow(), missing_keys))
+            logger.debug("Asking Scheduler for the AWS Fargate nodes storing {} keys.".format(len(missing_keys)))
             response = yield self.scheduler.get_fargate_info_for_task(keys = list(missing_keys))
-            print("[{}] Client received response from Scheduler about AWS Fargate information.".format(datetime.datetime.utcnow()))
+            located = {key: "{}:6379".format(fargate_task["privateIpv4Address"]) for key, fargate_task in response.items()}
+            fargate_data, still_missing = yield self._gather_engine.submit(located = located)
+            data.update(fargate_data)
+            missing_keys = (missing_keys - set(located)) | still_missing
+            for key in still_missing:
+                print("[ERROR] Failed to retrieve data from task {} from associated Fargate instance at {}...".format(key, located[key]))
 
-            start = pythontime.time()
-            num_retrieved = 0
-            for key, fargate_task in response.items():
-                rc = redis.Redis(host = fargate_task["privateIpv4Address"], port = 6379)
-                value = rc.get(key)
-
-                if value is None:
-                    print("[ERROR] Failed to retrieve data from task {} from associated Fargate instance at {}:6379...".format(key, fargate_task["privateIpv4Address"]))
-                else:
-                    missing_keys.remove(key)
-                    num_retrieved += 1
-                    print("Client successfully retrieved data from task {} from associated Fargate instance at {}:6379.".format(key, fargate_task["privateIpv4Address"]))
-                    value_deserialized = cloudpickle.loads(value)
-                    data[key] = value_deserialized
-            stop = pythontime.time()
-            duration = stop - start 
-
-            print("Client spent {} seconds retrieving {} task data from various AWS Fargate nodes.".format(duration, num_retrieved))
-        
         if missing_keys:
             result["status"] = "error"
             result["keys"] = missing_keys
         else: 
             result["status"] = "OK"
             result["data"] = data
-        logger.debug("Gathered " + str(len(data)) + " data values from Redis.")
-
-        print("[CLIENT] Returning {} to the user...".format(str(result)))
+        logger.debug("Gathered {} data values from Redis in {} seconds.".format(len(data), pythontime.time() - start))
 
         raise gen.Return(result)
-        
+
+    def gather_iter(self, futures, errors="raise"):
+        """ Gather the results of futures from Redis, yielding them as they arrive
+
+        Rather than waiting for every result (and holding all of them in
+        memory at once), this yields ``(future, result)`` pairs as batches of
+        futures finish and their results are retrieved. Results are fetched
+        concurrently from all of the Redis instances storing them.
+
+        Parameters
+        ----------
+        futures: list of Futures
+        errors: string
+            Either 'raise' or 'skip' if we should raise if a future has erred
+            or skip it
+
+        Examples
+        --------
+        >>> futures = client.compute(partitions)  # doctest: +SKIP
+        >>> for future, part in client.gather_iter(futures):  # doctest: +SKIP
+        ...     total += len(part)
+
+        See Also
+        --------
+        Client.gather
+        as_completed
+        """
+        for batch in as_completed(futures).batches():
+            futures_by_key = dict()
+            for future in batch:
+                if future.status == "finished":
+                    futures_by_key[tokey(future.key)] = future
+                elif errors == "raise":
+                    future.result()
+            missing = []
+            for key, value in self._gather_engine.iter_values(list(futures_by_key), missing=missing):
+                yield futures_by_key[key], value
+            if missing:
+                # Results stored on Fargate nodes (or that need to be recomputed) go through the regular gather.
+                missing_futures = [futures_by_key[key] for key in missing]
+                for future, value in zip(missing_futures, self.gather(missing_futures, errors=errors)):
+                    yield future, value
+
     @gen.coroutine
     def _gather_remote(self, direct, local_worker):
         """ Perform gather with workers or scheduler
@@ -2579,6 +2613,13 @@ class Client(Node):
             #if dsk3 is not None:
             #    dask.visualize(dsk3, filename = "update-graph-" + str(self.number_update_graph_calls), format = "svg")
 
+            # The scheduler acknowledges the graph (with the ID of the job) as soon as it receives it.
+            submission_id = uuid.uuid4().hex
+            submitted_at = pythontime.time()
+            self._graph_submissions[submission_id] = {"submitted-at": submitted_at, "num-keys": len(flatkeys)}
+            while len(self._graph_submissions) > 100:
+                self._graph_submissions.popitem(last=False)
+
             self._send_to_scheduler(
                 {
                     "op": "update-graph",
@@ -2594,7 +2635,9 @@ class Client(Node):
                     "retries": retries,
                     "fifo_timeout": fifo_timeout,
                     "actors": actors,
-                    "persist": persist
+                    "persist": persist,
+                    "submission_id": submission_id,
+                    "submitted_at": submitted_at
                 }
             )
             return futures
@@ -3528,6 +3571,89 @@ class Client(Node):
             keys = (keys,)
         return self.sync(self.scheduler.get_metadata, keys=keys, default=default)
 
+    def get_retained_state(self):
+        """ Get the sizes of the per-job and per-task state retained by the scheduler
+
+        This includes the number of jobs whose artifacts are retained and an
+        estimate of the bytes they use, which should stay roughly constant
+        across repeated submissions once their futures are released.
+
+        Examples
+        --------
+        >>> c.get_retained_state()  # doctest: +SKIP
+        {'job-artifacts': {'num-jobs': 1, 'num-bytes': 52341, ...}, ...}
+        """
+        return self.sync(self.scheduler.get_retained_state)
+
+    def get_job_timings(self):
+        """ Get the submission and launch timings of recent jobs
+
+        For each job retained by the scheduler, this returns when the job was
+        submitted, received by the scheduler, its static schedule was built
+        and uploaded, and its first leaf task was enqueued for invocation,
+        along with the latencies between those milestones (notably the
+        ``schedule-build-time`` and the ``submission-to-first-leaf``
+        latency). Jobs acknowledged by the scheduler also report the time it
+        took for the acknowledgement to reach this client. The ``upload``
+        entry gives the size, number of batches, duration and throughput of
+        the upload of the job's static schedule to Redis.
+
+        Examples
+        --------
+        >>> c.get_job_timings()  # doctest: +SKIP
+        {'1234AB': {'timings': {'submitted': ..., 'received': ..., ...},
+                    'latencies': {'schedule-build-time': 0.8,
+                                  'submission-to-first-leaf': 1.1, ...}}}
+        """
+        return self.sync(self._get_job_timings)
+
+    @gen.coroutine
+    def _get_job_timings(self):
+        timings = yield self.scheduler.get_job_timings()
+        for submission in self._graph_submissions.values():
+            job = timings.get(submission.get("job-id"))
+            if job is not None and "acknowledged-at" in submission:
+                job["latencies"]["submission-to-acknowledgement"] = submission["acknowledged-at"] - submission["submitted-at"]
+        raise gen.Return(timings)
+
+    def get_fargate_health(self):
+        """ Get the node-health table of the Fargate storage nodes
+
+        The table is updated by every health check and maintenance operation
+        the scheduler runs on the nodes. Nodes marked unhealthy are skipped
+        when placing new outputs.
+
+        Examples
+        --------
+        >>> c.get_fargate_health()  # doctest: +SKIP
+        {'nodes': {'10.0.0.1:6379': {'healthy': True, 'latency': 0.001, ...}, ...},
+         'metrics': {'num-nodes': 4, 'num-healthy': 4, ...}}
+        """
+        return self.sync(self.scheduler.get_fargate_health)
+
+    def get_wukong_metrics_summary(self, fields=None, q=(50, 90, 99)):
+        """ Get percentiles of the metrics reported by the Task Executors
+
+        The scheduler first drains the metrics records still in Redis into
+        its metrics tables.
+
+        Parameters
+        ----------
+        fields: list, optional
+            Numeric fields to summarize, e.g. ``["task_execution"]``. Defaults
+            to all of them.
+        q: tuple
+            Percentiles to compute.
+
+        Examples
+        --------
+        >>> c.get_wukong_metrics_summary(fields=["task_execution"])  # doctest: +SKIP
+        {'task-metrics': {'num-records': 1000000,
+                          'percentiles': {'task_execution': {50: 0.002, 90: 0.01, 99: 0.2}}},
+         'lambda-metrics': {...}}
+        """
+        return self.sync(self.scheduler.get_wukong_metrics_summary, fields=fields, q=q)
+
     def get_scheduler_logs(self, n=None):
         """ Get logs from scheduler
 
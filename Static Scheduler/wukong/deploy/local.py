@@ -120,10 +120,76 @@ class LocalCluster(SpecCluster):
         The AWS region in which all of the AWS components are running.
     num_fargate_nodes: int
         The number of Fargate nodes to use in the Storage Cluster.
+    num_fargate_shards: int
+        Number of logical storage shards the outputs of a job are placed on. Each shard is bound to one of the Fargate
+        nodes that have joined the Storage Cluster when the job's schedule is built. 0 means one per Fargate node.
+    fargate_min_nodes: int
+        Number of Fargate nodes that must have joined the Storage Cluster before a job's outputs are placed. The cluster
+        is launched in the background, so graphs are accepted and analysed while it starts.
+    fargate_launch_timeout: float
+        Maximum time (in seconds) a job waits for fargate_min_nodes Fargate nodes to join.
+    fargate_poll_interval: float
+        Interval (in seconds) at which ECS is polled for new Fargate nodes while the Storage Cluster is being launched.
     reuse_lambdas: bool
         Attempt to re-use existing Lambda functions between iterations of iterative workloads.
     wukong_config_path: str
         Path to the wukong-config.yaml configuration file.
+    invoker_tree_fanout: int
+        When a launch is large enough to use Invoker Lambdas, each Invoker forwards all but one of 'invoker_tree_fanout'
+        sub-batches of its payloads to other Invokers, so a launch completes in O(log N) rounds. 0 disables this.
+    redis_endpoints: List[str]
+        Redis instances ("host" or "host:port") across which dependency counters, paths, Fargate metadata, and small
+        results are sharded via consistent hashing. Defaults to the single Redis instance co-located with the KV Store Proxy.
+    fuse_max_tasks: int
+        If >= 2, linear chains (and small trees) of tasks are fused into composite tasks of at most this many tasks before the
+        static schedule is generated. Only the last task of each composite writes its output. 0 disables fusion.
+    fuse_max_bytes: int
+        Maximum total size (in bytes) of the serialized tasks in a composite task.
+    fuse_max_duration: float
+        Maximum total estimated duration (in seconds) of the tasks in a composite task.
+    max_retained_jobs: int
+        Maximum number of jobs whose artifacts (task locations, execution timings) the Scheduler retains while clients still
+        hold their futures. A task's artifacts are always dropped once its future is released.
+    collect_garbage: bool
+        If True, intermediate outputs are deleted from Redis once every downstream task has read them, and the keys a job
+        leaves behind are deleted once its futures are released, so back-to-back jobs don't need a global flush.
+    fleet_max_concurrency: int
+        Maximum number of Fargate storage nodes contacted at the same time by health checks and maintenance operations
+        (flushes, stats resets).
+    fargate_health_check_interval: float
+        Interval (in seconds) between background health checks of the Fargate storage nodes. Nodes found unhealthy are
+        skipped when placing new outputs. 0 disables the background checks.
+    metrics_drain_interval: float
+        Interval (in seconds) at which the metrics records pushed by the Task Executors are moved out of Redis into the
+        Scheduler's columnar metrics tables. 0 means they are only drained when the metrics are requested.
+    metrics_drain_batch_size: int
+        Number of metrics records moved out of Redis at a time.
+    background_schedule_upload: bool
+        If True, static schedules are uploaded to Redis and their leaf tasks invoked in the background, so the Scheduler
+        can build the next job's schedule while the previous one is being uploaded.
+    streaming_schedule: bool
+        If True, static schedules are uploaded to Redis in batches while they are being built, and the leaf tasks of
+        each batch are invoked as soon as it has been stored, so the first tasks start before the whole schedule is built.
+    streaming_batch_size: int
+        Minimum number of keys per batch when streaming_schedule is set. The first batch is always sent right away.
+    upload_connections_per_shard: int
+        Number of connections over which static schedules are written to each control-plane shard in parallel.
+    upload_batch_bytes: int
+        Maximum size (in bytes) of a single MSET when uploading static schedules.
+    upload_max_batch_latency: float
+        Target time (in seconds) Redis spends on one MSET of a static schedule upload. The batch size adapts so that
+        other clients (e.g., the Task Executors of running jobs) are not stalled for longer. 0 disables the adaptation.
+    stage_constants_threshold: int
+        If > 0, task arguments (and functions) at least this many bytes in size once serialized are stored in Redis
+        once, under their content hash, and the task payloads reference them. 0 disables.
+    staged_constants_bytes: int
+        Maximum total size (in bytes) of the constants kept in Redis for later jobs. The least recently used ones that
+        no retained job references are evicted.
+    memoize: bool
+        If True, the outputs of tasks are retained in Redis (by fingerprint) and reused by later jobs that submit
+        identical tasks, which are then not executed again.
+    memo_cache_bytes: int
+        Maximum total size (in bytes) of the outputs retained for memoization. The least recently used are evicted.
     
     Examples
     --------
@@ -203,8 +269,33 @@ class LocalCluster(SpecCluster):
         aws_region = 'us-east-1',
         reuse_lambdas = False,
         num_fargate_nodes = DEFAULT_NUM_FARGATE_NODES,
+        num_fargate_shards = 0,
+        fargate_min_nodes = 1,
+        fargate_launch_timeout = 600,
+        fargate_poll_interval = 2.0,
         use_invoker_lambdas_threshold = 10000,
         force_use_invoker_lambdas = False,        
+        invoker_tree_fanout = 0,
+        redis_endpoints = None,
+        fuse_max_tasks = 0,
+        fuse_max_bytes = 64000,
+        fuse_max_duration = 1.0,
+        max_retained_jobs = 16,
+        collect_garbage = False,
+        fleet_max_concurrency = 32,
+        fargate_health_check_interval = 0,
+        metrics_drain_interval = 0,
+        metrics_drain_batch_size = 10000,
+        background_schedule_upload = False,
+        streaming_schedule = False,
+        streaming_batch_size = 1000,
+        upload_connections_per_shard = 4,
+        upload_batch_bytes = 4 * 1024 * 1024,
+        upload_max_batch_latency = 0.05,
+        stage_constants_threshold = 0,
+        staged_constants_bytes = 256 * 1024 * 1024,
+        memoize = False,
+        memo_cache_bytes = 1024 * 1024 * 1024,
         **worker_kwargs
     ):
         if ip is not None:
@@ -288,6 +379,10 @@ class LocalCluster(SpecCluster):
                 aws_region = aws_region,
                 wukong_config_path = wukong_config_path,
                 num_fargate_nodes = num_fargate_nodes,
+                num_fargate_shards = num_fargate_shards,
+                fargate_min_nodes = fargate_min_nodes,
+                fargate_launch_timeout = fargate_launch_timeout,
+                fargate_poll_interval = fargate_poll_interval,
                 ecs_cluster_name = ecs_cluster_name,
                 ecs_task_definition = ecs_task_definition,
                 ecs_network_configuration = ecs_network_configuration,                
@@ -301,7 +396,28 @@ class LocalCluster(SpecCluster):
                 use_fargate = use_fargate,
                 reuse_existing_fargate_tasks_on_startup = reuse_existing_fargate_tasks_on_startup, # If there are already some Fargate tasks appropriately tagged/grouped and already running, should we just use those?
                 use_invoker_lambdas_threshold = use_invoker_lambdas_threshold,
-                force_use_invoker_lambdas = force_use_invoker_lambdas                      
+                force_use_invoker_lambdas = force_use_invoker_lambdas,
+                invoker_tree_fanout = invoker_tree_fanout,
+                redis_endpoints = redis_endpoints,
+                fuse_max_tasks = fuse_max_tasks,
+                fuse_max_bytes = fuse_max_bytes,
+                fuse_max_duration = fuse_max_duration,
+                max_retained_jobs = max_retained_jobs,
+                collect_garbage = collect_garbage,
+                fleet_max_concurrency = fleet_max_concurrency,
+                fargate_health_check_interval = fargate_health_check_interval,
+                metrics_drain_interval = metrics_drain_interval,
+                metrics_drain_batch_size = metrics_drain_batch_size,
+                background_schedule_upload = background_schedule_upload,
+                streaming_schedule = streaming_schedule,
+                streaming_batch_size = streaming_batch_size,
+                upload_connections_per_shard = upload_connections_per_shard,
+                upload_batch_bytes = upload_batch_bytes,
+                upload_max_batch_latency = upload_max_batch_latency,
+                stage_constants_threshold = stage_constants_threshold,
+                staged_constants_bytes = staged_constants_bytes,
+                memoize = memoize,
+                memo_cache_bytes = memo_cache_bytes
             ),
         }
 
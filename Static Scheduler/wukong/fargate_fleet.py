@@ -0,0 +1,196 @@
+from __future__ import print_function, division, absolute_import
+
+from concurrent.futures import ThreadPoolExecutor, wait
+import logging
+import threading
+import time
+
+import redis
+
+from .sharding import parse_redis_endpoint
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of storage nodes contacted at the same time by a fleet operation.
+DEFAULT_MAX_CONCURRENCY = 32
+
+# A node is considered unhealthy after this many consecutive failed operations.
+DEFAULT_UNHEALTHY_AFTER = 1
+
+class NodeHealth(object):
+    """ What we know about the health of a single storage node (a Redis instance running on a Fargate task). """
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.healthy = None                 # None until the node has been contacted for the first time.
+        self.last_checked = None
+        self.latency = None                 # Duration (in seconds) of the last successful operation.
+        self.consecutive_failures = 0
+        self.num_failures = 0
+        self.last_error = None
+
+    def record_success(self, latency):
+        self.healthy = True
+        self.last_checked = time.time()
+        self.latency = latency
+        self.consecutive_failures = 0
+
+    def record_failure(self, error, unhealthy_after):
+        self.last_checked = time.time()
+        self.consecutive_failures += 1
+        self.num_failures += 1
+        self.last_error = str(error)
+        if self.consecutive_failures >= unhealthy_after:
+            self.healthy = False
+
+    def to_dict(self):
+        return {
+            "healthy": self.healthy,
+            "last-checked": self.last_checked,
+            "latency": self.latency,
+            "consecutive-failures": self.consecutive_failures,
+            "num-failures": self.num_failures,
+            "last-error": self.last_error
+        }
+
+class FargateFleet(object):
+    """ Runs maintenance operations (health checks, flushes, ...) against the fleet of storage nodes.
+
+        Each operation contacts the nodes concurrently, using at most 'max_concurrency' threads, so a handful of unreachable
+        nodes cost one timeout rather than one timeout each, and nothing runs on the IOLoop. Every operation updates the
+        node-health table, which placement consults (see ``healthy_nodes``).
+
+        Parameters
+        ----------
+        max_concurrency : int
+            Maximum number of nodes contacted at the same time.
+        socket_timeout : float
+            Timeout (in seconds) of the Redis commands issued to the nodes.
+        socket_connect_timeout : float
+            Timeout (in seconds) when connecting to a node.
+        unhealthy_after : int
+            Number of consecutive failed operations after which a node is considered unhealthy.
+        client_factory : callable
+            Called with (host, port). Returns a Redis client. Defaults to ``redis.StrictRedis`` with the timeouts above.
+    """
+    def __init__(self, max_concurrency = DEFAULT_MAX_CONCURRENCY, socket_timeout = 5, socket_connect_timeout = 5,
+                 unhealthy_after = DEFAULT_UNHEALTHY_AFTER, client_factory = None):
+        self.max_concurrency = max_concurrency
+        self.socket_timeout = socket_timeout
+        self.socket_connect_timeout = socket_connect_timeout
+        self.unhealthy_after = unhealthy_after
+        self.client_factory = client_factory or self._create_client
+        self.executor = ThreadPoolExecutor(max_workers = max_concurrency)
+        self.lock = threading.Lock()
+        self.clients = dict()               # Mapping of "host:port" --> Redis client.
+        self.health = dict()                # Mapping of "host:port" --> NodeHealth.
+        self.num_operations = 0
+
+    def _create_client(self, host, port):
+        return redis.StrictRedis(host = host, port = port, db = 0, socket_timeout = self.socket_timeout,
+                                 socket_connect_timeout = self.socket_connect_timeout)
+
+    @staticmethod
+    def normalize(endpoint):
+        return "{}:{}".format(*parse_redis_endpoint(endpoint))
+
+    def get_client(self, endpoint):
+        with self.lock:
+            redis_client = self.clients.get(endpoint, None)
+            if redis_client is None:
+                redis_client = self.clients[endpoint] = self.client_factory(*parse_redis_endpoint(endpoint))
+            return redis_client
+
+    def _get_health(self, endpoint):
+        # Must be called while holding the lock.
+        health = self.health.get(endpoint, None)
+        if health is None:
+            health = self.health[endpoint] = NodeHealth(endpoint)
+        return health
+
+    def _run_on_node(self, endpoint, operation):
+        start = time.time()
+        try:
+            result = operation(self.get_client(endpoint))
+        except Exception as ex:
+            latency = time.time() - start
+            with self.lock:
+                self._get_health(endpoint).record_failure(ex, self.unhealthy_after)
+                # Drop the client, in case its connection is the problem.
+                self.clients.pop(endpoint, None)
+            logger.warning("Operation on storage node {} failed after {:.3f} seconds: {}".format(endpoint, latency, ex))
+            return {"ok": False, "error": str(ex), "latency": latency}
+        latency = time.time() - start
+        with self.lock:
+            self._get_health(endpoint).record_success(latency)
+        return {"ok": True, "result": result, "latency": latency}
+
+    def submit(self, endpoints, operation):
+        """ Start running ``operation(client)`` on every node, without waiting for it to complete.
+
+            Returns a mapping of endpoint ("host:port") --> concurrent.futures.Future. Each future's result is a dictionary
+            with "ok", "latency", and "result" or "error". """
+        self.num_operations += 1
+        endpoints = [self.normalize(endpoint) for endpoint in endpoints]
+        return {endpoint: self.executor.submit(self._run_on_node, endpoint, operation) for endpoint in endpoints}
+
+    def run(self, endpoints, operation, timeout = None):
+        """ Run ``operation(client)`` on every node concurrently and wait for all of them.
+
+            Returns a mapping of endpoint ("host:port") --> result dictionary (see ``submit``). Nodes which did not respond
+            within 'timeout' seconds are reported as failed. """
+        futures = self.submit(endpoints, operation)
+        wait(list(futures.values()), timeout = timeout)
+        results = dict()
+        for endpoint, future in futures.items():
+            if future.done():
+                results[endpoint] = future.result()
+            else:
+                results[endpoint] = {"ok": False, "error": "timed out after {} seconds".format(timeout), "latency": timeout}
+        return results
+
+    def ping(self, endpoints, timeout = None):
+        return self.run(endpoints, lambda redis_client: redis_client.ping(), timeout = timeout)
+
+    def flushdb(self, endpoints, asynchronous = True, timeout = None):
+        return self.run(endpoints, lambda redis_client: redis_client.flushdb(asynchronous = asynchronous), timeout = timeout)
+
+    def flushall(self, endpoints, asynchronous = True, timeout = None):
+        return self.run(endpoints, lambda redis_client: redis_client.flushall(asynchronous = asynchronous), timeout = timeout)
+
+    def reset_stats(self, endpoints, timeout = None):
+        """ Reset the statistics reported by INFO on every node (CONFIG RESETSTAT). """
+        return self.run(endpoints, lambda redis_client: redis_client.config_resetstat(), timeout = timeout)
+
+    def is_healthy(self, endpoint):
+        """ Return False if the node is known to be unhealthy. Nodes we have not contacted yet are assumed to be healthy. """
+        health = self.health.get(self.normalize(endpoint), None)
+        return health is None or health.healthy is not False
+
+    def healthy_nodes(self, nodes, endpoint_of = None):
+        """ Return the nodes which are not known to be unhealthy. If every node is unhealthy, all of them are returned, so
+            that placement can still make progress (operations on those nodes will fail and be retried as usual).
+
+            'endpoint_of' is called with a node to get its endpoint; by default, the nodes are the endpoints. """
+        endpoint_of = endpoint_of or (lambda node: node)
+        healthy = [node for node in nodes if self.is_healthy(endpoint_of(node))]
+        if len(healthy) == 0:
+            return list(nodes)
+        return healthy
+
+    def health_table(self):
+        with self.lock:
+            return {endpoint: health.to_dict() for endpoint, health in self.health.items()}
+
+    def get_metrics(self):
+        with self.lock:
+            num_healthy = sum(1 for health in self.health.values() if health.healthy is True)
+            num_unhealthy = sum(1 for health in self.health.values() if health.healthy is False)
+        return {
+            "num-nodes": len(self.health),
+            "num-healthy": num_healthy,
+            "num-unhealthy": num_unhealthy,
+            "num-operations": self.num_operations
+        }
+
+    def close(self):
+        self.executor.shutdown(wait = False)
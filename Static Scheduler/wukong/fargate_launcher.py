@@ -0,0 +1,317 @@
+from __future__ import print_function, division, absolute_import
+
+from collections import OrderedDict
+import logging
+import threading
+import time
+import zlib
+
+from .pathing import FARGATE_ARN_KEY, FARGATE_ENI_ID_KEY, FARGATE_PUBLIC_IP_KEY, FARGATE_PRIVATE_IP_KEY
+
+logger = logging.getLogger(__name__)
+
+# Interval (in seconds) between two polls of ECS while the fleet is being launched.
+DEFAULT_POLL_INTERVAL = 2.0
+
+# ECS's describe_tasks accepts at most this many tasks per call.
+DESCRIBE_TASKS_BATCH_SIZE = 100
+
+class FargateMembership(object):
+    """ Live table of the Fargate storage nodes that have joined the fleet (i.e., are running and passed a health check).
+
+        Nodes are added by the FargateLauncher as soon as they become healthy, and removed once ECS no longer reports them as
+        running. Listeners are called with ("joined" | "left", node) on the thread that changed the table. Thread-safe.
+    """
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.members = OrderedDict()        # Mapping of task ARN --> Fargate node dictionary, in the order in which they joined.
+        self.joined_at = dict()             # Mapping of task ARN --> time at which the node joined.
+        self.listeners = []
+
+    def __len__(self):
+        with self.lock:
+            return len(self.members)
+
+    def __contains__(self, task_arn):
+        with self.lock:
+            return task_arn in self.members
+
+    def nodes(self):
+        with self.lock:
+            return list(self.members.values())
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def _notify(self, event, node):
+        for listener in self.listeners:
+            try:
+                listener(event, node)
+            except Exception as ex:
+                logger.error("Fargate membership listener failed on \"{}\" event: {}".format(event, ex))
+
+    def add(self, node):
+        """ Add a node to the table. Returns False if it was a member already. """
+        with self.lock:
+            if node[FARGATE_ARN_KEY] in self.members:
+                return False
+            self.members[node[FARGATE_ARN_KEY]] = node
+            self.joined_at[node[FARGATE_ARN_KEY]] = time.time()
+            self.lock.notify_all()
+        self._notify("joined", node)
+        return True
+
+    def remove(self, task_arn):
+        """ Remove the node with the given ARN from the table. Returns the node (or None if it wasn't a member). """
+        with self.lock:
+            node = self.members.pop(task_arn, None)
+            self.joined_at.pop(task_arn, None)
+        if node is not None:
+            self._notify("left", node)
+        return node
+
+    def wait_for(self, count = 1, timeout = None):
+        """ Block until at least 'count' nodes have joined, or 'timeout' seconds have passed. Returns the number of members. """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.lock:
+            while len(self.members) < count:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.lock.wait(remaining)
+            return len(self.members)
+
+    def bind(self, num_shards, min_nodes = 1, timeout = None, eligible = None):
+        """ Return a ShardBinding of 'num_shards' logical shards to the members of this table. """
+        return ShardBinding(self, num_shards, min_nodes = min_nodes, timeout = timeout, eligible = eligible)
+
+class ShardBinding(object):
+    """ Binds the logical storage shards of one job to physical Fargate nodes.
+
+        While a job's schedule is built, the output of each task is assigned to a logical shard (see ``shard_of``). A shard is
+        bound to a physical node the first time one of its tasks is placed, to the member with the fewest shards of this job,
+        and keeps that node from then on. Only the first binding waits, for 'min_nodes' nodes to have joined (or 'timeout'
+        seconds), so a job can be analysed and partly scheduled while the fleet is still starting, and the shards bound later
+        use the nodes which have joined in the meantime.
+
+        Parameters
+        ----------
+        membership : FargateMembership
+            The nodes which shards can be bound to.
+        num_shards : int
+            Number of logical shards.
+        min_nodes : int
+            Number of nodes that must have joined before the first shard is bound.
+        timeout : float
+            Maximum time (in seconds) to wait for 'min_nodes' nodes. If fewer have joined by then, the shards are bound to the
+            nodes available (and a RuntimeError is raised if there are none).
+        eligible : callable
+            Called with a list of nodes. Returns those which shards may be bound to (e.g., the healthy ones). If it returns an
+            empty list, all of the members are eligible.
+    """
+    def __init__(self, membership, num_shards, min_nodes = 1, timeout = None, eligible = None):
+        self.membership = membership
+        self.num_shards = max(int(num_shards), 1)
+        self.min_nodes = min_nodes
+        self.timeout = timeout
+        self.eligible = eligible
+        self.bindings = dict()              # Mapping of shard ID --> Fargate node.
+        self.waited = False
+
+    def shard_of(self, key):
+        """ Return the logical shard of the given task key. """
+        return zlib.crc32(key.encode("utf-8")) % self.num_shards
+
+    def node_for(self, shard_id):
+        """ Return the node the given shard is bound to, binding it first if necessary. """
+        node = self.bindings.get(shard_id, None)
+        if node is not None:
+            return node
+        if not self.waited:
+            num_members = self.membership.wait_for(self.min_nodes, timeout = self.timeout)
+            if num_members < self.min_nodes:
+                logger.warning("Only {} of the {} Fargate nodes required have joined. Using them anyway.".format(num_members, self.min_nodes))
+            self.waited = True
+        candidates = self.membership.nodes()
+        if self.eligible is not None:
+            candidates = self.eligible(candidates) or candidates
+        if len(candidates) == 0:
+            raise RuntimeError("No Fargate storage node is available to bind shard {} to.".format(shard_id))
+        load = dict()
+        for bound in self.bindings.values():
+            load[bound[FARGATE_ARN_KEY]] = load.get(bound[FARGATE_ARN_KEY], 0) + 1
+        node = min(candidates, key = lambda candidate: load.get(candidate[FARGATE_ARN_KEY], 0))
+        self.bindings[shard_id] = node
+        return node
+
+    def node_for_key(self, key):
+        return self.node_for(self.shard_of(key))
+
+class FargateLauncher(object):
+    """ Launches the Fargate storage fleet in the background.
+
+        ``scale`` creates (or updates) the ECS service with the desired number of tasks and returns right away. A background
+        thread then polls ECS; each task that is running and has a network interface is described, health-checked, and added
+        to the membership table, so nodes join one by one as they come up instead of all at once. Nodes ECS no longer reports
+        as running are removed from the table. The thread stops polling once the table matches the desired number of tasks.
+
+        Parameters
+        ----------
+        ecs_client, ec2_client : boto3 clients
+            Anything implementing the ECS (describe_services, create_service, update_service, list_tasks, describe_tasks)
+            and EC2 (describe_network_interfaces) calls used here.
+        membership : FargateMembership
+            The table the nodes join.
+        cluster, task_definition, network_configuration : str, str, dict
+            The ECS cluster, task definition and network configuration of the storage service.
+        service_name, task_group : str
+            Name of the ECS service, and the group of its tasks.
+        tags : list
+            Tags of the service, if it has to be created.
+        poll_interval : float
+            Interval (in seconds) between two polls of ECS.
+        health_check : callable
+            Called with a list of newly running nodes. Returns those which are healthy; the others are checked again at the
+            next poll. By default, every running node is considered healthy.
+    """
+    def __init__(self, ecs_client, ec2_client, membership, cluster = None, task_definition = None, network_configuration = None,
+                 service_name = None, task_group = None, tags = None, poll_interval = DEFAULT_POLL_INTERVAL, health_check = None):
+        self.ecs_client = ecs_client
+        self.ec2_client = ec2_client
+        self.membership = membership
+        self.cluster = cluster
+        self.task_definition = task_definition
+        self.network_configuration = network_configuration
+        self.service_name = service_name
+        self.task_group = task_group
+        self.tags = tags or []
+        self.poll_interval = poll_interval
+        self.health_check = health_check
+        self.desired_num_tasks = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+        self.settled = threading.Event()    # Set while the membership table matches the desired number of tasks.
+        self.num_polls = 0
+        self.started_at = None
+        self.settled_at = None
+
+    def scale(self, desired_num_tasks):
+        """ Make the fleet grow (or shrink) to 'desired_num_tasks' nodes, in the background. Does nothing if it has that many nodes already. """
+        with self.lock:
+            if desired_num_tasks == self.desired_num_tasks and (self.is_running() or len(self.membership) == desired_num_tasks):
+                return
+            self.desired_num_tasks = desired_num_tasks
+            self.settled.clear()
+            self.started_at = time.time()
+            self.settled_at = None
+            self.ensure_service(desired_num_tasks)
+            if not self.is_running():
+                self.stopping.clear()
+                self.thread = threading.Thread(target = self._run, name = "Fargate-Launcher", daemon = True)
+                self.thread.start()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def ensure_service(self, desired_num_tasks):
+        """ Create the ECS service (or update its desired count). """
+        services = self.ecs_client.describe_services(cluster = self.cluster, services = [self.service_name])['services']
+        if len(services) == 0 or services[0]['status'] == 'INACTIVE':
+            logger.debug("[FARGATE] Creating service {} with task definition {} and desired count {}.".format(self.service_name, self.task_definition, desired_num_tasks))
+            self.ecs_client.create_service(
+                cluster = self.cluster,
+                serviceName = self.service_name,
+                taskDefinition = self.task_definition,
+                desiredCount = desired_num_tasks,
+                platformVersion = 'LATEST',
+                networkConfiguration = self.network_configuration,
+                schedulingStrategy = 'REPLICA',
+                tags = self.tags
+            )
+        elif services[0]['desiredCount'] != desired_num_tasks:
+            logger.debug("[FARGATE] Updating service {} with new desired count of {} (it was {}).".format(self.service_name, desired_num_tasks, services[0]['desiredCount']))
+            self.ecs_client.update_service(cluster = self.cluster, service = self.service_name, desiredCount = desired_num_tasks)
+
+    def list_task_descriptions(self):
+        """ Return the descriptions of the tasks of the storage service. """
+        task_arns = []
+        response = self.ecs_client.list_tasks(cluster = self.cluster)
+        task_arns.extend(response['taskArns'])
+        while 'nextToken' in response:
+            response = self.ecs_client.list_tasks(cluster = self.cluster, nextToken = response['nextToken'])
+            task_arns.extend(response['taskArns'])
+        descriptions = []
+        for i in range(0, len(task_arns), DESCRIBE_TASKS_BATCH_SIZE):
+            descriptions.extend(self.ecs_client.describe_tasks(cluster = self.cluster, tasks = task_arns[i:i + DESCRIBE_TASKS_BATCH_SIZE])['tasks'])
+        return [description for description in descriptions if description.get('group', None) == self.task_group]
+
+    def describe_nodes(self, task_descriptions):
+        """ Return the Fargate node dictionaries of the given (running) tasks. Their public IPs are resolved with a single EC2 call. """
+        nodes = []
+        for description in task_descriptions:
+            nodes.append({
+                FARGATE_ARN_KEY: description['taskArn'],
+                FARGATE_ENI_ID_KEY: description['attachments'][0]['details'][1]['value'],
+                FARGATE_PRIVATE_IP_KEY: description['containers'][0]['networkInterfaces'][0][FARGATE_PRIVATE_IP_KEY]
+            })
+        if len(nodes) > 0:
+            interfaces = self.ec2_client.describe_network_interfaces(NetworkInterfaceIds = [node[FARGATE_ENI_ID_KEY] for node in nodes])['NetworkInterfaces']
+            public_ips = {interface['NetworkInterfaceId']: interface.get('Association', {}).get('PublicIp', None) for interface in interfaces}
+            for node in nodes:
+                node[FARGATE_PUBLIC_IP_KEY] = public_ips.get(node[FARGATE_ENI_ID_KEY], None)
+        return nodes
+
+    def poll(self):
+        """ Update the membership table from ECS once. Returns the number of members. """
+        self.num_polls += 1
+        running = dict()
+        for description in self.list_task_descriptions():
+            # A task can only be used once it is running and its network interface has been attached.
+            try:
+                if description['lastStatus'] == 'RUNNING' and description['containers'][0]['networkInterfaces'][0][FARGATE_PRIVATE_IP_KEY]:
+                    running[description['taskArn']] = description
+            except (IndexError, KeyError):
+                pass
+        for node in self.membership.nodes():
+            if node[FARGATE_ARN_KEY] not in running:
+                logger.debug("[FARGATE] Node {} is no longer running.".format(node[FARGATE_ARN_KEY]))
+                self.membership.remove(node[FARGATE_ARN_KEY])
+        new_nodes = self.describe_nodes([description for arn, description in running.items() if arn not in self.membership])
+        if len(new_nodes) > 0 and self.health_check is not None:
+            new_nodes = self.health_check(new_nodes)
+        for node in new_nodes:
+            self.membership.add(node)
+        return len(self.membership)
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                num_members = self.poll()
+            except Exception as ex:
+                logger.error("[FARGATE] Failed to poll ECS for the storage nodes: {}".format(ex))
+            else:
+                logger.debug("[FARGATE] {}/{} storage nodes have joined.".format(num_members, self.desired_num_tasks))
+                with self.lock:
+                    if num_members == self.desired_num_tasks:
+                        self.settled_at = time.time()
+                        self.settled.set()
+                        self.thread = None
+                        return
+            self.stopping.wait(self.poll_interval)
+
+    def wait(self, timeout = None):
+        """ Block until the fleet has the desired number of nodes. Returns False if 'timeout' seconds passed first. """
+        return self.settled.wait(timeout)
+
+    def stop(self):
+        self.stopping.set()
+
+    def get_metrics(self):
+        return {
+            "desired": self.desired_num_tasks,
+            "num-members": len(self.membership),
+            "settled": self.settled.is_set(),
+            "num-polls": self.num_polls,
+            "launch-time": (self.settled_at - self.started_at) if self.settled_at is not None and self.started_at is not None else None
+        }
@@ -0,0 +1,125 @@
+from __future__ import print_function, division, absolute_import
+
+from collections import defaultdict
+
+# Key in a task's run spec (and thus in the payload sent to the Task Executors) holding the run specs of the tasks fused into it.
+FUSED_TASKS_KEY = "fused-tasks"
+
+def run_spec_size(run_spec):
+    """ Return the size (in bytes) of a serialized run spec, or None if the run spec is not serialized. """
+    if isinstance(run_spec, dict):
+        if not all(isinstance(value, (bytes, str)) for value in run_spec.values()):
+            return None
+        return sum(len(value) for value in run_spec.values())
+    if isinstance(run_spec, bytes):
+        return len(run_spec)
+    return None
+
+def as_run_spec_dict(run_spec):
+    """ Return the run spec as a dictionary (a serialized task is stored under "task", as in construct_basic_task_payload). """
+    if isinstance(run_spec, dict):
+        return dict(run_spec)
+    return {"task": run_spec}
+
+def reverse_topological_order(tasks, dependencies):
+    """ Return the keys of 'tasks' ordered such that every task comes before its dependencies. """
+    num_dependents = defaultdict(int)
+    for key in tasks:
+        for dep in dependencies.get(key, ()):
+            if dep in tasks:
+                num_dependents[dep] += 1
+    ready = [key for key in tasks if num_dependents[key] == 0]
+    order = []
+    while ready:
+        key = ready.pop()
+        order.append(key)
+        for dep in dependencies.get(key, ()):
+            if dep in tasks:
+                num_dependents[dep] -= 1
+                if num_dependents[dep] == 0:
+                    ready.append(dep)
+    return order
+
+def fuse_tasks(tasks, dependencies, keys, max_tasks = 16, max_bytes = 64000, max_duration = 1.0, estimate_duration = None, can_fuse = None):
+    """ Fuse linear chains (and small trees) of tasks into single, composite tasks.
+
+    A task is absorbed into its dependent if it is the only task that depends on it, it isn't one of the 'keys' requested
+    by the client, and it has a serialized run spec. The composite task keeps the key and run spec of the task at the bottom
+    of the chain, and its run spec lists the run specs of the absorbed tasks (in execution order) under FUSED_TASKS_KEY.
+    The Task Executor runs the absorbed tasks first, keeping their results in memory, so only the composite task's result
+    is written out and reported.
+
+    'tasks' and 'dependencies' are modified in place.
+
+    Parameters
+    ----------
+    tasks : dict
+        Mapping of task keys to (serialized) run specs, as passed to update_graph.
+    dependencies : dict
+        Mapping of task keys to the set of keys of their dependencies.
+    keys : set
+        Keys requested by the client. These are never absorbed.
+    max_tasks : int
+        Maximum number of tasks in a composite task (including the task at the bottom of the chain).
+    max_bytes : int
+        Maximum total size of the run specs in a composite task, which must fit in a Lambda payload.
+    max_duration : float
+        Maximum total estimated duration (in seconds) of the tasks in a composite task.
+    estimate_duration : callable
+        Called with a task key. Returns the estimated duration of the task in seconds (0 if unknown).
+    can_fuse : callable
+        Called with a task key. Returns False for tasks that must not be fused (e.g., tasks with restrictions).
+
+    Returns a mapping of the keys of the composite tasks to the list of keys absorbed into each of them.
+    """
+    estimate_duration = estimate_duration or (lambda key: 0)
+    dependents = defaultdict(set)
+    for key, deps in dependencies.items():
+        for dep in deps:
+            dependents[dep].add(key)
+
+    def can_absorb(key):
+        return (key in tasks and key not in keys and len(dependents[key]) == 1
+                and run_spec_size(tasks[key]) is not None and (can_fuse is None or can_fuse(key)))
+
+    fused = dict()
+    absorbed = set()
+    for key in reverse_topological_order(tasks, dependencies):
+        if key in absorbed or run_spec_size(tasks[key]) is None or (can_fuse is not None and not can_fuse(key)):
+            continue
+        num_tasks = 1
+        num_bytes = run_spec_size(tasks[key])
+        duration = estimate_duration(key)
+        group = []                  # Absorbed keys, in execution order (dependencies before dependents).
+        external = set()            # Dependencies of the composite task.
+
+        # Depth-first search through the absorbable dependencies. The absorbed tasks form a tree below 'key', as each
+        # one has exactly one dependent, so every task is visited once. Tasks are appended to the group in post-order.
+        stack = [(dep, False) for dep in dependencies.get(key, ())]
+        while stack:
+            dep, expanded = stack.pop()
+            if expanded:
+                group.append(dep)
+                continue
+            if (can_absorb(dep) and num_tasks < max_tasks and num_bytes + run_spec_size(tasks[dep]) <= max_bytes
+                    and duration + estimate_duration(dep) <= max_duration):
+                num_tasks += 1
+                num_bytes += run_spec_size(tasks[dep])
+                duration += estimate_duration(dep)
+                stack.append((dep, True))
+                stack.extend((d, False) for d in dependencies.get(dep, ()))
+            else:
+                external.add(dep)
+
+        if len(group) == 0:
+            continue
+        run_spec = as_run_spec_dict(tasks[key])
+        run_spec[FUSED_TASKS_KEY] = [dict(as_run_spec_dict(tasks[dep]), key = dep) for dep in group]
+        tasks[key] = run_spec
+        dependencies[key] = external
+        for dep in group:
+            del tasks[dep]
+            dependencies.pop(dep, None)
+            absorbed.add(dep)
+        fused[key] = group
+    return fused
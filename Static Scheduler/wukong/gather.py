@@ -0,0 +1,132 @@
+from __future__ import print_function, division, absolute_import
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import logging
+import threading
+
+import cloudpickle
+import redis
+
+from .sharding import parse_redis_endpoint
+
+logger = logging.getLogger(__name__)
+
+# Number of threads fetching (and deserializing) results at the same time.
+DEFAULT_GATHER_CONCURRENCY = 16
+
+# Number of keys retrieved with a single MGET.
+DEFAULT_GATHER_CHUNK_SIZE = 256
+
+class GatherEngine(object):
+    """ Retrieves the results of tasks from Redis on behalf of the Client.
+
+        Keys are grouped by the Redis instance storing them (the control-plane shard, or the Fargate node the Scheduler
+        placed them on) and split into chunks. Each chunk is fetched with a single MGET and deserialized by one of the
+        engine's worker threads, so all of the instances are read from concurrently, and a chunk's serialized values are
+        released as soon as they have been deserialized. Results are handed out chunk by chunk as they become available
+        (see ``iter_values``), and at most 'max_in_flight' chunks are fetched ahead of the consumer.
+
+        Parameters
+        ----------
+        dcp_ring : RedisShardRing
+            The control-plane shards, where small results are stored.
+        max_concurrency : int
+            Number of chunks fetched (and deserialized) at the same time.
+        chunk_size : int
+            Maximum number of keys per MGET.
+        max_in_flight : int
+            Maximum number of chunks fetched but not yet consumed. Defaults to twice 'max_concurrency'.
+        deserialize : callable
+            Called with a serialized value. Defaults to ``cloudpickle.loads``.
+    """
+    def __init__(self, dcp_ring, max_concurrency = DEFAULT_GATHER_CONCURRENCY, chunk_size = DEFAULT_GATHER_CHUNK_SIZE,
+                 max_in_flight = None, deserialize = None):
+        self.dcp_ring = dcp_ring
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight or 2 * max_concurrency
+        self.deserialize = deserialize or cloudpickle.loads
+        self.executor = ThreadPoolExecutor(max_workers = max_concurrency, thread_name_prefix = "Gather-Worker")
+        # Runs the blocking gather() calls made on behalf of coroutines, so that they don't block the IOLoop.
+        self.coordinator = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "Gather-Coordinator")
+        self.lock = threading.Lock()
+        self.clients = dict()               # Mapping of "host:port" --> Redis client of Fargate nodes.
+
+    def get_client(self, endpoint):
+        with self.lock:
+            redis_client = self.clients.get(endpoint, None)
+            if redis_client is None:
+                host, port = parse_redis_endpoint(endpoint)
+                redis_client = self.clients[endpoint] = redis.StrictRedis(host = host, port = port, db = 0)
+            return redis_client
+
+    def _fetch_chunk(self, redis_client, keys):
+        values = redis_client.mget(keys)
+        found = dict()
+        missing = []
+        for key, value in zip(keys, values):
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = self.deserialize(value)
+        return found, missing
+
+    def _chunks(self, keys = (), located = None):
+        """ Yield (Redis client, keys) pairs. 'keys' are on the control-plane shards, 'located' maps keys to the endpoint storing them. """
+        for node_name, shard_keys in self.dcp_ring.group_keys(keys).items():
+            redis_client = self.dcp_ring.clients[node_name]
+            for i in range(0, len(shard_keys), self.chunk_size):
+                yield redis_client, shard_keys[i:i + self.chunk_size]
+        if located:
+            groups = dict()
+            for key, endpoint in located.items():
+                groups.setdefault(endpoint, []).append(key)
+            for endpoint, endpoint_keys in groups.items():
+                redis_client = self.get_client(endpoint)
+                for i in range(0, len(endpoint_keys), self.chunk_size):
+                    yield redis_client, endpoint_keys[i:i + self.chunk_size]
+
+    def iter_chunks(self, keys = (), located = None):
+        """ Fetch the given keys, yielding a tuple ({key: value}, [missing keys]) per chunk in the order the chunks complete. """
+        chunks = self._chunks(keys = keys, located = located)
+        pending = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < self.max_in_flight:
+                try:
+                    redis_client, chunk_keys = next(chunks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(self.executor.submit(self._fetch_chunk, redis_client, chunk_keys))
+            if len(pending) == 0:
+                return
+            done, pending = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+    def iter_values(self, keys = (), located = None, missing = None):
+        """ Fetch the given keys, yielding (key, value) pairs as they become available.
+
+            Keys which could not be found are appended to 'missing' (if given). """
+        for found, chunk_missing in self.iter_chunks(keys = keys, located = located):
+            if missing is not None:
+                missing.extend(chunk_missing)
+            for item in found.items():
+                yield item
+
+    def gather(self, keys = (), located = None):
+        """ Fetch the given keys. Returns a tuple ({key: value}, set of missing keys). """
+        data = dict()
+        missing = set()
+        for found, chunk_missing in self.iter_chunks(keys = keys, located = located):
+            data.update(found)
+            missing.update(chunk_missing)
+        return data, missing
+
+    def submit(self, keys = (), located = None):
+        """ Run ``gather`` in the background. Returns a concurrent.futures.Future, which can be yielded from a coroutine. """
+        return self.coordinator.submit(self.gather, list(keys), located)
+
+    def close(self):
+        self.coordinator.shutdown(wait = False)
+        self.executor.shutdown(wait = False)
@@ -0,0 +1,225 @@
+from __future__ import print_function, division, absolute_import
+
+from collections import OrderedDict
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Number of jobs whose artifacts we retain (at most) while their futures are still held by clients.
+DEFAULT_MAX_RETAINED_JOBS = 16
+
+def entry_size(key, value):
+    """ Rough size (in bytes) of a flat dictionary entry. We only need this to be cheap and consistent, not exact. """
+    size = sys.getsizeof(key) + sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(v) for v in value.values())
+    elif isinstance(value, (list, tuple)):
+        size += sum(sys.getsizeof(v) for v in value)
+    return size
+
+class JobArtifacts(object):
+    """ The artifacts the Scheduler retains for a single job (i.e., a single call to update_graph()).
+
+        The static schedule itself (PathNodes, serialized payloads) is released once it has been uploaded to Redis. We only keep
+        what is needed afterwards: where each task's output lives and how many dependencies it has (for check_status_of_tasks()),
+        and the timing information reported by the Task Executors.
+    """
+    def __init__(self, job_id, requested_keys = ()):
+        self.job_id = job_id
+        self.created_at = time.time()
+        self.requested_keys = set(requested_keys)   # Keys requested by the client. The job is released once all of them are forgotten.
+        self.tasks = OrderedDict()          # Mapping of task key --> (Fargate node, number of dependencies), in schedule order.
+        self.completed_task_data = dict()   # Mapping of task key --> timing information (a list if the task was executed more than once).
+        self.num_completed = 0              # Number of EXECUTED_TASK messages received for the tasks of this job.
+        self.num_bytes = 0
+        self.timings = dict()               # Mapping of milestone (e.g., "received", "schedule-built") --> timestamp.
+        self.upload = None                  # Totals of the BulkLoader statistics of the uploads of the job's static schedule.
+
+    def add_task(self, task_key, fargate_node, num_dependencies):
+        value = (fargate_node, num_dependencies)
+        self.tasks[task_key] = value
+        self.num_bytes += entry_size(task_key, value)
+
+    def remove_task(self, task_key):
+        value = self.tasks.pop(task_key, None)
+        if value is not None:
+            self.num_bytes -= entry_size(task_key, value)
+        data = self.completed_task_data.pop(task_key, None)
+        if isinstance(data, list):
+            self.num_bytes -= sum(entry_size(task_key, d) for d in data)
+        elif data is not None:
+            self.num_bytes -= entry_size(task_key, data)
+
+    def drop_artifacts(self):
+        """ Drop everything but the job's index of tasks (i.e., the tasks' Fargate nodes), which is needed to reclaim their keys. """
+        self.completed_task_data = dict()
+        self.timings = dict()
+        self.upload = None
+        self.num_bytes = sum(entry_size(task_key, value) for task_key, value in self.tasks.items())
+
+    def record_completed_task(self, task_key, data):
+        """ Record the timing information of an execution of the given task. Returns how many times the task has been executed. """
+        self.num_completed += 1
+        self.num_bytes += entry_size(task_key, data)
+        previous = self.completed_task_data.get(task_key, None)
+        if previous is None:
+            self.completed_task_data[task_key] = data
+            return 1
+        if not isinstance(previous, list):
+            previous = self.completed_task_data[task_key] = [previous]
+        previous.append(data)
+        return len(previous)
+
+    def record_timing(self, milestone, timestamp = None):
+        """ Record when the job reached the given milestone. Only the first time a milestone is reached is kept. """
+        if milestone not in self.timings:
+            self.timings[milestone] = timestamp if timestamp is not None else time.time()
+
+    def record_upload(self, stats):
+        """ Add the statistics of an upload of (part of) the job's static schedule, as returned by BulkLoader.load(). """
+        if self.upload is None:
+            self.upload = {"num-keys": 0, "num-bytes": 0, "num-batches": 0, "duration": 0, "max-batch-latency": 0}
+        for field in ("num-keys", "num-bytes", "num-batches", "duration"):
+            self.upload[field] += stats[field]
+        self.upload["max-batch-latency"] = max(self.upload["max-batch-latency"], stats["max-batch-latency"])
+
+    def get_upload_stats(self):
+        """ Return the totals of the job's uploads and the resulting throughput, or None if nothing has been uploaded yet. """
+        if self.upload is None:
+            return None
+        stats = dict(self.upload)
+        duration = stats["duration"]
+        stats["keys-per-second"] = stats["num-keys"] / duration if duration > 0 else None
+        stats["bytes-per-second"] = stats["num-bytes"] / duration if duration > 0 else None
+        return stats
+
+    def get_latencies(self):
+        """ Return the durations (in seconds) between the job's milestones, for the milestones which have been reached. """
+        timings = self.timings
+        # If the Client didn't tell us when it submitted the job, measure from when we received it.
+        submitted = timings.get("submitted", timings.get("received"))
+        latencies = dict()
+        if "received" in timings and "schedule-built" in timings:
+            latencies["schedule-build-time"] = timings["schedule-built"] - timings["received"]
+        if "schedule-built" in timings and "uploaded" in timings:
+            latencies["upload-time"] = timings["uploaded"] - timings["schedule-built"]
+        if submitted is not None and "first-leaf-enqueued" in timings:
+            latencies["submission-to-first-leaf"] = timings["first-leaf-enqueued"] - submitted
+        return latencies
+
+    def get_metrics(self):
+        return {
+            "num-tasks": len(self.tasks),
+            "num-completed": self.num_completed,
+            "num-bytes": self.num_bytes,
+            "age": time.time() - self.created_at,
+            "timings": dict(self.timings),
+            "latencies": self.get_latencies(),
+            "upload": self.get_upload_stats()
+        }
+
+class JobArtifactRegistry(object):
+    """ Per-job artifacts retained by the Scheduler.
+
+        A job's artifacts are created when its static schedule is generated. Each task's artifacts are dropped when the task is
+        forgotten (i.e., once the clients release its future), and the job itself is dropped once all of its tasks are gone or
+        all of the keys requested by the client have been forgotten. The artifacts double as the job's index of keys in Redis.
+        If clients hold on to the futures of many jobs, only the artifacts of the 'max_jobs' most recent jobs are retained. The
+        jobs evicted beyond that keep their index of keys (see JobArtifacts.drop_artifacts) until their tasks are forgotten, so
+        their keys are still released by forget_task.
+    """
+    def __init__(self, max_jobs = DEFAULT_MAX_RETAINED_JOBS):
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()           # Mapping of job IDs to JobArtifacts, oldest first.
+        self.task_to_job = dict()           # Mapping of task keys to the JobArtifacts of the (most recent) job containing them, evicted or not.
+
+        self.num_created = 0
+        self.num_released = 0
+        self.num_evicted = 0
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __contains__(self, job_id):
+        return job_id in self.jobs
+
+    @property
+    def last_job(self):
+        """ The artifacts of the most recently submitted job, or None if there aren't any. """
+        if len(self.jobs) == 0:
+            return None
+        return next(reversed(self.jobs.values()))
+
+    def create(self, job_id, requested_keys = ()):
+        job = self.jobs[job_id] = JobArtifacts(job_id, requested_keys = requested_keys)
+        self.num_created += 1
+        while len(self.jobs) > self.max_jobs:
+            oldest_job_id = next(iter(self.jobs))
+            logger.debug("Evicting artifacts of job {} ({} jobs retained).".format(oldest_job_id, len(self.jobs)))
+            self.jobs.pop(oldest_job_id).drop_artifacts()
+            self.num_evicted += 1
+        return job
+
+    def add_task(self, job, task_key, fargate_node, num_dependencies):
+        # If the task was part of an earlier job, it now belongs to this one instead.
+        previous_job = self.task_to_job.get(task_key, None)
+        if previous_job is not None and previous_job is not job:
+            previous_job.remove_task(task_key)
+            if len(previous_job.tasks) == 0 and previous_job.job_id in self.jobs:
+                del self.jobs[previous_job.job_id]
+                self.num_released += 1
+        job.add_task(task_key, fargate_node, num_dependencies)
+        self.task_to_job[task_key] = job
+
+    def job_for_task(self, task_key):
+        """ The artifacts of the job containing the given task, or None if the job was evicted (or the task is unknown). """
+        job = self.task_to_job.get(task_key, None)
+        if job is None or self.jobs.get(job.job_id, None) is not job:
+            return None
+        return job
+
+    def forget_task(self, task_key):
+        """ Drop the artifacts of a task that was forgotten.
+
+            If this was the last of the keys requested by the client for the task's job (or the job's last task), the whole
+            job is released. Returns the list of (task key, Fargate node) pairs that were dropped, i.e., the tasks whose
+            keys in Redis are no longer needed. """
+        job = self.task_to_job.pop(task_key, None)
+        if job is None:
+            return []
+        released = []
+        if task_key in job.tasks:
+            released.append((task_key, job.tasks[task_key][0]))
+        job.remove_task(task_key)
+        had_requested_keys = len(job.requested_keys) > 0
+        job.requested_keys.discard(task_key)
+        if len(job.tasks) == 0 or (had_requested_keys and len(job.requested_keys) == 0):
+            for other_key, (fargate_node, _) in job.tasks.items():
+                released.append((other_key, fargate_node))
+            if self.jobs.get(job.job_id, None) is job:
+                self.num_released += 1
+            self._remove(job)
+        return released
+
+    def _remove(self, job):
+        if self.jobs.get(job.job_id, None) is job:
+            del self.jobs[job.job_id]
+        for task_key in job.tasks:
+            if self.task_to_job.get(task_key, None) is job:
+                del self.task_to_job[task_key]
+
+    def num_bytes(self):
+        return sum(job.num_bytes for job in self.jobs.values())
+
+    def get_metrics(self):
+        return {
+            "num-jobs": len(self.jobs),
+            "num-tasks": len(self.task_to_job),
+            "num-bytes": self.num_bytes(),
+            "num-created": self.num_created,
+            "num-released": self.num_released,
+            "num-evicted": self.num_evicted,
+            "jobs": {job_id: job.get_metrics() for job_id, job in self.jobs.items()}
+        }
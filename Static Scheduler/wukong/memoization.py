@@ -0,0 +1,312 @@
+from __future__ import print_function, division, absolute_import
+
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import pickle
+
+import cloudpickle
+
+from .fusion import reverse_topological_order
+
+logger = logging.getLogger(__name__)
+
+# Key in the payload sent to the Task Executors holding the task's fingerprint. Executors publish the outputs of such tasks.
+FINGERPRINT_KEY = "fingerprint"
+
+# Redis list (on the dcp_redis instance) to which the Task Executors push a record for every memoizable output they store.
+MEMOIZED_OUTPUTS_KEY = "memoized-outputs"
+
+# Default maximum total size (in bytes) of the outputs retained for memoization.
+DEFAULT_MEMO_CACHE_BYTES = 1024 * 1024 * 1024
+
+# Copies the value stored under KEYS[1] to KEYS[2] on the same Redis instance. Returns 0 if there is no value under KEYS[1].
+COPY_OUTPUT_SCRIPT = """
+local value = redis.call("GET", KEYS[1])
+if not value then
+   return 0
+end
+if KEYS[1] ~= KEYS[2] then
+   redis.call("SET", KEYS[2], value)
+end
+return 1
+"""
+
+# Replaces the references to a task's dependencies in its (deserialized) arguments, followed by the dependency's fingerprint.
+DEPENDENCY_TAG = "wukong-dependency"
+
+# Fields of a serialized run spec which may refer to the task's dependencies (by key).
+ARGUMENT_FIELDS = ("args", "kwargs", "task")
+
+def _update(h, value):
+    """ Feed a (serialized) run spec, or part of one, into the hash. Raises TypeError for values that can't be fingerprinted. """
+    if isinstance(value, bytes):
+        h.update(b"b%d:" % len(value))
+        h.update(value)
+    elif isinstance(value, str):
+        encoded = value.encode("utf-8")
+        h.update(b"s%d:" % len(encoded))
+        h.update(encoded)
+    elif isinstance(value, dict):
+        h.update(b"d%d:" % len(value))
+        for field in sorted(value, key = str):
+            _update(h, str(field))
+            _update(h, value[field])
+    elif isinstance(value, (list, tuple)):
+        h.update(b"l%d:" % len(value))
+        for element in value:
+            _update(h, element)
+    elif value is None or isinstance(value, (bool, int, float)):
+        _update(h, repr(value))
+    else:
+        raise TypeError("Cannot fingerprint a value of type {}.".format(type(value).__name__))
+
+def _substitute(value, dependency_fingerprints):
+    """ Replace the references to dependencies (keys of 'dependency_fingerprints') in a task's arguments by
+        (DEPENDENCY_TAG, fingerprint) tuples. Keys are strings or tuples, as are the nested tasks, which are walked. """
+    if isinstance(value, (str, tuple)):
+        try:
+            fingerprint = dependency_fingerprints.get(value, None)
+        except TypeError:           # A tuple holding unhashable values.
+            fingerprint = None
+        if fingerprint is not None:
+            return (DEPENDENCY_TAG, fingerprint)
+    if type(value) in (tuple, list):
+        return type(value)(_substitute(element, dependency_fingerprints) for element in value)
+    if type(value) is dict:
+        return {field: _substitute(element, dependency_fingerprints) for field, element in value.items()}
+    return value
+
+def _resolve_dependencies(run_spec, dependency_fingerprints):
+    """ Return the run spec with the references to the task's dependencies in its serialized arguments replaced by the
+        dependencies' fingerprints (the arguments are deserialized, substituted and serialized again), so that the run spec
+        doesn't depend on the keys of the task's inputs. Raises TypeError if the arguments can't be deserialized. """
+    if not isinstance(run_spec, dict) or len(dependency_fingerprints) == 0:
+        return run_spec
+    resolved = dict(run_spec)
+    for field in ARGUMENT_FIELDS:
+        if isinstance(resolved.get(field, None), bytes):
+            try:
+                resolved[field] = cloudpickle.dumps(_substitute(pickle.loads(resolved[field]), dependency_fingerprints))
+            except Exception as ex:
+                raise TypeError("Cannot deserialize the {} of the task: {}".format(field, ex))
+    return resolved
+
+def task_fingerprint(run_spec, dependency_fingerprints):
+    """ Return the fingerprint of a task: a hash of its (serialized) function and arguments, and of the fingerprints of its
+        inputs ('dependency_fingerprints' maps their keys to their fingerprints). The references to the inputs in the arguments
+        are replaced by their fingerprints, so the fingerprint doesn't depend on the keys of the task or of its inputs. Returns
+        None if the task can't be fingerprinted (its run spec isn't serialized, or one of its inputs has no fingerprint). """
+    if any(fingerprint is None for fingerprint in dependency_fingerprints.values()):
+        return None
+    h = hashlib.sha256()
+    try:
+        _update(h, _resolve_dependencies(run_spec, dependency_fingerprints))
+    except TypeError:
+        return None
+    for fingerprint in sorted(dependency_fingerprints.values()):
+        _update(h, fingerprint)
+    return h.hexdigest()
+
+def compute_fingerprints(tasks, dependencies, known = None):
+    """ Fingerprint the given tasks, inputs first. The fingerprints of dependencies that aren't in 'tasks' (i.e., tasks of an
+        earlier job) are looked up in 'known'. Returns the mapping of task key --> fingerprint of the tasks that have one. """
+    known = known or dict()
+    fingerprints = dict()
+    for key in reversed(reverse_topological_order(tasks, dependencies)):
+        dependency_fingerprints = {dep: fingerprints.get(dep, known.get(dep, None)) for dep in dependencies.get(key, ())}
+        fingerprint = task_fingerprint(tasks[key], dependency_fingerprints)
+        if fingerprint is not None:
+            fingerprints[key] = fingerprint
+    return fingerprints
+
+def needed_tasks(keys, dependencies, available):
+    """ Return the keys of the tasks needed to compute 'keys' when the outputs of the tasks in 'available' are reused: every task
+        reachable from 'keys' without going past an available task (available tasks that are reached are included). """
+    needed = set()
+    stack = list(keys)
+    while stack:
+        key = stack.pop()
+        if key in needed:
+            continue
+        needed.add(key)
+        if key not in available:
+            stack.extend(dependencies.get(key, ()))
+    return needed
+
+def restore_outputs(hits, source_client, target_client):
+    """ Make the memoized outputs available under the keys of the tasks reusing them.
+
+        'hits' maps task keys to cache entries. 'source_client' is called with an entry and returns the Redis client of the
+        instance storing the output. 'target_client' is called with a task key and its entry and returns the client of the
+        instance the task's output should be read from. Outputs that stay on the same instance are checked (and copied, when
+        the keys differ) by one pipelined script per instance. The others are only checked (by one pipelined EXISTS per
+        instance), as copying them moves the values through the Scheduler: they are returned as copies to be made by
+        copy_outputs() before any task reads them.
+
+        Returns the set of task keys whose output is (or will be, once copied) available, and the list of copies to make. """
+    restored = set()
+    local_copies = OrderedDict()            # Mapping of id(client) --> (client, list of (task key, entry)).
+    remote_copies = OrderedDict()           # Mapping of id(source client) --> (source client, list of (task key, entry, target client)).
+    for task_key, entry in hits.items():
+        source = source_client(entry)
+        target = target_client(task_key, entry)
+        if source is target:
+            local_copies.setdefault(id(source), (source, []))[1].append((task_key, entry))
+        else:
+            remote_copies.setdefault(id(source), (source, []))[1].append((task_key, entry, target))
+    for redis_client, copies in local_copies.values():
+        try:
+            pipe = redis_client.pipeline(transaction = False)
+            for task_key, entry in copies:
+                pipe.eval(COPY_OUTPUT_SCRIPT, 2, entry["key"], task_key)
+            for (task_key, _), found in zip(copies, pipe.execute()):
+                if found:
+                    restored.add(task_key)
+        except Exception as ex:
+            logger.error("Failed to restore the memoized outputs of {} tasks: {}".format(len(copies), ex))
+    pending = []
+    for redis_client, copies in remote_copies.values():
+        try:
+            pipe = redis_client.pipeline(transaction = False)
+            for task_key, entry, _ in copies:
+                pipe.exists(entry["key"])
+            for (task_key, entry, target), found in zip(copies, pipe.execute()):
+                if found:
+                    restored.add(task_key)
+                    pending.append((task_key, entry["key"], redis_client, target))
+        except Exception as ex:
+            logger.error("Failed to look up the memoized outputs of {} tasks: {}".format(len(copies), ex))
+    return restored, pending
+
+def copy_outputs(copies):
+    """ Make the copies returned by restore_outputs(): each is a (task key, source key, source client, target client) tuple. The
+        values are moved with DUMP and RESTORE, pipelined per instance. May take a while, so it shouldn't be called on the IOLoop.
+
+        Returns the set of task keys whose output couldn't be copied (e.g., it was deleted after it was checked). """
+    failed = set()
+    sources = OrderedDict()                 # Mapping of id(source client) --> (source client, list of copies).
+    for copy in copies:
+        sources.setdefault(id(copy[2]), (copy[2], []))[1].append(copy)
+    targets = OrderedDict()                 # Mapping of id(target client) --> (target client, list of (task key, dumped value)).
+    for redis_client, source_copies in sources.values():
+        try:
+            pipe = redis_client.pipeline(transaction = False)
+            for _, source_key, _, _ in source_copies:
+                pipe.dump(source_key)
+            dumped = pipe.execute()
+        except Exception as ex:
+            logger.error("Failed to read {} memoized outputs: {}".format(len(source_copies), ex))
+            failed.update(task_key for task_key, _, _, _ in source_copies)
+            continue
+        for (task_key, _, _, target), value in zip(source_copies, dumped):
+            if value is None:
+                failed.add(task_key)
+            else:
+                targets.setdefault(id(target), (target, []))[1].append((task_key, value))
+    for redis_client, values in targets.values():
+        try:
+            pipe = redis_client.pipeline(transaction = False)
+            for task_key, value in values:
+                pipe.restore(task_key, 0, value, replace = True)
+            pipe.execute()
+        except Exception as ex:
+            logger.error("Failed to copy {} memoized outputs: {}".format(len(values), ex))
+            failed.update(task_key for task_key, _ in values)
+    return failed
+
+class MemoCache(object):
+    """ Index of the task outputs retained in Redis for reuse by later jobs, by fingerprint.
+
+        Each entry records the key the output is stored under, the Fargate node storing it (None for the control-plane
+        shards), and its size. The entries are kept in least-recently-used order; once their total size exceeds 'max_bytes',
+        the least recently used ones are evicted. The evicted entries are kept (see pop_evicted) so that the Scheduler can
+        delete their outputs from Redis.
+
+        The Task Executors push a JSON record for every memoizable output they store to MEMOIZED_OUTPUTS_KEY, so the cache can
+        be filled with drain_metrics_list().
+    """
+    def __init__(self, max_bytes = DEFAULT_MEMO_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()        # Mapping of fingerprint --> {"key", "fargate-node", "nbytes"}, least recently used first.
+        self.keys = dict()                  # Mapping of task key --> fingerprint.
+        self.num_bytes = 0
+        self.evicted = []
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self.entries
+
+    def holds(self, task_key):
+        """ Return True if the output stored under the given key is retained for memoization. """
+        return task_key in self.keys
+
+    def get(self, fingerprint):
+        entry = self.entries.get(fingerprint, None)
+        if entry is None:
+            self.num_misses += 1
+            return None
+        self.entries.move_to_end(fingerprint)
+        self.num_hits += 1
+        return entry
+
+    def put(self, fingerprint, task_key, fargate_node = None, nbytes = 0):
+        # The output now stored under 'task_key' replaces whatever was stored there before.
+        self.discard_key(task_key)
+        previous = self.discard(fingerprint)
+        if previous is not None and previous["key"] != task_key:
+            self.evicted.append(previous)
+        self.entries[fingerprint] = {"key": task_key, "fargate-node": fargate_node, "nbytes": nbytes}
+        self.keys[task_key] = fingerprint
+        self.num_bytes += nbytes
+        while self.num_bytes > self.max_bytes and len(self.entries) > 0:
+            fingerprint, entry = self.entries.popitem(last = False)
+            del self.keys[entry["key"]]
+            self.num_bytes -= entry["nbytes"]
+            self.num_evictions += 1
+            self.evicted.append(entry)
+
+    def discard(self, fingerprint):
+        """ Remove and return the entry with the given fingerprint (None if there is none). Its output is left alone. """
+        entry = self.entries.pop(fingerprint, None)
+        if entry is not None:
+            del self.keys[entry["key"]]
+            self.num_bytes -= entry["nbytes"]
+        return entry
+
+    def discard_key(self, task_key):
+        """ Remove and return the entry of the output stored under the given key (e.g., because it is about to be overwritten). """
+        fingerprint = self.keys.get(task_key, None)
+        return None if fingerprint is None else self.discard(fingerprint)
+
+    def append_record(self, data):
+        """ Add an entry from a record pushed by a Task Executor. """
+        record = json.loads(data)
+        self.put(record["fingerprint"], record["key"], record.get("fargate-node", None), record.get("nbytes", 0))
+
+    def pop_evicted(self):
+        """ Return (and forget) the entries evicted since the last call. """
+        evicted, self.evicted = self.evicted, []
+        return evicted
+
+    def clear(self):
+        self.entries.clear()
+        self.keys.clear()
+        self.num_bytes = 0
+        self.evicted = []
+
+    def get_metrics(self):
+        return {
+            "num-entries": len(self.entries),
+            "num-bytes": self.num_bytes,
+            "max-bytes": self.max_bytes,
+            "num-hits": self.num_hits,
+            "num-misses": self.num_misses,
+            "num-evictions": self.num_evictions
+        }
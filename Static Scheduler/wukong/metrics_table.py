@@ -0,0 +1,147 @@
+from __future__ import print_function, division, absolute_import
+
+from array import array
+import csv
+import logging
+
+import cloudpickle
+import numpy as np
+
+from .wukong_metrics import METRICS_SCHEMAS, METRICS_SCHEMA_VERSION, is_metrics_record, unpack_metrics_record
+
+logger = logging.getLogger(__name__)
+
+# Number of records removed from a Redis list (and decoded) at a time when draining metrics.
+DEFAULT_DRAIN_BATCH_SIZE = 10000
+
+class MetricsTable(object):
+    """ Columnar, in-memory table of the metrics records of one kind (TASK_RECORD or LAMBDA_RECORD).
+
+        Numeric fields are stored as arrays of doubles (8 bytes per value), and string fields as lists, so a table of
+        1M task records takes a couple hundred megabytes rather than the gigabytes used by the equivalent unpickled objects.
+        Missing values are NaN.
+    """
+    def __init__(self, kind):
+        self.kind = kind
+        self.string_fields, self.numeric_fields = METRICS_SCHEMAS[(METRICS_SCHEMA_VERSION, kind)]
+        self.strings = {field: [] for field in self.string_fields}
+        self.numbers = {field: array("d") for field in self.numeric_fields}
+        self.num_records = 0
+
+    def __len__(self):
+        return self.num_records
+
+    @property
+    def fields(self):
+        return list(self.string_fields) + list(self.numeric_fields)
+
+    def append_values(self, strings, numbers):
+        """ Append a record given as mappings of field name --> value. Fields missing from the mappings are left empty. """
+        for field in self.string_fields:
+            self.strings[field].append(strings.get(field, ""))
+        for field in self.numeric_fields:
+            self.numbers[field].append(numbers.get(field, float("nan")))
+        self.num_records += 1
+
+    def append_record(self, data):
+        """ Append an encoded record. Records pushed by older Task Executors (pickled breakdown objects) are accepted too. """
+        if not is_metrics_record(data):
+            self.append_breakdown(cloudpickle.loads(data))
+            return
+        version, kind, strings, numbers = unpack_metrics_record(data)
+        if kind != self.kind:
+            raise ValueError("Cannot add a record of kind {} to a table of kind {}.".format(kind, self.kind))
+        string_fields, numeric_fields = METRICS_SCHEMAS[(version, kind)]
+        if version == METRICS_SCHEMA_VERSION:
+            for field, value in zip(string_fields, strings):
+                self.strings[field].append(value)
+            for field, value in zip(numeric_fields, numbers):
+                self.numbers[field].append(value)
+            self.num_records += 1
+        else:
+            self.append_values(dict(zip(string_fields, strings)), dict(zip(numeric_fields, numbers)))
+
+    def append_breakdown(self, breakdown):
+        """ Append a TaskExecutionBreakdown or LambdaExecutionBreakdown object. """
+        strings = dict()
+        for field in self.string_fields:
+            value = getattr(breakdown, field, None)
+            strings[field] = "" if value is None else str(value)
+        numbers = dict()
+        for field in self.numeric_fields:
+            try:
+                numbers[field] = float(getattr(breakdown, field))
+            except (AttributeError, TypeError, ValueError):
+                pass
+        self.append_values(strings, numbers)
+
+    def column(self, field):
+        """ Return a column of the table: a numpy array (a copy) for numeric fields, a list for string fields. """
+        if field in self.numbers:
+            # Copy, as the array can't grow while a numpy array is viewing its buffer.
+            return np.frombuffer(self.numbers[field], dtype = np.float64).copy()
+        return self.strings[field]
+
+    def percentiles(self, field, q = (50, 90, 99)):
+        """ Return a mapping of percentile --> value of the given numeric field, ignoring missing values. """
+        values = self.column(field)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return {p: float("nan") for p in q}
+        return dict(zip(q, (float(v) for v in np.percentile(values, q))))
+
+    def to_dict(self):
+        """ Return the table as a mapping of field name --> list of values. """
+        columns = {field: list(values) for field, values in self.strings.items()}
+        columns.update({field: values.tolist() for field, values in self.numbers.items()})
+        return columns
+
+    def to_csv(self, path):
+        with open(path, "w", newline = "") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.fields)
+            columns = [self.strings[field] for field in self.string_fields] + [self.numbers[field] for field in self.numeric_fields]
+            for row in zip(*columns):
+                writer.writerow(row)
+
+    def to_parquet(self, path):
+        """ Write the table to a Parquet file. Requires pyarrow. """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Exporting metrics to Parquet requires pyarrow, which is not installed.")
+        columns = {field: pa.array(self.strings[field], type = pa.string()) for field in self.string_fields}
+        columns.update({field: pa.array(self.column(field), type = pa.float64()) for field in self.numeric_fields})
+        pq.write_table(pa.table(columns), path)
+
+    def clear(self):
+        for values in self.strings.values():
+            del values[:]
+        for field in self.numeric_fields:
+            self.numbers[field] = array("d")
+        self.num_records = 0
+
+def drain_metrics_list(redis_client, list_key, table, batch_size = DEFAULT_DRAIN_BATCH_SIZE, max_batches = None):
+    """ Move the records in a Redis list into a MetricsTable, 'batch_size' records at a time.
+
+        The Task Executors LPUSH their records, so the oldest ones are at the tail of the list. Each batch is read and
+        removed from the tail in a single transaction (LRANGE + LTRIM), so records pushed concurrently are never lost and
+        at most one batch of encoded records is held in memory at a time. Returns the number of records drained. """
+    num_drained = 0
+    num_batches = 0
+    while max_batches is None or num_batches < max_batches:
+        pipe = redis_client.pipeline(transaction = True)
+        pipe.lrange(list_key, -batch_size, -1)
+        pipe.ltrim(list_key, 0, -batch_size - 1)
+        records, _ = pipe.execute()
+        num_batches += 1
+        for data in reversed(records):
+            try:
+                table.append_record(data)
+            except Exception as ex:
+                logger.error("Could not decode metrics record from \"{}\": {}".format(list_key, ex))
+        num_drained += len(records)
+        if len(records) < batch_size:
+            break
+    return num_drained
@@ -4,6 +4,7 @@ import uuid
 FARGATE_ARN_KEY = "taskARN"
 FARGATE_ENI_ID_KEY = "eniID"
 FARGATE_PUBLIC_IP_KEY = "publicIP"
+FARGATE_PRIVATE_IP_KEY = "privateIpv4Address"
 
 class Path(object):
     def __init__(self, tasks, task_map, next_paths, previous_paths, tasks_to_fargate_nodes):
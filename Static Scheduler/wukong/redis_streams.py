@@ -0,0 +1,201 @@
+from __future__ import print_function, division, absolute_import
+
+import datetime
+import logging
+import threading
+import time
+
+import redis
+import ujson
+from tornado.ioloop import IOLoop
+
+from .utils import parse_timedelta
+
+logger = logging.getLogger(__name__)
+
+# Name of the field in each stream entry that holds the (JSON-serialized) message.
+STREAM_DATA_FIELD = b"data"
+
+class RedisStreamConsumer(object):
+    """ Consume messages published to a Redis Stream by AWS Lambda Task Executors as part of a consumer group.
+
+    This replaces the pub-sub polling processes. A background thread issues blocking XREADGROUP calls (so there is
+    no sleeping/polling) and hands each batch of entries to the IOLoop, where they are passed to ``handler``.
+    Entries are acknowledged (XACK) and then deleted (XDEL) by the thread once the handler has run, so the stream only
+    holds the entries that haven't been processed yet (the consumer group is the stream's only reader). Entries which
+    were delivered to this consumer but never acknowledged (e.g., because the Scheduler was restarted) are replayed when
+    the consumer starts.
+
+    Errors never stop the thread: it backs off and tries again. If the group is gone (e.g., the stream was deleted by a
+    FLUSHALL), it is created again. Entries whose acknowledgement failed are acknowledged again before the next read, so
+    handled messages aren't redelivered.
+
+    Parameters
+    ----------
+    redis_address : str
+        Hostname of the Redis instance on which the stream lives.
+    stream_name : str
+        Name of the stream (this is the "channel" name used by the Task Executors).
+    group_name : str
+        Name of the consumer group. The group is created if it does not already exist.
+    consumer_name : str
+        Name of this consumer within the group. Must be stable across restarts for pending entries to be replayed.
+    handler : callable
+        Called on the IOLoop with a list of deserialized messages (dicts).
+    batch_size : int
+        Maximum number of entries returned by a single XREADGROUP.
+    block : str or float
+        How long a single XREADGROUP blocks waiting for new entries.
+    max_retry_delay : str or float
+        Longest time to wait before reading again after an error (e.g., losing the connection to Redis). The delay
+        doubles after each consecutive failure, up to this value.
+    """
+    def __init__(self, redis_address, stream_name, group_name, consumer_name, handler, loop = None,
+                 batch_size = 500, block = "1s", redis_port = 6379, max_retry_delay = "5s"):
+        self.loop = loop or IOLoop.current()
+        self.redis_client = redis.StrictRedis(host = redis_address, port = redis_port, db = 0)
+        self.stream_name = stream_name
+        self.group_name = group_name
+        self.consumer_name = consumer_name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.block_ms = int(parse_timedelta(block, default = "ms") * 1000)
+        self.max_retry_delay = parse_timedelta(max_retry_delay)
+        self.please_stop = False
+        self.thread = None
+
+        self.num_messages = 0           # Total number of messages handled.
+        self.num_batches = 0            # Total number of batches handled.
+        self.num_replayed = 0           # Number of pending entries replayed on start-up.
+        self.num_errors = 0             # Number of messages that could not be deserialized or handled.
+        self.num_connection_errors = 0  # Number of reads (or acknowledgements) that failed because the connection to Redis was lost.
+        self.num_group_recreations = 0  # Number of times the consumer group was created again after an error.
+        self.entries_to_ack = []        # IDs of handled entries whose acknowledgement failed.
+
+    def __repr__(self):
+        return "<RedisStreamConsumer: stream={}, group={}, consumer={}, messages={}>".format(self.stream_name, self.group_name, self.consumer_name, self.num_messages)
+
+    def start(self):
+        self.create_group()
+        self.thread = threading.Thread(target = self._run, name = "RedisStreamConsumer-" + self.stream_name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.please_stop = True
+
+    def create_group(self, latest_id = "$"):
+        """ Create the consumer group (and the stream) if they do not exist yet. The group starts reading after 'latest_id'. """
+        try:
+            self.redis_client.xgroup_create(self.stream_name, self.group_name, id = latest_id, mkstream = True)
+        except redis.exceptions.ResponseError as ex:
+            # BUSYGROUP means the group already exists, which is fine (e.g., the Scheduler is being restarted).
+            if "BUSYGROUP" not in str(ex):
+                raise
+
+    def _read(self, last_id, block = None):
+        response = self.redis_client.xreadgroup(self.group_name, self.consumer_name, {self.stream_name: last_id},
+                                                count = self.batch_size, block = block)
+        if not response:
+            return []
+        # The response is a list of [stream_name, [(entry_id, fields), ...]].
+        return response[0][1]
+
+    def _run(self):
+        # First, replay any entries that were delivered to this consumer but never acknowledged.
+        replaying = True
+        group_exists = True
+        retry_delay = 0
+        while not self.please_stop:
+            try:
+                if not group_exists:
+                    # Every entry in a stream that was deleted along with its group was added since then, so none are skipped.
+                    self.create_group(latest_id = "0")
+                    group_exists = True
+                if len(self.entries_to_ack) > 0:
+                    self._acknowledge(self.entries_to_ack)
+                    self.entries_to_ack = []
+                if replaying:
+                    replaying = self._replay_pending()
+                else:
+                    entries = self._read(">", block = self.block_ms)
+                    if len(entries) > 0:
+                        self._submit(entries)
+                retry_delay = 0
+                continue
+            except redis.exceptions.ResponseError as ex:
+                # The stream (and thus the group) may have been deleted, e.g., by a FLUSHALL, along with the entries pending in the
+                # old group. Creating the group again is harmless if it still exists.
+                group_exists = False
+                self.entries_to_ack = []
+                self.num_group_recreations += 1
+                if "NOGROUP" in str(ex):
+                    logger.warning("[ {} ] Consumer group {} of stream {} no longer exists. Creating it again.".format(
+                        datetime.datetime.utcnow(), self.group_name, self.stream_name))
+                    continue
+                self.num_errors += 1
+                logger.error("[ {} ] Error while consuming stream {}: {}".format(datetime.datetime.utcnow(), self.stream_name, ex))
+            except redis.exceptions.ConnectionError as ex:
+                self.num_connection_errors += 1
+                logger.error("[ {} ] ConnectionError while consuming stream {}: {}".format(datetime.datetime.utcnow(), self.stream_name, ex))
+            except Exception as ex:
+                self.num_errors += 1
+                logger.exception(ex)
+            # Back off before trying again, rather than spinning while Redis is unreachable.
+            retry_delay = min(self.max_retry_delay, max(0.1, retry_delay * 2))
+            logger.error("Reading from stream {} again in {} seconds.".format(self.stream_name, retry_delay))
+            time.sleep(retry_delay)
+
+    def _replay_pending(self):
+        """ Replay a batch of the entries delivered to this consumer but never acknowledged. Returns False once there are none left. """
+        entries = self._read("0")
+        if len(entries) == 0:
+            return False
+        # Entries which were deleted from the stream (e.g., trimmed) come back with no fields. They're only acknowledged.
+        deleted = [entry_id for entry_id, fields in entries if not fields]
+        if len(deleted) > 0:
+            self._acknowledge(deleted)
+        entries = [entry for entry in entries if entry[1]]
+        if len(entries) > 0:
+            self.num_replayed += len(entries)
+            logger.info("Replaying {} pending entries from stream {}.".format(len(entries), self.stream_name))
+            self._submit(entries)
+        return True
+
+    def _acknowledge(self, entry_ids):
+        pipe = self.redis_client.pipeline(transaction = False)
+        pipe.xack(self.stream_name, self.group_name, *entry_ids)
+        pipe.xdel(self.stream_name, *entry_ids)
+        pipe.execute()
+
+    def _submit(self, entries):
+        # Wait for the IOLoop to process the batch before reading the next one. This applies backpressure:
+        # unread entries simply remain in the stream (which absorbs bursts) rather than piling up in memory.
+        done = threading.Event()
+        self.loop.add_callback(self._handle_entries, entries, done)
+        done.wait()
+
+        # Acknowledge the whole batch, then delete it. Messages that raised an error are not redelivered; they'd just fail again.
+        entry_ids = [entry_id for entry_id, _ in entries]
+        self.entries_to_ack.extend(entry_ids)
+        self._acknowledge(self.entries_to_ack)
+        self.entries_to_ack = []
+
+    def _handle_entries(self, entries, done):
+        try:
+            messages = []
+            for entry_id, fields in entries:
+                try:
+                    messages.append(ujson.loads(fields[STREAM_DATA_FIELD].decode()))
+                except (KeyError, ValueError) as ex:
+                    self.num_errors += 1
+                    logger.error("Could not deserialize entry {} from stream {}: {}".format(entry_id, self.stream_name, ex))
+            try:
+                self.handler(messages)
+            except Exception as ex:
+                self.num_errors += 1
+                logger.exception(ex)
+            self.num_messages += len(messages)
+            self.num_batches += 1
+        finally:
+            done.set()
@@ -21,6 +21,8 @@ import sys
 import hashlib
 import string
 import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 import redis 
@@ -47,16 +49,24 @@ from tornado import gen
 from tornado.gen import Return
 from tornado.ioloop import IOLoop
 from tornado.tcpclient import TCPClient
-import multiprocessing
-from multiprocessing import Pipe, Process
-import queue 
 
 import dask
 
 import sys, os
 sys.path.insert(0, os.path.abspath('..'))
 from .pathing import Path, PathNode
-from .wukong_metrics import TaskExecutionBreakdown, LambdaExecutionBreakdown
+from .fusion import fuse_tasks
+from .staging import StagedConstants, stage_constants, constant_key, DEFAULT_STAGED_CONSTANT_BYTES
+from .memoization import (MemoCache, compute_fingerprints, needed_tasks, restore_outputs, copy_outputs, FINGERPRINT_KEY, MEMOIZED_OUTPUTS_KEY,
+                          DEFAULT_MEMO_CACHE_BYTES)
+from .job_artifacts import JobArtifactRegistry, DEFAULT_MAX_RETAINED_JOBS
+from .fargate_fleet import FargateFleet, DEFAULT_MAX_CONCURRENCY
+from .fargate_launcher import FargateMembership, FargateLauncher, DEFAULT_POLL_INTERVAL
+from .bulk_loader import BulkLoader, DEFAULT_CONNECTIONS_PER_SHARD, DEFAULT_BATCH_BYTES
+from .wukong_metrics import TaskExecutionBreakdown, LambdaExecutionBreakdown, TASK_RECORD, LAMBDA_RECORD
+from .metrics_table import MetricsTable, drain_metrics_list, DEFAULT_DRAIN_BATCH_SIZE
+from .sharding import RedisShardRing, proxy_worker_for_key
+from .redis_streams import RedisStreamConsumer
 
 from .protocol import dumps
 from .comm.utils import from_frames
@@ -70,7 +80,7 @@ from .comm import (
 from .batched_lambda_invoker import BatchedLambdaInvoker
 from .comm.addressing import address_from_user_args
 from .compatibility import finalize, unicode, Mapping, Set
-from .core import rpc, connect, send_recv, clean_exception, CommClosedError
+from .core import rpc, connect, send_recv, clean_exception, error_message, CommClosedError
 from . import profile
 from .metrics import time
 from .node import ServerNode
@@ -152,6 +162,13 @@ ITERATION_COUNTER_SUFFIX = "---iteration"
 # Appended to the end of a task key to store fargate node metadata in Redis.
 FARGATE_DATA_SUFFIX = "---fargate"
 
+# Appended to the end of a task key to get the Redis key (on the same node as the task's output) counting the downstream tasks
+# that have yet to read the output. Only used when garbage collection of intermediate outputs is enabled.
+CONSUMER_COUNTER_SUFFIX = "---consumers"
+
+# Suffixes of the keys stored on the control-plane shards for each task of a job. These are deleted along with the task's output.
+CONTROL_PLANE_KEY_SUFFIXES = [DEPENDENCY_COUNTER_SUFFIX, PATH_KEY_SUFFIX, ITERATION_COUNTER_SUFFIX, FARGATE_DATA_SUFFIX]
+
 # Leaf Task Lambdas will subscribe to a Redis Pub/Sub channel prefixed by this. The suffix will be the corresponding leaf task key.
 #leaf_task_channel_prefix = "__keyspace@0__:"
 
@@ -170,6 +187,9 @@ DATA_SIZE = "data-size"
 TASK_BREAKDOWNS = "task_breakdowns"
 LAMBDA_DURATIONS = "lambda_durations"
 
+# Maximum number of batches of metrics records drained from each list before control is returned to the IOLoop.
+METRICS_DRAIN_STEP_BATCHES = 4
+
 # Key used to send Redis address to Client objects.
 REDIS_ADDRESS_KEY = "redis-address"
 
@@ -183,6 +203,9 @@ redis_channel_name_prefix = "dask-workers-"
 # The Lambdas are only using one channel now that the Scheduler only gets final results. The channel is hard-coded.
 redis_channel_names.append(redis_channel_name_prefix + "1")
 
+# Messages from AWS Lambda are written to a Redis Stream named after the channel. The Scheduler reads them as part of this consumer group.
+REDIS_STREAM_GROUP_NAME = "wukong-scheduler"
+
 # print("There are {} cores available so we will have {} redis channels.".format(num_cores, num_channels))
 # Create the channel names based on the number of cores available. 
 # for i in range(0, num_channels):
@@ -993,6 +1016,10 @@ class Scheduler(ServerNode):
         #                         'securityGroups': [ 'sg-0f4ea153447b2c910' ], 
         #                         'assignPublicIp': 'ENABLED' } },         
         num_fargate_nodes = DEFAULT_NUM_FARGATE_NODES, # The maximum number of Fargate tasks that can be started. Caps out at 250 for FARGATE_SPOT and 100 for FARGATE.
+        num_fargate_shards = 0,                        # Number of logical storage shards the outputs of a job are placed on. Each is bound to a Fargate node when the job's schedule is built. 0 means one per Fargate node.
+        fargate_min_nodes = 1,                         # Number of Fargate nodes that must have joined the fleet before a job's outputs are placed. Set to 'num_fargate_nodes' to wait for the whole fleet.
+        fargate_launch_timeout = 600,                  # Maximum time (in seconds) a job waits for 'fargate_min_nodes' Fargate nodes to join the fleet.
+        fargate_poll_interval = DEFAULT_POLL_INTERVAL, # Interval (in seconds) at which ECS is polled for new Fargate nodes while the fleet is being launched.
         max_task_fanout = 10,                          # The threshold for when a node will use the proxy to parallelize downstream task invocations.
         chunk_large_tasks = False,                     # Flag indicating whether or not Lambda functions should break up large tasks and store them in chunks.
         big_task_threshold = 200_000_000,              # The threshold, in bytes, above which an object should be broken up into chunks when stored.
@@ -1001,6 +1028,27 @@ class Scheduler(ServerNode):
                                                        # each chunk is size 'big_task_threshold'.
         use_invoker_lambdas_threshold = 10000,
         force_use_invoker_lambdas = False,        
+        invoker_tree_fanout = 0,                       # If >= 2, large launches go through a tree of Invoker Lambdas with this fan-out (rather than chunks of 50).
+        redis_endpoints = None,                        # List of Redis endpoints ("host" or "host:port") across which dependency counters, paths, and small results are sharded.
+        fuse_max_tasks = 0,                            # If >= 2, linear chains of tasks are fused into composite tasks of at most this many tasks. 0 disables fusion.
+        fuse_max_bytes = 64000,                        # Maximum total size (in bytes) of the serialized tasks in a composite task.
+        fuse_max_duration = 1.0,                       # Maximum total estimated duration (in seconds) of the tasks in a composite task.
+        max_retained_jobs = DEFAULT_MAX_RETAINED_JOBS, # Maximum number of jobs whose artifacts (task locations, timings) are retained while their futures are held.
+        collect_garbage = False,                       # If True, intermediate outputs are deleted from Redis once all of their consumers have read them, and a job's remaining keys are deleted once its futures are released.
+        fleet_max_concurrency = DEFAULT_MAX_CONCURRENCY, # Maximum number of Fargate storage nodes contacted at the same time by health checks and maintenance operations.
+        fargate_health_check_interval = 0,             # Interval (in seconds) between background health checks of the Fargate storage nodes. Unhealthy nodes are skipped by placement. 0 disables.
+        metrics_drain_interval = 0,                    # Interval (in seconds) at which the metrics records pushed by the Task Executors are moved out of Redis into the Scheduler's metrics tables. 0 means they're only drained by get_wukong_metrics().
+        metrics_drain_batch_size = DEFAULT_DRAIN_BATCH_SIZE, # Number of metrics records moved out of Redis (and decoded) at a time.
+        background_schedule_upload = False,            # If True, static schedules are uploaded to Redis (and their leaf tasks invoked) in the background, so update_graph() returns once the schedule is built.
+        streaming_schedule = False,                    # If True, static schedules are uploaded in batches while they are being built, and each batch's leaf tasks are invoked as soon as it is stored.
+        streaming_batch_size = 1000,                   # Minimum number of keys (paths, dependency counters, Fargate metadata) per batch when 'streaming_schedule' is set. The first batch is always sent right away.
+        upload_connections_per_shard = DEFAULT_CONNECTIONS_PER_SHARD, # Number of connections over which static schedules are written to each control-plane shard in parallel.
+        upload_batch_bytes = DEFAULT_BATCH_BYTES,      # Maximum size (in bytes) of a single MSET when uploading static schedules.
+        upload_max_batch_latency = 0.05,               # Target time (in seconds) Redis spends on one MSET of a static schedule upload. The batch size adapts to stay under it, so other clients aren't stalled. 0 disables the adaptation.
+        stage_constants_threshold = 0,                 # If > 0, task arguments (and functions) at least this large (in bytes) once serialized are stored in Redis once, under their content hash, and referenced by the task payloads. 0 disables.
+        staged_constants_bytes = DEFAULT_STAGED_CONSTANT_BYTES, # Maximum total size (in bytes) of the staged constants kept in Redis for later jobs. The least recently used ones that no running job references are evicted (and deleted from Redis) first.
+        memoize = False,                               # If True, task outputs are retained in Redis under their fingerprint (a hash of the task and its inputs), and later jobs reuse them instead of executing identical tasks again.
+        memo_cache_bytes = DEFAULT_MEMO_CACHE_BYTES,   # Maximum total size (in bytes) of the outputs retained for memoization. The least recently used are evicted (and deleted from Redis) first.
         **kwargs
     ):
         self._setup_logging()
@@ -1243,6 +1291,10 @@ class Scheduler(ServerNode):
             "register_worker_plugin": self.register_worker_plugin,
             "lambda-result": self.result_from_lambda,
             "get_fargate_info_for_task": self.get_fargate_info_for_task,
+            "get_retained_state": self.get_retained_state,
+            "get_fargate_health": self.get_fargate_health,
+            "get_wukong_metrics_summary": self.get_wukong_metrics_summary,
+            "get_job_timings": self.get_job_timings,
             "task-erred-lambda": self.handle_task_erred_lambda,
             "debug-msg": self.handle_debug_message2
         }
@@ -1302,15 +1354,41 @@ class Scheduler(ServerNode):
         # Count how many times a given task started executing on AWS Lambda (i.e., how many times we got a notification saying it was starting execution).
         self.executing_tasks_counters = defaultdict(int)
 
-        # Contains the start time, end time, and duration of execution of completed tasks (when lambda_debug is enabled).
-        self.completed_task_data = dict()
-
-        self.path_nodes = dict()
-        self.task_payloads = dict()
-
-        # Sometimes Tasks are re-used. In these cases, we put their old payloads and PathNode objects here for safe-keeping.
-        self.old_path_nodes = defaultdict(list)
-        self.old_task_payloads = defaultdict(list)
+        # Per-job artifacts (where each task's output lives, and the start time, end time, and duration of execution of completed tasks).
+        # The static schedule itself (PathNodes, task payloads) is not retained once it has been uploaded. A task's artifacts are dropped
+        # when the task is forgotten, so the memory used by the Scheduler doesn't grow with the number of jobs it has run.
+        self.job_artifacts = JobArtifactRegistry(max_jobs = max_retained_jobs)
+
+        # Garbage collection of the keys stored in Redis. Executors (and the KV Store Proxy) delete an intermediate output once every
+        # downstream task has read it. The keys left over once a job's futures are released are deleted by us, using the job's artifacts
+        # as the index of its keys (so we never have to SCAN), which means back-to-back jobs don't need a global flush.
+        self.collect_garbage = collect_garbage
+        self.keys_to_reclaim = []                   # List of (task key, Fargate node) whose keys will be deleted by the next reclamation.
+        self.reclaim_scheduled = False
+        self.reclaim_clients = dict()               # Mapping of Fargate IP --> Redis client used for reclamation.
+        self.num_reclaimed_keys = 0
+
+        # Health checks and maintenance operations (flushes, stats resets) on the Fargate storage nodes. These contact the nodes
+        # concurrently on a thread pool, so a few unreachable nodes don't stall the Scheduler for one timeout each. The results
+        # are kept in a node-health table, and placement skips the nodes known to be unhealthy.
+        self.fargate_fleet = FargateFleet(max_concurrency = fleet_max_concurrency)
+        self.fargate_health_check_interval = fargate_health_check_interval
+        self.fargate_health_check_futures = None    # Futures of the health check in progress (if any).
+
+        # Metrics records pushed by the Task Executors (to TASK_BREAKDOWNS and LAMBDA_DURATIONS), kept in columnar tables. The records are
+        # drained from Redis in batches, either periodically or when get_wukong_metrics() is called, so memory use stays bounded.
+        self.task_metrics = MetricsTable(TASK_RECORD)
+        self.lambda_metrics = MetricsTable(LAMBDA_RECORD)
+        self.metrics_drain_interval = metrics_drain_interval
+        self.metrics_drain_batch_size = metrics_drain_batch_size
+
+        # Uploads static schedules to Redis in the background (see upload_static_schedule). A single thread, so that jobs are
+        # uploaded (and launched) in the order in which they were submitted.
+        self.background_schedule_upload = background_schedule_upload
+        self.schedule_uploader = ThreadPoolExecutor(max_workers = 1)
+        self.failed_schedule_uploads = set()    # IDs of the streamed jobs whose remaining batches are not uploaded, as an earlier one failed.
+        self.streaming_schedule = streaming_schedule
+        self.streaming_batch_size = streaming_batch_size
 
         self.lambda_debug = lambda_debug
 
@@ -1318,8 +1396,40 @@ class Scheduler(ServerNode):
         self.dcp_redis = redis.StrictRedis(host = proxy_address, port = 6379, db = 0)
         self.dcp_pubsub = self.dcp_redis.pubsub()
 
+        # Dependency counters, paths, Fargate metadata, and small results are sharded across these Redis instances via consistent hashing.
+        # The Redis instance co-located with the KV Store Proxy is used by default (in which case there is exactly one shard). The 
+        # dcp_redis instance is still used for everything that is not associated with a particular task (metrics, scheduler address, etc.).
+        self.redis_endpoints = redis_endpoints or [proxy_address]
+        self.dcp_ring = RedisShardRing(self.redis_endpoints)
+
+        # Uploads static schedules to the shards in size-bounded batches, over several connections per shard.
+        self.bulk_loader = BulkLoader(self.dcp_ring, connections_per_shard = upload_connections_per_shard, batch_bytes = upload_batch_bytes,
+                                      max_batch_latency = upload_max_batch_latency or None)
+
         self.use_invoker_lambdas_threshold = use_invoker_lambdas_threshold
         self.force_use_invoker_lambdas = force_use_invoker_lambdas
+        self.invoker_tree_fanout = invoker_tree_fanout
+
+        # Task fusion. Composite tasks run the tasks absorbed into them on the same Executor, so only their own output is written.
+        self.fuse_max_tasks = fuse_max_tasks
+        self.fuse_max_bytes = fuse_max_bytes
+        self.fuse_max_duration = fuse_max_duration
+        self.fused_tasks = dict()                   # Mapping of composite task key --> list of keys of the tasks absorbed into it.
+
+        # Staging of large constants. They are stored on the control-plane shards once (across jobs) and fetched (and cached) by the Executors.
+        self.stage_constants_threshold = stage_constants_threshold
+        self.staged_constants = StagedConstants(max_bytes = staged_constants_bytes) # The constants stored on the control-plane shards.
+        # Jobs referencing staged constants, until each of their tasks has finished or been forgotten. Their constants aren't evicted.
+        # This is tracked independently of the job artifacts, which may be evicted while the job is still running.
+        self.constant_jobs = dict()                 # Mapping of update_graph ID --> set of unfinished task keys.
+        self.constant_job_of_task = dict()          # Mapping of task key --> update_graph ID of the constant job containing the task.
+
+        # Memoization of task outputs across jobs. The Executors publish the outputs of fingerprinted tasks, which later jobs reuse.
+        self.memoize = memoize
+        self.memo_cache = MemoCache(max_bytes = memo_cache_bytes)
+        self.task_fingerprints = dict()             # Mapping of task key --> fingerprint.
+        self.memoized_tasks = dict()                # Mapping of task key --> Fargate node of the tasks whose output was restored from the cache.
+        self.num_memoized_tasks = 0                 # Number of tasks that were not executed because their output was reused.
 
         # Track info such as how many times each Fargate node has been selected.
         self.fargate_metrics = dict()
@@ -1345,6 +1455,22 @@ class Scheduler(ServerNode):
         self.ecs_cluster_name = ecs_cluster_name
         self.ecs_task_definition = ecs_task_definition
         self.ecs_network_configuration = ecs_network_configuration
+
+        # The Fargate storage fleet is launched in the background. Nodes join the membership table as they become healthy.
+        self.num_fargate_shards = num_fargate_shards
+        self.fargate_min_nodes = fargate_min_nodes
+        self.fargate_launch_timeout = fargate_launch_timeout
+        self.fargate_membership = FargateMembership()
+        self.fargate_membership.add_listener(self.fargate_membership_changed)
+        self.fargate_launcher = FargateLauncher(self.ecs_client, self.ec2_client, self.fargate_membership, 
+                                                cluster = self.ecs_cluster_name, 
+                                                task_definition = self.ecs_task_definition, 
+                                                network_configuration = self.ecs_network_configuration,
+                                                service_name = ECS_SERVICE_NAME, 
+                                                task_group = FARGATE_TASK_GROUP, 
+                                                tags = [{'key': FARGATE_TASK_TAG, 'value': FARGATE_TASK_TAG}],
+                                                poll_interval = fargate_poll_interval, 
+                                                health_check = self.check_new_fargate_nodes)
         self.reuse_lambdas = reuse_lambdas              # Re-use Lambdas between iterations of iterative workloads.
         self.workload_fargate_tasks = defaultdict(list) # For each workload, keep a list of the Fargate tasks created so that they may be closed when we're done.
         self.num_fargate_nodes = num_fargate_nodes
@@ -1357,28 +1483,40 @@ class Scheduler(ServerNode):
         self.num_messages_received_from_lambda = 0      # number of messages we got back from lambda (one message may have multiple results, like results from more than one task)
         #self.lambda_diagnostic = PeriodicCallback(self.print_lambda_diagnostic_info, callback_time = 1000, io_loop = loop)
         #self.periodic_callbacks["lambda-diagnostic"] = self.lambda_diagnostic
-        #self.poll_redis = PeriodicCallback(self.poll_redis_channel, callback_time = 50, io_loop = loop)
-        self.poll_redis = PeriodicCallback(self.consume_redis_queue, callback_time = 5, io_loop = loop)
+        # Consumers reading messages from AWS Lambda off of Redis Streams (one per channel name). Created in start().
+        self.redis_stream_consumers = []
         self.task_execution_lengths = dict()        
         self.use_fargate = use_fargate              # If True, use Fargate cluster for Storage. Otherwise, use single Redis instance (DCP Redis).
         self.redis_channel_index = 0                # used to tell lambdas which redis pub-sub channel to use
         self.start_end_times = dict()               # start and end times for tasks
         self.debug_print = False                    # controls certain prints
-        self.periodic_callbacks["poll-redis"] = self.poll_redis
         self.sum_lambda_lengths = 0                 # running sum of values in lambda_lengths 
         self.lambda_lengths = []                    # execution lengths of lambdas (ENTIRE lambdas, not just the tasks right?)
         self.proxy_port = proxy_port            # Port of the Redix proxy
-        self.num_zero_processed = 0             # number of times a call to consume_redis_queue resulted in the processing of zero messages.
+        self.num_zero_processed = 0             # number of times a call to consume_lambda_messages resulted in the processing of zero messages.
+        self.report_buffer = None               # While a batch of Lambda messages is being processed, reports for clients are buffered here (see consume_lambda_messages).
+        self.batched_recommendations = None     # While a batch of Lambda messages is being processed, the recommendations from completed tasks are merged here.
+        self.num_lambda_batches = 0             # Number of batches of messages handled by consume_lambda_messages.
         self.max_task_fanout = max_task_fanout  # If a task has this many or more downstream tasks, it will use Redis proxy to invoke them.
         self.proxy_comm = None
+
+        # Jobs (calls to update_graph) whose fan-outs are handled by the KV Store Proxy. The proxy keeps state for each such job,
+        # so we tell it when every task of the job has finished (or been released) and it can drop that state.
+        self.proxy_jobs = dict()                    # Mapping of update_graph ID --> {"remaining": set of unfinished task keys, "cancelled": bool}
+        self.proxy_job_of_task = dict()             # Mapping of task key --> update_graph ID of the proxy job containing the task.
+
+        # Redis pub-sub channels on which the KV Store Proxy listens for messages from Task Executors. If the proxy is sharded 
+        # across several worker processes, then 'redis_channel_names_for_proxy_workers' holds the channels of each worker.
+        self.redis_channel_names_for_proxy = []
+        self.redis_channel_names_for_proxy_workers = []
+        self.current_redis_proxy_channel_index = 0
+        self.num_redis_proxy_channels = 0
         self.big_task_threshold = big_task_threshold     # The threshold, in bytes, above which an object should be broken up into chunks when stored.
         self.chunk_large_tasks = chunk_large_tasks # Flag indicating whether or not Lambda functions should break up large tasks and store them in chunks.
         self.num_chunks_for_large_tasks = num_chunks_for_large_tasks
         self.print_debug = print_debug  # Print debug info to console?
         self.print_level = print_level  # Level of debugging
         self.reuse_existing_fargate_tasks_on_startup = reuse_existing_fargate_tasks_on_startup # Reuse existing, already-running Fargate tasks when possible (instead of creating new ones).
-        self.last_job_tasks = list()                # List of task keys/payloads for the last-submitted job.
-        self.last_job_counter = 0                   # How many tasks from last_job_tasks have finished executing.
         self.tasks_to_fargate_nodes = dict()        # Mapping of TaskID --> FargateNode
         self.use_bit_dep_checking = use_bit_dep_checking            # If True, use bit-method of dep counters. If False, use traditional way (incrementing integers).
         self.executors_use_task_queue = executors_use_task_queue, # Large tasks don't write data; instead, they wait for the tasks to become ready to execute locally.
@@ -1437,6 +1575,14 @@ class Scheduler(ServerNode):
             pc = PeriodicCallback(self.check_idle, self.idle_timeout / 4, io_loop=loop)
             self.periodic_callbacks["idle-timeout"] = pc
 
+        if self.fargate_health_check_interval:
+            pc = PeriodicCallback(self.start_fargate_health_check, self.fargate_health_check_interval * 1000, io_loop=loop)
+            self.periodic_callbacks["fargate-health-check"] = pc
+
+        if self.metrics_drain_interval:
+            pc = PeriodicCallback(self.drain_wukong_metrics_step, self.metrics_drain_interval * 1000, io_loop=loop)
+            self.periodic_callbacks["metrics-drain"] = pc
+
         if extensions is None:
             extensions = DEFAULT_EXTENSIONS
         for ext in extensions:
@@ -1574,6 +1720,7 @@ class Scheduler(ServerNode):
                                                            invoker_function_name = self.invoker_function_name,
                                                            use_invoker_lambdas_threshold = self.use_invoker_lambdas_threshold,
                                                            force_use_invoker_lambdas = self.force_use_invoker_lambdas,
+                                                           invoker_tree_fanout = self.invoker_tree_fanout,
                                                            aws_access_key_id = self.aws_access_key_id,
                                                            aws_secret_access_key = self.aws_secret_access_key,
                                                            aws_session_token = self.aws_session_token)
@@ -1585,27 +1732,22 @@ class Scheduler(ServerNode):
         self.dcp_redis.set(address_key, self.address)          
         print("Done.")
 
-        # Create a list to keep track of the processes as well as the Queue object, which we use for communication between the processes.
-        self.redis_polling_processes = []
-        self.redis_polling_queue = multiprocessing.Queue()
-        
-        logger.info("Creating %s redis-polling processes." % (len(redis_channel_names)))
-        print("Creating {} redis-polling processes.".format(len(redis_channel_names)))
-        # For each channel, we create a process and store a reference to it in our list.
+        # Messages from AWS Lambda are published to Redis Streams (one per channel name). We read them as part of a consumer group.
+        logger.info("Creating %s Redis Stream consumers." % (len(redis_channel_names)))
+        print("Creating {} Redis Stream consumers.".format(len(redis_channel_names)))
         for channel_name in redis_channel_names:
-            redis_polling_process = Process(target = self.poll_redis_process, args = (self.redis_polling_queue, channel_name, self.proxy_address))
-            redis_polling_process.daemon = True 
-            self.redis_polling_processes.append(redis_polling_process)
+            consumer = RedisStreamConsumer(self.proxy_address, channel_name, REDIS_STREAM_GROUP_NAME, REDIS_STREAM_GROUP_NAME + "-" + channel_name, 
+                                           self.consume_lambda_messages, loop = self.loop)
+            self.redis_stream_consumers.append(consumer)
 
-        # Start the processes.
-        for redis_polling_process in self.redis_polling_processes:
-            redis_polling_process.start()            
+        for consumer in self.redis_stream_consumers:
+            consumer.start()
             
         self.start_periodic_callbacks()
 
         setproctitle("dask-scheduler [%s]" % (self.address,))
         
-        #payload_for_proxy = {"op": "start", "redis-channel-names": redis_channel_names, "scheduler-address": self.address}
+        #payload_for_proxy = {"op": "start", "redis-channel-names": redis_channel_names, "scheduler-address": self.address, "redis-endpoints": self.dcp_ring.endpoints}
 
         #self.loop.add_callback(self.send_message_to_proxy, payload = payload_for_proxy, start_handling = True)
 
@@ -1660,6 +1802,14 @@ class Scheduler(ServerNode):
             pc.stop()
         self.periodic_callbacks.clear()
 
+        for consumer in self.redis_stream_consumers:
+            consumer.stop()
+
+        self.fargate_launcher.stop()
+        self.fargate_fleet.close()
+        self.schedule_uploader.shutdown(wait = False)
+        self.bulk_loader.close()
+
         self.stop_services()
         for ext in self.extensions:
             with ignoring(AttributeError):
@@ -1781,19 +1931,28 @@ class Scheduler(ServerNode):
         user_priority=0,
         actors=None,
         persist=False,
-        fifo_timeout=0
+        fifo_timeout=0,
+        submission_id=None,
+        submitted_at=None
     ):
         """
         Add new computations to the internal dask graph
 
         This happens whenever the Client calls submit, map, get, or compute.
+
+        The Client is told the job was received (with the job's ID) right away, and the time at which the Client submitted
+        the job is kept along with the job's other milestones (see get_job_timings).
         """
         start = time()
+        received_at = pythontime.time()
         fifo_timeout = parse_timedelta(fifo_timeout)
         keys = set(keys)
         update_graph_id = str(random.randint(0, 9999)) + random.choice(string.ascii_letters).upper() + random.choice(string.ascii_letters).upper()
         self.number_update_graph_calls += 1
         logger.debug("=-=-=-= [SCHEDULER] update_graph() #{} --- ID: {} (Scheduler ID is {}) =-=-=-=".format(self.number_update_graph_calls, update_graph_id, self.scheduler_id))
+        # The schedule is built synchronously, and the client's BatchedSend only sends once the IOLoop is free, so the ack is written directly.
+        if client is not None and submission_id is not None and client in self.client_comms:
+            self.write_to_client(client, {"op": "graph-received", "submission_id": submission_id, "job_id": update_graph_id, "received_at": received_at})
         
         if self.print_debug and persist:
             logger.debug("=== This is a persist operation! ===")
@@ -1808,22 +1967,16 @@ class Scheduler(ServerNode):
                 ["all", client], {"action": "update_graph", "count": len(tasks)}
             )
         
-        fargate_launcher = None 
-        manager = multiprocessing.Manager()
-        fargate_tasks = manager.list()
-
-        if self.use_fargate:        
-            # Check if we need to launch or remove Fargate tasks.
-            if (len(self.workload_fargate_tasks['current']) > self.num_fargate_nodes):
-                # Add all of the Fargate tasks we currently know about to fargate_tasks
-                fargate_tasks.extend(self.workload_fargate_tasks['current'])
-                fargate_launcher = Process(target = self.launch_fargate_nodes, args = [self.num_fargate_nodes, fargate_tasks], kwargs = {"max_retries": 10})
-                fargate_launcher.start()
-            elif  (len(self.workload_fargate_tasks['current']) < self.num_fargate_nodes):
-                self.workload_fargate_tasks['current'].clear()
-                # Add all of the Fargate tasks we currently know about to fargate_tasks
-                fargate_launcher = Process(target = self.launch_fargate_nodes, args = [self.num_fargate_nodes, fargate_tasks], kwargs = {"max_retries": 10})
-                fargate_launcher.start()
+        # Grow (or shrink) the Fargate storage fleet in the background. Nodes join the membership table as they become healthy, and
+        # this job's outputs are placed on logical shards which are bound to the nodes that have joined by the time the schedule is
+        # built (see ShardBinding), so analysing the graph doesn't wait for the fleet.
+        shard_binding = None
+        if self.use_fargate:
+            self.launch_fargate_nodes(self.num_fargate_nodes, wait = False)
+            shard_binding = self.fargate_membership.bind(self.num_fargate_shards or self.num_fargate_nodes,
+                                                         min_nodes = min(self.fargate_min_nodes, self.num_fargate_nodes),
+                                                         timeout = self.fargate_launch_timeout,
+                                                         eligible = partial(self.fargate_fleet.healthy_nodes, endpoint_of = self.fargate_endpoint))
         
         # Remove aliases
         for k in list(tasks):
@@ -1860,6 +2013,15 @@ class Scheduler(ServerNode):
                 deps.remove(k)
             dependencies[k] = deps
 
+        # Reuse the outputs of identical tasks computed by earlier jobs. Those tasks are put in memory before their dependents' counters
+        # are initialized, so the counters start out credited for them, and neither they nor the tasks only they depend on are invoked.
+        memoized_payloads = dict()
+        memoized_copies = []
+        if self.memoize:
+            memoized = self.reuse_memoized_outputs(tasks, dependencies, keys, shard_binding, memoized_payloads, memoized_copies)
+            if memoized:
+                logger.debug("[SCHEDULER] Reusing the memoized outputs of {} tasks.".format(len(memoized)))
+
         # Avoid computation that is already finished
         already_in_memory = set()  # tasks that are already done
         for k, v in dependencies.items():
@@ -1894,6 +2056,38 @@ class Scheduler(ServerNode):
                 tasks.pop(d, None)
                 dependencies.pop(d, None)
 
+        # Fuse linear chains of tasks into composite tasks, so that each chain is executed by a single Executor (and becomes a single
+        # PathNode) without writing the intermediate results. Tasks with restrictions, actors, and tasks we already know about are left alone.
+        if self.fuse_max_tasks >= 2:
+            unfusible = set(restrictions or ()) | set(loose_restrictions or ()) | set(resources or ())
+            if actors is True:
+                unfusible.update(tasks)
+            elif actors:
+                unfusible.update(actors)
+            fused = fuse_tasks(tasks, dependencies, keys, max_tasks = self.fuse_max_tasks, max_bytes = self.fuse_max_bytes,
+                               max_duration = self.fuse_max_duration,
+                               estimate_duration = lambda k: self.task_duration.get(key_split(k), 0),
+                               can_fuse = lambda k: k not in unfusible and k not in self.tasks)
+            self.fused_tasks.update(fused)
+            for absorbed_key in itertools.chain.from_iterable(fused.values()):
+                self.task_fingerprints.pop(absorbed_key, None)
+            if fused:
+                logger.debug("[SCHEDULER] Fused {} tasks into {} composite tasks.".format(sum(len(absorbed) for absorbed in fused.values()), len(fused)))
+
+        # Replace the large constants embedded in the tasks by references to their content hashes, so that each one is serialized into
+        # the paths (and leaf payloads) as a short reference and stored in Redis only once. Constants stored for an earlier job are reused.
+        # The others are uploaded with the job's static schedule, and only recorded as stored once the upload has succeeded.
+        new_constants = dict()
+        constants = dict()
+        if self.stage_constants_threshold > 0:
+            constants = stage_constants(tasks, self.stage_constants_threshold)
+            for digest, value in constants.items():
+                if not self.staged_constants.use(digest, update_graph_id):
+                    new_constants[digest] = value
+            if constants:
+                logger.debug("[SCHEDULER] Staged {} constants ({} new, {:,} bytes).".format(len(constants), len(new_constants),
+                             sum(len(value) for value in new_constants.values())))
+
         # Get or create task states
         stack = list(keys)
         touched_keys = set()
@@ -2053,8 +2247,11 @@ class Scheduler(ServerNode):
         # We will use a pipeline to store all of the payloads in a bulk, batch operation. This should be faster than doing them one-at-a-time.
         # task_payload_pipeline = self.redis_client.pipeline()
 
-        # We pass this to mset for one big initial payload.
-        initial_payloads = defaultdict(dict)
+        # We pass this to the shard ring for one big initial payload (one pipelined MSET per shard). The new staged constants go
+        # first, so that they're stored before any of the job's leaf tasks are invoked.
+        initial_payloads = {constant_key(digest): value for digest, value in new_constants.items()}
+        new_constant_sizes = {digest: len(value) for digest, value in new_constants.items()}
+        initial_payloads.update(memoized_payloads)
 
         # List of sizes of all tasks. This is so we can attempt to compute the average size of tasks. 
         task_sizes = []
@@ -2076,14 +2273,25 @@ class Scheduler(ServerNode):
         
         tasks_to_serialized_path_node = dict()
 
+        # With 'streaming_schedule', the tasks visited, paths started and leaves processed since the last batch was uploaded.
+        streamed_tasks = []
+        streamed_path_starts = []
+        streamed_leaves = []
+        num_streamed_batches = 0
+        streamed_proxy_fanouts = False
+
         serialized_tasks = dict()
 
         # Used just for diagnostics. We print out the largest fanout for the current workload.
         largest_fanout = 0
         largest_fanout_task_key = ""
 
-        self.last_job_counter = 0
-        self.last_job_tasks.clear() 
+        job_artifacts = self.job_artifacts.create(update_graph_id, requested_keys = keys)
+        if constants:
+            self.track_constant_job(update_graph_id, [k for k in tasks if k in self.tasks and self.tasks[k].state not in ("memory", "erred")])
+        job_artifacts.record_timing("received", received_at)
+        if submitted_at is not None:
+            job_artifacts.record_timing("submitted", submitted_at)
         
         #print("\nTasks contained in parameter Tasks:")
         #for tsk in tasks:
@@ -2157,6 +2365,12 @@ class Scheduler(ServerNode):
         for k,c in self.completed_task_counts.items():
             sum_tasks = sum_tasks + c
         
+        # Estimate the length of the longest chain of work downstream of each task (the "critical path" starting there). Leaves with
+        # the most downstream work are launched first, and each task's "invoke" list is ordered the same way, so that the Task Executors
+        # and the KV Store Proxy start the most important downstream tasks first when the rate at which we can invoke Lambdas is limited.
+        critical_path_lengths = self.compute_critical_path_lengths(leaf_tasks.values())
+        leaf_tasks = dict(sorted(leaf_tasks.items(), key = lambda item: critical_path_lengths[item[0]], reverse = True))
+
         if self.debug_mode or (self.print_debug and self.print_level <= 2):
             logger.debug("num_leaf_tasks =", len(leaf_tasks))        
             logger.debug("Number of tasks executed so far:", sum_tasks)
@@ -2226,6 +2440,8 @@ class Scheduler(ServerNode):
             nonlocal largest_fanout_task_key
 
             visited[current_task.key] = True
+            if self.streaming_schedule:
+                streamed_tasks.append(current_task.key)
 
             # We may have already executed this task in a previous job.
             already_executed = False #(current_task.key in self.tasks and current_task.state == "memory")
@@ -2279,10 +2495,8 @@ class Scheduler(ServerNode):
                     
                     dep_index_map[dts.key] = idx
 
-            # Put the payload in the "master list (dict)" of task payloads. 
-            # Presently we don't do anything with this master list though...
+            # Put the payload in the "master list (dict)" of task payloads for this job.
             task_payloads[current_task.key] = payload
-            self.task_payloads[current_task.key] = payload 
 
             # Serialize the entire payload using Dask serialization.
             serialized_payload = list(dumps(payload))
@@ -2304,8 +2518,8 @@ class Scheduler(ServerNode):
                 # If we're re-using a task from a previous computation, then we've already 
                 # mapped its data somewhere. We would like to reuse the data/mapping.
                 if current_task.key not in self.tasks_to_fargate_nodes:
-                    # (Pseudo-)randomly select a Fargate task to map to the current PathNode (which we're about to create).
-                    fargate_task_for_node = random.choice(self.workload_fargate_tasks['current'])
+                    # Place the output on the Fargate node its logical shard is bound to (among those not known to be unhealthy).
+                    fargate_task_for_node = shard_binding.node_for_key(current_task.key)
                 else:
                     if self.print_debug and self.print_level <= 1:
                         logger.debug("\tReusing existing Fargate mapping for task {}".format(current_task.key))
@@ -2314,7 +2528,7 @@ class Scheduler(ServerNode):
             
                 # Increment our internal record of how many times we've selected this Fargate node in a workload.
                 fargate_task_ARN = fargate_task_for_node[FARGATE_ARN_KEY]
-                self.fargate_metrics[fargate_task_ARN][FARGATE_NUM_SELECTED] += 1
+                self.fargate_metrics.setdefault(fargate_task_ARN, {FARGATE_NUM_SELECTED: 0})[FARGATE_NUM_SELECTED] += 1
 
                 # Store the mapping.
                 self.tasks_to_fargate_nodes[current_task.key] = fargate_task_for_node
@@ -2333,7 +2547,7 @@ class Scheduler(ServerNode):
                                          starts_at = None) # Value for starts_at will be updated later...
             
             # We're gonna store this PathNode in Redis.
-            # initial_payloads[self.dcp_redis][current_task.key] = current_path_node
+            # initial_payloads[current_task.key] = current_path_node
 
             #if current_task.key in self.path_nodes:
             #    old_path_node = self.path_nodes[current_task.key]
@@ -2351,10 +2565,8 @@ class Scheduler(ServerNode):
                 #     print("\tTask {} has NOT been completed, NOR has it been executed...\n")                
                 #     #pythontime.sleep(5)
 
-            # Record the PathNode in our local dictionary of TASK_KEY --> PathNode.
-            self.path_nodes[current_task.key] = current_path_node
-
-            self.last_job_tasks.append((current_path_node, payload))
+            # Record where the task's output will live. The PathNode itself is released once the static schedule has been uploaded.
+            self.job_artifacts.add_task(job_artifacts, current_task.key, fargate_task_for_node, len(payload["dependencies"]))
 
             tasks_to_path_nodes[current_task.key][current_path.id] = current_path_node
             
@@ -2363,6 +2575,8 @@ class Scheduler(ServerNode):
                 if self.print_debug and self.print_level <= 1:
                     logger.debug("[NEW PATH] Task {} is the first node in a new path.".format(current_task.key))
                 tasks_to_path_starts[current_task.key] = current_path
+                if self.streaming_schedule:
+                    streamed_path_starts.append(current_task.key)
 
             # Add the new path node to the current path. We should do this AFTER the previous step (where we
             # attempted to update the previous node) as it makes it easier to correctly update the "previous"
@@ -2397,7 +2611,7 @@ class Scheduler(ServerNode):
                         if self.print_debug:
                             logger.debug("Dependency {} of task {} is in state {}. Cannot consider it done.".format(dts.key, current_task.key, self.tasks[dts.key].state))
 
-                initial_payloads[self.dcp_redis][redis_dep_counter_key] = initial_dep_value
+                initial_payloads[redis_dep_counter_key] = initial_dep_value
 
             # If there are no downstream tasks from this node, then just pass.
             if payload["num-dependencies-of-dependents"] == 0:
@@ -2536,6 +2750,8 @@ class Scheduler(ServerNode):
 
                                 # The dependent task is now the start of a new path, so update its entry in tasks_to_path_starts.
                                 tasks_to_path_starts[dependent_task_path_node.get_task_key()] = new_path
+                                if self.streaming_schedule:
+                                    streamed_path_starts.append(dependent_task_path_node.get_task_key())
                                 
                                 if self.use_fargate:
                                     # Add the current path node's fargate node to the new path's mapping. The new path may need to
@@ -2578,6 +2794,8 @@ class Scheduler(ServerNode):
                     current_path_node.use_proxy = True
             # Serialize this node. This check is redundant/unnecessary?
             if current_task.key not in tasks_to_serialized_path_node:
+                # Invoke the downstream tasks with the most downstream work first.
+                current_path_node.invoke.sort(key = lambda invoke_key: critical_path_lengths.get(invoke_key, 0), reverse = True)
                 # Temporarily remove the Path reference before we serialize as we don't want to serialize the path reference.
                 current_path_node.starts_at = current_path.get_start().task_key
                 current_path_node.path = None 
@@ -2586,28 +2804,98 @@ class Scheduler(ServerNode):
                 current_path_node.path = current_path
             return current_path_node
         
-        # If we created a process to launch Fargate tasks, then we need to wait for it to finish before we begin invoking Lambdas.
-        if self.use_fargate and fargate_launcher is not None:
-            logger.debug("Scheduler is waiting for FARGATE LAUNCHER progress to finish...")
-            fargate_launcher.join()
-            logger.debug("Fargate-launching process has finished.")
-            #print("fargate_tasks:", fargate_tasks)
-            for fargate_task in fargate_tasks:
-                #print("Is fargate_task {} in self.workload_fargate_tasks['current']?".format(fargate_task))
-                if not fargate_task in self.workload_fargate_tasks['current']:
-                    #print("It is not! Adding it now.")
-                    self.workload_fargate_tasks['current'].append(fargate_task)
-                taskArn = fargate_task[FARGATE_ARN_KEY]
-                if taskArn not in self.fargate_metrics:
-                    #print("Creating entry in fargate_metrics for Fargate task {}.".format(taskArn))
-                    self.fargate_metrics[taskArn] = {
-                        FARGATE_NUM_SELECTED: 0
-                    }
-            #self.workload_fargate_tasks['current'].extend(fargate_tasks)
-            
-            #for _task in tasks_removed:
-            #    self.workload_fargate_tasks['current'].remove(_task)
-            
+        encoded_nodes = {}
+
+        def serialize_paths(path_starts, serialized_paths, payloads, proxy_index, proxy_priorities):
+            """ Serialize the paths starting at the given tasks, adding each one to 'serialized_paths' (task key --> payload) and 'payloads'
+                (path key --> payload). The nodes whose fan-out is handled by the KV Store Proxy are added to 'proxy_index' and their
+                downstream tasks to 'proxy_priorities'. """
+            if type(self.executors_use_task_queue) is tuple:
+                self.executors_use_task_queue = self.executors_use_task_queue[0]
+            for task_key in path_starts:
+                path = tasks_to_path_starts[task_key]
+                nodes = {}
+                starting_node_key = path.get_start().task_key
+
+                # Store each node in the dictionary under its associated task key. We encode the bytes-form of the nodes so we can send it to Lambda (can't send bytes directly).
+                for node in path.tasks:
+                    if node.use_proxy:
+                        proxy_index[node.task_key] = task_key
+                        for invoke_key in node.invoke:
+                            proxy_priorities[invoke_key] = critical_path_lengths.get(invoke_key, 0)
+                    if node.task_key in encoded_nodes:
+                        nodes[node.task_key] = encoded_nodes[node.task_key]
+                    else:
+                        encoded = base64.encodestring(tasks_to_serialized_path_node[node.task_key]).decode(ENCODING)
+                        nodes[node.task_key] = encoded
+                        encoded_nodes[node.task_key] = encoded
+                    for invoke_node_key in node.invoke:
+                        if invoke_node_key in encoded_nodes:
+                            nodes[invoke_node_key] = encoded_nodes[invoke_node_key]
+                        else:
+                            encoded = base64.encodestring(tasks_to_serialized_path_node[invoke_node_key]).decode(ENCODING)
+                            nodes[invoke_node_key] = encoded
+                            encoded_nodes[invoke_node_key] = encoded                    
+                payload = {
+                    "nodes-map": nodes, 
+                    "lambda-debug": self.lambda_debug, 
+                    "use-bit-counters": self.use_bit_dep_checking, 
+                    EXECUTOR_TASK_QUEUE_KEY: self.executors_use_task_queue, 
+                    "starting-node-key": starting_node_key, 
+                    "use-fargate": self.use_fargate,
+                    "executor_function_name": self.executor_function_name,
+                    "invoker_function_name": self.invoker_function_name,
+                    "proxy_address": self.proxy_address,
+                    "redis-endpoints": self.dcp_ring.endpoints,
+                    TASK_TO_FARGATE_MAPPING: path.tasks_to_fargate_nodes,
+                    # If self.reuse_lambdas is False, then we don't care if this is a leaf task or not.
+                    # We're not going to use it no matter what, so we may as well treat it like its not.
+                    "is-leaf": leaf_tasks.get(task_key, False) and self.reuse_lambdas 
+                }
+                serialized_payload = ujson.dumps(payload)
+                serialized_paths[task_key] = serialized_payload
+                path_key = task_key + PATH_KEY_SUFFIX
+                if self.print_debug and self.print_level <= 1:
+                    logger.debug("\nPath - {}".format(task_key))
+                    logger.debug("\tLength of Path:", len(nodes), "tasks")
+                    path_size = sys.getsizeof(serialized_payload)
+                    logger.debug("\tSize of Path:", path_size, "bytes")
+                    path_sizes.append(path_size)
+                payloads[path_key] = serialized_payload  
+
+        def stream_static_schedule(final = False):
+            """ Upload the part of the static schedule built since the last batch, then invoke the leaf tasks whose DFS produced it.
+
+                Every path, dependency counter and Fargate mapping an Executor of these leaves may read before it needs the output of a
+                later leaf is in this batch or an earlier one: a task depending on a later leaf can't run until that leaf has been
+                invoked, which happens after the leaf's own batch is stored. The only thing later leaves change in existing paths is
+                their task --> Fargate node mappings, which Executors fall back to reading from the tasks' Fargate metadata. Batches
+                are uploaded (and their leaves invoked) in order on the schedule uploader's thread, so the IOLoop keeps building the
+                schedule in the meantime. """
+            nonlocal initial_payloads, num_streamed_batches, streamed_proxy_fanouts
+            batch_paths = dict()
+            batch_proxy_index = dict()
+            batch_proxy_priorities = dict()
+            serialize_paths(streamed_path_starts, batch_paths, initial_payloads, batch_proxy_index, batch_proxy_priorities)
+            if self.use_fargate:
+                for task_key in streamed_tasks:
+                    initial_payloads[task_key + FARGATE_DATA_SUFFIX] = ujson.dumps(self.tasks_to_fargate_nodes[task_key])
+            batch_leaf_tasks = {leaf_task_key: leaf_tasks[leaf_task_key] for leaf_task_key in streamed_leaves}
+            # The proxy job is tracked once the whole schedule has been built (see below), so no task keys are passed here.
+            launch = partial(self.invoke_leaf_tasks, update_graph_id, batch_paths, batch_leaf_tasks, batch_proxy_index, batch_proxy_priorities,
+                             None, max_path_size_bytes, immediate = True)
+            # The memoized outputs are copied (and the new constants stored) with the first batch, before any task can read them.
+            self.schedule_uploader.submit(self.upload_static_schedule, update_graph_id, initial_payloads, launch,
+                                          milestone = "uploaded" if final else None, task_keys = tasks,
+                                          output_copies = memoized_copies if num_streamed_batches == 0 else (),
+                                          constants = new_constant_sizes if num_streamed_batches == 0 else None)
+            streamed_proxy_fanouts = streamed_proxy_fanouts or len(batch_proxy_index) > 0
+            num_streamed_batches += 1
+            initial_payloads = dict()
+            del streamed_tasks[:]
+            del streamed_path_starts[:]
+            del streamed_leaves[:]
+
         visited = dict()
         metrics = dict()
         DFS_start = pythontime.time()
@@ -2633,6 +2921,13 @@ class Scheduler(ServerNode):
             if self.print_debug and self.print_level <= 2:
                 logger.debug("Performing DFS for leaf task {}.".format(leaf_task_key))
             DFS(leaf_task_state, new_path, current_path_size, visited, isNewPath = False, incrDepCounter = False)
+
+            if self.streaming_schedule:
+                streamed_path_starts.append(leaf_task_key)
+                streamed_leaves.append(leaf_task_key)
+                # The first leaf is sent on its own, so that it starts as soon as possible regardless of the size of the graph.
+                if num_streamed_batches == 0 or len(initial_payloads) + len(streamed_path_starts) >= self.streaming_batch_size:
+                    stream_static_schedule()
         
         DFS_end = pythontime.time()
         
@@ -2664,62 +2959,12 @@ class Scheduler(ServerNode):
 
         _serialization_start = pythontime.time()
 
-        # Serialize all of the paths and store them in Redis.
+        # Serialize all of the paths and store them in Redis. With 'streaming_schedule', they have been uploaded already.
         serialized_paths = {}
-        path_counter = 1
-        encoded_nodes = {}
-        for task_key, path in tasks_to_path_starts.items():
-            nodes = {}
-            starting_node_key = path.get_start().task_key
-
-            # Store each node in the dictionary under its associated task key. We encode the bytes-form of the nodes so we can send it to Lambda (can't send bytes directly).
-            for node in path.tasks:
-                if node.task_key in encoded_nodes:
-                    nodes[node.task_key] = encoded_nodes[node.task_key]
-                else:
-                    encoded = base64.encodestring(tasks_to_serialized_path_node[node.task_key]).decode(ENCODING)
-                    nodes[node.task_key] = encoded
-                    encoded_nodes[node.task_key] = encoded
-                for invoke_node_key in node.invoke:
-                    if invoke_node_key in encoded_nodes:
-                        nodes[invoke_node_key] = encoded_nodes[invoke_node_key]
-                    else:
-                        encoded = base64.encodestring(tasks_to_serialized_path_node[invoke_node_key]).decode(ENCODING)
-                        nodes[invoke_node_key] = encoded
-                        encoded_nodes[invoke_node_key] = encoded                    
-            if type(self.executors_use_task_queue) is tuple:
-                self.executors_use_task_queue = self.executors_use_task_queue[0]
-            payload = {
-                "nodes-map": nodes, 
-                "lambda-debug": self.lambda_debug, 
-                "use-bit-counters": self.use_bit_dep_checking, 
-                EXECUTOR_TASK_QUEUE_KEY: self.executors_use_task_queue, 
-                "starting-node-key": starting_node_key, 
-                "use-fargate": self.use_fargate,
-                "executor_function_name": self.executor_function_name,
-                "invoker_function_name": self.invoker_function_name,
-                "proxy_address": self.proxy_address,
-                TASK_TO_FARGATE_MAPPING: path.tasks_to_fargate_nodes,
-                # If self.reuse_lambdas is False, then we don't care if this is a leaf task or not.
-                # We're not going to use it no matter what, so we may as well treat it like its not.
-                "is-leaf": leaf_tasks.get(task_key, False) and self.reuse_lambdas 
-            }
-            serialized_payload = ujson.dumps(payload)
-            serialized_paths[task_key] = serialized_payload
-            #if self.print_debug:
-            #    host = self.big_hash_ring.get_node_hostname(task_key)
-            #    port = self.big_hash_ring.get_node_port(task_key)
-            #    print("Path beginning at task {} will be stored in Redis instance listening at {}:{}".format(task_key, host, port))
-            path_key = task_key + PATH_KEY_SUFFIX
-            if self.print_debug and self.print_level <= 1:
-                logger.debug("\nPath #{} - {}".format(path_counter, task_key))
-                logger.debug("\tLength of Path:", len(nodes), "tasks")
-                path_size = sys.getsizeof(serialized_payload)
-                logger.debug("\tSize of Path:", path_size, "bytes")
-                path_sizes.append(path_size)
-            #associated_redis_client = self.big_hash_ring.get_node_instance(task_key)
-            initial_payloads[self.dcp_redis][path_key] = serialized_payload  
-            path_counter += 1
+        proxy_index = {}        # Map of task key --> key of the path containing it, for the nodes whose fan-out is handled by the KV Store Proxy.
+        proxy_priorities = {}   # Map of task key --> critical path length, for the downstream tasks of the nodes in proxy_index.
+        if not self.streaming_schedule:
+            serialize_paths(tasks_to_path_starts, serialized_paths, initial_payloads, proxy_index, proxy_priorities)
             
         _serialization_done = pythontime.time()
         _serialization_length = _serialization_done - _serialization_start
@@ -2734,24 +2979,212 @@ class Scheduler(ServerNode):
         
         _store_paths_redis_start = pythontime.time()
 
-        if self.use_fargate:
+        if self.use_fargate and not self.streaming_schedule:
         # Add metadata to payload.
             # TODO: Optimize this process; fix any and all issues with using DFS exclusively for fargate data.
             for task_key, fargate_dict in self.tasks_to_fargate_nodes.items():
                 fargate_metadata_key = task_key + FARGATE_DATA_SUFFIX
-                initial_payloads[self.dcp_redis][fargate_metadata_key] = ujson.dumps(fargate_dict)
-
-        # Store everything.
-        for client, payload in initial_payloads.items():
-            if len(payload) > 0:
-                client.mset(payload)
+                initial_payloads[fargate_metadata_key] = ujson.dumps(fargate_dict)
+
+        job_artifacts.record_timing("schedule-built")
+
+        # Store everything, then invoke the leaf tasks. With 'background_schedule_upload', the static schedule is uploaded on a
+        # background thread (one job at a time, in submission order) and the leaf tasks are invoked once it has been stored, so
+        # the Scheduler can go on building the next job's schedule and processing results while the upload is in progress.
+        # With 'streaming_schedule', most of the schedule has been uploaded (and its leaf tasks invoked) while it was being built.
+        if self.streaming_schedule:
+            stream_static_schedule(final = True)
+            if streamed_proxy_fanouts:
+                self.track_proxy_job(update_graph_id, [k for k in tasks if k in self.tasks and self.tasks[k].state not in ("memory", "erred")])
+        else:
+            task_keys = list(tasks)
+            launch = partial(self.invoke_leaf_tasks, update_graph_id, serialized_paths, leaf_tasks, proxy_index, proxy_priorities,
+                             task_keys, max_path_size_bytes)
+            if self.background_schedule_upload:
+                self.schedule_uploader.submit(self.upload_static_schedule, update_graph_id, initial_payloads, partial(self.loop.add_callback, launch),
+                                              task_keys = task_keys, output_copies = memoized_copies, constants = new_constant_sizes)
+            else:
+                self.upload_static_schedule(update_graph_id, initial_payloads, launch, task_keys = task_keys, output_copies = memoized_copies,
+                                            constants = new_constant_sizes)
 
         _store_paths_redis_stop = pythontime.time()
         _store_paths_redis_length = _store_paths_redis_stop - _store_paths_redis_start
 
         metrics["Store-Paths-Redis"] = _store_paths_redis_length
 
-        logger.debug("Done storing paths in Redis. Invoking Lambdas now.")
+        logger.debug("[INFO] Largest Fanout: Task {} with a fanout factor of {}!".format(largest_fanout_task_key, largest_fanout))
+        if (self.print_debug and self.print_level <= 1):
+            # Avoid ZeroDivisionErrors by checking length of arrays before attempting to divide by said lengths. That being said,
+            # these lengths should almost always be non-zero.
+            if len(task_sizes) != 0:
+                logger.debug("[INFO] Average task size: {} bytes.".format(sum(task_sizes) / len(task_sizes)))
+            else:
+                # Print some sort of warning since zero tasks may indicate an error...
+                logger.debug("[WARNING] There were no tasks. Average task size in bytes: N/A.")
+            if len(path_sizes) != 0:
+                logger.debug("[INFO] Average path size: {} bytes.".format(sum(path_sizes) / len(path_sizes)))
+            else:
+                # Print some sort of warning since zero tasks may indicate an error...
+                logger.debug("[WARNING] There were no paths. Average path size in bytes: N/A.")
+
+        # TO-DO: 
+        # - Serialize each path.
+        # - Store necessary path in Redis.
+        #       - Will probably just iterate through the tasks that serve as a starting node for paths and store those in Redis...
+        #       - Store payload/path under <task key> + "---payload" or <task key> + "---path".
+        # - Invoke each leaf task, sending the associated path as its payload.
+
+        #print("[ {} ] Scheduler - INFO: Invoked {} leaf tasks.".format(datetime.datetime.utcnow(), len(immediately_invocable_task_payloads)))
+
+        # Transition everything to processing.
+        for tk, ts in self.tasks.items():
+            self.transition_waiting_processing_lambda(tk)
+        
+        #self.transitions(recommendations)
+
+        for ts in touched_tasks:
+            if ts.state in ("memory", "erred"):
+                self.report_on_key(ts.key, client=client)
+
+        end = pythontime.time()
+        if self.digests is not None:
+            self.digests["update-graph-duration"].add(end - start)
+        _now = datetime.datetime.utcnow()
+        logger.debug("Number of Tasks: %d" % len(tasks))
+        logger.debug("Number of Leaf Tasks: %d" % len(leaf_tasks))        
+        logger.debug("Update graph duration was {} seconds.".format(end - start))
+        for _label,_length in metrics.items():
+            logger.debug("{} took {} seconds...".format(_label, _length))
+        # TODO: balance workers
+
+    def upload_static_schedule(self, update_graph_id, initial_payloads, launch, milestone = "uploaded", task_keys = (), output_copies = (),
+                               constants = None):
+        """ Store a job's static schedule (paths, dependency counters, Fargate metadata) in Redis, then call 'launch' to invoke its leaf tasks.
+            The memoized outputs the job reuses from other Redis instances ('output_copies', see restore_outputs) are copied first.
+            The new staged constants among 'initial_payloads' ('constants', a mapping of hash --> size in bytes) are recorded as stored
+            once the upload has succeeded.
+
+            Runs on the schedule uploader's thread if 'background_schedule_upload' is set, in which case 'launch' schedules the
+            invocation on the IOLoop. With 'streaming_schedule', this is called for each batch of the schedule, and only the last
+            batch records the 'milestone' of the job.
+
+            If the upload fails, the job isn't launched. When running on the IOLoop, the error is raised. Otherwise, the tasks of
+            the job ('task_keys') are marked as erred (see fail_static_schedule) and the job's remaining batches are skipped. Either
+            way, the memoized outputs that couldn't be copied are discarded (see discard_memoized_outputs). """
+        background = self.streaming_schedule or self.background_schedule_upload
+        if update_graph_id in self.failed_schedule_uploads:
+            if milestone is not None:
+                self.failed_schedule_uploads.discard(update_graph_id)
+            return
+        upload_stats = None
+        lost_outputs = ()
+        try:
+            if len(output_copies) > 0:
+                lost_outputs = copy_outputs(output_copies)
+                if len(lost_outputs) > 0:
+                    raise RuntimeError("Failed to copy the memoized outputs of {} tasks.".format(len(lost_outputs)))
+            if len(initial_payloads) > 0:
+                upload_stats = self.bulk_loader.load(initial_payloads)
+        except Exception as ex:
+            logger.error("Failed to store the static schedule of job {} in Redis: {}".format(update_graph_id, ex))
+            if not background:
+                self.discard_memoized_outputs(lost_outputs)
+                raise
+            if len(lost_outputs) > 0:
+                self.loop.add_callback(self.discard_memoized_outputs, lost_outputs)
+            if milestone is None:
+                self.failed_schedule_uploads.add(update_graph_id)
+            self.loop.add_callback(self.fail_static_schedule, update_graph_id, list(task_keys), error_message(ex))
+            return
+        if constants:
+            if background:
+                self.loop.add_callback(self.record_staged_constants, update_graph_id, constants)
+            else:
+                self.record_staged_constants(update_graph_id, constants)
+        job = self.job_artifacts.jobs.get(update_graph_id, None)
+        if job is not None:
+            if upload_stats is not None:
+                job.record_upload(upload_stats)
+            if milestone is not None:
+                job.record_timing(milestone)
+        logger.debug("Done storing paths of job {} in Redis. Invoking Lambdas now.".format(update_graph_id))
+        launch()
+
+    def record_staged_constants(self, update_graph_id, constants):
+        """ Record that the given job has stored the given constants (a mapping of hash --> size in bytes) on the control-plane shards, so
+            later jobs reuse them. If the staged constants now take up too much space, the least recently used ones that no running job
+            references are deleted.
+
+            The deletion is ordered with the uploads of the static schedules: it goes through the schedule uploader if the schedules are
+            uploaded in the background, and happens right away otherwise. A later job storing one of the deleted constants again (as it is no
+            longer recorded as stored) thus always stores it after it has been deleted. """
+        for digest, nbytes in constants.items():
+            self.staged_constants.add(digest, nbytes, update_graph_id)
+        evicted = self.staged_constants.evict(lambda job_id: job_id in self.constant_jobs)
+        if len(evicted) > 0:
+            logger.debug("[SCHEDULER] Deleting {} staged constants ({:,} bytes retained).".format(len(evicted), self.staged_constants.num_bytes))
+            released = [(constant_key(digest), None) for digest in evicted]
+            if self.streaming_schedule or self.background_schedule_upload:
+                self.schedule_uploader.submit(self.unlink_task_keys, released)
+            else:
+                self.unlink_task_keys(released)
+
+    def track_constant_job(self, job_id, task_keys):
+        """ Record that a job references staged constants, until each of the given tasks has finished or been forgotten. """
+        self.constant_jobs[job_id] = set()
+        for key in task_keys:
+            # If the task was part of an earlier job that hasn't finished, it now belongs to this job instead.
+            if key in self.constant_job_of_task:
+                self.constant_job_task_finished(key)
+            self.constant_jobs[job_id].add(key)
+            self.constant_job_of_task[key] = job_id
+        if len(self.constant_jobs[job_id]) == 0:
+            del self.constant_jobs[job_id]
+
+    def constant_job_task_finished(self, key):
+        """ Record that a task of a job referencing staged constants finished (or was forgotten). Once they all have, the job's
+            constants may be evicted. """
+        job_id = self.constant_job_of_task.pop(key)
+        remaining = self.constant_jobs.get(job_id, None)
+        if remaining is None:
+            return
+        remaining.discard(key)
+        if len(remaining) == 0:
+            del self.constant_jobs[job_id]
+
+    def discard_memoized_outputs(self, task_keys):
+        """ Undo the reuse of memoized outputs that couldn't be copied under the keys of the tasks reusing them: their cache entries
+            are dropped, and the tasks are released so that later jobs compute them again. """
+        for task_key in task_keys:
+            fingerprint = self.task_fingerprints.get(task_key, None)
+            if fingerprint is not None:
+                self.memo_cache.discard(fingerprint)
+            self.memoized_tasks.pop(task_key, None)
+            ts = self.tasks.get(task_key, None)
+            if ts is not None and ts.state == "memory":
+                ts.state = "released"
+
+    def fail_static_schedule(self, update_graph_id, task_keys, error):
+        """ Mark the tasks of a job whose static schedule couldn't be stored in Redis as erred, reporting 'error' (see
+            error_message) to the clients waiting on them. The upload isn't retried, so neither are the tasks. """
+        logger.error("Marking the {} tasks of job {} as erred, as its static schedule could not be stored.".format(len(task_keys), update_graph_id))
+        for key in task_keys:
+            ts = self.tasks.get(key, None)
+            if ts is None or ts.state != "processing":
+                continue
+            recommendations = self.transition(key, "erred", cause = key, exception = error["exception"], traceback = error["traceback"], worker = None)
+            self.transitions(recommendations)
+
+    def invoke_leaf_tasks(self, update_graph_id, serialized_paths, leaf_tasks, proxy_index, proxy_priorities, task_keys, max_path_size_bytes,
+                          immediate = False):
+        """ Hand a job's fan-out index to the KV Store Proxy and invoke its leaf tasks. Called once the job's static schedule is stored in Redis.
+
+            The job is tracked as a proxy job if any of its fan-outs are handled by the proxy, unless 'task_keys' is None (in which case the
+            caller tracks it). If 'immediate' is set, the leaf tasks are handed to the invoker processes right away rather than through the
+            BatchedLambdaInvoker's buffer, so this may be called from another thread while the IOLoop is busy. """
+        job = self.job_artifacts.jobs.get(update_graph_id, None)
+        immediate_payloads = []
+        enqueue = immediate_payloads.append if immediate else self.batched_lambda_invoker.send
 
         # Construct a payload to send to the Redis proxy containing the keys for all paths 
         # in this graph. The proxy can then just grab the paths from Redis (and thus the path nodes).
@@ -2760,7 +3193,14 @@ class Scheduler(ServerNode):
             logger.debug("Path keys for Redis Proxy: ", path_keys_for_proxy)
         #payload_for_proxy = {"op": "graph-init", "path-keys": path_keys_for_proxy, "scheduler-address": self.address}
 
-        #self.loop.add_callback(self.send_message_to_proxy, payload = payload_for_proxy)
+        # The proxy only acts on the nodes whose fan-out is sent to it, so we just send it an index of those nodes
+        # (and the path in which each one can be found). The proxy retrieves and decodes the nodes lazily.
+        if len(proxy_index) > 0:
+            payload_for_proxy = {"op": "graph-init", "proxy-index": proxy_index, "scheduler-address": self.address, "job-id": update_graph_id,
+                                 "priorities": proxy_priorities}
+            self.loop.add_callback(self.send_message_to_proxy, payload = payload_for_proxy)
+            if task_keys is not None:
+                self.track_proxy_job(update_graph_id, [k for k in task_keys if k in self.tasks and self.tasks[k].state not in ("memory", "erred")])
 
         if self.print_debug and self.print_level <= 1:
             logger.debug("Stored the following paths in Redis: ")
@@ -2791,10 +3231,13 @@ class Scheduler(ServerNode):
                         "use-fargate": self.use_fargate,
                         "executor_function_name": self.executor_function_name,
                         "invoker_function_name": self.invoker_function_name,
-                        "proxy_address": self.proxy_address                        
+                        "proxy_address": self.proxy_address,
+                        "redis-endpoints": self.dcp_ring.endpoints
                     }
                     payload = ujson.dumps(updated_payload)
-                self.batched_lambda_invoker.send(payload)
+                enqueue(payload)
+                if job is not None:
+                    job.record_timing("first-leaf-enqueued")
                 num_invoked += 1                
             elif self.seen_leaf_tasks.get(leaf_task_key, False) == False:
                 payload = serialized_paths[leaf_task_key]
@@ -2809,11 +3252,14 @@ class Scheduler(ServerNode):
                         "use-fargate": self.use_fargate,
                         "executor_function_name": self.executor_function_name,
                         "invoker_function_name": self.invoker_function_name,
-                        "proxy_address": self.proxy_address                        
+                        "proxy_address": self.proxy_address,
+                        "redis-endpoints": self.dcp_ring.endpoints
                     }
                     payload = ujson.dumps(updated_payload)
-                self.dcp_redis.set(leaf_task_key + ITERATION_COUNTER_SUFFIX, 0)
-                self.batched_lambda_invoker.send(payload)
+                self.dcp_ring.get_client(leaf_task_key).set(leaf_task_key + ITERATION_COUNTER_SUFFIX, 0)
+                enqueue(payload)
+                if job is not None:
+                    job.record_timing("first-leaf-enqueued")
                 num_invoked += 1
 
                 # Record that we've now seen this leaf task and increment is counter in Redis.
@@ -2850,61 +3296,17 @@ class Scheduler(ServerNode):
                 num_existing += 1
                 # Publish message to the Lambda.
                 # self.dcp_redis.publish(channel, "set")
-                self.dcp_redis.incr(leaf_task_key + ITERATION_COUNTER_SUFFIX)
+                self.dcp_ring.get_client(leaf_task_key).incr(leaf_task_key + ITERATION_COUNTER_SUFFIX)
 
+        if len(immediate_payloads) > 0:
+            self.batched_lambda_invoker.send_now(immediate_payloads)
 
         _invoke_leaf_tasks_stop = pythontime.time()
         _invoke_leaf_tasks_length = _invoke_leaf_tasks_stop - _invoke_leaf_tasks_start
 
-        metrics["Enqueue-Leaf-Task-Invocations"] = _invoke_leaf_tasks_length
-
+        logger.debug("Enqueuing the leaf task invocations of job {} took {} seconds.".format(update_graph_id, _invoke_leaf_tasks_length))
         logger.debug("[ {} ] - Scheduler: {} leaf tasks have been submitted for invocation while {} were already existing ({} total).".format(datetime.datetime.utcnow(), num_invoked, num_existing, len(leaf_tasks)))
 
-        logger.debug("[INFO] Largest Fanout: Task {} with a fanout factor of {}!".format(largest_fanout_task_key, largest_fanout))
-        if (self.print_debug and self.print_level <= 1):
-            # Avoid ZeroDivisionErrors by checking length of arrays before attempting to divide by said lengths. That being said,
-            # these lengths should almost always be non-zero.
-            if len(task_sizes) != 0:
-                logger.debug("[INFO] Average task size: {} bytes.".format(sum(task_sizes) / len(task_sizes)))
-            else:
-                # Print some sort of warning since zero tasks may indicate an error...
-                logger.debug("[WARNING] There were no tasks. Average task size in bytes: N/A.")
-            if len(path_sizes) != 0:
-                logger.debug("[INFO] Average path size: {} bytes.".format(sum(path_sizes) / len(path_sizes)))
-            else:
-                # Print some sort of warning since zero tasks may indicate an error...
-                logger.debug("[WARNING] There were no paths. Average path size in bytes: N/A.")
-
-        # TO-DO: 
-        # - Serialize each path.
-        # - Store necessary path in Redis.
-        #       - Will probably just iterate through the tasks that serve as a starting node for paths and store those in Redis...
-        #       - Store payload/path under <task key> + "---payload" or <task key> + "---path".
-        # - Invoke each leaf task, sending the associated path as its payload.
-
-        #print("[ {} ] Scheduler - INFO: Invoked {} leaf tasks.".format(datetime.datetime.utcnow(), len(immediately_invocable_task_payloads)))
-
-        # Transition everything to processing.
-        for tk, ts in self.tasks.items():
-            self.transition_waiting_processing_lambda(tk)
-        
-        #self.transitions(recommendations)
-
-        for ts in touched_tasks:
-            if ts.state in ("memory", "erred"):
-                self.report_on_key(ts.key, client=client)
-
-        end = pythontime.time()
-        if self.digests is not None:
-            self.digests["update-graph-duration"].add(end - start)
-        _now = datetime.datetime.utcnow()
-        logger.debug("Number of Tasks: %d" % len(tasks))
-        logger.debug("Number of Leaf Tasks: %d" % len(leaf_tasks))        
-        logger.debug("Update graph duration was {} seconds.".format(end - start))
-        for _label,_length in metrics.items():
-            logger.debug("{} took {} seconds...".format(_label, _length))
-        # TODO: balance workers
-
     def construct_basic_task_payload(self, task_key, ts, already_executed = False, persist = False):
         """Construct a standard payload for a given task state and task key. Used by AWS Lambda functions when executing tasks.
         
@@ -2927,6 +3329,7 @@ class Scheduler(ServerNode):
 
         # Compute the number of dependents for this task. The dependents are downstream tasks that require this task's data.
         num_dependencies_of_dependents = {dependent.key : len(dependent.dependencies) for dependent in ts.dependents}
+        fingerprint = self.task_fingerprints.get(task_key, None) if self.memoize else None
             
         # The basic payload.
         payload = {
@@ -2936,17 +3339,18 @@ class Scheduler(ServerNode):
             "scheduler-address": self.address,
             "use-fargate": self.use_fargate,
             "num-dependencies-of-dependents": num_dependencies_of_dependents,
-            #"proxy-channel": self.redis_channel_names_for_proxy[self.current_redis_proxy_channel_index],
+            "proxy-channel": self.get_proxy_channel_for_task(task_key),
             "chunk-large-tasks": self.chunk_large_tasks,
             "big-task-threshold": self.big_task_threshold,
             "num-chunks-for-large-tasks": self.num_chunks_for_large_tasks or -1,
-            "already-executed": already_executed
+            "already-executed": already_executed,
+            # If garbage collection is enabled, outputs that are not wanted by a client are deleted once all of their consumers have read them.
+            "collect-garbage": self.collect_garbage and fingerprint is None,
+            "output-wanted": persist or len(ts.who_wants) > 0
         }  
-
-        # Reset the index if it is now too large.
-        #self.current_redis_proxy_channel_index += 1
-        #if self.current_redis_proxy_channel_index >= self.num_redis_proxy_channels:
-        #    self.current_redis_proxy_channel_index = 0
+        # Memoized outputs are retained (rather than deleted once read), and published by the Executor that stores them.
+        if fingerprint is not None:
+            payload[FINGERPRINT_KEY] = fingerprint
 
         # The run spec defines how to execute the task. This includes the task's code.
         task_run_spec = ts.run_spec
@@ -2966,7 +3370,12 @@ class Scheduler(ServerNode):
 
         return payload 
     
-    def launch_fargate_nodes(self, desired_num_tasks, fargate_tasks, max_retries = 30):
+    def launch_fargate_nodes(self, desired_num_tasks, wait = True, timeout = None):
+        """ Grow (or shrink) the Fargate storage fleet to 'desired_num_tasks' nodes.
+
+            The fleet is launched in the background by the FargateLauncher; nodes join self.fargate_membership (and the list of
+            current Fargate tasks) one by one as they become healthy. If 'wait' is True, block until the fleet has the desired
+            number of nodes (or 'timeout' seconds have passed). Returns the nodes which have joined so far. """
         # Check if the user is requests more Fargate tasks than the platform allows.
         if (desired_num_tasks > MAX_FARGATE_TASKS):
             print("[WARNING] Specified {} Fargate nodes, which is greater than maximum of {}. Clamping value to {}.".format(desired_num_tasks, MAX_FARGATE_TASKS, MAX_FARGATE_TASKS))
@@ -2975,141 +3384,29 @@ class Scheduler(ServerNode):
         if (desired_num_tasks <= 0):
             print("[Warning] Specified {} Fargate nodes, which is not valid. Using {} instead.".format(desired_num_tasks, DEFAULT_NUM_FARGATE_NODES))
             desired_num_tasks = DEFAULT_NUM_FARGATE_NODES
-            
-        print("[FARGATE] There are already {} tasks running according to the Scheduler's internal records...".format(len(self.workload_fargate_tasks['current'])))
 
-        # Check for existing service.
-        describe_services_response = self.ecs_client.describe_services(
-            cluster = self.ecs_cluster_name,
-            services = [ECS_SERVICE_NAME]
-        )
-
-        services = describe_services_response['services']
-        
-        # Check if there already exists a service.
-        if len(services) == 0:
-            if self.print_debug:
-                print("[FARGATE] No existing services. Creating new service {} with task definition {}, desired count {}, etc.".format(ECS_SERVICE_NAME, self.ecs_task_definition, desired_num_tasks))
-
-            # No existing service...
-            self.ecs_client.create_service(
-                cluster = self.ecs_cluster_name,
-                serviceName = ECS_SERVICE_NAME,
-                taskDefinition = self.ecs_task_definition,
-                desiredCount = desired_num_tasks,
-                platformVersion = 'LATEST',
-                networkConfiguration = self.ecs_network_configuration,
-                #loadBalancers = [None],
-                schedulingStrategy = 'REPLICA',
-                tags = [{
-                    'key': FARGATE_TASK_TAG,
-                    'value': FARGATE_TASK_TAG
-                }]
-            )                                      
+        self.fargate_launcher.scale(desired_num_tasks)
+        if wait:
+            self.fargate_launcher.wait(timeout)
+        return self.fargate_membership.nodes()
+
+    def check_new_fargate_nodes(self, fargate_nodes):
+        """ Ping the Fargate nodes which have just started running (concurrently). Only the healthy ones join the fleet. """
+        good_nodes, _ = self.run_on_fargate_nodes(FargateFleet.ping, fargate_nodes)
+        return good_nodes
+
+    def fargate_membership_changed(self, event, fargate_node):
+        """ Called by the Fargate membership table (on the launcher's thread) when a node joins or leaves the fleet. """
+        self.loop.add_callback(self._update_fargate_tasks, event, fargate_node)
+
+    def _update_fargate_tasks(self, event, fargate_node):
+        task_arn = fargate_node[FARGATE_ARN_KEY]
+        if event == "joined":
+            if fargate_node not in self.workload_fargate_tasks['current']:
+                self.workload_fargate_tasks['current'].append(fargate_node)
+            self.fargate_metrics.setdefault(task_arn, {FARGATE_NUM_SELECTED: 0})
         else:
-            wukong_service = services[0]
-            if self.print_debug:
-                print("Existing service's status: {}".format(wukong_service['status']))
-            # Make sure the existing service is active before attempting to use it/interact with it. 
-            if wukong_service['status'] == 'INACTIVE':
-
-                if self.print_debug:
-                    print("[FARGATE] Existing service is 'INACTIVE.' Creating new service {} with task definition {}, desired count {}, etc.".format(ECS_SERVICE_NAME, self.ecs_task_definition, desired_num_tasks))
-
-                self.ecs_client.create_service(
-                    cluster = self.ecs_cluster_name,
-                    serviceName = ECS_SERVICE_NAME,
-                    taskDefinition = self.ecs_task_definition,
-                    desiredCount = desired_num_tasks,
-                    platformVersion = 'LATEST',
-                    networkConfiguration = self.ecs_network_configuration,
-                    #loadBalancers = [None],
-                    schedulingStrategy = 'REPLICA',
-                    tags = [{
-                        'key': FARGATE_TASK_TAG,
-                        'value': FARGATE_TASK_TAG
-                    }]
-                )        
-            else:
-                existing_service_desired_count = wukong_service['desiredCount']
-
-                # Check if we need to update the existing service to match our desired number of tasks.
-                if existing_service_desired_count != desired_num_tasks:
-
-                    if self.print_debug:
-                        print("[FARGATE] Updating existing service {} with new desired count of {}. (It was {})".format(ECS_SERVICE_NAME, desired_num_tasks, existing_service_desired_count))
-
-                    self.ecs_client.update_service(
-                        cluster = self.ecs_cluster_name,
-                        service = ECS_SERVICE_NAME,
-                        desiredCount = desired_num_tasks
-                    )
-        
-        num_running = -1
-
-        num_checks = 0
-        while num_running != desired_num_tasks:
-            describe_services_response = self.ecs_client.describe_services(
-                        cluster = self.ecs_cluster_name,
-                        services = [ECS_SERVICE_NAME]
-                    )    
-            services = describe_services_response['services']
-            wukong_service = services[0]
-            num_running = wukong_service['runningCount']
-
-            # If we're growing the Fargate cluster, then we should pri.nt how many tasks have started running so far out of how
-            # many we asked for. If we're shrinking the Fargate cluster, then we should print how many tasks still need to stop.
-            if num_running < desired_num_tasks:
-                print("[FARGATE - {}] {}/{} have entered the 'RUNNING' state...".format(datetime.datetime.utcnow(), num_running, desired_num_tasks))
-            elif num_running < desired_num_tasks:
-                num_to_stop = desired_num_tasks - num_running
-                print("[FARGATE] Still waiting for another {} tasks to stop...".format(num_to_stop))
-            num_checks = num_checks + 1
-            
-            # Only sleep if this isn't our first check and the tasks haven't finished starting.
-            if num_checks != 1 and num_running != desired_num_tasks:
-                pythontime.sleep(5)
-        
-        print("[FARGATE] All {} tasks have entered the 'RUNNING state. Collecting metadata now.".format(desired_num_tasks))
-
-        # TODO: Add option to skip this if the number of nodes hasn't changed.
-        # Or just show new nodes/nodes that we don't already have (without having
-        # to call list_tasks and describe_tasks for all of them). Like perhaps filter
-        # through which tasks we already have first, before calling describe_tasks... 
-        
-        task_arn_lists = list()
-        # List the tasks.
-        list_tasks_response = self.ecs_client.list_tasks(cluster = self.ecs_cluster_name)
-        taskArns = list_tasks_response['taskArns']
-        task_arn_lists.append(taskArns)
-        while 'nextToken' in list_tasks_response:
-            nextToken =list_tasks_response['nextToken']
-            list_tasks_response = self.ecs_client.list_tasks(cluster = self.ecs_cluster_name, nextToken = nextToken)
-            taskArns = list_tasks_response['taskArns']
-            task_arn_lists.append(taskArns)  
-        task_descriptions = list() 
-        for task_arn_list in task_arn_lists:
-            descriptions = self.ecs_client.describe_tasks(cluster = self.ecs_cluster_name, tasks = task_arn_list)['tasks']
-            task_descriptions.extend(descriptions)
-        
-        # Iterate over all of the running tasks...
-        for task_description in task_descriptions:
-            if task_description['group'] == FARGATE_TASK_GROUP:
-                taskArn = task_description['taskArn']
-                privateIP = task_description['containers'][0]['networkInterfaces'][0][FARGATE_PRIVATE_IP_KEY]
-                # Otherwise, collect the information and store it.
-                eniID = task_description['attachments'][0]['details'][1]['value']
-                network_interface_description = self.ec2_client.describe_network_interfaces(NetworkInterfaceIds = [eniID])
-                publicIP = network_interface_description['NetworkInterfaces'][0]['Association']['PublicIp']                    
-                fargate_node = {
-                    FARGATE_ARN_KEY: taskArn,
-                    FARGATE_ENI_ID_KEY: eniID,
-                    FARGATE_PUBLIC_IP_KEY: publicIP,
-                    FARGATE_PRIVATE_IP_KEY: privateIP
-                }
-                # We may already have this task in our collection, in which case just ignore it.
-                if not fargate_node in fargate_tasks:
-                    fargate_tasks.append(fargate_node)         
+            self.workload_fargate_tasks['current'] = [fn for fn in self.workload_fargate_tasks['current'] if fn[FARGATE_ARN_KEY] != task_arn]
 
     def launch_tasks(self, remaining, max_retries, starting):
         """ Launch Fargate tasks.
@@ -3196,6 +3493,34 @@ class Scheduler(ServerNode):
                 task = task_arn)
             fargate_tasks.remove(task_definition)
 
+    def track_proxy_job(self, job_id, task_keys):
+        """ Start tracking the tasks of a job whose state is retained by the KV Store Proxy. """
+        self.proxy_jobs[job_id] = {"remaining": set(), "cancelled": False}
+        for key in task_keys:
+            # If the task was part of an earlier job that hasn't finished, it now belongs to this job instead.
+            if key in self.proxy_job_of_task:
+                self.proxy_job_task_finished(key, "released")
+            self.proxy_jobs[job_id]["remaining"].add(key)
+            self.proxy_job_of_task[key] = job_id
+        if len(self.proxy_jobs[job_id]["remaining"]) == 0:
+            self.proxy_job_task_finished(None, None, job_id = job_id)
+
+    def proxy_job_task_finished(self, key, state, job_id = None):
+        """ Record that a task of a proxy job finished (or was forgotten). Tells the proxy once the whole job is done. """
+        if key is not None:
+            job_id = self.proxy_job_of_task.pop(key)
+        job = self.proxy_jobs.get(job_id, None)
+        if job is None:
+            return
+        job["remaining"].discard(key)
+        # Tasks that are forgotten before they finish were cancelled (or released) by the client.
+        if state == "forgotten":
+            job["cancelled"] = True
+        if len(job["remaining"]) == 0:
+            del self.proxy_jobs[job_id]
+            payload = {"op": "job-done", "job-id": job_id, "cancelled": job["cancelled"]}
+            self.loop.add_callback(self.send_message_to_proxy, payload = payload)
+
     @gen.coroutine 
     def send_message_to_proxy(self, payload, start_handling = False):
         if self.proxy_comm is None:
@@ -3211,34 +3536,60 @@ class Scheduler(ServerNode):
         if start_handling:
             yield self.handle_stream(comm = self.proxy_comm)
     
-    def check_health_of_fargate_tasks(self):
-        fargate_nodes = self.workload_fargate_tasks['current']
+    @staticmethod
+    def fargate_endpoint(fargate_node):
+        """ Return the endpoint ("host:port") of the Redis instance running on the given Fargate node. """
+        #return "{}:6379".format(fargate_node[FARGATE_PUBLIC_IP_KEY])
+        return "{}:6379".format(fargate_node[FARGATE_PRIVATE_IP_KEY])
+
+    def run_on_fargate_nodes(self, operation, fargate_nodes = None, timeout = None):
+        """ Run one of the FargateFleet's operations (e.g., FargateFleet.ping) on the given Fargate nodes (all of them by default).
+
+            The nodes are contacted concurrently. Returns a tuple (good nodes, bad nodes). """
+        if fargate_nodes is None:
+            fargate_nodes = self.workload_fargate_tasks['current']
+        fargate_nodes = list(fargate_nodes)
+        results = operation(self.fargate_fleet, [self.fargate_endpoint(fn) for fn in fargate_nodes], timeout = timeout)
         good_nodes = []
         bad_nodes = []
-        counter = 1
         for fn in fargate_nodes:
-            arn = fn[FARGATE_ARN_KEY]
-            #ip = fn[FARGATE_PUBLIC_IP_KEY]
-            ip = fn[FARGATE_PRIVATE_IP_KEY]
-            print("\nChecking Fargate node #{} -- Redis @ {}:6379 ({})".format(counter, ip, arn))
-            counter = counter + 1
-            try:
-                rc = redis.Redis(host = ip, port = 6379, db = 0, socket_timeout = 10, socket_connect_timeout = 10)
-                res = rc.ping() 
-                if res == False:
-                    print("\tCould not connect/ping...")
-                    bad_nodes.append(fn)
-                else:
-                    print("\tConnected and pinged successfully!")
-                    good_nodes.append(fn)
-            except:
+            result = results[self.fargate_endpoint(fn)]
+            if result["ok"] and result.get("result", True) is not False:
+                good_nodes.append(fn)
+            else:
+                if self.print_debug:
+                    print("Operation on Redis instance at {} ({}) failed: {}".format(self.fargate_endpoint(fn), fn[FARGATE_ARN_KEY], result.get("error")))
                 bad_nodes.append(fn)
-        
+        return good_nodes, bad_nodes
+
+    def check_health_of_fargate_tasks(self):
+        """ Ping the Redis instance on each Fargate node (concurrently). Returns a dictionary with the "good" and "bad" nodes. """
+        good_nodes, bad_nodes = self.run_on_fargate_nodes(FargateFleet.ping)
+        print("Checked {} Fargate nodes: {} healthy, {} unhealthy.".format(len(good_nodes) + len(bad_nodes), len(good_nodes), len(bad_nodes)))
         return {
             "good": good_nodes,
             "bad": bad_nodes
         }
 
+    def start_fargate_health_check(self):
+        """ Start pinging the Fargate nodes in the background, without waiting for the responses. The node-health table
+            (and thus placement) is updated as the responses come in. Called periodically if 'fargate_health_check_interval' is set. """
+        if not self.use_fargate or len(self.workload_fargate_tasks['current']) == 0:
+            return
+        # Skip this round if the previous health check is still running (i.e., some nodes have not timed out yet).
+        if self.fargate_health_check_futures is not None and not all(f.done() for f in self.fargate_health_check_futures.values()):
+            return
+        endpoints = [self.fargate_endpoint(fn) for fn in self.workload_fargate_tasks['current']]
+        self.fargate_health_check_futures = self.fargate_fleet.submit(endpoints, lambda redis_client: redis_client.ping())
+
+    def get_fargate_health(self, comm = None):
+        """ Return the node-health table of the Fargate storage nodes. """
+        return {
+            "nodes": self.fargate_fleet.health_table(),
+            "metrics": self.fargate_fleet.get_metrics(),
+            "launcher": self.fargate_launcher.get_metrics()
+        }
+
     def stop_fargate_tasks(self, task_arns):
         """ Tells the Scheduler to stop the Fargate tasks with ARNs defined in the task_arns parameter.
 
@@ -3259,30 +3610,45 @@ class Scheduler(ServerNode):
                 arn = arn[FARGATE_ARN_KEY]
             response = self.ecs_client.stop_task(cluster = self.ecs_cluster_name, task = arn)
             responses[arn] = response
+            self.fargate_membership.remove(arn)
 
         # Remove all the stopped Fargate nodes/tasks from our local mapping.
         self.workload_fargate_tasks['current'] = [fn for fn in self.workload_fargate_tasks['current'] if fn[FARGATE_ARN_KEY] not in task_arns]
 
         return responses
 
-    def flush_data_on_redis_shards(self, asynchronous = True, rewrite_address = True, socket_connect_timeout = 5, socket_timeout = 5):   
-        """ Clear all of the data on each Fargate shard and the EC2 Redis instance using the flushall command."""
+    def forget_staged_constants(self):
+        """ Forget which constants are stored on the control-plane shards (e.g., after they have been flushed), so they're stored again when next used. """
+        self.staged_constants.clear()
+
+    def forget_memoized_outputs(self):
+        """ Empty the memoization cache (e.g., after the outputs it refers to have been flushed). """
+        self.memo_cache.clear()
+
+    def flush_data_on_redis_shards(self, asynchronous = True, rewrite_address = True, timeout = None):
+        """ Clear all of the data on each Fargate shard, each control-plane shard, and the EC2 Redis instance using the flushall command.
+        
+            The Fargate shards are flushed concurrently. Returns the Fargate Node dictionaries of the nodes that had an error. """
         self.dcp_redis.flushall(asynchronous = asynchronous)
-        for fargate_node in self.workload_fargate_tasks['current']:
-            #fargate_ip = fargate_node[FARGATE_PUBLIC_IP_KEY]
-            fargate_ip = fargate_node[FARGATE_PRIVATE_IP_KEY]
-            redis_client = redis.StrictRedis(host = fargate_ip, port = 6379, db = 0, socket_connect_timeout  = socket_connect_timeout, socket_timeout = socket_timeout)
-            redis_client.flushall(asynchronous = asynchronous)
+        self.dcp_ring.for_each_client(lambda client: client.flushall(asynchronous = asynchronous))
+        self.forget_staged_constants()
+        self.forget_memoized_outputs()
+        _, bad_nodes = self.run_on_fargate_nodes(partial(FargateFleet.flushall, asynchronous = asynchronous), timeout = timeout)
         if rewrite_address:
             self.dcp_redis.set("scheduler-address", self.address)
+        return bad_nodes
 
-    def flush_db_data_on_redis_shards(self, asynchronous = True, rewrite_address = True, socket_connect_timeout = 5, socket_timeout = 5):   
+    def flush_db_data_on_redis_shards(self, asynchronous = True, rewrite_address = True, timeout = None):   
         """ Clear all of the data (in the current db) on each Fargate shard and the EC2 Redis instance using the flushdb command.
+
+            The Fargate shards are flushed concurrently, so unreachable shards cost a single timeout.
         
             Args:
                 asynchronous (bool): If True, execute the Redis command asynchronously (do not wait for response).
 
                 rewrite_address (bool): If True, rewrite the Scheduler's address to the dcp_redis server.
+
+                timeout (float): Maximum time (in seconds) to wait for the Fargate shards. Shards that have not responded by then are reported as bad.
             
             Returns:
                 dict: Dictionary with two entries. 
@@ -3290,34 +3656,18 @@ class Scheduler(ServerNode):
                     (2) Just the IP addresses of those nodes (for easy passing to the 'stop_fargate_tasks' function)
         """      
         self.dcp_redis.flushdb(asynchronous = asynchronous)
-        counter = 1
-        bad_nodes = []
-        bad_ips = []
-        for fargate_node in self.workload_fargate_tasks['current']:
-            fargate_arn = fargate_node[FARGATE_ARN_KEY]
-            #fargate_ip = fargate_node[FARGATE_PUBLIC_IP_KEY] 
-            fargate_ip = fargate_node[FARGATE_PRIVATE_IP_KEY]
-            if self.print_debug:
-                print("\nAttempting to connect to Redis @ {}:6379 (ARN {})...".format(fargate_ip, fargate_arn))
-            redis_client = redis.StrictRedis(host = fargate_ip, port = 6379, db = 0, socket_connect_timeout  = socket_connect_timeout, socket_timeout = socket_timeout)
-            if self.print_debug:
-                print("\tConnection successful! Executing 'flushdb' command now...")
-            try:
-                redis_client.flushdb(asynchronous = asynchronous)
-            except:
-                print("Redis is configured to save RDB snapshots, but it is currently not able to persist on disk. Commands that may modify the data set are disabled, because this instance is configured to report errors during writes if RDB snapshotting fails.")
-                print("\tInstance is listening at {}:6379 ({}).".format(fargate_ip, fargate_arn))
-                bad_nodes.append(fargate_node)
-                bad_ips.append(fargate_ip)
-            if self.print_debug:
-                print("Flushed current db for Redis instance at {}:6379 ({}) [{}/{}]".format(fargate_ip, fargate_arn, counter, len(self.workload_fargate_tasks['current'])))
-            counter += 1
+        self.dcp_ring.for_each_client(lambda client: client.flushdb(asynchronous = asynchronous))
+        self.forget_staged_constants()
+        self.forget_memoized_outputs()
+        _, bad_nodes = self.run_on_fargate_nodes(partial(FargateFleet.flushdb, asynchronous = asynchronous), timeout = timeout)
+        if self.print_debug:
+            print("Flushed current db for {}/{} Fargate Redis instances.".format(len(self.workload_fargate_tasks['current']) - len(bad_nodes), len(self.workload_fargate_tasks['current'])))
         if rewrite_address:
             self.dcp_redis.set("scheduler-address", self.address)      
         
         return {
             "nodes": bad_nodes,
-            "ips": bad_ips
+            "ips": [fargate_node[FARGATE_PRIVATE_IP_KEY] for fargate_node in bad_nodes]
         }
 
     def stimulus_task_finished(self, key=None, worker=None, **kwargs):
@@ -3807,6 +4157,19 @@ class Scheduler(ServerNode):
     # Manage Messages #
     ###################
 
+    def write_to_client(self, client, msg):
+        """ Write a message to a client's comm right away, bypassing its BatchedSend (whose buffer is only flushed once the IOLoop is
+            free). The message is serialized and handed to the socket before this returns, unless it is very large. """
+        bcomm = self.client_comms.get(client, None)
+        if bcomm is None or bcomm.comm is None or bcomm.comm.closed():
+            return
+
+        def check_written(future):
+            if future.exception() is not None and self.status == "running":
+                logger.info("Failed to write message %s to client %s: %s", msg.get("op", None), client, future.exception())
+
+        bcomm.comm.write(msg, serializers = bcomm.serializers).add_done_callback(check_written)
+
     def report(self, msg, ts=None, client=None):
         """
         Publish updates to all listening Queues and Comms
@@ -3817,7 +4180,7 @@ class Scheduler(ServerNode):
         if client is not None:
             try:
                 comm = self.client_comms[client]
-                comm.send(msg)
+                self.send_report(comm, msg)
             except CommClosedError:
                 if self.status == "running":
                     logger.critical("Tried writing to closed comm: %s", msg)
@@ -3838,12 +4201,29 @@ class Scheduler(ServerNode):
             ]
         for c in comms:
             try:
-                c.send(msg)
+                self.send_report(c, msg)
                 # logger.debug("Scheduler sends message to client %s", msg)
             except CommClosedError:
                 if self.status == "running":
                     logger.critical("Tried writing to closed comm: %s", msg)
 
+    def send_report(self, comm, msg):
+        """ Send a report to a client, or buffer it if we're in the middle of processing a batch of Lambda messages. """
+        if self.report_buffer is not None:
+            self.report_buffer[comm].append(msg)
+        else:
+            comm.send(msg)
+
+    def flush_reports(self):
+        """ Send the buffered reports, all of the reports for a given client at once. """
+        report_buffer, self.report_buffer = self.report_buffer, None
+        for comm, msgs in report_buffer.items():
+            try:
+                comm.send_many(msgs)
+            except CommClosedError:
+                if self.status == "running":
+                    logger.critical("Tried writing to closed comm: %s", msgs)
+
     @gen.coroutine
     def add_client(self, comm, client=None):
         """ Add client to network
@@ -3859,7 +4239,7 @@ class Scheduler(ServerNode):
             bcomm = BatchedSend(interval="2ms", loop=self.loop)
             bcomm.start(comm)
             self.client_comms[client] = bcomm
-            bcomm.send({"op": "stream-start", REDIS_ADDRESS_KEY: self.proxy_address}) 
+            bcomm.send({"op": "stream-start", REDIS_ADDRESS_KEY: self.proxy_address, "redis-endpoints": self.dcp_ring.endpoints}) 
             try:
                 yield self.handle_stream(comm=comm, extra={"client": client})
             finally:
@@ -3991,71 +4371,47 @@ class Scheduler(ServerNode):
                 pdb.set_trace()
             raise       
     
-    def poll_redis_process(self, _queue, redis_channel_name, redis_endpoint):
-        ''' This function defines a process which continually polls Redis for messages. 
-        
-            When a message is found, it is passed to the main Scheduler process via the queue given to this process. ''' 
-        print("Redis Polling Process started. Polling channel ", redis_channel_name)
-
-        redis_client = redis.StrictRedis(host=redis_endpoint, port = 6379, db = 0)
-        
-        base_sleep_interval = 0.05 
-        max_sleep_interval = 0.1 
-        current_sleep_interval = base_sleep_interval
-        consecutive_misses = 0
-
-        # We just do pub-sub on the first redis client.
-        redis_channel = redis_client.pubsub(ignore_subscribe_messages = True)
-        redis_channel.subscribe(redis_channel_name)
-        
-        # This process will just loop endlessly polling Redis for messages. When it finds a message,
-        # it will decode it (from bytes to UTF-8) and send it to the Scheduler process via the queue. 
-        #
-        # If no messages are found, then the thread will sleep before continuing to poll. 
-        while True:
-            message = redis_channel.get_message()
-            if message is not None:
-                #timestamp_now = datetime.datetime.utcnow()
-                data = message["data"]
-                data = data.decode()
-                data = ujson.loads(data)
-                #if self.print_debug:
-                #    print("[ {} ] Received message from AWS Lambda...".format(timestamp_now))
-                #    print("\tMessage Contents: {}\n".format(data))
-                _queue.put([data])
-                consecutive_misses = 0
-                current_sleep_interval = base_sleep_interval
+    def consume_lambda_messages(self, messages):
+        """ Handle a batch of messages read from the Redis Streams by a RedisStreamConsumer. This runs on the IOLoop.
+
+        The messages are grouped by type: notifications that tasks began executing are handled first, then completed
+        tasks, then errors (so a task's 'executing' message is always handled before its result, as before). Each
+        completed task is marked as finished individually, but the recommendations resulting from all of them are
+        merged and processed with a single call to transitions(), and the reports for clients are sent at the end
+        of the batch, all at once for each client. An exception while handling one message is logged and does not
+        affect the other messages in the batch.
+        """
+        self.num_lambda_batches += 1
+        executing, finished, other = [], [], []
+        for msg in messages:
+            op = msg.get("op", None)
+            if op == EXECUTING_TASK_KEY:
+                executing.append(msg)
+            elif op in (LAMBDA_RESULT_KEY, EXECUTED_TASK_KEY):
+                finished.append(msg)
             else:
-                pythontime.sleep(current_sleep_interval + (random.uniform(0, 0.5) / 1000))
-                consecutive_misses = consecutive_misses + 1
-                current_sleep_interval += 0.05 
-                if (current_sleep_interval > max_sleep_interval):
-                    current_sleep_interval = max_sleep_interval
-
-                
-    def consume_redis_queue(self):
-        ''' This function executes periodically (as a PeriodicCallback on the IO loop). 
-        
-        It reads messages from the message queue until none are available.'''
-        messages = []
+                other.append(msg)
 
-        # 'end' is the time at which we should stop iterating. By default, it is 50ms.
-        stop_at = datetime.datetime.utcnow().microsecond + 5000
-        while datetime.datetime.utcnow().microsecond < stop_at and len(messages) < 50:
-            try:
-                timestamp_now = datetime.datetime.utcnow()
+        self.report_buffer = defaultdict(list)
+        self.batched_recommendations = dict()
+        try:
+            for msg in executing + finished + other:
+                try:
+                    self.result_from_lambda(None, **msg)
+                except Exception as ex:
+                    logger.error("Exception while handling message from AWS Lambda: {}".format(msg))
+                    logger.exception(ex)
+            recommendations, self.batched_recommendations = self.batched_recommendations, None
+            if len(recommendations) > 0:
+                try:
+                    self.transitions(recommendations)
+                except Exception as ex:
+                    logger.error("Exception while processing transitions for a batch of {} messages from AWS Lambda.".format(len(messages)))
+                    logger.exception(ex)
+        finally:
+            self.batched_recommendations = None
+            self.flush_reports()
 
-                # Attempt to get a payload from the Queue. A 'payload' consists of a message
-                # and possibly some benchmarking data. The message will be at index 0 of the payload.
-                payload = self.redis_polling_queue.get(block = False, timeout = None)
-                message = payload[0]
-                messages.append(message)
-            # In the case that the queue is empty, break out of the loop and process what we already have.
-            except queue.Empty:
-                break
-        for msg in messages:
-            self.result_from_lambda(None, **msg)
-               
     def result_from_lambda(self, comm, op, task_key, lambda_id = None, time_sent = None, **msg):  
         """ Handle the result from executing a task on AWS Lambda. """   
         self.num_messages_received_from_lambda = self.num_messages_received_from_lambda + 1
@@ -4064,7 +4420,7 @@ class Scheduler(ServerNode):
             if self.print_debug == True:
                 print("\n[ {} ] Received result from Lambda for task {}.".format(datetime.datetime.utcnow(), task_key))
                 print("\tExecution Time: {} seconds".format(msg["execution-time"]))
-                print("\t{} of {} tasks of current job completed.".format(self.last_job_counter, len(self.last_job_tasks)))
+                print("\t{} of {} tasks of current job completed.".format(*self.last_job_progress()))
                 print("\tTime Sent:", datetime.datetime.fromtimestamp(time_sent).isoformat())
                 print("\t\tTotal # messages received from Lambda:", self.num_messages_received_from_lambda)                 
                 print("\t\tTotal # results received from Lambda:", self.num_results_received_from_lambda, "\n")
@@ -4089,8 +4445,11 @@ class Scheduler(ServerNode):
                 print("[WARNING] Got notification that Task {} began executing on Lambda, but no entry for said task exists in self.tasks...".format(task_key))
             #self.transition_waiting_processing_lambda(task_key)
         elif op == EXECUTED_TASK_KEY:
-            self.last_job_counter += 1
-            self.executed_tasks.append(task_key)
+            # We only keep track of this information if debug mode is enabled.
+            if self.debug_mode:
+                self.executed_tasks.append(task_key)
+            if task_key in self.tasks and msg.get("execution-time", None) is not None:
+                self.update_task_duration(self.tasks[task_key].prefix, msg["execution-time"])
             # Record that we've completed the task.
             self.completed_tasks[task_key] = True
             self.completed_task_counts[task_key] = self.completed_task_counts[task_key] + 1
@@ -4099,44 +4458,21 @@ class Scheduler(ServerNode):
             #    self.tasks[task_key].state = "released"
             ##else:
             #    print("[WARNING] Got notification that Task {} finished execution on Lambda, but no entry for said task exists in self.tasks...".format(task_key))
-            # If there already exists an entry for this task, then print a 'WARNING' message indicating this. 
-            # We record all entries (not just the first) in the dictionary. Otherwise, just add an entry for the executed task.
-            if task_key in self.completed_task_data:
-                if type(self.completed_task_data[task_key]) is list:
-                    self.completed_task_data[task_key].append({
-                                                        "start": msg['start-time'],
-                                                        "stop": msg['stop-time'],
-                                                        "execution-time": msg['execution-time'],
-                                                        "lambda-id": lambda_id,
-                                                        "task-key": task_key,
-                                                        DATA_SIZE: msg[DATA_SIZE],
-                                                        "time_sent": time_sent,
-                                                        })
-                    if self.print_debug:
-                        print("\n\n[WARNING] Task {} has now been executed {} times by AWS Lambda!\n".format(task_key, len(self.completed_task_data[task_key])))
-                else:
-                    prev_entry = self.completed_task_data[task_key]
-                    new_entry = {
-                            "start": msg['start-time'],
-                            "stop": msg['stop-time'],
-                            "execution-time": msg['execution-time'],
-                            "lambda-id": lambda_id,
-                            "task-key": task_key,
-                            "time_sent": time_sent,
-                        }
-                    lst = [prev_entry, new_entry]
-                    self.completed_task_data[task_key] = lst 
-                    if self.print_debug:
-                        print("\n\n[WARNING] Task {} has now been executed 2 times by AWS Lambda!\n".format(task_key))
-            else:        
-                self.completed_task_data[task_key] = {
+            # Record the timing information with the job's artifacts. If the task was executed before, then print a 'WARNING' message
+            # indicating this. We record all entries (not just the first).
+            job = self.job_artifacts.job_for_task(task_key)
+            if job is not None:
+                num_executions = job.record_completed_task(task_key, {
                                 "start": msg['start-time'],
                                 "stop": msg['stop-time'],
                                 "execution-time": msg['execution-time'],
                                 "lambda-id": lambda_id,
                                 "task-key": task_key,
+                                DATA_SIZE: msg.get(DATA_SIZE, None),
                                 "time_sent": time_sent,
-                            }
+                            })
+                if num_executions > 1 and self.print_debug:
+                    print("\n\n[WARNING] Task {} has now been executed {} times by AWS Lambda!\n".format(task_key, num_executions))
             self.obtained_valid_result_from_lambda(task_key = task_key, **msg)
             if self.print_debug:
                 print("[DEBUG - {}] Task {} has been executed successfully by Lambda {}.\n\tStart Time: {}\n\tStop Time: {}\n\tExecution Time: {} seconds.\n\t{} of {} tasks of last job completed\n\tTime Sent: {}\n".format(
@@ -4146,8 +4482,7 @@ class Scheduler(ServerNode):
                                                                                                                                                 datetime.datetime.fromtimestamp(msg['start-time']).isoformat(),
                                                                                                                                                 datetime.datetime.fromtimestamp(msg['stop-time']).isoformat(),
                                                                                                                                                 msg['execution-time'],
-                                                                                                                                                self.last_job_counter,
-                                                                                                                                                len(self.last_job_tasks),
+                                                                                                                                                *self.last_job_progress(),
                                                                                                                                                 datetime.datetime.fromtimestamp(time_sent).isoformat()))
         elif op == TASK_ERRED_KEY:
             print("!!!!!!!!!!!!!!!!!!!!!!!!\n[TASK ERROR - {}] The execution of task {} resulted in an error. Start time: {}. Lambda ID: {}. Actual Exception: {}.\n\tTime Sent: {}\n".format(datetime.datetime.utcnow(), task_key,
@@ -4166,14 +4501,233 @@ class Scheduler(ServerNode):
         if time_diff >= 5:
             print("\n\n[WARNING] Long time difference between msg sent by Lambda and received by Scheduler: {} seconds\n\n".format(time_diff))
          
-    def get_wukong_metrics(self):
-        task_metrics = self.dcp_redis.lrange(TASK_BREAKDOWNS, 0, -1)
-        lambda_metrics = self.dcp_redis.lrange(LAMBDA_DURATIONS, 0, -1)
+    def last_job_progress(self):
+        """ Return the number of completed tasks and the total number of tasks of the last-submitted job. """
+        job = self.job_artifacts.last_job
+        if job is None:
+            return 0, 0
+        return job.num_completed, len(job.tasks)
+
+    def get_retained_state(self, comm = None):
+        """ Return the sizes of the per-job and per-task state retained by the Scheduler. """
+        return {
+            "job-artifacts": self.job_artifacts.get_metrics(),
+            "num-tasks": len(self.tasks),
+            "num-completed-tasks": len(self.completed_tasks),
+            "num-fargate-mappings": len(self.tasks_to_fargate_nodes),
+            "num-fused-tasks": len(self.fused_tasks),
+            "num-staged-constants": len(self.staged_constants),
+            "num-staged-constant-bytes": self.staged_constants.num_bytes,
+            "num-constant-jobs": len(self.constant_jobs),
+            "num-task-fingerprints": len(self.task_fingerprints),
+            "num-memoized-tasks": self.num_memoized_tasks,
+            "memo-cache": self.memo_cache.get_metrics(),
+            "num-proxy-jobs": len(self.proxy_jobs),
+            "num-keys-to-reclaim": len(self.keys_to_reclaim),
+            "num-reclaimed-keys": self.num_reclaimed_keys,
+            "transition-log-length": len(self.transition_log)
+        }
 
-        task_metrics = [cloudpickle.loads(res) for res in task_metrics]
-        lambda_metrics = [cloudpickle.loads(res) for res in lambda_metrics]
+    def get_job_timings(self, comm = None):
+        """ Return the milestones (submitted, received, schedule-built, uploaded, first-leaf-enqueued) and latencies of the retained jobs. """
+        return {job_id: {"timings": dict(job.timings), "latencies": job.get_latencies(), "upload": job.get_upload_stats()} 
+                for job_id, job in self.job_artifacts.jobs.items()}
+
+    def forget_task_artifacts(self, key):
+        """ Drop everything we retain about a task once it has been forgotten (i.e., its future was released by all clients). """
+        released = self.job_artifacts.forget_task(key)
+        if self.collect_garbage and len(released) > 0:
+            self.reclaim_task_keys(released)
+        self.completed_tasks.pop(key, None)
+        self.completed_task_counts.pop(key, None)
+        self.executing_tasks.pop(key, None)
+        self.executing_tasks_counters.pop(key, None)
+        self.tasks_to_fargate_nodes.pop(key, None)
+        self.fused_tasks.pop(key, None)
+        self.task_fingerprints.pop(key, None)
+        # Outputs restored from the memoization cache belong to no job, so they're reclaimed here (unless the cache holds them).
+        if key in self.memoized_tasks:
+            fargate_node = self.memoized_tasks.pop(key)
+            if self.collect_garbage:
+                self.reclaim_task_keys([(key, fargate_node)])
+
+    def reclaim_task_keys(self, released):
+        """ Queue the keys in Redis of the given (task key, Fargate node) pairs for deletion.
+
+            Tasks that are still wanted by a client, or that tasks outside of 'released' depend on (e.g., tasks of a later job),
+            are left alone, as are the outputs retained for memoization. The keys are deleted on a background thread, as deleting
+            them takes a round trip per Redis instance. """
+        if self.memoize:
+            # Make sure the cache knows about the outputs published by the tasks being released.
+            self.drain_memoized_outputs()
+        released_keys = set(task_key for task_key, _ in released)
+        for task_key, fargate_node in released:
+            ts = self.tasks.get(task_key, None)
+            if ts is not None and (ts.who_wants or any(dts.key not in released_keys for dts in ts.dependents)):
+                continue
+            if self.memo_cache.holds(task_key):
+                continue
+            self.keys_to_reclaim.append((task_key, fargate_node))
+        self.schedule_reclaim()
+
+    def schedule_reclaim(self):
+        if len(self.keys_to_reclaim) > 0 and not self.reclaim_scheduled:
+            # Batch up the tasks released by the current round of transitions.
+            self.reclaim_scheduled = True
+            self.loop.add_callback(self.start_reclaiming_keys)
+
+    def start_reclaiming_keys(self):
+        self.reclaim_scheduled = False
+        released, self.keys_to_reclaim = self.keys_to_reclaim, []
+        threading.Thread(target = self.unlink_task_keys, args = (released,), daemon = True).start()
+
+    def unlink_task_keys(self, released):
+        """ Delete the keys of the given (task key, Fargate node) pairs from Redis. Runs on a background thread. """
+        control_plane_keys = []
+        data_keys = defaultdict(list)               # Mapping of Fargate IP --> keys of task outputs stored on that Fargate node.
+        for task_key, fargate_node in released:
+            # Small final results are stored on the control-plane shards under the task's key, so we delete that too.
+            control_plane_keys.append(task_key)
+            control_plane_keys.extend(task_key + suffix for suffix in CONTROL_PLANE_KEY_SUFFIXES)
+            if fargate_node is None:
+                control_plane_keys.append(task_key + CONSUMER_COUNTER_SUFFIX)
+            else:
+                data_keys[fargate_node[FARGATE_PRIVATE_IP_KEY]].extend([task_key, task_key + CONSUMER_COUNTER_SUFFIX])
+        num_deleted = 0
+        try:
+            num_deleted += self.dcp_ring.unlink_many(control_plane_keys)
+            for fargate_ip, keys in data_keys.items():
+                redis_client = self.reclaim_clients.get(fargate_ip, None)
+                if redis_client is None:
+                    redis_client = redis.StrictRedis(host = fargate_ip, port = 6379, db = 0, socket_connect_timeout = 5, socket_timeout = 5)
+                    self.reclaim_clients[fargate_ip] = redis_client
+                num_deleted += redis_client.unlink(*keys)
+        except Exception as ex:
+            logger.error("Failed to delete the keys of {} released tasks from Redis: {}".format(len(released), ex))
+        self.num_reclaimed_keys += num_deleted
+        logger.debug("[SCHEDULER] Deleted {} keys of {} released tasks from Redis.".format(num_deleted, len(released)))
+
+    def drain_memoized_outputs(self):
+        """ Move the records of the memoizable outputs stored by the Task Executors into the memoization cache, and queue the
+            outputs the cache evicts for deletion. Evicted outputs of tasks we still know about are left to garbage collection. """
+        num_drained = drain_metrics_list(self.dcp_redis, MEMOIZED_OUTPUTS_KEY, self.memo_cache, batch_size = self.metrics_drain_batch_size)
+        for entry in self.memo_cache.pop_evicted():
+            if entry["key"] not in self.tasks:
+                self.keys_to_reclaim.append((entry["key"], entry["fargate-node"]))
+        self.schedule_reclaim()
+        return num_drained
+
+    def reuse_memoized_outputs(self, tasks, dependencies, keys, shard_binding, initial_payloads, output_copies):
+        """ Fingerprint the tasks of a new job and reuse the outputs of those whose fingerprint is in the memoization cache.
+
+            The fingerprint of a task is a hash of its serialized function and arguments (in which the references to its inputs are
+            replaced by their fingerprints) and of the fingerprints of its inputs, so tasks of later jobs get the same fingerprint
+            whatever their keys. A reused output is copied under the task's key (on the
+            Redis instance the cache entry is on, or the one the task's key is placed on), and the task is put in the "memory" state.
+            Those tasks, and the tasks that are only needed to compute them, are removed from 'tasks' and 'dependencies'. The
+            Fargate metadata of the reused outputs is added to 'initial_payloads'. Outputs that have to be copied from another Redis
+            instance are only checked here: the copies are appended to 'output_copies' and made along with the job's static schedule
+            (see upload_static_schedule), so the values aren't moved through the Scheduler on the IOLoop.
+
+            Returns the mapping of task key --> Fargate node (None for the control-plane shards) of the tasks whose output was reused. """
+        self.drain_memoized_outputs()
+        fingerprints = compute_fingerprints(tasks, dependencies, known = self.task_fingerprints)
+        hits = dict()
+        for task_key, fingerprint in fingerprints.items():
+            ts = self.tasks.get(task_key, None)
+            if ts is not None and ts.state != "released":
+                continue
+            entry = self.memo_cache.get(fingerprint)
+            if entry is not None:
+                hits[task_key] = entry
+        needed = needed_tasks(keys, dependencies, hits)
+        hits = {task_key: entry for task_key, entry in hits.items() if task_key in needed}
+
+        fargate_nodes = dict()
+        def source_client(entry):
+            if entry["fargate-node"] is None:
+                return self.dcp_ring.get_client(entry["key"])
+            return self.fargate_fleet.get_client(self.fargate_endpoint(entry["fargate-node"]))
+        def target_client(task_key, entry):
+            if not self.use_fargate:
+                return self.dcp_ring.get_client(task_key)
+            fargate_node = fargate_nodes[task_key] = entry["fargate-node"] or shard_binding.node_for_key(task_key)
+            return self.fargate_fleet.get_client(self.fargate_endpoint(fargate_node))
+
+        restored, copies = restore_outputs(hits, source_client, target_client)
+        output_copies.extend(copies)
+        memoized = dict()
+        for task_key in hits:
+            if task_key not in restored:
+                # The output is gone (e.g., its Fargate node was replaced), so the task is executed again.
+                self.memo_cache.discard(fingerprints[task_key])
+                continue
+            ts = self.tasks.get(task_key, None)
+            if ts is None:
+                ts = self.tasks[task_key] = TaskState(task_key, tasks.get(task_key))
+            ts.state = "memory"
+            fargate_node = memoized[task_key] = self.memoized_tasks[task_key] = fargate_nodes.get(task_key, None)
+            if fargate_node is not None:
+                self.tasks_to_fargate_nodes[task_key] = fargate_node
+                initial_payloads[task_key + FARGATE_DATA_SUFFIX] = ujson.dumps(fargate_node)
+
+        if len(memoized) > 0:
+            needed = needed_tasks(keys, dependencies, memoized)
+            for task_key in list(tasks):
+                if task_key in memoized or task_key not in needed:
+                    del tasks[task_key]
+                    dependencies.pop(task_key, None)
+        for task_key in tasks:
+            # The task is going to store a new output under its key, so whatever the cache has under that key is stale.
+            if task_key not in fingerprints or self.memo_cache.keys.get(task_key, None) != fingerprints[task_key]:
+                self.memo_cache.discard_key(task_key)
+        # Only the fingerprints of tasks we're going to track are kept (they're dropped once the tasks are forgotten).
+        self.task_fingerprints.update((task_key, fingerprints[task_key]) for task_key in itertools.chain(tasks, memoized) if task_key in fingerprints)
+        self.num_memoized_tasks += len(memoized)
+        return memoized
+
+    def drain_wukong_metrics(self, max_batches = None):
+        """ Move the metrics records pushed by the Task Executors out of Redis and into the metrics tables. Returns the number of records moved. """
+        num_drained = drain_metrics_list(self.dcp_redis, TASK_BREAKDOWNS, self.task_metrics, batch_size = self.metrics_drain_batch_size, max_batches = max_batches)
+        num_drained += drain_metrics_list(self.dcp_redis, LAMBDA_DURATIONS, self.lambda_metrics, batch_size = self.metrics_drain_batch_size, max_batches = max_batches)
+        return num_drained
+
+    def drain_wukong_metrics_step(self):
+        # Called periodically on the IOLoop, so only move a few batches at a time.
+        try:
+            self.drain_wukong_metrics(max_batches = METRICS_DRAIN_STEP_BATCHES)
+        except Exception as ex:
+            logger.error("Failed to drain metrics records from Redis: {}".format(ex))
+
+    @gen.coroutine
+    def drain_all_wukong_metrics(self):
+        """ Drain the outstanding metrics records a few batches at a time, letting the IOLoop run in between. Returns the number of records moved. """
+        num_drained = 0
+        while True:
+            num_moved = self.drain_wukong_metrics(max_batches = METRICS_DRAIN_STEP_BATCHES)
+            num_drained += num_moved
+            # Unless one of the lists had a full step's worth of records, both of them are empty.
+            if num_moved < METRICS_DRAIN_STEP_BATCHES * self.metrics_drain_batch_size:
+                return num_drained
+            yield gen.moment
+
+    @gen.coroutine
+    def get_wukong_metrics(self):
+        """ Drain any outstanding metrics records and return the metrics tables (see MetricsTable for percentiles and CSV/Parquet export). """
+        yield self.drain_all_wukong_metrics()
+        return {"task-metrics": self.task_metrics, "lambda-metrics": self.lambda_metrics}
 
-        return {"task-metrics": task_metrics, "lambda-metrics": lambda_metrics}
+    @gen.coroutine
+    def get_wukong_metrics_summary(self, comm = None, fields = None, q = (50, 90, 99)):
+        """ Return the number of records and the percentiles of the given numeric fields (all of them by default) of each metrics table. """
+        yield self.drain_all_wukong_metrics()
+        summary = dict()
+        for name, table in (("task-metrics", self.task_metrics), ("lambda-metrics", self.lambda_metrics)):
+            summary[name] = {
+                "num-records": len(table),
+                "percentiles": {field: table.percentiles(field, q = q) for field in table.numeric_fields if fields is None or field in fields}
+            }
+        return summary
     
     # def small_redis_statistics(self, n = 1000000):
     #     units = ""
@@ -4267,8 +4821,11 @@ class Scheduler(ServerNode):
     def check_status_of_tasks(self):
         """ Checks which tasks from the last-submitted job are done and which are not done.
 
-            For the tasks that are not done, this also returns how many of their dependencies have been resolved."""
-        print("[SCHEDULER] Checking status of last job. Need to check {} tasks.".format(len(self.last_job_tasks)))
+            For the tasks that are not done, this also returns how many of their dependencies have been resolved.
+            Tasks are identified by their keys."""
+        job = self.job_artifacts.last_job
+        job_tasks = job.tasks if job is not None else {}
+        print("[SCHEDULER] Checking status of last job. Need to check {} tasks.".format(len(job_tasks)))
         # Get current timestamp.
         _now = datetime.datetime.utcnow()        
         
@@ -4278,48 +4835,35 @@ class Scheduler(ServerNode):
         timeouts = list()
 
         counter = 1
-        for task_node, payload in self.last_job_tasks:
-            task_key = task_node.task_key 
+        for task_key, (fargate_node, num_dependencies) in list(job_tasks.items()):
             if self.print_debug:
-                print("[INFO] Processing status for task {} ({}/{}).".format(task_key, counter, len(self.last_job_tasks)))
+                print("[INFO] Processing status for task {} ({}/{}).".format(task_key, counter, len(job_tasks)))
             
-            if self.completed_tasks[task_key] == True:
-                _payload = payload.copy()
-                _payload["function"] = None
-                _payload["args"] = None
-                complete.append((task_node, _payload))
+            if self.completed_tasks.get(task_key, False) == True:
+                complete.append(task_key)
                 continue
             
-            #fargate_ip = task_node.fargate_node[FARGATE_PUBLIC_IP_KEY] 
-            fargate_ip = task_node.fargate_node[FARGATE_PRIVATE_IP_KEY] 
+            #fargate_ip = fargate_node[FARGATE_PUBLIC_IP_KEY] 
+            fargate_ip = fargate_node[FARGATE_PRIVATE_IP_KEY] 
             redis_client = redis.StrictRedis(host = fargate_ip, port = 6379, db = 0, socket_connect_timeout  = 5, socket_timeout = 5)
             val = 0
             try:
                 val = redis_client.exists(task_key)
             except Exception as ex:
                 exception_type = type(ex)
-                print("{} when attempting to check if value for key {} exists at Redis instance {}:6379. ARN: {}".format(exception_type, task_key, fargate_ip, task_node.fargate_node[FARGATE_ARN_KEY]))
-                timeouts.append(task_node)
+                print("{} when attempting to check if value for key {} exists at Redis instance {}:6379. ARN: {}".format(exception_type, task_key, fargate_ip, fargate_node[FARGATE_ARN_KEY]))
+                timeouts.append(task_key)
                 continue 
             if val == 0:
-                # Remove the function/args entries as they will just be serialized nonsense.
-                _payload = payload.copy()
-                _payload["function"] = None
-                _payload["args"] = None                    
-                incomplete.append((task_node, _payload))
+                incomplete.append(task_key)
                 dep_counter = task_key + DEPENDENCY_COUNTER_SUFFIX
-                remaining = self.dcp_redis.get(dep_counter).decode()
-                total = len(payload["dependencies"])
-                waiting_on[task_key] = (remaining, total)
+                remaining = self.dcp_ring.get_client(task_key).get(dep_counter).decode()
+                waiting_on[task_key] = (remaining, num_dependencies)
             else:
-                # Remove the function/args entries as they will just be serialized nonsense.
-                _payload = payload.copy()
-                _payload["function"] = None
-                _payload["args"] = None
-                complete.append((task_node, _payload))
+                complete.append(task_key)
             counter = counter + 1
         
-        print("[SCHEDULER] {}/{} of the tasks in the last workload have finished executing.".format(len(complete), len(self.last_job_tasks)))
+        print("[SCHEDULER] {}/{} of the tasks in the last workload have finished executing.".format(len(complete), len(job_tasks)))
         print("Additionally, there were {} timeouts.".format(len(timeouts)))
         return {
             "completed-tasks": complete,
@@ -4404,7 +4948,7 @@ class Scheduler(ServerNode):
             print("Setting all seen-leaf-task interation counters to -1.")
             # Reset all counters. It's possible we could use the same keys again,
             # particularly if the users are seeding the RNG or using the same input data.
-            self.dcp_redis.mset(mapping)
+            self.dcp_ring.mset(mapping)
 
         # Clear this.
         self.seen_leaf_tasks = dict()
@@ -4413,20 +4957,26 @@ class Scheduler(ServerNode):
         """Clear the data stored at keys corresponding to Wukong metrics on the Redis instance."""
         if task_breakdowns:
             self.dcp_redis.delete(TASK_BREAKDOWNS)
+            self.task_metrics.clear()
         if lambda_durations:
             self.dcp_redis.delete(LAMBDA_DURATIONS)
+            self.lambda_metrics.clear()
         if fan_in_data:
             self.dcp_redis.delete("fan-in-data")
         if fan_out_data:
             self.dcp_redis.delete("fan-out-data")
         return True 
     
-    def reset_fargate_metrics(self, full_clear = False):
+    def reset_fargate_metrics(self, full_clear = False, reset_node_stats = False):
         """ Clear the fargate_metrics dictionary by setting all values to default (most likely 0).
 
             Args:
                 full_clear (bool): If True, then this will clear out the keys of the fargate_metrics dictionary entirely.
+
+                reset_node_stats (bool): If True, also reset the statistics reported by INFO on every Fargate node (concurrently).
         """
+        if reset_node_stats:
+            self.run_on_fargate_nodes(FargateFleet.reset_stats)
         if full_clear:
             if self.print_debug:
                 print("[WARNING] Scheduler is clearing fargate_metrics dictionary...")
@@ -4439,19 +4989,43 @@ class Scheduler(ServerNode):
                 self.fargate_metrics[key][FARGATE_NUM_SELECTED] = 0
 
     @gen.coroutine 
-    def handle_redis_proxy_channels(self, num_channels, base_name, **msg):
+    def handle_redis_proxy_channels(self, num_channels, base_name, workers = None, **msg):
         """ Handles receiving message from Proxy telling Scheduler how to construct
-            list of Redis Channel Names. """
+            list of Redis Channel Names. 
+            
+            If the proxy is sharded across several worker processes, then 'workers' is a list 
+            containing the number of channels and the base channel name of each worker. """
         print("[ {} ] Received message from Proxy!\nNumber of Redis Proxy Channels: {}".format(datetime.datetime.utcnow(), num_channels))
         self.redis_channel_names_for_proxy = []
+        self.redis_channel_names_for_proxy_workers = []
         # self.proxy_comm = comm
         # Populate the list with channel names.
-        for i in range(num_channels):
-            self.redis_channel_names_for_proxy.append(base_name + str(i))
+        if workers:
+            for worker in sorted(workers, key = lambda worker: worker["worker-id"]):
+                worker_channels = [worker["base_name"] + str(i) for i in range(worker["num_channels"])]
+                self.redis_channel_names_for_proxy_workers.append(worker_channels)
+                self.redis_channel_names_for_proxy.extend(worker_channels)
+            print("Proxy is sharded across {} worker processes.".format(len(workers)))
+        else:
+            for i in range(num_channels):
+                self.redis_channel_names_for_proxy.append(base_name + str(i))
         self.current_redis_proxy_channel_index = 0
-        self.num_redis_proxy_channels = num_channels
+        self.num_redis_proxy_channels = len(self.redis_channel_names_for_proxy)
         # yield self.handle_stream(comm = self.proxy_comm)
 
+    def get_proxy_channel_for_task(self, task_key):
+        """ Return the Redis channel that Task Executors should use when handing the given task off to the KV Store Proxy.
+
+            If the proxy is sharded, then the channel belongs to the proxy worker which owns the task. Channels are assigned
+            round-robin (within a worker, if applicable). Returns None if the proxy has not told us about its channels. """
+        if self.num_redis_proxy_channels == 0:
+            return None
+        self.current_redis_proxy_channel_index += 1
+        if len(self.redis_channel_names_for_proxy_workers) > 0:
+            worker_channels = self.redis_channel_names_for_proxy_workers[proxy_worker_for_key(task_key, len(self.redis_channel_names_for_proxy_workers))]
+            return worker_channels[self.current_redis_proxy_channel_index % len(worker_channels)]
+        return self.redis_channel_names_for_proxy[self.current_redis_proxy_channel_index % self.num_redis_proxy_channels]
+
     def result_from_lambda_centralized(self, comm, messages, time_received_from_scheduler, time_sent_to_scheduler, lambda_length = None, **msg):  
         """ Handle the result from executing a task on AWS Lambda. """
         self.num_messages_received_from_lambda = self.num_messages_received_from_lambda + 1
@@ -4482,7 +5056,11 @@ class Scheduler(ServerNode):
     def obtained_valid_result_from_lambda(self, task_key, **msg):
         validate_key(task_key)
         r = self.stimulus_task_finished_lambda(key=task_key, **msg)
-        self.transitions(r)        
+        # When processing a batch of messages, the recommendations are processed once the whole batch has been handled.
+        if self.batched_recommendations is not None:
+            self.batched_recommendations.update(r)
+        else:
+            self.transitions(r)        
       
     def handle_uncaught_error(self, **msg):
         logger.exception(clean_exception(**msg)[1])
@@ -5526,6 +6104,43 @@ class Scheduler(ServerNode):
         """
         return sum(dts.nbytes for dts in ts.dependencies - ws.has_what) / self.bandwidth
 
+    def update_task_duration(self, prefix, duration):
+        """ Update the average duration of the tasks with the given prefix (e.g., with the execution time reported by a Lambda). """
+        old_duration = self.task_duration.get(prefix, 0)
+        if not old_duration:
+            self.task_duration[prefix] = duration
+        else:
+            self.task_duration[prefix] = 0.5 * old_duration + 0.5 * duration
+
+    def compute_critical_path_lengths(self, roots, default_duration=0.5):
+        """
+        Estimate, for each task downstream of (and including) the given tasks,
+        the total duration of the longest chain of tasks starting at that task.
+
+        Task durations come from ``task_duration`` (the average duration of
+        tasks with the same prefix) when available, and default to
+        ``default_duration`` seconds otherwise.
+
+        Returns a dictionary mapping task keys to critical path lengths.
+        """
+        lengths = dict()
+        for root in roots:
+            # Iterative post-order traversal (graphs can be far deeper than the recursion limit).
+            stack = [(root, False)]
+            while stack:
+                ts, expanded = stack.pop()
+                if ts.key in lengths:
+                    continue
+                if expanded:
+                    downstream = max([lengths[dts.key] for dts in ts.dependents], default=0)
+                    lengths[ts.key] = self.task_duration.get(ts.prefix, default_duration) + downstream
+                else:
+                    stack.append((ts, True))
+                    for dts in ts.dependents:
+                        if dts.key not in lengths:
+                            stack.append((dts, False))
+        return lengths
+
     def get_task_duration(self, ts, default=0.5):
         """
         Get the estimated computation cost of the given task
@@ -5702,6 +6317,10 @@ class Scheduler(ServerNode):
             msg["type"] = type
         self.report(msg)
 
+        # The tasks fused into this one were executed along with it. Their results were never stored, but they did complete.
+        for absorbed_key in self.fused_tasks.pop(ts.key, ()):
+            self.report({"op": "key-in-memory", "key": absorbed_key})
+
         ts.state = "memory"
         ts.type = typename
 
@@ -6372,7 +6991,7 @@ class Scheduler(ServerNode):
                 #    ts.waiting_on.add(dts)
                 # Check both the big and small hash rings.
                 #if self.big_hash_ring[dts.key].exists(dts.key) == 0 and self.small_hash_ring[dts.key].exists(dts.key) == 0:
-                if self.dcp_redis.exists(dts.key) == 0:
+                if self.dcp_ring.get_client(dts.key).exists(dts.key) == 0:
                     ts.waiting_on.add(dts)
                 if dts.state == "released":
                     recommendations[dep] = "waiting"
@@ -6425,7 +7044,7 @@ class Scheduler(ServerNode):
                 #if self.get_redis_client(dts.key).exists(dts.key) == 0:
                 #    ts.waiting_on.add(dts)     
                 #if self.big_hash_ring[dts.key].exists(dts.key) == 0 and self.small_hash_ring[dts.key].exists(dts.key) == 0:
-                if self.dcp_redis.exists(dts.key) == 0:
+                if self.dcp_ring.get_client(dts.key).exists(dts.key) == 0:
                     ts.waiting_on.add(dts)
                 # if not dts.who_has:
                     # ts.waiting_on.add(dep)
@@ -7241,6 +7860,12 @@ class Scheduler(ServerNode):
 
             finish2 = ts.state
             self.transition_log.append((key, start, finish2, recommendations, time()))
+            if key in self.proxy_job_of_task and finish2 in ("memory", "erred", "forgotten"):
+                self.proxy_job_task_finished(key, finish2)
+            if key in self.constant_job_of_task and finish2 in ("memory", "erred", "forgotten"):
+                self.constant_job_task_finished(key)
+            if finish2 == "forgotten":
+                self.forget_task_artifacts(key)
             if self.validate:
                 logger.debug(
                     "Transitioned %r %s->%s (actual: %s).  Consequence: %s",
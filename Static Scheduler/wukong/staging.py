@@ -0,0 +1,189 @@
+from __future__ import print_function, division, absolute_import
+
+from collections import OrderedDict
+import hashlib
+import pickle
+
+import cloudpickle
+
+from .fusion import FUSED_TASKS_KEY
+
+# Key in a task's run spec (and thus in the payload sent to the Task Executors) listing the hashes of the constants staged out of it.
+STAGED_CONSTANTS_KEY = "staged-constants"
+
+# A staged constant is replaced (in the run spec, or in its serialized arguments) by this prefix followed by the constant's hash.
+STAGED_CONSTANT_PREFIX = "--staged-constant--"
+
+# Appended to the hash of a constant to get the Redis key (on the control-plane shards) under which it is stored.
+CONSTANT_KEY_SUFFIX = "---constant"
+
+# Fields of a run spec which may be staged, and those of them which hold serialized arguments (whose large elements are staged individually).
+STAGED_FIELDS = ("function", "args", "kwargs")
+ARGUMENT_FIELDS = ("args", "kwargs")
+
+# Default maximum total size (in bytes) of the constants kept on the control-plane shards for reuse by later jobs.
+DEFAULT_STAGED_CONSTANT_BYTES = 256 * 1024 * 1024
+
+def constant_hash(serialized):
+    """ Return the content hash of a serialized constant. """
+    return hashlib.sha256(serialized).hexdigest()
+
+def constant_key(digest):
+    """ Return the Redis key under which the constant with the given hash is stored. """
+    return digest + CONSTANT_KEY_SUFFIX
+
+def stage_arguments(serialized, threshold, constants, loads = pickle.loads, dumps = cloudpickle.dumps):
+    """ Stage the elements of a serialized tuple or list of arguments (or the values of a dictionary of keyword arguments) which
+        are at least 'threshold' bytes once serialized.
+
+        Returns a tuple (serialized arguments with references in place of the staged elements, list of hashes), or None if the
+        arguments can't be deserialized here or none of the elements is large enough. """
+    try:
+        container = loads(serialized)
+    except Exception:
+        return None
+    if type(container) is dict:
+        staged = dict(container)
+        indices = list(staged)
+    elif type(container) in (tuple, list):
+        staged = list(container)
+        indices = range(len(staged))
+    else:
+        return None
+
+    digests = []
+    for index in indices:
+        element = staged[index]
+        if isinstance(element, (bool, int, float, type(None))) or isinstance(element, (str, bytes)) and len(element) < threshold:
+            continue
+        try:
+            element_serialized = dumps(element)
+        except Exception:
+            continue
+        if len(element_serialized) < threshold:
+            continue
+        digest = constant_hash(element_serialized)
+        constants[digest] = element_serialized
+        staged[index] = STAGED_CONSTANT_PREFIX + digest
+        digests.append(digest)
+    if len(digests) == 0:
+        return None
+    if type(container) is tuple:
+        staged = tuple(staged)
+    return dumps(staged), digests
+
+def stage_run_spec(run_spec, threshold, constants):
+    """ Stage the large constants of a single (serialized) run spec. Returns the number of constants staged out of it. """
+    digests = []
+    for field in STAGED_FIELDS:
+        value = run_spec.get(field, None)
+        if not isinstance(value, bytes) or len(value) < threshold:
+            continue
+        staged = stage_arguments(value, threshold, constants) if field in ARGUMENT_FIELDS else None
+        if staged is not None:
+            run_spec[field], field_digests = staged
+            digests.extend(field_digests)
+        else:
+            # The whole field (e.g., a function closing over a large lookup table) is staged.
+            digest = constant_hash(value)
+            constants[digest] = value
+            run_spec[field] = STAGED_CONSTANT_PREFIX + digest
+            digests.append(digest)
+    if len(digests) > 0:
+        run_spec[STAGED_CONSTANTS_KEY] = sorted(set(digests))
+    return len(digests)
+
+def stage_constants(tasks, threshold, constants = None):
+    """ Replace the large constants in the run specs of the given tasks by references to their content hashes.
+
+    A serialized function, or the serialized arguments of a task, at least 'threshold' bytes in size is looked into: each of its
+    arguments (or keyword arguments) which is at least 'threshold' bytes once serialized is replaced by STAGED_CONSTANT_PREFIX
+    followed by the hash of its serialized form. If no single argument is that large (or the arguments can't be deserialized by
+    the Scheduler), the field as a whole is replaced by a reference. The hashes a run spec references are listed under
+    STAGED_CONSTANTS_KEY, so the Task Executor can fetch them (and cache them across tasks) before deserializing the task. Each
+    distinct constant is thus stored once, however many tasks (and paths) it appears in. The run specs of fused tasks are staged
+    as well.
+
+    'tasks' is modified in place.
+
+    Parameters
+    ----------
+    tasks : dict
+        Mapping of task keys to (serialized) run specs, as passed to update_graph.
+    threshold : int
+        Minimum size (in bytes) of a serialized constant for it to be staged.
+    constants : dict
+        Mapping of hash --> serialized constant, to which the staged constants are added.
+
+    Returns the mapping of hash --> serialized constant.
+    """
+    constants = dict() if constants is None else constants
+    for key, run_spec in tasks.items():
+        if not isinstance(run_spec, dict):
+            continue
+        run_spec = dict(run_spec)
+        num_staged = stage_run_spec(run_spec, threshold, constants)
+        if FUSED_TASKS_KEY in run_spec:
+            run_spec[FUSED_TASKS_KEY] = [dict(fused_run_spec) for fused_run_spec in run_spec[FUSED_TASKS_KEY]]
+        for fused_run_spec in run_spec.get(FUSED_TASKS_KEY, ()):
+            num_staged += stage_run_spec(fused_run_spec, threshold, constants)
+        if num_staged > 0:
+            tasks[key] = run_spec
+    return constants
+
+class StagedConstants(object):
+    """ Index of the constants stored on the control-plane shards, by hash.
+
+        A constant is added once it has been stored, along with the job that stored it, and each later job referencing it is
+        recorded as one of its users. The constants are kept in least-recently-used order; once their total size exceeds
+        'max_bytes', the least recently used ones whose jobs are all gone are evicted (see evict), so they can be deleted.
+    """
+    def __init__(self, max_bytes = DEFAULT_STAGED_CONSTANT_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()        # Mapping of hash --> (size in bytes, set of IDs of the jobs using it), least recently used first.
+        self.num_bytes = 0
+        self.num_evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, digest):
+        return digest in self.entries
+
+    def use(self, digest, job_id):
+        """ Record that the given job references the constant. Returns False if the constant isn't stored. """
+        entry = self.entries.get(digest, None)
+        if entry is None:
+            return False
+        entry[1].add(job_id)
+        self.entries.move_to_end(digest)
+        return True
+
+    def add(self, digest, nbytes, job_id):
+        """ Record that the given job has stored the constant. """
+        if self.use(digest, job_id):
+            return
+        self.entries[digest] = (nbytes, {job_id})
+        self.num_bytes += nbytes
+
+    def evict(self, is_running):
+        """ Evict the least recently used constants until their total size is within 'max_bytes'. Constants used by a job for
+            which 'is_running' (called with a job ID) returns True are kept. Returns the hashes of the evicted constants. """
+        evicted = []
+        for digest in list(self.entries):
+            if self.num_bytes <= self.max_bytes:
+                break
+            nbytes, job_ids = self.entries[digest]
+            running = set(job_id for job_id in job_ids if is_running(job_id))
+            if len(running) > 0:
+                self.entries[digest] = (nbytes, running)
+                continue
+            del self.entries[digest]
+            self.num_bytes -= nbytes
+            self.num_evictions += 1
+            evicted.append(digest)
+        return evicted
+
+    def clear(self):
+        self.entries.clear()
+        self.num_bytes = 0
@@ -72,6 +72,22 @@ def test_BatchedSend():
         assert b.byte_count > 1
 
 
+@gen_test()
+def test_send_many():
+    with echo_server() as e:
+        comm = yield connect(e.address)
+
+        b = BatchedSend(interval=10)
+        b.start(comm)
+
+        b.send("hello")
+        b.send_many(["a", "b", "c"])
+
+        result = yield comm.read()
+        assert result == ("hello", "a", "b", "c")
+        assert b.message_count == 4
+
+
 @gen_test()
 def test_send_before_start():
     with echo_server() as e:
@@ -0,0 +1,84 @@
+from __future__ import print_function, division, absolute_import
+
+import threading
+import time
+
+from wukong.bulk_loader import BulkLoader, MIN_BATCH_BYTES
+
+
+class Shard(object):
+    """ Stands in for the Redis client of a control-plane shard; each MSET takes 'delay' seconds plus 'per_byte' seconds per byte. """
+    def __init__(self, delay=0, per_byte=0):
+        self.delay = delay
+        self.per_byte = per_byte
+        self.data = {}
+        self.batches = []
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def mset(self, mapping):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        size = sum(len(k) + len(str(v)) for k, v in mapping.items())
+        time.sleep(self.delay + self.per_byte * size)
+        with self.lock:
+            self.in_flight -= 1
+            self.batches.append(size)
+            self.data.update(mapping)
+        return True
+
+
+class Ring(object):
+    def __init__(self, clients):
+        self.clients = clients
+
+    def __len__(self):
+        return len(self.clients)
+
+    def group_mapping(self, mapping):
+        groups = {}
+        for key, value in mapping.items():
+            groups.setdefault("shard-%d" % (int(key.split("-")[1]) % len(self.clients)), {})[key] = value
+        return groups
+
+
+def make_mapping(num_keys, value_size=100):
+    return {"t-%d---path" % i: "x" * value_size for i in range(num_keys)}
+
+
+def test_batches_are_size_bounded():
+    ring = Ring({"shard-0": Shard(), "shard-1": Shard()})
+    loader = BulkLoader(ring, batch_bytes=2000)
+    mapping = make_mapping(500)
+    mapping["t-1000---dep-counter"] = 0
+    stats = loader.load(mapping)
+    assert ring.clients["shard-0"].data.keys() | ring.clients["shard-1"].data.keys() == set(mapping)
+    assert all(size <= 2000 for shard in ring.clients.values() for size in shard.batches)
+    assert stats["num-keys"] == 501 and stats["num-batches"] > 20
+    assert stats["keys-per-second"] > 0 and sum(stats["shards"].values()) == 501
+    assert loader.get_metrics()["num-loads"] == 1
+    loader.close()
+
+
+def test_shards_and_connections_are_written_in_parallel():
+    ring = Ring({"shard-%d" % i: Shard(delay=0.1) for i in range(2)})
+    loader = BulkLoader(ring, connections_per_shard=4, batch_bytes=1200)
+    start = time.time()
+    stats = loader.load(make_mapping(160))
+    # 16 batches of ~10 keys; written one at a time, this would take 1.6 seconds.
+    assert time.time() - start < 0.8
+    assert stats["num-batches"] >= 16
+    assert all(shard.max_in_flight > 1 for shard in ring.clients.values())
+    loader.close()
+
+
+def test_batch_size_adapts_to_latency_bound():
+    shard = Shard(per_byte=2e-7)
+    loader = BulkLoader(Ring({"shard-0": shard}), connections_per_shard=1, batch_bytes=1024 * 1024, max_batch_latency=0.05)
+    stats = loader.load(make_mapping(5000, value_size=1000))
+    # A full batch takes ~0.2 seconds, so the batches shrink until they take less than the bound.
+    assert MIN_BATCH_BYTES <= stats["batch-bytes"] < 256 * 1024
+    assert max(shard.batches[3:]) * 2e-7 < 0.05
+    loader.close()
@@ -0,0 +1,68 @@
+from __future__ import print_function, division, absolute_import
+
+import socket
+import time
+
+from wukong.fargate_fleet import FargateFleet
+
+
+class SlowNode(object):
+    """ Stands in for the Redis client of a storage node that takes 'delay' seconds to respond (and fails if 'error' is set). """
+    def __init__(self, delay, error=None):
+        self.delay = delay
+        self.error = error
+
+    def ping(self):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return True
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_nodes_are_contacted_concurrently():
+    nodes = {"10.0.0.%d:6379" % i: SlowNode(0.5) for i in range(8)}
+    nodes["10.0.0.100:6379"] = SlowNode(0.5, error=ConnectionError("unreachable"))
+    fleet = FargateFleet(max_concurrency=16, client_factory=lambda host, port: nodes["%s:%d" % (host, port)])
+
+    start = time.time()
+    results = fleet.ping(list(nodes))
+    # Serially, this would take 4.5 seconds.
+    assert time.time() - start < 2
+    assert sorted(endpoint for endpoint, result in results.items() if not result["ok"]) == ["10.0.0.100:6379"]
+
+    assert fleet.get_metrics()["num-unhealthy"] == 1
+    assert not fleet.is_healthy("10.0.0.100")
+    assert fleet.health_table()["10.0.0.100:6379"]["last-error"] == "unreachable"
+    assert "10.0.0.100:6379" not in fleet.healthy_nodes(list(nodes))
+    assert len(fleet.healthy_nodes(list(nodes))) == 8
+    fleet.close()
+
+
+def test_timeout_and_recovery():
+    node = SlowNode(1.0)
+    fleet = FargateFleet(client_factory=lambda host, port: node)
+    results = fleet.ping(["10.0.0.1"], timeout=0.1)
+    assert not results["10.0.0.1:6379"]["ok"]
+
+    node.delay = 0
+    fleet.ping(["10.0.0.1"])
+    assert fleet.is_healthy("10.0.0.1:6379")
+    fleet.close()
+
+
+def test_unreachable_redis_endpoint():
+    fleet = FargateFleet(socket_timeout=1, socket_connect_timeout=1)
+    endpoint = "127.0.0.1:%d" % free_port()
+    results = fleet.ping([endpoint])
+    assert not results[endpoint]["ok"]
+    # If every node is unhealthy, placement still gets all of them.
+    assert fleet.healthy_nodes([endpoint]) == [endpoint]
+    fleet.close()
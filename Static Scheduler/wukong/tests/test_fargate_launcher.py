@@ -0,0 +1,158 @@
+from __future__ import print_function, division, absolute_import
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from wukong.fargate_launcher import FargateMembership, FargateLauncher
+from wukong.pathing import FARGATE_ARN_KEY, FARGATE_PUBLIC_IP_KEY, FARGATE_PRIVATE_IP_KEY
+
+GROUP = "service:WukongStorageService"
+
+# Each "task" is a local process which creates its ready-file after a startup delay, then idles.
+TASK_PROGRAM = "import sys, time; time.sleep(float(sys.argv[1])); open(sys.argv[2], 'w').close(); time.sleep(120)"
+
+
+class LocalECS(object):
+    """ Stands in for the ECS and EC2 APIs. The service's tasks are local processes, and a task is RUNNING once its process is ready. """
+    def __init__(self, tmpdir, startup_delays):
+        self.tmpdir = tmpdir
+        self.startup_delays = list(startup_delays)
+        self.processes = dict()
+        self.ready_files = dict()
+        self.service = None
+        self.lock = threading.Lock()
+
+    def _start_task(self):
+        i = len(self.processes)
+        arn = "arn:task/%d" % i
+        delay = self.startup_delays[i] if i < len(self.startup_delays) else 0
+        self.ready_files[arn] = os.path.join(self.tmpdir, "task-%d" % i)
+        self.processes[arn] = subprocess.Popen([sys.executable, "-c", TASK_PROGRAM, str(delay), self.ready_files[arn]])
+
+    def describe_services(self, cluster, services):
+        return {"services": [] if self.service is None else [dict(self.service)]}
+
+    def create_service(self, desiredCount, **kwargs):
+        with self.lock:
+            self.service = {"status": "ACTIVE", "desiredCount": desiredCount}
+            for _ in range(desiredCount):
+                self._start_task()
+
+    def update_service(self, desiredCount, **kwargs):
+        with self.lock:
+            self.service["desiredCount"] = desiredCount
+            while len([p for p in self.processes.values() if p.poll() is None]) < desiredCount:
+                self._start_task()
+
+    def list_tasks(self, cluster, nextToken=None):
+        arns = sorted(self.processes)
+        # Page through the tasks two at a time.
+        start = int(nextToken or 0)
+        response = {"taskArns": arns[start:start + 2]}
+        if start + 2 < len(arns):
+            response["nextToken"] = str(start + 2)
+        return response
+
+    def describe_tasks(self, cluster, tasks):
+        descriptions = []
+        for arn in tasks:
+            i = int(arn.split("/")[1])
+            running = self.processes[arn].poll() is None and os.path.exists(self.ready_files[arn])
+            stopped = self.processes[arn].poll() is not None
+            descriptions.append({
+                "taskArn": arn,
+                "group": GROUP,
+                "lastStatus": "STOPPED" if stopped else ("RUNNING" if running else "PENDING"),
+                "containers": [{"networkInterfaces": [{FARGATE_PRIVATE_IP_KEY: "10.0.0.%d" % i}] if running else []}],
+                "attachments": [{"details": [{"value": "subnet"}, {"value": "eni-%d" % i}]}]
+            })
+        return {"tasks": descriptions}
+
+    def describe_network_interfaces(self, NetworkInterfaceIds):
+        return {"NetworkInterfaces": [{"NetworkInterfaceId": eni, "Association": {"PublicIp": "54.0.0.%s" % eni.split("-")[1]}}
+                                      for eni in NetworkInterfaceIds]}
+
+    def stop_task(self, arn):
+        self.processes[arn].terminate()
+        self.processes[arn].wait()
+
+    def close(self):
+        for process in self.processes.values():
+            process.terminate()
+            process.wait()
+
+
+def make_launcher(ecs, membership, health_check=None):
+    return FargateLauncher(ecs, ecs, membership, cluster="wukong", service_name="WukongStorageService", task_group=GROUP,
+                           poll_interval=0.05, health_check=health_check)
+
+
+def test_nodes_join_as_they_come_up(tmpdir):
+    ecs = LocalECS(str(tmpdir), startup_delays=[0.1, 0.1, 1.5, 1.5])
+    membership = FargateMembership()
+    joined = []
+    membership.add_listener(lambda event, node: joined.append((event, node[FARGATE_ARN_KEY])))
+    launcher = make_launcher(ecs, membership)
+    try:
+        start = time.time()
+        launcher.scale(4)
+        # scale() doesn't wait for the fleet.
+        assert time.time() - start < 0.5
+        assert membership.wait_for(2, timeout=10) >= 2
+        assert len(membership) < 4 and not launcher.wait(0)
+
+        assert launcher.wait(timeout=15)
+        assert sorted(arn for _, arn in joined) == ["arn:task/%d" % i for i in range(4)]
+        node = membership.nodes()[0]
+        assert node[FARGATE_PUBLIC_IP_KEY] == "54.0.0.%s" % node[FARGATE_ARN_KEY].split("/")[1]
+        assert launcher.get_metrics()["settled"]
+
+        # A stopped task leaves the table, and the launcher brings the fleet back to its desired size.
+        ecs.stop_task("arn:task/0")
+        launcher.poll()
+        assert "arn:task/0" not in membership and ("left", "arn:task/0") in joined
+        ecs.update_service(desiredCount=4)
+        launcher.scale(4)
+        assert launcher.wait(timeout=10) and len(membership) == 4
+    finally:
+        launcher.stop()
+        ecs.close()
+
+
+def test_unhealthy_nodes_do_not_join(tmpdir):
+    ecs = LocalECS(str(tmpdir), startup_delays=[0, 0])
+    membership = FargateMembership()
+    healthy = {"arn:task/0"}
+    launcher = make_launcher(ecs, membership, health_check=lambda nodes: [n for n in nodes if n[FARGATE_ARN_KEY] in healthy])
+    try:
+        launcher.scale(2)
+        assert membership.wait_for(1, timeout=10) == 1
+        assert not launcher.wait(0.3)
+        healthy.add("arn:task/1")
+        assert launcher.wait(timeout=10)
+    finally:
+        launcher.stop()
+        ecs.close()
+
+
+def test_shards_are_bound_to_nodes_that_have_joined():
+    membership = FargateMembership()
+    membership.add({FARGATE_ARN_KEY: "a"})
+    binding = membership.bind(4)
+    first = {shard: binding.node_for(shard)[FARGATE_ARN_KEY] for shard in (0, 1)}
+    assert first == {0: "a", 1: "a"}
+
+    # Shards bound after a node joins go to it; shards already bound keep their node.
+    membership.add({FARGATE_ARN_KEY: "b"})
+    assert binding.node_for(2)[FARGATE_ARN_KEY] == "b"
+    assert binding.node_for(0)[FARGATE_ARN_KEY] == "a"
+    assert binding.node_for_key("x-1") is binding.node_for(binding.shard_of("x-1"))
+
+    # The first binding waits for 'min_nodes' nodes.
+    empty = FargateMembership()
+    waiting = empty.bind(2, min_nodes=1, timeout=5)
+    threading.Timer(0.2, empty.add, args=[{FARGATE_ARN_KEY: "c"}]).start()
+    assert waiting.node_for(0)[FARGATE_ARN_KEY] == "c"
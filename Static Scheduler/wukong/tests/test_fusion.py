@@ -0,0 +1,115 @@
+from __future__ import print_function, division, absolute_import
+
+import pickle
+
+from wukong.fusion import fuse_tasks, FUSED_TASKS_KEY
+
+
+def inc(x):
+    return x + 1
+
+
+def add(x, y):
+    return x + y
+
+
+def serialize(task):
+    return pickle.dumps(task)
+
+
+def chain(n):
+    """ x-0 --> x-1 --> ... --> x-(n-1) """
+    tasks = {"x-0": serialize((inc, 0))}
+    dependencies = {"x-0": set()}
+    for i in range(1, n):
+        tasks["x-%d" % i] = serialize((inc, "x-%d" % (i - 1)))
+        dependencies["x-%d" % i] = {"x-%d" % (i - 1)}
+    return tasks, dependencies
+
+
+def run(tasks, dependencies, key):
+    """ Execute a fused graph the way the Task Executor does (fused tasks first, results kept by key). """
+    results = {}
+
+    def execute(run_spec, data):
+        func, arg = pickle.loads(run_spec["task"])[0], pickle.loads(run_spec["task"])[1:]
+        return func(*[data.get(a, a) if isinstance(a, str) else a for a in arg])
+
+    def compute(k):
+        if k in results:
+            return results[k]
+        data = {dep: compute(dep) for dep in dependencies[k]}
+        run_spec = tasks[k] if isinstance(tasks[k], dict) else {"task": tasks[k]}
+        for fused_task in run_spec.get(FUSED_TASKS_KEY, []):
+            data[fused_task["key"]] = execute(fused_task, data)
+        results[k] = execute(run_spec, data)
+        return results[k]
+
+    return compute(key)
+
+
+def test_linear_chain():
+    tasks, dependencies = chain(5)
+    fused = fuse_tasks(tasks, dependencies, keys={"x-4"})
+
+    assert fused == {"x-4": ["x-0", "x-1", "x-2", "x-3"]}
+    assert list(tasks) == ["x-4"]
+    assert dependencies == {"x-4": set()}
+    assert [t["key"] for t in tasks["x-4"][FUSED_TASKS_KEY]] == ["x-0", "x-1", "x-2", "x-3"]
+    assert run(tasks, dependencies, "x-4") == 5
+
+
+def test_limits():
+    tasks, dependencies = chain(10)
+    fused = fuse_tasks(tasks, dependencies, keys={"x-9"}, max_tasks=4)
+    assert all(len(absorbed) <= 3 for absorbed in fused.values())
+    assert run(tasks, dependencies, "x-9") == 10
+
+    tasks, dependencies = chain(10)
+    fused = fuse_tasks(tasks, dependencies, keys={"x-9"}, max_duration=1.0,
+                       estimate_duration=lambda key: 0.4)
+    assert all(len(absorbed) <= 1 for absorbed in fused.values())
+    assert run(tasks, dependencies, "x-9") == 10
+
+    tasks, dependencies = chain(10)
+    assert fuse_tasks(tasks, dependencies, keys={"x-9"}, max_bytes=1) == {}
+    assert len(tasks) == 10
+
+
+def test_shared_and_requested_tasks_are_not_absorbed():
+    # a is used by both b and c, so it must be written out; b is requested by the client.
+    tasks = {
+        "a": serialize((inc, 1)),
+        "b": serialize((inc, "a")),
+        "c": serialize((inc, "a")),
+        "d": serialize((add, "b", "c")),
+    }
+    dependencies = {"a": set(), "b": {"a"}, "c": {"a"}, "d": {"b", "c"}}
+    fused = fuse_tasks(tasks, dependencies, keys={"b", "d"})
+
+    assert fused == {"d": ["c"]}
+    assert set(tasks) == {"a", "b", "d"}
+    assert dependencies["d"] == {"a", "b"}
+    assert run(tasks, dependencies, "d") == 6
+
+
+def test_tree():
+    tasks = {
+        "a": serialize((inc, 1)),
+        "b": serialize((inc, 2)),
+        "c": serialize((add, "a", "b")),
+    }
+    dependencies = {"a": set(), "b": set(), "c": {"a", "b"}}
+    fused = fuse_tasks(tasks, dependencies, keys={"c"})
+
+    assert sorted(fused["c"]) == ["a", "b"]
+    assert run(tasks, dependencies, "c") == 5
+
+
+def test_can_fuse():
+    tasks, dependencies = chain(4)
+    fused = fuse_tasks(tasks, dependencies, keys={"x-3"}, can_fuse=lambda key: key != "x-1")
+    assert fused == {"x-3": ["x-2"]}
+    assert dependencies["x-3"] == {"x-1"}
+    assert "x-1" in tasks and "x-0" in tasks
+    assert run(tasks, dependencies, "x-3") == 4
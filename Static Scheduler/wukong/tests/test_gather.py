@@ -0,0 +1,82 @@
+from __future__ import print_function, division, absolute_import
+
+import pickle
+import threading
+import time
+
+from wukong.gather import GatherEngine
+
+
+class Shard(object):
+    """ Stands in for the Redis client of a control-plane shard; each MGET takes 'delay' seconds. """
+    def __init__(self, data, delay=0):
+        self.data = data
+        self.delay = delay
+        self.requests = []
+
+    def mget(self, keys):
+        self.requests.append(list(keys))
+        time.sleep(self.delay)
+        return [self.data.get(key) for key in keys]
+
+
+class Ring(object):
+    def __init__(self, clients):
+        self.clients = clients
+
+    def group_keys(self, keys):
+        groups = {}
+        for key in keys:
+            groups.setdefault("shard-%d" % (int(key.split("-")[1]) % len(self.clients)), []).append(key)
+        return groups
+
+
+def make_ring(num_keys, num_shards, delay=0):
+    clients = {"shard-%d" % i: Shard({}, delay) for i in range(num_shards)}
+    ring = Ring(clients)
+    for i in range(num_keys):
+        key = "x-%d" % i
+        clients[ring.group_keys([key]).popitem()[0]].data[key] = pickle.dumps(i)
+    return ring
+
+
+def test_gather_chunks_and_missing():
+    ring = make_ring(100, 4)
+    engine = GatherEngine(ring, chunk_size=10)
+    keys = ["x-%d" % i for i in range(100)] + ["x-1000"]
+    data, missing = engine.gather(keys)
+    assert data == {"x-%d" % i: i for i in range(100)}
+    assert missing == {"x-1000"}
+    assert all(len(request) <= 10 for shard in ring.clients.values() for request in shard.requests)
+    engine.close()
+
+
+def test_shards_are_read_concurrently():
+    ring = make_ring(80, 8, delay=0.2)
+    engine = GatherEngine(ring, max_concurrency=8, chunk_size=10)
+    start = time.time()
+    data, missing = engine.gather(["x-%d" % i for i in range(80)])
+    # Serially, this would take 1.6 seconds.
+    assert time.time() - start < 0.8
+    assert len(data) == 80 and not missing
+    engine.close()
+
+
+def test_iter_values_is_progressive_and_bounded():
+    ring = make_ring(200, 2)
+    fetched = []
+    lock = threading.Lock()
+
+    def deserialize(value):
+        with lock:
+            fetched.append(value)
+        return pickle.loads(value)
+
+    engine = GatherEngine(ring, max_concurrency=2, chunk_size=10, max_in_flight=2, deserialize=deserialize)
+    values = engine.iter_values(["x-%d" % i for i in range(200)])
+    first = [next(values) for _ in range(10)]
+    assert len(first) == 10
+    # Only the chunks in flight have been fetched, not all 200 values.
+    assert len(fetched) <= 40
+    assert len(first) + len(list(values)) == 200
+    engine.close()
@@ -0,0 +1,100 @@
+from __future__ import print_function, division, absolute_import
+
+import threading
+import time
+
+from wukong.invocation_controller import InvocationController, is_throttle_error
+
+
+class TooManyRequestsException(Exception):
+    def __init__(self):
+        Exception.__init__(self, "Rate Exceeded.")
+        self.response = {"Error": {"Code": "TooManyRequestsException"}}
+
+
+class ThrottlingLambda(object):
+    """ Local stand-in for the Lambda client which throttles invocations beyond 'limit' concurrent ones. """
+    def __init__(self, limit, latency=0.005):
+        self.limit = limit
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.invoked = []
+        self.num_throttled = 0
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        with self.lock:
+            if self.active >= self.limit:
+                self.num_throttled += 1
+                raise TooManyRequestsException()
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.invoked.append((FunctionName, Payload))
+
+
+def test_is_throttle_error():
+    assert is_throttle_error(TooManyRequestsException())
+    assert not is_throttle_error(ValueError("nope"))
+
+
+def test_throttled_invocations_are_retried():
+    client = ThrottlingLambda(limit=4)
+    controller = InvocationController(client, function_name="WukongExecutor", initial_concurrency=32,
+                                      max_concurrency=32, base_backoff=0.001, max_backoff=0.01, max_retries=100)
+    payloads = ["payload-{}".format(i) for i in range(200)]
+    try:
+        assert controller.invoke_all(payloads) == len(payloads)
+    finally:
+        controller.close()
+
+    # Every payload is invoked exactly once.
+    assert sorted(payload for _, payload in client.invoked) == sorted(payloads)
+    assert client.max_active <= 4
+    assert client.num_throttled > 0
+    assert controller.num_throttled == client.num_throttled
+    assert controller.num_failed == 0
+    # The throttles pulled the concurrency limit down from its initial value.
+    assert controller.concurrency < 32
+
+
+def test_additive_increase_without_throttles():
+    client = ThrottlingLambda(limit=1000, latency=0)
+    controller = InvocationController(client, function_name="WukongExecutor", initial_concurrency=2, max_concurrency=64)
+    try:
+        controller.invoke_all(["x"] * 500)
+    finally:
+        controller.close()
+    assert controller.num_throttled == 0
+    assert controller.concurrency > 2
+    assert controller.invokes_per_second() > 0
+    assert controller.get_metrics()["num-invoked"] == 500
+
+
+def test_gives_up_after_max_retries():
+    client = ThrottlingLambda(limit=0)
+    controller = InvocationController(client, function_name="WukongExecutor", base_backoff=0.001, max_backoff=0.002, max_retries=3)
+    try:
+        assert controller.invoke_all(["x", "y"]) == 0
+    finally:
+        controller.close()
+    assert controller.num_failed == 2
+    assert controller.num_throttled == 2 * 4
+
+
+def test_priority_order():
+    client = ThrottlingLambda(limit=1, latency=0)
+    controller = InvocationController(client, function_name="WukongExecutor", initial_concurrency=1, max_concurrency=1)
+    try:
+        controller.submit("low", priority=10)
+        controller.submit("high", priority=0)
+        controller.submit("medium", priority=5, function_name="WukongInvoker")
+        controller.run_until_empty()
+    finally:
+        controller.close()
+    assert client.invoked == [("WukongExecutor", "high"), ("WukongInvoker", "medium"), ("WukongExecutor", "low")]
@@ -0,0 +1,165 @@
+from __future__ import print_function, division, absolute_import
+
+import threading
+import time
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+import ujson
+
+from wukong.batched_lambda_invoker import BatchedLambdaInvoker
+from wukong.invocation_controller import InvocationController
+from wukong.invoker_tree import (handle_invoker_event, launch_invoker_tree, split_range,
+                                 MAX_PAYLOAD_BYTES)
+
+EXECUTOR = "WukongExecutor"
+INVOKER = "WukongInvoker"
+
+
+class LocalRedis(object):
+    """ The handful of list commands used to stage payloads. """
+    def __init__(self):
+        self.data = {}
+        self.lranges = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        pass
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(value.encode() for value in values)
+
+    def expire(self, key, ttl):
+        pass
+
+    def lrange(self, key, start, end):
+        self.lranges.append(end - start + 1)
+        return self.data[key][start:end + 1]
+
+
+class LocalLambda(object):
+    """ Local Lambda emulator. Invoker events are handled synchronously by a fresh InvocationController
+    (each invocation runs in its own "container"); Executor payloads are recorded. """
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.lock = threading.Lock()
+        self.executed = []
+        self.invoker_events = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        if FunctionName == INVOKER:
+            event = ujson.loads(Payload)
+            with self.lock:
+                self.invoker_events.append(event)
+            controller = InvocationController(self, initial_concurrency=4)
+            try:
+                handle_invoker_event(event, controller, lambda address: self.redis_client)
+            finally:
+                controller.close()
+        else:
+            with self.lock:
+                self.executed.append(Payload)
+
+
+def launch(payloads, fanout, leaf_size):
+    redis_client = LocalRedis()
+    emulator = LocalLambda(redis_client)
+    controller = InvocationController(emulator, initial_concurrency=4)
+    try:
+        launch_invoker_tree(controller, payloads, EXECUTOR, INVOKER, fanout, leaf_size=leaf_size,
+                            redis_client=redis_client, redis_address="127.0.0.1")
+    finally:
+        controller.close()
+    return emulator, redis_client
+
+
+def test_split_range():
+    assert split_range(0, 10, 3) == [(0, 3), (3, 6), (6, 10)]
+    assert split_range(5, 7, 4) == [(5, 6), (6, 7)]
+    assert split_range(0, 0, 4) == []
+
+
+def test_inline_tree():
+    payloads = [ujson.dumps({"task": i}) for i in range(1000)]
+    emulator, redis_client = launch(payloads, fanout=4, leaf_size=10)
+
+    assert sorted(emulator.executed) == sorted(payloads)
+    assert redis_client.data == {}
+    assert all("payloads_serialized" in event for event in emulator.invoker_events)
+    # The root Invokers forwarded sub-batches to other Invokers.
+    assert len(emulator.invoker_events) > 4
+
+
+def test_staged_tree():
+    payloads = [ujson.dumps({"task": i, "data": "x" * 2000}) for i in range(500)]
+    assert len(ujson.dumps(payloads)) > MAX_PAYLOAD_BYTES
+    emulator, redis_client = launch(payloads, fanout=3, leaf_size=20)
+
+    assert sorted(emulator.executed) == sorted(payloads)
+    # The payloads are staged exactly once, and each Invoker only reads its own share.
+    assert len(redis_client.data) == 1
+    assert max(redis_client.lranges) <= 20
+    assert sum(redis_client.lranges) == len(payloads)
+    for event in emulator.invoker_events:
+        assert "payloads_serialized" not in event
+        assert len(ujson.dumps(event)) < MAX_PAYLOAD_BYTES
+
+
+def test_legacy_event():
+    emulator = LocalLambda(LocalRedis())
+    controller = InvocationController(emulator)
+    try:
+        num_invoked, num_invokers = handle_invoker_event(
+            {"lambda_function_name": EXECUTOR, "payloads_serialized": ["a", "b", "c"]}, controller, None)
+    finally:
+        controller.close()
+    assert (num_invoked, num_invokers) == (3, 0)
+    assert sorted(emulator.executed) == ["a", "b", "c"]
+
+
+class SlowLambda(object):
+    """ Records each invocation, and how many were in flight at once. """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.invoked = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+            self.invoked.append((FunctionName, Payload))
+
+
+def test_batched_invoker_invokes_concurrently():
+    # Executors are invoked directly, or (for large batches, without an invoker tree) through one Invoker per 50 of them.
+    for force_use_invoker_lambdas, function_name, num_invocations in ((False, EXECUTOR, 200), (True, INVOKER, 4)):
+        emulator = SlowLambda()
+        invoker = BatchedLambdaInvoker("1ms", num_invokers=0, redis_address="127.0.0.1",
+                                       force_use_invoker_lambdas=force_use_invoker_lambdas)
+        invoker.controller = InvocationController(emulator, initial_concurrency=4)
+
+        @gen.coroutine
+        def run():
+            IOLoop.current().spawn_callback(invoker._background_send)
+            for i in range(200):
+                invoker.send(ujson.dumps({"task-key": "t-%d" % i}))
+            while len(emulator.invoked) < num_invocations:
+                yield gen.sleep(0.01)
+            invoker.please_stop = True
+            invoker.waker.set()
+            yield invoker.stopped.wait()
+
+        try:
+            IOLoop.current().run_sync(run, timeout=30)
+        finally:
+            invoker.controller.close()
+        assert len(emulator.invoked) == num_invocations and emulator.max_in_flight > 1
+        assert set(name for name, _ in emulator.invoked) == {function_name}
+        assert invoker.total_lambdas_invoked == 200
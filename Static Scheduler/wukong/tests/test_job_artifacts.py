@@ -0,0 +1,121 @@
+from __future__ import print_function, division, absolute_import
+
+from wukong.job_artifacts import JobArtifactRegistry
+
+FARGATE_NODE = {"taskArn": "arn", "private_ip": "10.0.0.1"}
+
+
+def submit(registry, job_id, keys):
+    job = registry.create(job_id)
+    for key in keys:
+        registry.add_task(job, key, FARGATE_NODE, 1)
+    for key in keys:
+        registry.job_for_task(key).record_completed_task(key, {"start": 0, "stop": 1, "execution-time": 1})
+    return job
+
+
+def test_forgotten_tasks_release_job():
+    registry = JobArtifactRegistry()
+    job = submit(registry, "a", ["x", "y"])
+    assert registry.last_job is job
+    assert job.num_completed == 2 and job.num_bytes > 0
+
+    registry.forget_task("x")
+    assert "a" in registry
+    registry.forget_task("y")
+    assert "a" not in registry
+    assert registry.num_bytes() == 0
+    assert registry.task_to_job == {}
+
+
+def test_retained_bytes_constant_across_jobs():
+    registry = JobArtifactRegistry()
+    sizes = []
+    for i in range(50):
+        keys = ["task-%d-%d" % (i, j) for j in range(100)]
+        submit(registry, str(i), keys)
+        sizes.append(registry.num_bytes())
+        for key in keys:
+            registry.forget_task(key)
+    assert len(registry) == 0
+    assert max(sizes) - min(sizes) < 0.1 * max(sizes)
+
+
+def test_eviction_and_reused_tasks():
+    registry = JobArtifactRegistry(max_jobs=2)
+    submit(registry, "a", ["x"])
+    job_b = submit(registry, "b", ["x", "y"])
+    # "x" now belongs to the newer job.
+    assert registry.job_for_task("x") is job_b
+    assert "a" not in registry
+
+    submit(registry, "c", ["z"])
+    submit(registry, "d", ["w"])
+    assert list(registry.jobs) == ["c", "d"]
+    assert registry.get_metrics()["num-evicted"] == 1
+
+    assert registry.job_for_task("x") is None
+
+    job_c = registry.jobs["c"]
+    job_c.record_completed_task("z", {"start": 1})
+    assert isinstance(job_c.completed_task_data["z"], list)
+    registry.forget_task("z")
+    assert "z" not in job_c.completed_task_data
+
+
+def test_releasing_requested_keys_releases_job():
+    registry = JobArtifactRegistry()
+    job = registry.create("a", requested_keys={"z"})
+    for key in ["x", "y", "z"]:
+        registry.add_task(job, key, FARGATE_NODE, 1)
+
+    # Intermediate tasks can be forgotten on their own.
+    assert registry.forget_task("x") == [("x", FARGATE_NODE)]
+    assert "a" in registry
+
+    # Once the client releases the result, the keys of the job's remaining tasks are released with it.
+    assert sorted(registry.forget_task("z")) == [("y", FARGATE_NODE), ("z", FARGATE_NODE)]
+    assert "a" not in registry
+    assert registry.task_to_job == {}
+    assert registry.forget_task("y") == []
+
+
+def test_evicted_jobs_still_release_their_keys():
+    registry = JobArtifactRegistry(max_jobs=2)
+    jobs = []
+    for i in range(5):
+        job = registry.create(str(i), requested_keys={"out-%d" % i})
+        jobs.append(job)
+        for key in ["in-%d" % i, "out-%d" % i]:
+            registry.add_task(job, key, FARGATE_NODE, 1)
+        job.record_completed_task("in-%d" % i, {"start": 0})
+    assert list(registry.jobs) == ["3", "4"] and registry.num_evicted == 3
+    # Only the index of keys of the evicted jobs is kept.
+    assert registry.job_for_task("in-0") is None and jobs[0].completed_task_data == {}
+    assert jobs[0].num_bytes < jobs[4].num_bytes
+
+    assert registry.forget_task("in-0") == [("in-0", FARGATE_NODE)]
+    assert registry.forget_task("out-0") == [("out-0", FARGATE_NODE)]
+    assert sorted(registry.forget_task("out-1")) == [("in-1", FARGATE_NODE), ("out-1", FARGATE_NODE)]
+    assert registry.forget_task("in-1") == []
+    for i in range(2, 5):
+        assert len(registry.forget_task("out-%d" % i)) == 2
+    assert registry.task_to_job == {} and len(registry) == 0 and registry.num_released == 2
+
+
+def test_job_timings():
+    registry = JobArtifactRegistry()
+    job = registry.create("a")
+    job.record_timing("received", 10.0)
+    job.record_timing("submitted", 9.5)
+    job.record_timing("schedule-built", 12.0)
+    job.record_timing("uploaded", 12.5)
+    job.record_timing("first-leaf-enqueued", 13.0)
+    # Only the first time a milestone is reached counts.
+    job.record_timing("first-leaf-enqueued", 20.0)
+    assert job.get_latencies() == {
+        "schedule-build-time": 2.0,
+        "upload-time": 0.5,
+        "submission-to-first-leaf": 3.5,
+    }
+    assert registry.get_metrics()["jobs"]["a"]["timings"]["received"] == 10.0
@@ -0,0 +1,112 @@
+from __future__ import print_function, division, absolute_import
+
+import json
+import pickle
+
+import cloudpickle
+
+from wukong.memoization import MemoCache, compute_fingerprints, copy_outputs, needed_tasks, restore_outputs
+
+
+def add(x, y):
+    return x + y
+
+
+def spec(*args):
+    return {"function": cloudpickle.dumps(add), "args": pickle.dumps(args)}
+
+
+class Instance(object):
+    """ Stands in for a Redis instance: a pipeline of EXISTS, DUMP, RESTORE, and EVAL of the copy script. """
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+        self.queued = []
+        self.num_pipelines = 0
+
+    def pipeline(self, transaction=True):
+        self.num_pipelines += 1
+        return self
+
+    def exists(self, key):
+        self.queued.append(lambda: int(key in self.data))
+
+    def dump(self, key):
+        self.queued.append(lambda: None if key not in self.data else ("dumped", self.data[key]))
+
+    def restore(self, key, ttl, value, replace=False):
+        self.queued.append(lambda: self.data.__setitem__(key, value[1]))
+
+    def eval(self, script, num_keys, source, target):
+        def copy():
+            if source in self.data:
+                self.data[target] = self.data[source]
+            return int(source in self.data)
+        self.queued.append(copy)
+
+    def execute(self):
+        results = [command() for command in self.queued]
+        self.queued = []
+        return results
+
+
+def test_fingerprints_depend_on_content_not_keys():
+    first = compute_fingerprints({"a-1": spec(1, 2), "b-1": spec(3, 4), "c-1": spec(5, 6)}, {"c-1": {"a-1", "b-1"}})
+    second = compute_fingerprints({"a-2": spec(1, 2), "b-2": spec(3, 4), "c-2": spec(5, 6)}, {"c-2": {"a-2", "b-2"}})
+    assert [first[k + "-1"] for k in "abc"] == [second[k + "-2"] for k in "abc"]
+
+    # A change upstream changes the fingerprints of everything downstream of it.
+    third = compute_fingerprints({"a-3": spec(1, 2), "b-3": spec(3, 5), "c-3": spec(5, 6)}, {"c-3": {"a-3", "b-3"}})
+    assert third["a-3"] == first["a-1"] and third["b-3"] != first["b-1"] and third["c-3"] != first["c-1"]
+
+    # Dependencies outside of the graph use the known fingerprints; tasks that can't be fingerprinted have none.
+    fourth = compute_fingerprints({"c-4": spec(5, 6)}, {"c-4": {"a-1", "b-1"}}, known=first)
+    assert fourth["c-4"] == first["c-1"]
+    assert compute_fingerprints({"x": {"task": object()}}, {}) == {}
+
+
+def test_fingerprints_ignore_the_keys_of_referenced_inputs():
+    def job(suffix, b_args=(3, 4)):
+        a, b = "a-" + suffix, ("b", suffix)
+        tasks = {a: spec(1, 2), b: spec(*b_args), "c-" + suffix: spec(a, [b, "x"]), "d-" + suffix: spec(b, a)}
+        return compute_fingerprints(tasks, {"c-" + suffix: {a, b}, "d-" + suffix: {a, b}})
+
+    first, second = job("1"), job("2")
+    assert [first[k + "-1"] for k in "acd"] == [second[k + "-2"] for k in "acd"]
+    # The inputs are told apart by where they are referenced, not by their keys.
+    assert first["c-1"] != first["d-1"]
+    assert job("3", b_args=(3, 5))["c-3"] != first["c-1"]
+
+
+def test_cache_evicts_least_recently_used():
+    cache = MemoCache(max_bytes=100)
+    cache.put("f1", "a", nbytes=40)
+    cache.append_record(json.dumps({"fingerprint": "f2", "key": "b", "fargate-node": {"privateIpv4Address": "10.0.0.1"}, "nbytes": 40}))
+    assert cache.get("f1")["key"] == "a"
+    cache.put("f3", "c", nbytes=40)
+    # "b" was the least recently used.
+    assert "f2" not in cache and not cache.holds("b") and cache.holds("a")
+    assert [entry["key"] for entry in cache.pop_evicted()] == ["b"] and cache.pop_evicted() == []
+
+    # A new output stored under a key replaces the entry that was there.
+    cache.put("f4", "a", nbytes=10)
+    assert "f1" not in cache and cache.num_bytes == 50
+    assert cache.get_metrics()["num-evictions"] == 1 and cache.get("f5") is None
+
+
+def test_restored_tasks_prune_their_inputs():
+    dependencies = {"c": {"a", "b"}, "d": {"c"}, "e": {"b"}}
+    needed = needed_tasks(["d", "e"], dependencies, {"c"})
+    assert needed == {"d", "c", "e", "b"}
+
+    shard, other = Instance({"old-c": b"C", "old-e": b"E", "old-g": b"G"}), Instance()
+    hits = {"c": {"key": "old-c"}, "e": {"key": "old-e"}, "f": {"key": "missing"}, "g": {"key": "old-g"}, "h": {"key": "missing"}}
+    restored, copies = restore_outputs(hits, lambda entry: shard, lambda task_key, entry: other if task_key in "egh" else shard)
+    assert restored == {"c", "e", "g"}
+    assert shard.data["c"] == b"C"
+
+    # The outputs on other instances are only checked; they're copied later, off the IOLoop.
+    assert "e" not in other.data and [copy[0] for copy in copies] == ["e", "g"]
+    del shard.data["old-g"]
+    shard.num_pipelines = 0
+    assert copy_outputs(copies) == {"g"}
+    assert other.data == {"e": b"E"} and shard.num_pipelines == 1
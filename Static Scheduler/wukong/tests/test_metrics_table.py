@@ -0,0 +1,135 @@
+from __future__ import print_function, division, absolute_import
+
+import csv
+import math
+import os
+
+import cloudpickle
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from wukong.scheduler import Scheduler, TASK_BREAKDOWNS, LAMBDA_DURATIONS
+from wukong.wukong_metrics import (TaskExecutionBreakdown, LambdaExecutionBreakdown, TASK_RECORD, LAMBDA_RECORD,
+                                   pack_task_breakdown, pack_lambda_breakdown, unpack_metrics_record)
+from wukong.metrics_table import MetricsTable
+
+
+def breakdown(i):
+    b = TaskExecutionBreakdown("task-%d" % i, update_graph_id="job-1")
+    b.task_execution = float(i)
+    b.bytes_read = 100 * i
+    return b
+
+
+class Lists(object):
+    """ Stands in for the dcp_redis instance: lists, and a pipeline of LRANGE and LTRIM. """
+    def __init__(self, lists):
+        self.lists = lists
+        self.queued = []
+        self.num_ticks = 0
+        self.ticks_seen = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def lrange(self, key, start, end):
+        self.queued.append(lambda: self.lists[key][start:][:end - start + 1 if end != -1 else None])
+
+    def ltrim(self, key, start, end):
+        def trim():
+            self.lists[key] = self.lists[key][start:max(0, len(self.lists[key]) + end + 1)]
+        self.queued.append(trim)
+
+    def execute(self):
+        self.ticks_seen.append(self.num_ticks)
+        results = [command() for command in self.queued]
+        self.queued = []
+        return results
+
+
+class Metrics(object):
+    """ Stands in for the Scheduler's metrics state. """
+    drain_wukong_metrics = Scheduler.drain_wukong_metrics
+    drain_all_wukong_metrics = Scheduler.drain_all_wukong_metrics
+
+    def __init__(self, dcp_redis, batch_size):
+        self.dcp_redis = dcp_redis
+        self.metrics_drain_batch_size = batch_size
+        self.task_metrics = MetricsTable(TASK_RECORD)
+        self.lambda_metrics = MetricsTable(LAMBDA_RECORD)
+
+
+def test_metrics_are_drained_a_few_batches_at_a_time():
+    # LPUSHed, so the oldest records are at the tail.
+    tasks = [pack_task_breakdown(breakdown(i)) for i in reversed(range(100))]
+    lambdas = [pack_lambda_breakdown(LambdaExecutionBreakdown(start_time=float(i))) for i in reversed(range(3))]
+    redis = Lists({TASK_BREAKDOWNS: tasks, LAMBDA_DURATIONS: lambdas})
+    metrics = Metrics(redis, batch_size=5)
+
+    def tick():
+        redis.num_ticks += 1
+        if redis.lists[TASK_BREAKDOWNS]:
+            IOLoop.current().add_callback(tick)
+
+    @gen.coroutine
+    def drain():
+        IOLoop.current().add_callback(tick)
+        num_drained = yield metrics.drain_all_wukong_metrics()
+        return num_drained
+
+    assert IOLoop.current().run_sync(drain) == 103
+    assert metrics.task_metrics.column("task_key") == ["task-%d" % i for i in range(100)]
+    assert len(metrics.lambda_metrics) == 3 and redis.lists == {TASK_BREAKDOWNS: [], LAMBDA_DURATIONS: []}
+    # The IOLoop ran in between the steps.
+    assert len(set(redis.ticks_seen)) > 1
+
+
+def test_record_roundtrip():
+    record = pack_task_breakdown(breakdown(3))
+    version, kind, strings, numbers = unpack_metrics_record(record)
+    assert kind == TASK_RECORD
+    assert strings == ["task-3", "job-1"]
+
+    table = MetricsTable(TASK_RECORD)
+    table.append_record(record)
+    assert table.column("task_key") == ["task-3"]
+    assert table.column("task_execution").tolist() == [3.0]
+    assert table.column("bytes_read").tolist() == [300.0]
+
+    lambda_record = pack_lambda_breakdown(LambdaExecutionBreakdown(start_time=1.5, aws_request_id="req"))
+    assert len(lambda_record) < len(cloudpickle.dumps(LambdaExecutionBreakdown(start_time=1.5, aws_request_id="req")))
+    lambda_table = MetricsTable(LAMBDA_RECORD)
+    lambda_table.append_record(lambda_record)
+    assert lambda_table.column("aws_request_id") == ["req"]
+    assert lambda_table.column("start_time").tolist() == [1.5]
+
+
+def test_pickled_breakdowns_are_accepted():
+    table = MetricsTable(TASK_RECORD)
+    table.append_record(cloudpickle.dumps(breakdown(7)))
+    legacy = breakdown(8)
+    legacy.task_execution = None
+    table.append_record(cloudpickle.dumps(legacy))
+    assert table.column("task_key") == ["task-7", "task-8"]
+    values = table.column("task_execution")
+    assert values[0] == 7.0 and math.isnan(values[1])
+
+
+def test_percentiles_and_export(tmpdir):
+    table = MetricsTable(TASK_RECORD)
+    for i in range(1, 101):
+        table.append_record(pack_task_breakdown(breakdown(i)))
+    assert len(table) == 100
+    percentiles = table.percentiles("task_execution", q=(50, 99))
+    assert abs(percentiles[50] - 50.5) < 1e-9
+    assert percentiles[99] > 98
+
+    path = os.path.join(str(tmpdir), "tasks.csv")
+    table.to_csv(path)
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 100
+    assert rows[0]["task_key"] == "task-1" and float(rows[0]["task_execution"]) == 1.0
+
+    table.clear()
+    assert len(table) == 0 and len(table.column("task_execution")) == 0
@@ -0,0 +1,63 @@
+from __future__ import print_function, division, absolute_import
+
+import json
+import time
+
+import pytest
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from wukong.redis_streams import RedisStreamConsumer
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def publish(redis_client, message):
+    return redis_client.xadd("stream", {"data": json.dumps(message)})
+
+
+@gen.coroutine
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        yield gen.sleep(0.01)
+
+
+def test_consumer_replays_pending_entries_and_survives_a_flush():
+    redis_client = fakeredis.FakeStrictRedis()
+    received = []
+    consumers = []
+
+    # Three entries were delivered before a restart. One of them has since been deleted from the stream.
+    redis_client.xgroup_create("stream", "group", id="$", mkstream=True)
+    ids = [publish(redis_client, {"i": i}) for i in range(3)]
+    redis_client.xreadgroup("group", "consumer", {"stream": ">"})
+    redis_client.xdel("stream", ids[1])
+
+    @gen.coroutine
+    def run():
+        consumer = RedisStreamConsumer("localhost", "stream", "group", "consumer", received.extend, loop=IOLoop.current(),
+                                       block="50ms", max_retry_delay="100ms")
+        consumer.redis_client = redis_client
+        consumers.append(consumer)
+        consumer.start()
+        yield wait_for(lambda: len(received) == 2)
+        assert received == [{"i": 0}, {"i": 2}]
+        yield wait_for(lambda: redis_client.xpending("stream", "group")["pending"] == 0)
+
+        # The stream and its group go away. Messages published afterwards are still consumed.
+        redis_client.flushall()
+        publish(redis_client, {"i": 3})
+        yield wait_for(lambda: len(received) == 3)
+        publish(redis_client, {"i": 4})
+        yield wait_for(lambda: len(received) == 4)
+        yield wait_for(lambda: redis_client.xlen("stream") == 0)
+
+    try:
+        IOLoop.current().run_sync(run)
+    finally:
+        for consumer in consumers:
+            consumer.stop()
+    assert received[2:] == [{"i": 3}, {"i": 4}]
+    assert consumer.num_replayed == 2 and consumer.num_group_recreations >= 1 and consumer.thread.is_alive()
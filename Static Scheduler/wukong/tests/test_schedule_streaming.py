@@ -0,0 +1,179 @@
+from __future__ import print_function, division, absolute_import
+
+from functools import partial
+import json
+import pickle
+
+import cloudpickle
+import yaml
+
+from wukong.scheduler import Scheduler, DEPENDENCY_COUNTER_SUFFIX, FARGATE_DATA_SUFFIX, PATH_KEY_SUFFIX
+from wukong.staging import CONSTANT_KEY_SUFFIX
+
+
+def inc(x):
+    return x + 1
+
+
+def add(x, y):
+    return x + y
+
+
+def spec(function, *args):
+    return {"function": cloudpickle.dumps(function), "args": pickle.dumps(args)}
+
+
+class Uploader(object):
+    """ Stands in for the schedule uploader's thread: runs the uploads right away, in order. """
+    def submit(self, function, *args, **kwargs):
+        function(*args, **kwargs)
+
+
+class Store(object):
+    """ Stands in for the BulkLoader: keeps the uploaded keys. """
+    def __init__(self):
+        self.data = dict()
+
+    def load(self, payloads):
+        self.data.update(payloads)
+
+
+class Invoker(object):
+    """ Stands in for the BatchedLambdaInvoker: records each leaf payload along with the keys stored when it was invoked. """
+    def __init__(self, store):
+        self.store = store
+        self.invoked = []
+
+    def send_now(self, payloads):
+        for payload in payloads:
+            self.invoked.append((json.loads(payload), dict(self.store.data)))
+
+    def send(self, payload):
+        self.send_now([payload])
+
+
+def make_scheduler(tmpdir, **kwargs):
+    config = {"credentials": {"aws_access_key_id": None, "aws_secret_access_key": None, "aws_session_token": None},
+              "aws_lambda": {"retrieve_function_names_from_cloudformation": False, "executor_function_name": "WukongExecutor",
+                             "invoker_function_name": "WukongInvoker"}}
+    config_path = str(tmpdir.join("wukong-config.yaml"))
+    with open(config_path, "w") as f:
+        yaml.safe_dump(config, f)
+    s = Scheduler(proxy_address = "127.0.0.1", wukong_config_path = config_path, aws_region = "us-east-1", **kwargs)
+    s._address = "tcp://127.0.0.1:8786"
+    s.schedule_uploader = Uploader()
+    s.bulk_loader = Store()
+    s.batched_lambda_invoker = Invoker(s.bulk_loader)
+    return s
+
+
+def start_fleet(s, num_nodes):
+    """ Make the Scheduler's fleet of Fargate nodes look like it's up already. """
+    s.launch_fargate_nodes = lambda *args, **kwargs: s.fargate_membership.nodes()
+    for i in range(num_nodes):
+        s.fargate_membership.add({"taskARN": "arn-%d" % i, "publicIP": "10.0.0.%d" % i, "privateIpv4Address": "10.0.1.%d" % i})
+
+
+def test_streamed_batches_are_stored_before_their_leaves_are_invoked(tmpdir):
+    s = make_scheduler(tmpdir, streaming_schedule = True, streaming_batch_size = 1, use_fargate = True, num_fargate_nodes = 2)
+    start_fleet(s, 2)
+
+    # Three leaves, each in its own batch. 'c' and 'f' are fan-ins across leaves of different batches.
+    tasks = {"a": spec(inc, 1), "b": spec(inc, 2), "e": spec(inc, 3), "c": spec(add, "a", "b"), "d": spec(inc, "c"), "f": spec(add, "d", "e")}
+    dependencies = {"a": set(), "b": set(), "e": set(), "c": {"a", "b"}, "d": {"c"}, "f": {"d", "e"}}
+    dependents = {"a": {"c"}, "b": {"c"}, "e": {"f"}, "c": {"d"}, "d": {"f"}, "f": set()}
+    s.update_graph(client = "client", tasks = tasks, keys = ["f"], dependencies = dependencies)
+
+    invoked = s.batched_lambda_invoker.invoked
+    assert sorted(payload["starting-node-key"] for payload, _ in invoked) == ["a", "b", "e"]
+    assert len(set(len(stored) for _, stored in invoked)) == 3
+
+    for payload, stored in invoked:
+        leaf = payload["starting-node-key"]
+        assert leaf + PATH_KEY_SUFFIX in stored
+        # The nodes an Executor of this leaf can find without the paths of the later leaves.
+        nodes = set(payload["nodes-map"])
+        for key, value in stored.items():
+            if key.endswith(PATH_KEY_SUFFIX):
+                nodes.update(json.loads(value)["nodes-map"])
+        reachable, stack = set(), list(dependents[leaf])
+        while stack:
+            key = stack.pop()
+            if key not in reachable:
+                reachable.add(key)
+                stack.extend(dependents[key])
+        for key in reachable:
+            assert key + DEPENDENCY_COUNTER_SUFFIX in stored
+            assert key + FARGATE_DATA_SUFFIX in stored
+            assert key in nodes
+
+
+class FailingStore(Store):
+    """ A BulkLoader whose first upload fails. """
+    def __init__(self):
+        super(FailingStore, self).__init__()
+        self.num_loads = 0
+
+    def load(self, payloads):
+        self.num_loads += 1
+        if self.num_loads == 1:
+            raise ConnectionError("Connection lost.")
+        super(FailingStore, self).load(payloads)
+
+
+def test_constants_of_a_failed_upload_are_staged_again(tmpdir, monkeypatch):
+    s = make_scheduler(tmpdir, streaming_schedule = True, stage_constants_threshold = 1000)
+    start_fleet(s, 1)
+    s.bulk_loader = s.batched_lambda_invoker.store = FailingStore()
+    table = list(range(1000))
+    callbacks = []
+    monkeypatch.setattr(s.loop, "add_callback", lambda callback, *args, **kwargs: callbacks.append(partial(callback, *args, **kwargs)))
+
+    s.update_graph(client = "client", tasks = {"x": spec(len, table)}, keys = ["x"], dependencies = {"x": set()})
+    assert s.batched_lambda_invoker.invoked == []
+    for callback in callbacks:
+        callback()
+    assert s.tasks["x"].state == "erred" and len(s.staged_constants) == 0
+
+    # The next job using the constant stores it again, after which it is reused.
+    s.update_graph(client = "client", tasks = {"y": spec(len, table)}, keys = ["y"], dependencies = {"y": set()})
+    for callback in callbacks[1:]:
+        callback()
+    assert len(s.batched_lambda_invoker.invoked) == 1
+    constant_keys = [key for key in s.bulk_loader.data if key.endswith(CONSTANT_KEY_SUFFIX)]
+    assert len(constant_keys) == 1 and len(s.staged_constants) == 1
+
+
+def test_constants_of_running_jobs_outlive_their_artifacts(tmpdir, monkeypatch):
+    s = make_scheduler(tmpdir, streaming_schedule = True, stage_constants_threshold = 1000, staged_constants_bytes = 1, max_retained_jobs = 1)
+    start_fleet(s, 1)
+    callbacks = []
+    monkeypatch.setattr(s.loop, "add_callback", lambda callback, *args, **kwargs: callbacks.append(partial(callback, *args, **kwargs)))
+    # The deletions go through the schedule uploader, like the uploads.
+    unlinked = []
+    def unlink_task_keys(released):
+        for key, _ in released:
+            unlinked.append(key)
+            s.bulk_loader.data.pop(key, None)
+    s.unlink_task_keys = unlink_task_keys
+
+    def submit(key, table):
+        s.update_graph(client = "client", tasks = {key: spec(len, table)}, keys = [key], dependencies = {key: set()})
+        while callbacks:
+            callbacks.pop(0)()
+        return [key for key in s.bulk_loader.data if key.endswith(CONSTANT_KEY_SUFFIX)]
+
+    first, second, third = [list(range(i, i + 1000)) for i in range(3)]
+    [first_key] = submit("x", first)
+    submit("y", second)
+    # The artifacts of the first job are gone, but it's still running, so its constant is kept.
+    assert len(s.job_artifacts) == 1 and s.job_artifacts.num_evicted == 1
+    assert unlinked == [] and len(s.staged_constants) == 2 and len(s.constant_jobs) == 2
+
+    s.client_releases_keys(keys = ["x"], client = "client")
+    assert len(s.constant_jobs) == 1
+    submit("z", third)
+    assert unlinked == [first_key] and len(s.staged_constants) == 2
+
+    # A later job using the deleted constant stores it again.
+    assert first_key in submit("w", first)
@@ -0,0 +1,76 @@
+from __future__ import print_function, division, absolute_import
+
+import pickle
+
+import cloudpickle
+
+from wukong.fusion import FUSED_TASKS_KEY
+from wukong.staging import StagedConstants, stage_constants, STAGED_CONSTANTS_KEY, STAGED_CONSTANT_PREFIX, constant_hash
+
+THRESHOLD = 10000
+
+
+def getter(table, index):
+    return table[index]
+
+
+def resolve(run_spec, constants):
+    """ Rebuild a staged run spec's arguments the way the Task Executor does. """
+    args = run_spec["args"]
+    if isinstance(args, str):
+        return pickle.loads(constants[args[len(STAGED_CONSTANT_PREFIX):]])
+    return tuple(pickle.loads(constants[arg[len(STAGED_CONSTANT_PREFIX):]])
+                 if isinstance(arg, str) and arg.startswith(STAGED_CONSTANT_PREFIX) else arg for arg in pickle.loads(args))
+
+
+def test_large_arguments_are_staged_once():
+    table = list(range(5000))
+    tasks = {"x-%d" % i: {"function": cloudpickle.dumps(getter), "args": pickle.dumps((table, i))} for i in range(10)}
+    tasks["small"] = {"function": cloudpickle.dumps(getter), "args": pickle.dumps(([1, 2, 3], 0))}
+    original = dict(tasks)
+
+    constants = stage_constants(tasks, THRESHOLD)
+    # The table is stored once, whatever the number of tasks referencing it.
+    assert len(constants) == 1
+    digest = list(constants)[0]
+    assert digest == constant_hash(constants[digest])
+    for i in range(10):
+        run_spec = tasks["x-%d" % i]
+        assert run_spec[STAGED_CONSTANTS_KEY] == [digest]
+        assert len(run_spec["args"]) < 200
+        assert resolve(run_spec, constants) == (table, i)
+    assert tasks["small"] is original["small"]
+
+
+def test_fields_and_fused_tasks_are_staged():
+    lookup = dict(("k%d" % i, i) for i in range(5000))
+    opaque = pickle.dumps(bytearray(THRESHOLD * 2))
+    tasks = {
+        "x": {"function": cloudpickle.dumps(getter), "args": opaque,
+              FUSED_TASKS_KEY: [{"key": "y", "function": cloudpickle.dumps(getter), "args": pickle.dumps((lookup, "k1"))}]}
+    }
+    constants = stage_constants(tasks, THRESHOLD)
+    assert len(constants) == 2
+
+    # Arguments which aren't a tuple are staged as a whole.
+    assert tasks["x"]["args"] == STAGED_CONSTANT_PREFIX + constant_hash(opaque)
+    assert resolve(tasks["x"], constants) == bytearray(THRESHOLD * 2)
+    fused = tasks["x"][FUSED_TASKS_KEY][0]
+    assert fused["key"] == "y" and len(fused[STAGED_CONSTANTS_KEY]) == 1
+    assert resolve(fused, constants) == (lookup, "k1")
+
+
+def test_staged_constants_of_finished_jobs_are_evicted():
+    staged = StagedConstants(max_bytes=100)
+    staged.add("a", 40, "job-1")
+    staged.add("b", 40, "job-2")
+    assert "a" in staged and not staged.use("c", "job-3")
+    assert staged.use("a", "job-3")
+    staged.add("c", 40, "job-3")
+
+    # "b" is the least recently used, but job-2 is still running.
+    running = {"job-2", "job-3"}
+    assert staged.evict(running.__contains__) == [] and staged.num_bytes == 120
+    running.discard("job-2")
+    assert staged.evict(running.__contains__) == ["b"]
+    assert staged.num_bytes == 80 and len(staged) == 2 and staged.num_evictions == 1
@@ -1,5 +1,6 @@
 from collections import defaultdict
 from enum import Enum
+import struct
 
 # All of the possible event names.
 event_names = ["Store Intermediate Data in Cloud Storage", "Store PathNodes in Cloud Storage", "Get IP from Coordinator", "Invoke Cluster Schedulers", 
@@ -316,4 +317,81 @@ class LambdaExecutionBreakdown(object):
                 "stop": stop_time,
                 "fargateARN": fargateARN              
             }
-            # (size, _redis_read_duration, start_time, stop_time)
\ No newline at end of file
+            # (size, _redis_read_duration, start_time, stop_time)
+
+
+# Compact, fixed-layout records of the breakdowns above, which the Task Executors push to Redis instead of pickled objects.
+# A record is a header (magic, schema version, record kind), the record's string fields (each one prefixed with its length),
+# and its numeric fields packed as little-endian doubles. The collections (events, per-key read/write times, ...) are not
+# part of the record; fan-in and fan-out data are pushed separately.
+METRICS_RECORD_MAGIC = b"WKM"
+METRICS_SCHEMA_VERSION = 1
+TASK_RECORD = 1
+LAMBDA_RECORD = 2
+
+_RECORD_HEADER = struct.Struct("<3sBB")
+_STRING_LENGTH = struct.Struct("<H")
+
+# Mapping of (schema version, record kind) --> (string fields, numeric fields). When fields are added, add a new schema
+# version rather than changing an existing one, so that records pushed by older Task Executors can still be decoded.
+METRICS_SCHEMAS = {
+    (1, TASK_RECORD): (
+        ("task_key", "update_graph_id"),
+        ("task_processing_start_time", "task_processing_end_time", "total_time_spent_on_this_task",
+         "task_execution_start_time", "task_execution_end_time", "task_execution", "dependency_processing",
+         "cloud_storage_read_time", "cloud_storage_write_time", "redis_read_time", "redis_write_time",
+         "checking_and_incrementing_dependency_counters", "invoking_downstream_tasks", "publishing_messages",
+         "serialization_time", "deserialization_time", "process_task_time", "bytes_read")),
+    (1, LAMBDA_RECORD): (
+        ("aws_request_id",),
+        ("start_time", "total_duration", "number_of_tasks_executed", "process_path_time", "execution_time",
+         "cloud_storage_read_time", "cloud_storage_write_time", "redis_read_time", "redis_write_time",
+         "checking_and_incrementing_dependency_counters", "invoking_downstream_tasks", "invoking_dfs_lambdas_time",
+         "publishing_messages", "serialization_time", "deserialization_time", "process_task_time", "bytes_read",
+         "bytes_written", "install_deps_from_S3", "tasks_pulled_down", "reuse_count")),
+}
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+def pack_metrics_record(breakdown, kind, version = METRICS_SCHEMA_VERSION):
+    """ Pack the fields of a TaskExecutionBreakdown (kind = TASK_RECORD) or LambdaExecutionBreakdown (kind = LAMBDA_RECORD). """
+    string_fields, numeric_fields = METRICS_SCHEMAS[(version, kind)]
+    parts = [_RECORD_HEADER.pack(METRICS_RECORD_MAGIC, version, kind)]
+    for field in string_fields:
+        value = getattr(breakdown, field, None)
+        encoded = b"" if value is None else str(value).encode("utf-8")[:0xFFFF]
+        parts.append(_STRING_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    parts.append(struct.pack("<%dd" % len(numeric_fields), *[_as_float(getattr(breakdown, field, None)) for field in numeric_fields]))
+    return b"".join(parts)
+
+def pack_task_breakdown(breakdown):
+    return pack_metrics_record(breakdown, TASK_RECORD)
+
+def pack_lambda_breakdown(breakdown):
+    return pack_metrics_record(breakdown, LAMBDA_RECORD)
+
+def is_metrics_record(data):
+    return data[:len(METRICS_RECORD_MAGIC)] == METRICS_RECORD_MAGIC
+
+def unpack_metrics_record(data):
+    """ Unpack a record created by pack_metrics_record. Returns a tuple (version, kind, strings, numbers). """
+    magic, version, kind = _RECORD_HEADER.unpack_from(data, 0)
+    if magic != METRICS_RECORD_MAGIC:
+        raise ValueError("Not a metrics record.")
+    if (version, kind) not in METRICS_SCHEMAS:
+        raise ValueError("Unknown metrics record schema (version {}, kind {}).".format(version, kind))
+    string_fields, numeric_fields = METRICS_SCHEMAS[(version, kind)]
+    offset = _RECORD_HEADER.size
+    strings = []
+    for _ in string_fields:
+        (length,) = _STRING_LENGTH.unpack_from(data, offset)
+        offset += _STRING_LENGTH.size
+        strings.append(bytes(data[offset:offset + length]).decode("utf-8"))
+        offset += length
+    numbers = struct.unpack_from("<%dd" % len(numeric_fields), data, offset)
+    return version, kind, strings, numbers